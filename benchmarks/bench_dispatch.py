@@ -0,0 +1,110 @@
+"""
+Бенчмарк диспетчеризации текстовых сообщений: прежняя цепочка фильтров
+(лямбды кнопок, Command, регулярные выражения, TEXT_COMMANDS) против
+классификатора bot.routing. Обработчики — пустышки, поэтому замеряется
+только стоимость выбора обработчика внутри настоящего Dispatcher.
+
+Запуск:
+    python -m benchmarks.bench_dispatch --updates 20000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import Command
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fakes import FAKE_TOKEN, RecordingSession, make_message_update
+from bot.routing import route_filter, Route
+# Импорт регистрирует настоящие обработчики в классификаторе
+import bot.commands  # noqa: F401
+import bot.expense  # noqa: F401
+
+# Типичная смесь сообщений: в основном транзакции, затем кнопки и команды
+MESSAGES = (
+    ["500 продукты", "-150 такси", "+50000 зарплата", "250 кофе вчера",
+     "1200 USD билеты", "89,90 шаурма"] * 6
+    + ["Статистика", "История", "Настройки", "Помощь", "Скрыть меню"] * 2
+    + ["/stats", "/list", "/summary", "статистика", "отчет", "привет"]
+)
+
+# Текстовые команды в том виде, в каком они проверялись в main.py
+LEGACY_TEXT_COMMANDS = {"помощь", "статистика", "список", "отчет",
+                        "категории", "удалить", "меню"}
+
+
+async def noop(message) -> None:
+    """Пустой обработчик"""
+
+
+def build_legacy_dispatcher() -> Dispatcher:
+    """Воспроизводит прежний порядок фильтров из main.py, commands.py и expense.py"""
+    dp = Dispatcher()
+    dp.message(lambda message: message.text and message.text.lower() in LEGACY_TEXT_COMMANDS)(noop)
+
+    commands = Router()
+    commands.message(Command("menu"))(noop)
+    for text in ("Скрыть меню", "Статистика", "История", "Настройки", "Помощь", "Подписка"):
+        commands.message(lambda message, text=text: message.text == text)(noop)
+    commands.message(Command("start"))(noop)
+    commands.message(lambda message: message.text == "Открыть меню")(noop)
+    for name in ("help", "summary", "stats", "list", "delete", "categories"):
+        commands.message(Command(name))(noop)
+
+    expense = Router()
+    expense.message(F.text.regexp(r'^-\d+(?:[.,]\d+)?\s+\w+.*$'))(noop)
+    expense.message(F.text.regexp(r'^(-|\+)?\d+(?:[.,]\d+)?(?:\s+\S+)+$'))(noop)
+
+    dp.include_router(commands)
+    dp.include_router(expense)
+    return dp
+
+
+def build_routed_dispatcher() -> Dispatcher:
+    """Один обработчик с фильтром-классификатором"""
+    dp = Dispatcher()
+    router = Router()
+
+    @router.message(route_filter)
+    async def dispatch(message, route: Route) -> None:
+        pass
+
+    dp.include_router(router)
+    return dp
+
+
+async def run(dp: Dispatcher, updates) -> float:
+    """Прогоняет обновления через диспетчер и возвращает время, с"""
+    bot = Bot(token=FAKE_TOKEN, session=RecordingSession())
+    start = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20000,
+                        help="Количество обновлений")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    updates = [make_message_update(rng.randint(1, 1000), rng.choice(MESSAGES))
+               for _ in range(args.updates)]
+
+    for name, builder in (("цепочка фильтров", build_legacy_dispatcher),
+                          ("классификатор", build_routed_dispatcher)):
+        elapsed = asyncio.run(run(builder(), updates))
+        print(f"{name:<18} {args.updates / elapsed:10.0f} обновлений/с "
+              f"({elapsed / args.updates * 1e6:.1f} мкс на обновление)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Бенчмарк групповой записи: вставки в секунду с отдельными коммитами и через
+очередь групповой записи при 100 одновременных пользователях.
+
+Запуск:
+    python -m benchmarks.bench_group_commit --users 100 --inserts 20
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.db import Base, configure_sqlite
+from core.models import Transaction
+from core.writer import WriteQueue, insert
+
+
+def make_transaction(user_id: int) -> Transaction:
+    """Создает случайную транзакцию пользователя"""
+    return Transaction(
+        user_id=user_id,
+        amount=round(random.uniform(50, 5000), 2),
+        original_amount=None,
+        currency="RUB",
+        description="500 продукты",
+        is_expense=1,
+    )
+
+
+async def run_direct(engine, users: int, inserts: int) -> float:
+    """Каждая вставка фиксируется отдельным коммитом из своего потока"""
+    SessionLocal = sessionmaker(bind=engine)
+
+    def write_one(user_id: int) -> None:
+        db = SessionLocal()
+        try:
+            db.add(make_transaction(user_id))
+            db.commit()
+        finally:
+            db.close()
+
+    async def user(user_id: int) -> None:
+        for _ in range(inserts):
+            await asyncio.to_thread(write_one, user_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return time.perf_counter() - start
+
+
+async def run_grouped(engine, users: int, inserts: int) -> float:
+    """Вставки идут через очередь групповой записи"""
+    queue = WriteQueue(bind=engine)
+    await queue.start()
+
+    async def user(user_id: int) -> None:
+        for _ in range(inserts):
+            await queue.submit(insert(make_transaction(user_id)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    await queue.stop()
+    print(f"  коммитов: {queue.batches_committed}, "
+          f"в среднем {queue.ops_committed / max(queue.batches_committed, 1):.1f} операций на коммит")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100,
+                        help="Количество одновременных пользователей")
+    parser.add_argument("--inserts", type=int, default=20,
+                        help="Вставок на пользователя")
+    args = parser.parse_args()
+    total = args.users * args.inserts
+
+    for name, runner in (("отдельные коммиты", run_direct),
+                         ("групповая запись", run_grouped)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = configure_sqlite(
+                create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}"))
+            Base.metadata.create_all(engine)
+            print(f"{name}:")
+            elapsed = asyncio.run(runner(engine, args.users, args.inserts))
+            engine.dispose()
+        print(f"  {total} вставок за {elapsed:.2f} с — {total / elapsed:.0f} вставок/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Бенчмарк импорта выписок: время и пиковая память импорта CSV-файла на
+временной базе (LLM отключена, категории — из словаря и кэша).
+
+Запуск:
+    python -m benchmarks.bench_import --rows 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Описания операций: часть совпадает со словарем товаров, часть — нет
+DESCRIPTIONS = [
+    "Магнит", "Пятерочка", "Перекресток", "Яндекс Такси", "Кофе",
+    "Аптека 36,6", "МТС", "Кинотеатр", "ООО Ромашка", "Перевод Ивану",
+]
+
+
+def generate_statement(path: str, rows: int, seed: int = 42) -> None:
+    """Создает CSV-выписку в формате российских банков"""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Дата операции;Сумма операции;Валюта;Описание\n")
+        for i in range(rows):
+            date = start + timedelta(minutes=7 * i)
+            if rng.random() < 0.05:
+                amount = f"{rng.randint(10000, 90000)},00"
+                description = "Зарплата"
+            else:
+                amount = f"-{rng.randint(50, 5000)},{rng.randint(0, 99):02d}"
+                # Номер точки делает часть описаний уникальными
+                description = f"{rng.choice(DESCRIPTIONS)} {rng.randint(1, 300)}"
+            f.write(f"{date:%d.%m.%Y %H:%M:%S};{amount};RUB;{description}\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000,
+                        help="Строк в выписке")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # База создается до импорта модулей бота
+        os.environ["DB_PATH"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        os.environ.setdefault("BOT_TOKEN", "bench")
+        os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+        from core import llm
+        from core.db import SessionLocal, engine, init_db
+        from core.models import User, Transaction
+        from core.writer import write_queue
+        from bot.importer import import_statement
+
+        llm.LLM_AVAILABLE = False
+        init_db()
+        with SessionLocal() as db:
+            db.add(User(telegram_id=1))
+            db.commit()
+
+        path = str(Path(tmp) / "statement.csv")
+        generate_statement(path, args.rows)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+
+        async def run():
+            await write_queue.start()
+            try:
+                return await import_statement(path, 1)
+            finally:
+                await write_queue.stop()
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result = asyncio.run(run())
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        with SessionLocal() as db:
+            stored = db.query(Transaction).count()
+        engine.dispose()
+
+    print(f"Файл: {args.rows} строк, {size_mb:.1f} МБ, "
+          f"{result.descriptions} уникальных описаний")
+    print(f"Импортировано: {result.imported} (в базе {stored}), "
+          f"пропущено {result.skipped}")
+    print(f"Время: {result.elapsed:.2f} с, "
+          f"{result.imported / result.elapsed:.0f} строк/с")
+    print(f"Рост пиковой памяти: {(rss_after - rss_before) / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
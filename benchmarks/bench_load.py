@@ -0,0 +1,348 @@
+"""
+Нагрузочный прогон бота без Telegram: синтетические сообщения и нажатия
+кнопок тысяч виртуальных пользователей идут через настоящий Dispatcher
+(main.create_dispatcher) с очередью записи, а исходящие запросы
+записываются RecordingSession вместо отправки.
+
+Отчет: пропускная способность, p50/p95/p99 задержки по обработчикам (по
+деревьям core.tracing), запросы к Telegram и ожидание блокировок SQLite.
+В WAL читатели не блокируются, писатель ждет блокировку записи внутри
+первого пишущего запроса транзакции (busy_timeout) — поэтому ожиданием
+считаются пишущие запросы дольше --lock-wait-ms и ошибки "database is locked".
+Отдельно показывается, сколько соединений пула было занято одновременно:
+обработчики держат сессию через await, и при конкурентности выше размера
+пула (pool_size + max_overflow) следующий обработчик блокирует event loop
+в ожидании соединения.
+
+Запуск:
+    python -m benchmarks.bench_load --users 2000 --updates 20000 --concurrency 10
+    python -m benchmarks.bench_load --db big.db --updates 5000  # на готовой базе (меняет ее)
+    python -m benchmarks.bench_load --llm-url http://127.0.0.1:8765/v1  # с заглушкой benchmarks.mock_llm
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Доли видов обновлений в смеси: транзакции преобладают
+MIX = {
+    "transaction": 70,
+    "/stats": 6,
+    "/list": 6,
+    "/summary": 4,
+    "/categories": 2,
+    "Статистика": 2,
+    "/help": 2,
+    "list_page": 7,
+    # Графики рисуются в пуле процессов и дороги; повторы берутся из кэша
+    "chart": 1,
+}
+
+# Первый telegram_id виртуальных пользователей во временной базе
+FIRST_TELEGRAM_ID = 1_000_000
+
+# Виды пишущих запросов: в них SQLite ждет блокировку записи
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+@dataclass
+class LoadReport:
+    """Результат нагрузочного прогона"""
+    updates: int
+    concurrency: int
+    elapsed: float
+    # Обработчик -> задержки обновлений, мс
+    latencies_ms: Dict[str, List[float]]
+    telegram_calls: Dict[str, int]
+    write_statements: int = 0
+    lock_waits: int = 0
+    lock_wait_ms: float = 0.0
+    locked_errors: int = 0
+    max_in_flight: int = 0
+    max_connections: int = 0
+    pool_limit: int = 0
+    errors: List[str] = field(default_factory=list)
+    logged_errors: List[str] = field(default_factory=list)
+    # Длительности запросов к LLM, мс, и откуда взяты категории
+    llm_ms: List[float] = field(default_factory=list)
+    categorization: Dict[str, int] = field(default_factory=dict)
+
+    def format(self) -> str:
+        lines = [
+            f"Обновлений: {self.updates} за {self.elapsed:.2f} с, "
+            f"{self.updates / self.elapsed:.0f} обн/с, конкурентность {self.concurrency} "
+            f"(одновременно в обработке до {self.max_in_flight})",
+            "",
+            f"{'Обработчик':<28} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}",
+        ]
+        for name, values in sorted(self.latencies_ms.items(), key=lambda item: -len(item[1])):
+            lines.append(f"{name:<28} {len(values):>7} {percentile(values, 50):>9.1f} "
+                         f"{percentile(values, 95):>9.1f} {percentile(values, 99):>9.1f}")
+        lines.append("")
+        lines.append("Запросы к Telegram: " + ", ".join(
+            f"{name} {count}" for name, count in sorted(self.telegram_calls.items())))
+        lines.append(f"SQLite: пишущих запросов {self.write_statements}, ожиданий блокировки "
+                     f"{self.lock_waits} ({self.lock_wait_ms:.0f} мс), "
+                     f"ошибок 'database is locked' {self.locked_errors}")
+        lines.append(f"Соединений пула занято одновременно: до {self.max_connections} "
+                     f"из {self.pool_limit}")
+        if self.llm_ms:
+            lines.append(f"LLM: запросов {len(self.llm_ms)}, p50 {percentile(self.llm_ms, 50):.0f} мс, "
+                         f"p95 {percentile(self.llm_ms, 95):.0f} мс")
+        if self.categorization:
+            lines.append("Категории: " + ", ".join(
+                f"{tier} {count}" for tier, count in self.categorization.items()))
+        if self.errors:
+            lines.append(f"Исключения в обработчиках: {len(self.errors)}, первое: {self.errors[0]}")
+        if self.logged_errors:
+            lines.append(f"Ошибок в логе: {len(self.logged_errors)}, первая: {self.logged_errors[0]}")
+        return "\n".join(lines)
+
+
+class ErrorCollector(logging.Handler):
+    """Собирает ERROR-записи: обработчики ловят исключения и только логируют их"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+class LockWatcher:
+    """Считает пишущие запросы, долгие из них, ошибки блокировки и занятые соединения"""
+
+    def __init__(self, engine, threshold_ms: float):
+        from sqlalchemy import event
+
+        self.threshold = threshold_ms / 1000
+        self.writes = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.locked = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+
+        @event.listens_for(engine, "checkout")
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+        @event.listens_for(engine, "checkin")
+        def _checkin(dbapi_connection, connection_record):
+            self.checked_out -= 1
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info["lock_watch_start"] = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+                elapsed = time.perf_counter() - conn.info.pop("lock_watch_start")
+                self.writes += 1
+                if elapsed > self.threshold:
+                    self.waits += 1
+                    self.wait_time += elapsed
+
+        @event.listens_for(engine, "handle_error")
+        def _error(context):
+            if "database is locked" in str(context.original_exception):
+                self.locked += 1
+
+
+def make_updates(telegram_ids: List[int], count: int, seed: int = 42) -> list:
+    """Смесь обновлений MIX от случайных виртуальных пользователей"""
+    from benchmarks.bench_micro import make_messages
+    from benchmarks.fakes import make_callback_update, make_message_update
+
+    rng = random.Random(seed)
+    kinds = rng.choices(list(MIX), weights=list(MIX.values()), k=count)
+    texts = iter(make_messages(rng, kinds.count("transaction")))
+    period = datetime.now().strftime("%Y-%m")
+    updates = []
+    for kind in kinds:
+        user_id = rng.choice(telegram_ids)
+        if kind == "transaction":
+            updates.append(make_message_update(user_id, next(texts)))
+        elif kind == "list_page":
+            # Курсор за концом истории: листание на самые старые записи
+            updates.append(make_callback_update(user_id, "list:older:2147483647:"))
+        elif kind == "chart":
+            updates.append(make_callback_update(user_id, f"chart:pie:{period}"))
+        else:
+            updates.append(make_message_update(user_id, kind))
+    return updates
+
+
+async def replay(dp, bot, updates: list, concurrency: int) -> tuple:
+    """Прогоняет обновления через диспетчер не больше concurrency одновременно"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+    in_flight = 0
+    max_in_flight = 0
+    errors: List[str] = []
+
+    async def worker() -> None:
+        nonlocal in_flight, max_in_flight
+        while not queue.empty():
+            update = queue.get_nowait()
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            finally:
+                in_flight -= 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, max_in_flight, errors
+
+
+def run_load(users: int = 1000, updates: int = 10000, concurrency: int = 10,
+             api_latency_ms: float = 0.0, lock_wait_ms: float = 5.0,
+             seed: int = 42, use_llm: bool = False) -> LoadReport:
+    """
+    Прогоняет нагрузку в текущем процессе
+
+    База берется из DB_PATH; если в ней нет пользователей, создаются users
+    виртуальных. С use_llm категоризация обращается к LLM_BASE_URL (например,
+    к заглушке benchmarks.mock_llm), иначе LLM выключена. Диспетчер можно создать один раз на процесс, поэтому и
+    прогон — один на процесс.
+    """
+    from aiogram import Bot
+    from sqlalchemy import insert, select
+
+    import main
+    from benchmarks.fakes import FAKE_TOKEN, RecordingSession
+    from bot.middleware import TracingRequestMiddleware
+    from core import llm, tracing
+    from core.metrics import CATEGORIZATION
+    from core.db import engine, init_db
+    from core.models import User
+    from core.writer import write_queue
+
+    llm.LLM_AVAILABLE = use_llm
+    tiers = ("cache", "dictionary", "llm", "default")
+    tiers_before = {tier: CATEGORIZATION.value(tier) for tier in tiers}
+    init_db()
+    with engine.begin() as conn:
+        telegram_ids = list(conn.execute(select(User.telegram_id)).scalars())
+        if not telegram_ids:
+            telegram_ids = list(range(FIRST_TELEGRAM_ID, FIRST_TELEGRAM_ID + users))
+            conn.execute(insert(User), [{"telegram_id": telegram_id,
+                                         "first_name": f"user{telegram_id}"}
+                                        for telegram_id in telegram_ids])
+
+    tracing.trace_engine(engine)
+    watcher = LockWatcher(engine, lock_wait_ms)
+    dp = main.create_dispatcher()
+    session = RecordingSession(latency=api_latency_ms / 1000)
+    session.middleware(TracingRequestMiddleware())
+    bot = Bot(token=FAKE_TOKEN, session=session)
+    batch = make_updates(telegram_ids, updates, seed)
+
+    async def run():
+        await write_queue.start()
+        try:
+            return await replay(dp, bot, batch, concurrency)
+        finally:
+            await write_queue.stop()
+            main.shutdown_render_pool()
+
+    collector = ErrorCollector()
+    logging.getLogger().addHandler(collector)
+    try:
+        with tracing.collect_traces() as traces:
+            elapsed, max_in_flight, errors = asyncio.run(run())
+    finally:
+        logging.getLogger().removeHandler(collector)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    llm_ms: List[float] = []
+    for trace in traces:
+        handler = next((span.name for span in trace.walk() if span.kind == "handler"),
+                       "без обработчика")
+        latencies[handler].append(trace.duration * 1000)
+        llm_ms.extend(span.duration * 1000 for span in trace.walk() if span.kind == "llm")
+    calls: Dict[str, int] = defaultdict(int)
+    for _, method in session.requests:
+        calls[type(method).__name__] += 1
+
+    return LoadReport(
+        updates=len(batch), concurrency=concurrency, elapsed=elapsed,
+        latencies_ms=dict(latencies), telegram_calls=dict(calls),
+        write_statements=watcher.writes, lock_waits=watcher.waits,
+        lock_wait_ms=watcher.wait_time * 1000, locked_errors=watcher.locked,
+        max_in_flight=max_in_flight, max_connections=watcher.max_checked_out,
+        pool_limit=engine.pool.size() + engine.pool._max_overflow,
+        errors=errors, logged_errors=collector.messages, llm_ms=llm_ms,
+        categorization={tier: int(CATEGORIZATION.value(tier) - tiers_before[tier])
+                        for tier in tiers})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000,
+                        help="Виртуальных пользователей (если база пустая)")
+    parser.add_argument("--updates", type=int, default=10000,
+                        help="Обновлений в прогоне")
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="Обновлений в обработке одновременно")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0,
+                        help="Задержка ответа поддельного Telegram, мс")
+    parser.add_argument("--lock-wait-ms", type=float, default=5.0,
+                        help="Пишущий запрос дольше этого считается ожиданием блокировки")
+    parser.add_argument("--db", help="Готовая база (например, из benchmarks.gen_dataset); "
+                                     "по умолчанию — временная")
+    parser.add_argument("--llm-url", help="OpenAI-совместимый API для категоризации "
+                                          "(например, benchmarks.mock_llm); по умолчанию LLM выключена")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Подробные логи обработчиков не нужны в отчете, ошибки собираются в него
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # База выбирается до импорта модулей бота
+        db_path = Path(args.db).resolve() if args.db else Path(tmp) / "load.db"
+        os.environ["DB_PATH"] = f"sqlite:///{db_path}"
+        os.environ.setdefault("BOT_TOKEN", "bench")
+        os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+        if not args.db:
+            os.environ.setdefault("ARCHIVE_DB_PATH", str(Path(tmp) / "load_archive.db"))
+        if args.llm_url:
+            os.environ["LLM_BASE_URL"] = args.llm_url
+
+        report = run_load(args.users, args.updates, args.concurrency,
+                          args.api_latency_ms, args.lock_wait_ms, args.seed,
+                          use_llm=bool(args.llm_url))
+        print(report.format())
+
+
+if __name__ == "__main__":
+    main()
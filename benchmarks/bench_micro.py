@@ -0,0 +1,281 @@
+"""
+Микробенчмарки функций, которые выполняются на каждое сообщение:
+разбор транзакции, словарь товаров, ключевые слова категорий, эмодзи и
+полная категоризация (кэш, словарь, LLM-заглушка) на базе в памяти.
+
+Входные данные генерируются с фиксированным seed: русские описания,
+названия магазинов, опечатки, валюты, даты и упоминания. Результаты можно
+сохранить как базовые и сравнивать с ними перед выкладкой; сравнение
+завершается с кодом 1, если какая-то функция замедлилась больше порога.
+Базовые значения зависят от машины — снимайте их там же, где сравниваете.
+
+Запуск:
+    python -m benchmarks.bench_micro                 # замер
+    python -m benchmarks.bench_micro --save          # сохранить базовые значения
+    python -m benchmarks.bench_micro --compare       # сравнить с базовыми
+    python -m benchmarks.bench_micro --compare --threshold 0.1 --only parse
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+# Базовые значения по умолчанию
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "bench_micro.json"
+
+# Магазины и сервисы в том виде, в каком их пишут пользователи и банки
+MERCHANTS = [
+    "пятерочка", "пятёрочка", "магнит у дома", "вкусвилл", "перекресток",
+    "яндекс такси", "ситимобил", "макдоналдс", "kfc", "шоколадница",
+    "аптека 36,6", "мтс", "билайн", "озон", "wildberries", "кинотеатр каро",
+    "ооо ромашка", "ип сидоров", "азбука вкуса", "лента",
+]
+
+# Товары и траты из словаря товаров и мимо него
+ITEMS = [
+    "хлеб", "молоко", "кофе", "капучино", "обед", "пицца", "бензин", "метро",
+    "такси до дома", "футболка", "кроссовки", "шампунь", "стрижка",
+    "интернет", "квартплата", "подарок маме", "книги", "абонемент в зал",
+    "ремонт телефона", "корм для кота", "зарплата", "кэшбэк",
+]
+
+CATEGORY_NAMES = [
+    "продукты", "кафе", "рестораны", "транспорт", "такси", "одежда",
+    "развлечения", "здоровье", "связь", "коммуналка", "образование",
+    "спорт", "путешествия", "подарки", "техника", "зарплата", "доход",
+    "другое", "канцтовары", "бытовая химия", "Кофейни", "хобби",
+]
+
+
+def with_typo(rng: random.Random, text: str) -> str:
+    """Пропуск, удвоение или перестановка букв в случайном месте"""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 2)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:i] + text[i + 1:]
+    if kind == 1:
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def make_descriptions(rng: random.Random, count: int) -> List[str]:
+    """Описания трат: магазины, товары, их сочетания и опечатки"""
+    result = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.35:
+            text = rng.choice(ITEMS)
+        elif roll < 0.65:
+            text = rng.choice(MERCHANTS)
+        else:
+            text = f"{rng.choice(ITEMS)} {rng.choice(MERCHANTS)}"
+        if rng.random() < 0.25:
+            text = with_typo(rng, text)
+        result.append(text)
+    return result
+
+
+def make_messages(rng: random.Random, count: int) -> List[str]:
+    """Сообщения о транзакциях во всех поддерживаемых форматах"""
+    result = []
+    for description in make_descriptions(rng, count):
+        amount = rng.choice([str(rng.randint(50, 5000)),
+                             f"{rng.randint(1, 999)},{rng.randint(0, 99):02d}"])
+        sign = rng.choices(["", "-", "+"], weights=[8, 1, 1])[0]
+        parts = [sign + amount]
+        if rng.random() < 0.1:
+            parts.append(rng.choice(["USD", "EUR", "$", "€"]))
+        parts.append(description)
+        if rng.random() < 0.15:
+            parts.append(rng.choice(["вчера", "позавчера", "12.03.2024", "2024-03-12"]))
+        if rng.random() < 0.05:
+            parts.append(rng.choice(["@иван", "@masha_k"]))
+        result.append(" ".join(parts))
+    return result
+
+
+@dataclass
+class Case:
+    """Бенчмарк: функция и входные данные, по которым она прогоняется"""
+    name: str
+    func: Callable[[Any], Any]
+    inputs: List[Any]
+
+
+class DiscardingQueue:
+    """Очередь записи, которая ничего не пишет: запись замеряет bench_group_commit"""
+
+    def enqueue(self, op) -> None:
+        pass
+
+
+def stub_llm(answer: str = "кафе") -> Any:
+    """Клиент OpenAI, мгновенно отвечающий одной категорией"""
+    message = SimpleNamespace(content=answer)
+    response = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    completions = SimpleNamespace(create=lambda **kwargs: response)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def build_cases(size: int = 500, seed: int = 42) -> List[Case]:
+    """
+    Готовит бенчмарки и базу в памяти для категоризации
+
+    LLM и очередь записи подменяются в core.llm на время процесса.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from bot.expense import get_category_emoji, parse_transaction_message, recognize_category
+    from core import llm
+    from core.db import Base
+    from core.models import CategoryCache, User
+
+    rng = random.Random(seed)
+    descriptions = make_descriptions(rng, size)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, telegram_id=100))
+    # Описания из descriptions уже в кэше
+    cached = list(dict.fromkeys(d.strip().lower() for d in descriptions))
+    db.add_all([CategoryCache(description_hash=llm.description_hash(text), description=text,
+                              category_name="продукты", confidence=0.9)
+                for text in cached])
+    db.commit()
+
+    llm.write_queue = DiscardingQueue()
+    llm.LLM_AVAILABLE = True
+    llm._client = stub_llm()
+
+    # Описания, которых нет ни в кэше, ни в словаре: идут в LLM
+    unknown = [text for text in (f"{text} #{i}" for i, text in
+                                 enumerate(make_descriptions(rng, size * 3)))
+               if llm.match_product_to_category(text)[0] is None][:size]
+    # Описания из словаря, которых нет в кэше
+    dictionary = [f"{text} {i}" for i, text in enumerate(rng.choices(ITEMS[:12], k=size))]
+
+    def categorize(text: str) -> Optional[str]:
+        return llm.categorize_transaction(text, db, 1)
+
+    return [
+        Case("parse_transaction_message", parse_transaction_message, make_messages(rng, size)),
+        Case("match_product_to_category", llm.match_product_to_category, descriptions),
+        Case("recognize_category", recognize_category, descriptions),
+        Case("get_category_emoji", get_category_emoji, rng.choices(CATEGORY_NAMES, k=size)),
+        Case("categorize_transaction[cache]", categorize, descriptions),
+        Case("categorize_transaction[dictionary]", categorize, dictionary),
+        Case("categorize_transaction[llm]", categorize, unknown),
+    ]
+
+
+def measure(case: Case, repeat: int = 5, min_time: float = 0.2) -> float:
+    """
+    Лучшее из repeat прогонов время одного вызова, микросекунды
+
+    Каждый прогон проходит по входным данным столько раз, чтобы длиться не
+    меньше min_time: короткие замеры слишком шумные.
+    """
+    func = case.func
+    start = time.perf_counter()
+    for item in case.inputs:
+        func(item)
+    passes = max(1, round(min_time / max(time.perf_counter() - start, 1e-9)))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(passes):
+            for item in case.inputs:
+                func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / (passes * len(case.inputs)) * 1e6
+
+
+def run_suite(size: int = 500, repeat: int = 5, only: Optional[str] = None,
+              min_time: float = 0.2) -> Dict[str, float]:
+    """Прогоняет бенчмарки; only — подстрока имени для выборочного запуска"""
+    return {case.name: measure(case, repeat, min_time) for case in build_cases(size)
+            if only is None or only in case.name}
+
+
+def save_baseline(results: Dict[str, float], path: Path = BASELINE_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor() or platform.machine()},
+        "results_us": {name: round(value, 3) for name, value in results.items()},
+    }
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Dict[str, float]:
+    return json.loads(path.read_text(encoding="utf-8"))["results_us"]
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float],
+            threshold: float = 0.2) -> List[str]:
+    """
+    Сравнивает замер с базовыми значениями
+
+    Returns:
+        List[str]: имена бенчмарков, замедлившихся больше чем на threshold
+    """
+    return [name for name, value in results.items()
+            if name in baseline and value > baseline[name] * (1 + threshold)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=500,
+                        help="Входных значений на бенчмарк")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Прогонов, из которых берется лучший")
+    parser.add_argument("--only", help="Только бенчмарки, в имени которых есть подстрока")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH,
+                        help="Файл базовых значений")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save", action="store_true", help="Сохранить замер как базовый")
+    mode.add_argument("--compare", action="store_true", help="Сравнить с базовыми значениями")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Допустимое замедление при сравнении (0.2 — на 20%%)")
+    args = parser.parse_args()
+
+    results = run_suite(args.size, args.repeat, args.only)
+    baseline = load_baseline(args.baseline) if args.compare else {}
+
+    print(f"{'Бенчмарк':<36} {'мкс/вызов':>10}" + (f" {'база':>10} {'изм.':>8}" if baseline else ""))
+    for name, value in results.items():
+        line = f"{name:<36} {value:>10.2f}"
+        if name in baseline:
+            line += f" {baseline[name]:>10.2f} {(value / baseline[name] - 1) * 100:>+7.1f}%"
+        print(line)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Базовые значения сохранены в {args.baseline}")
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Замедление больше {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("Замедлений нет")
+
+
+if __name__ == "__main__":
+    main()
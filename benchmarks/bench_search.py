@@ -0,0 +1,115 @@
+"""
+Бенчмарк поиска по описаниям: FTS5-индекс против LIKE '%...%' на временной
+базе с миллионами транзакций.
+
+Запуск:
+    python -m benchmarks.bench_search --rows 1000000 --users 10
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core import search
+from core.db import Base, configure_sqlite
+from core.models import Transaction, User
+from core.search import search_transactions
+
+# Словарь описаний: частые и редкие слова
+COMMON_WORDS = ["продукты", "кофе", "обед", "такси", "магнит", "пятерочка", "метро",
+                "аптека", "бензин", "ужин", "хлеб", "молоко", "кино", "подарок"]
+RARE_WORDS = ["аэропорт", "стоматолог", "ремонт", "нотариус", "зоомагазин"]
+
+# Поисковые запросы: (описание, слова)
+QUERIES = [("частое слово", "такси"), ("редкое слово", "нотариус"),
+           ("два слова", "такси аэропорт"), ("префикс", "пятер")]
+
+
+def populate(engine, rows: int, users: int, seed: int = 42) -> None:
+    """Заполняет базу случайными транзакциями пачками по 50 000"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([User(id=i + 1, telegram_id=i + 1) for i in range(users)])
+        db.commit()
+
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            words = rng.sample(COMMON_WORDS, 2)
+            if rng.random() < 0.01:
+                words.append(rng.choice(RARE_WORDS))
+            amount = rng.randint(50, 5000)
+            batch.append({
+                "user_id": rng.randint(1, users),
+                "amount": amount,
+                "description": f"{amount} " + " ".join(words),
+                "transaction_date": start + timedelta(minutes=i),
+                "is_expense": 1,
+            })
+            if len(batch) == 50_000:
+                conn.execute(insert(Transaction.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Transaction.__table__), batch)
+
+
+def measure(db, repeat: int, **kwargs) -> float:
+    """Среднее время поиска, мс"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        search_transactions(db, 1, **kwargs)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000,
+                        help="Транзакций в базе")
+    parser.add_argument("--users", type=int, default=10,
+                        help="Пользователей (поиск идет по истории одного)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Повторов каждого запроса")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = configure_sqlite(create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}"))
+        Base.metadata.create_all(engine)
+
+        start = time.perf_counter()
+        populate(engine, args.rows, args.users)
+        print(f"Заполнение: {args.rows} строк за {time.perf_counter() - start:.1f} с")
+
+        start = time.perf_counter()
+        search.ensure_search_index(engine)
+        print(f"Построение FTS5-индекса: {time.perf_counter() - start:.1f} с\n")
+
+        with sessionmaker(bind=engine)() as db:
+            user_rows = db.query(func.count(Transaction.id)).filter(
+                Transaction.user_id == 1).scalar()
+            print(f"История пользователя: {user_rows} транзакций")
+            print(f"{'запрос':<16}{'найдено':>10}{'LIKE, мс':>12}{'FTS5, мс':>12}{'ускорение':>12}")
+            for title, words in QUERIES:
+                search.FTS_AVAILABLE = False
+                found = search_transactions(db, 1, words).count
+                like_ms = measure(db, args.repeat, words=words)
+                search.FTS_AVAILABLE = True
+                assert search_transactions(db, 1, words).count == found
+                fts_ms = measure(db, args.repeat, words=words)
+                print(f"{title:<16}{found:>10}{like_ms:>12.1f}{fts_ms:>12.1f}"
+                      f"{like_ms / fts_ms:>11.1f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
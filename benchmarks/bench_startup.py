@@ -0,0 +1,165 @@
+"""
+Бенчмарк старта: время от запуска процесса до первого обработанного
+обновления с разбивкой по импортируемым модулям (python -X importtime).
+
+Запуск:
+    python -m benchmarks.bench_startup            # общее время и фазы
+    python -m benchmarks.bench_startup --imports  # плюс топ модулей по импорту
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Корень проекта: дочерний процесс импортирует main.py оттуда
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Строка, которой дочерний процесс сообщает о первом обработанном обновлении
+MARKER = "FIRST_UPDATE_HANDLED "
+
+
+@dataclass
+class StartupReport:
+    """Результат замера старта"""
+    total_ms: float
+    # Фазы внутри процесса: импорт, init_db, диспетчер, первое обновление
+    phases_ms: Dict[str, float]
+    # Кумулятивное время импорта по пакетам верхнего уровня, мс
+    imports_ms: List[Tuple[str, float]] = field(default_factory=list)
+
+    def format(self, top: int = 15) -> str:
+        """Форматирует отчет для вывода в консоль"""
+        lines = [f"Старт до первого обновления: {self.total_ms:.0f} мс"]
+        lines += [f"  {name}: {ms:.0f} мс" for name, ms in self.phases_ms.items()]
+        if self.imports_ms:
+            lines.append(f"Импорт по пакетам (топ {top}):")
+            lines += [f"  {name:<30} {ms:8.1f} мс"
+                      for name, ms in self.imports_ms[:top]]
+        return "\n".join(lines)
+
+
+def run_child() -> None:
+    """
+    Код дочернего процесса: импортирует бота, инициализирует БД и прогоняет
+    одно обновление /start через настоящий диспетчер
+    """
+    import asyncio
+
+    phases = {}
+    start = time.perf_counter()
+
+    import main
+    from aiogram import Bot
+    from core.db import init_db
+    from benchmarks.fakes import FAKE_TOKEN, RecordingSession, make_message_update
+    phases["импорт"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    init_db()
+    phases["init_db"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    dp = main.create_dispatcher()
+    bot = Bot(token=FAKE_TOKEN, session=RecordingSession())
+    phases["диспетчер"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    asyncio.run(dp.feed_update(bot, make_message_update(1, "/start")))
+    phases["первое обновление"] = time.perf_counter() - mark
+
+    print(MARKER + json.dumps({k: v * 1000 for k, v in phases.items()}), flush=True)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, float]]:
+    """
+    Суммирует вывод -X importtime по пакетам верхнего уровня
+
+    Складывается собственное (self) время модулей, поэтому вложенные импорты
+    не считаются дважды, а сумма по пакетам равна общему времени импорта.
+
+    Args:
+        stderr: вывод дочернего процесса
+
+    Returns:
+        List[Tuple[str, float]]: (пакет, мс), по убыванию времени
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] += int(self_us) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def measure_startup(profile_imports: bool = False) -> StartupReport:
+    """
+    Запускает бота в отдельном процессе и замеряет время до первого обновления
+
+    Процесс работает во временном каталоге с временной БД, поэтому не трогает
+    finbot.db и finbot.log.
+
+    Args:
+        profile_imports: включить -X importtime (замедляет старт)
+
+    Returns:
+        StartupReport: общее время, фазы и разбивка по импортам
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = str(PROJECT_ROOT)
+        env["DB_PATH"] = f"sqlite:///{Path(tmp) / 'startup.db'}"
+        env.setdefault("BOT_TOKEN", "123456789:AAFakeTokenForOfflineBenchmarks000000")
+        env.setdefault("OPENROUTER_API_KEY", "offline")
+
+        command = [sys.executable]
+        if profile_imports:
+            command += ["-X", "importtime"]
+        command += ["-m", "benchmarks.bench_startup", "--child"]
+
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=tmp, env=env,
+                                capture_output=True, text=True, timeout=120)
+        total_ms = (time.perf_counter() - start) * 1000
+
+    marker_lines = [line for line in result.stdout.splitlines()
+                    if line.startswith(MARKER)]
+    if result.returncode != 0 or not marker_lines:
+        raise RuntimeError(f"Дочерний процесс не обработал обновление:\n{result.stderr[-2000:]}")
+
+    phases = json.loads(marker_lines[-1][len(MARKER):])
+    imports = parse_importtime(result.stderr) if profile_imports else []
+    return StartupReport(total_ms=total_ms, phases_ms=phases, imports_ms=imports)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--imports", action="store_true",
+                        help="Показать разбивку времени импорта по пакетам")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Количество запусков (берется лучший)")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    best = min((measure_startup() for _ in range(args.runs)),
+               key=lambda report: report.total_ms)
+    print(best.format())
+
+    if args.imports:
+        print(measure_startup(profile_imports=True).format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Подделки Telegram для прогона обновлений через настоящий диспетчер.
+
+RecordingSession заменяет HTTP-сессию бота: вместо отправки запросов в
+Telegram она записывает их и возвращает правдоподобные ответы. Функции
+make_*_update строят синтетические обновления.
+"""
+import asyncio
+import itertools
+import time
+import typing
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+# Токен правильного формата; запросы с ним никуда не уходят
+FAKE_TOKEN = "123456789:AAFakeTokenForOfflineBenchmarks000000"
+
+# Счетчики идентификаторов синтетических объектов
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+class RecordingSession(BaseSession):
+    """Сессия бота, записывающая исходящие запросы вместо их отправки"""
+
+    def __init__(self, latency: float = 0.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency = latency
+        # Записанные запросы: (время, метод)
+        self.requests: List[Tuple[float, TelegramMethod]] = []
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(self, bot: Bot, method: TelegramMethod,
+                           timeout: Optional[int] = None) -> Any:
+        """Записывает запрос и возвращает ответ нужного типа"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests.append((time.perf_counter(), method))
+        return _fake_result(method)
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None,
+                             timeout: int = 30, chunk_size: int = 65536,
+                             raise_for_status: bool = True):
+        """Скачивание файлов не поддерживается"""
+        raise NotImplementedError("RecordingSession не скачивает файлы")
+        yield b""  # pragma: no cover
+
+    def calls(self, name: str) -> List[TelegramMethod]:
+        """Возвращает записанные запросы указанного метода (например, "SendMessage")"""
+        return [method for _, method in self.requests
+                if type(method).__name__ == name]
+
+
+def _fake_result(method: TelegramMethod) -> Any:
+    """Строит ответ Telegram по возвращаемому типу метода"""
+    returning = method.__returning__
+    candidates = typing.get_args(returning) or (returning,)
+
+    if Message in candidates:
+        chat_id = getattr(method, "chat_id", None) or 0
+        return Message(
+            message_id=getattr(method, "message_id", None) or next(_message_ids),
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=getattr(method, "text", None) or getattr(method, "caption", None),
+        )
+    if bool in candidates:
+        return True
+    if typing.get_origin(returning) in (list, List):
+        return []
+    return None
+
+
+def make_user(user_id: int) -> User:
+    """Создает синтетического пользователя Telegram"""
+    return User(id=user_id, is_bot=False, first_name=f"user{user_id}",
+                username=f"user{user_id}")
+
+
+def make_message(user_id: int, text: str) -> Message:
+    """Создает синтетическое сообщение пользователя в личном чате"""
+    return Message(
+        message_id=next(_message_ids),
+        date=datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=make_user(user_id),
+        text=text,
+    )
+
+
+def make_message_update(user_id: int, text: str) -> Update:
+    """Создает обновление с текстовым сообщением"""
+    return Update(update_id=next(_update_ids), message=make_message(user_id, text))
+
+
+def make_callback_update(user_id: int, data: str) -> Update:
+    """Создает обновление с нажатием inline-кнопки"""
+    return Update(
+        update_id=next(_update_ids),
+        callback_query=CallbackQuery(
+            id=str(next(_update_ids)),
+            from_user=make_user(user_id),
+            chat_instance=str(user_id),
+            message=make_message(user_id, "сообщение бота"),
+            data=data,
+        ),
+    )
@@ -0,0 +1,397 @@
+"""
+Генератор синтетической базы для проверки масштабирования: N пользователей
+с правдоподобной историей транзакций за несколько лет.
+
+История каждого пользователя: зарплата два раза в месяц и случайные доходы,
+расходы по категориям со своими частотами и суммами, сезонность (декабрь,
+летние путешествия, выходные), часть трат в валюте, упоминания друзей.
+Описания хранятся так же, как их пишет бот (текст сообщения), для всех
+описаний заполняется кэш категорий. Строки вставляются executemany пачками
+на уровне драйвера, полнотекстовый индекс строится одним проходом в конце.
+Результат зависит только от параметров и seed.
+
+Запуск:
+    python -m benchmarks.gen_dataset dataset_1m.db --preset 1m
+    python -m benchmarks.gen_dataset dataset_10m.db --preset 10m
+    python -m benchmarks.gen_dataset small.db --users 50 --transactions 20000 --seed 7
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+# Готовые размеры: пользователей и транзакций
+PRESETS = {
+    "small": (100, 10_000),
+    "1m": (10_000, 1_000_000),
+    "10m": (100_000, 10_000_000),
+}
+
+# Курсы для рублевых сумм зеркала expenses (совпадают с FALLBACK_RATES core.currency)
+RATES = {"USD": 90.0, "EUR": 100.0}
+
+
+def _db_date(moment: datetime) -> str:
+    """Дата в формате, в котором SQLAlchemy хранит DateTime в SQLite"""
+    return moment.isoformat(" ", "microseconds")
+
+
+class CategorySpec(NamedTuple):
+    """Категория расходов: вес в смеси, медиана суммы, разброс и описания"""
+    weight: float
+    median: float
+    sigma: float
+    descriptions: Tuple[str, ...]
+
+
+EXPENSE_CATEGORIES: Dict[str, CategorySpec] = {
+    "продукты": CategorySpec(30, 900, 0.7, (
+        "пятерочка", "магнит", "перекресток", "вкусвилл", "лента", "ашан",
+        "хлеб", "молоко", "овощи", "продукты на неделю", "азбука вкуса")),
+    "кафе": CategorySpec(16, 350, 0.5, (
+        "кофе", "капучино", "шоколадница", "макдоналдс", "kfc", "обед",
+        "бизнес-ланч", "пицца", "шаурма")),
+    "транспорт": CategorySpec(10, 60, 0.4, (
+        "метро", "автобус", "электричка", "бензин", "каршеринг", "парковка")),
+    "такси": CategorySpec(7, 450, 0.5, ("яндекс такси", "такси до дома", "такси")),
+    "рестораны": CategorySpec(4, 2800, 0.6, ("ресторан", "ужин в ресторане", "суши")),
+    "развлечения": CategorySpec(5, 900, 0.7, ("кино", "кинотеатр каро", "концерт",
+                                              "боулинг", "театр", "подписка кинопоиск")),
+    "одежда": CategorySpec(3, 3500, 0.7, ("футболка", "кроссовки", "джинсы",
+                                          "куртка", "wildberries", "lamoda")),
+    "здоровье": CategorySpec(4, 800, 0.8, ("аптека", "аптека 36,6", "витамины",
+                                           "стоматолог", "анализы")),
+    "связь": CategorySpec(2, 600, 0.3, ("мтс", "билайн", "мегафон", "интернет")),
+    "коммуналка": CategorySpec(2, 6500, 0.4, ("квартплата", "электричество", "коммуналка")),
+    "подарки": CategorySpec(2, 2500, 0.8, ("подарок маме", "цветы", "подарок другу")),
+    "путешествия": CategorySpec(1, 15000, 0.9, ("билеты", "отель", "авиабилеты",
+                                                "экскурсия")),
+    "образование": CategorySpec(1, 2500, 0.8, ("книги", "курс английского", "вебинар")),
+    "спорт": CategorySpec(2, 1500, 0.6, ("абонемент в зал", "бассейн", "йога")),
+    "техника": CategorySpec(1, 9000, 1.0, ("наушники", "ремонт телефона", "зарядка")),
+}
+
+# Доходы помимо зарплаты: описание и медиана суммы
+OTHER_INCOMES = (("кэшбэк", 400), ("перевод от друга", 2000),
+                 ("фриланс", 15000), ("продажа на авито", 3000))
+
+# Траты выходного дня: в субботу и воскресенье их вес выше
+WEEKEND_CATEGORIES = {"кафе", "рестораны", "развлечения", "такси"}
+
+# Имена для упоминаний (@username)
+FRIENDS = ("ivan", "masha_k", "petrov", "anna", "dima92", "olga_s", "sergey")
+
+# Сезонный множитель трат по месяцам: декабрь, январские праздники, отпуск
+MONTH_FACTOR = {1: 0.8, 2: 0.9, 3: 1.0, 4: 1.0, 5: 1.05, 6: 1.1, 7: 1.2,
+                8: 1.15, 9: 1.0, 10: 1.0, 11: 1.05, 12: 1.4}
+
+# Накопленные веса часов суток: ночью почти не тратят, пик — обед и вечер
+HOUR_WEIGHTS = list(itertools.accumulate(
+    (0.1, 0.05, 0.02, 0.02, 0.02, 0.05, 0.3, 1.0, 1.5, 1.5, 1.5, 1.5,
+     2.5, 2.5, 1.8, 1.5, 1.5, 1.8, 2.5, 2.5, 2.0, 1.5, 0.8, 0.3)))
+
+
+@dataclass
+class DatasetStats:
+    """Итоги генерации"""
+    users: int = 0
+    transactions: int = 0
+    expenses: int = 0
+    categories: int = 0
+    cache_entries: int = 0
+    foreign_currency: int = 0
+    mentions: int = 0
+    elapsed: float = 0.0
+
+    def format(self) -> str:
+        return (f"Пользователей {self.users}, транзакций {self.transactions} "
+                f"(в валюте {self.foreign_currency}, с упоминанием {self.mentions}), "
+                f"расходов (старая таблица) {self.expenses}, категорий {self.categories}, "
+                f"записей кэша {self.cache_entries} за {self.elapsed:.1f} с "
+                f"({self.transactions / max(self.elapsed, 1e-9):,.0f} транзакций/с)")
+
+
+def _split_counts(rng: random.Random, total: int, users: int) -> List[int]:
+    """Распределяет транзакции по пользователям: активность логнормальная"""
+    weights = [rng.lognormvariate(0, 0.9) for _ in range(users)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    # Остаток от округления — самым активным
+    for i in sorted(range(users), key=lambda i: -weights[i])[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def _seasonal_days(start: datetime, days: int) -> Tuple[List[float], List[Tuple[bool, bool]]]:
+    """
+    Накопленные веса дней периода с учетом сезонности и признаки дней
+
+    Returns:
+        tuple: накопленные веса для random.choices и (выходной, лето) каждого дня
+    """
+    cum_weights, kinds = [], []
+    total = 0.0
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        weekend = day.weekday() >= 5
+        total += MONTH_FACTOR[day.month] * (1.25 if weekend else 1.0)
+        cum_weights.append(total)
+        kinds.append((weekend, day.month in (6, 7, 8)))
+    return cum_weights, kinds
+
+
+def _amount_text(amount: float) -> str:
+    return str(int(amount)) if amount == int(amount) else f"{amount:.2f}".replace(".", ",")
+
+
+def generate_user(rng: random.Random, user_id: int, count: int, now: datetime,
+                  months: int) -> Iterator[tuple]:
+    """
+    История одного пользователя в порядке дат
+
+    Returns:
+        Iterator[tuple]: строки (категория, доход ли, сумма в рублях, сумма в валюте или None,
+        валюта, описание-сообщение, нормализованное описание, дата, упоминание)
+    """
+    # Пользователь пришел в случайный момент окна истории
+    joined = (now - timedelta(days=rng.uniform(30, months * 30.4))).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    days = (now - joined).days
+    day_weights, day_kinds = _seasonal_days(joined, days)
+
+    # Зарплата два раза в месяц: часть транзакций — доходы
+    salary = round(rng.lognormvariate(math.log(45000), 0.5), -3)
+    rows = []
+    day = joined.replace(hour=10, minute=0, second=0, microsecond=0)
+    while day < now and len(rows) < count // 6:
+        if day.day in (5, 20):
+            amount = salary if day.day == 5 else round(salary * 0.6, -2)
+            rows.append(("зарплата", True, amount, None, "RUB", f"+{_amount_text(amount)} зарплата",
+                         "зарплата", day, None))
+        day += timedelta(days=1)
+
+    names = list(EXPENSE_CATEGORIES)
+    specs = list(EXPENSE_CATEGORIES.values())
+    # У каждого пользователя своя смесь категорий; на выходных и летом она смещается
+    weights = [spec.weight * rng.uniform(0.3, 1.7) for spec in specs]
+    mixes = {}
+    for weekend in (False, True):
+        for summer in (False, True):
+            mix = [w * (1.8 if weekend and name in WEEKEND_CATEGORIES else 1.0)
+                   * (4.0 if summer and name == "путешествия" else 1.0)
+                   for name, w in zip(names, weights)]
+            mixes[weekend, summer] = list(itertools.accumulate(mix))
+    indices = range(len(names))
+
+    # Дни и часы трат выбираются сразу на всю историю: днем и вечером чаще
+    expense_count = count - len(rows)
+    offsets = rng.choices(range(days), cum_weights=day_weights, k=expense_count)
+    hours = rng.choices(range(24), cum_weights=HOUR_WEIGHTS, k=expense_count)
+    for offset, hour in zip(offsets, hours):
+        moment = joined + timedelta(days=offset, seconds=hour * 3600 + rng.randrange(3600))
+        if rng.random() < 0.03:
+            description, median = rng.choice(OTHER_INCOMES)
+            amount = round(rng.lognormvariate(math.log(median), 0.6))
+            rows.append(("доход", True, amount, None, "RUB", f"+{amount} {description}",
+                         description, moment, None))
+            continue
+
+        index = rng.choices(indices, cum_weights=mixes[day_kinds[offset]])[0]
+        name, spec = names[index], specs[index]
+        description = rng.choice(spec.descriptions)
+        # Каждая пятая сумма — с копейками
+        amount = rng.lognormvariate(math.log(spec.median), spec.sigma)
+        amount = max(round(amount, 2 if rng.random() < 0.2 else 0), 1)
+
+        # В поездках платят в валюте
+        currency, original = "RUB", None
+        if rng.random() < (0.5 if name == "путешествия" else 0.02):
+            currency = rng.choice(("USD", "EUR"))
+            original = max(round(amount / RATES[currency], 2), 1)
+            amount = round(original * RATES[currency], 2)
+            text = f"{_amount_text(original)} {currency} {description}"
+        else:
+            text = f"{_amount_text(amount)} {description}"
+
+        mention = None
+        if rng.random() < 0.02:
+            mention = rng.choice(FRIENDS)
+            text += f" @{mention}"
+        rows.append((name, False, amount, original, currency, text, description, moment, mention))
+
+    rows.sort(key=lambda row: row[7])
+    return iter(rows)
+
+
+def generate(db_path: str, users: int, transactions: int, months: int = 24,
+             seed: int = 42, batch_size: int = 50_000, expenses: bool = True,
+             search_index: bool = True, now: Optional[datetime] = None) -> DatasetStats:
+    """
+    Создает базу db_path и заполняет ее синтетическими данными
+
+    Args:
+        db_path: файл новой базы (не должен существовать)
+        users: число пользователей
+        transactions: общее число транзакций
+        months: глубина истории, месяцев
+        seed: seed генератора
+        batch_size: строк в одном executemany
+        expenses: дублировать расходы в старую таблицу expenses, как бот
+        search_index: построить полнотекстовый индекс /search
+        now: конец истории (по умолчанию — текущий момент)
+
+    Raises:
+        FileExistsError: файл базы уже существует
+    """
+    from sqlalchemy import create_engine
+
+    from bot.expense import get_category_emoji
+    from core import models
+    from core.db import Base, configure_sqlite
+    from core.llm import description_hash
+    from core.search import ensure_search_index
+
+    if Path(db_path).exists():
+        raise FileExistsError(f"Файл {db_path} уже существует")
+
+    start = time.perf_counter()
+    now = (now or datetime.now()).replace(microsecond=0)
+    rng = random.Random(seed)
+    stats = DatasetStats(users=users)
+
+    engine = configure_sqlite(create_engine(f"sqlite:///{db_path}"))
+    Base.metadata.create_all(engine)
+    # Вторичные индексы больших таблиц дешевле построить после загрузки
+    bulk_indexes = [index for table in (models.Transaction.__table__, models.Expense.__table__)
+                    for index in table.indexes]
+
+    created = _db_date(now - timedelta(days=months * 30.4))
+    counts = _split_counts(rng, transactions, users)
+    cache: Dict[str, Tuple[str, int]] = {}
+
+    with engine.begin() as conn:
+        # Загрузка одним писателем: журнал можно не синхронизировать
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        conn.exec_driver_sql("PRAGMA cache_size=-200000")
+        for index in bulk_indexes:
+            index.drop(conn)
+
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, telegram_id, username, first_name, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(user_id, 100_000_000 + user_id, f"user{user_id}", f"Пользователь {user_id}", created)
+             for user_id in range(1, users + 1)])
+
+        category_ids: Dict[Tuple[int, str, bool], int] = {}
+        category_rows: List[tuple] = []
+        transaction_rows: List[tuple] = []
+        expense_rows: List[tuple] = []
+
+        def flush() -> None:
+            if category_rows:
+                conn.exec_driver_sql(
+                    "INSERT INTO categories (id, user_id, name, emoji, is_expense, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", category_rows)
+            if transaction_rows:
+                conn.exec_driver_sql(
+                    "INSERT INTO transactions (user_id, amount, original_amount, currency, "
+                    "category_id, description, transaction_date, created_at, is_expense, "
+                    "mentioned_user) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", transaction_rows)
+            if expense_rows:
+                conn.exec_driver_sql(
+                    "INSERT INTO expenses (user_id, amount, category, description, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)", expense_rows)
+            stats.categories += len(category_rows)
+            stats.transactions += len(transaction_rows)
+            stats.expenses += len(expense_rows)
+            category_rows.clear()
+            transaction_rows.clear()
+            expense_rows.clear()
+
+        for user_id, count in zip(range(1, users + 1), counts):
+            for (category, is_income, amount, original, currency, text, normalized,
+                 moment, mention) in generate_user(rng, user_id, count, now, months):
+                key = (user_id, category, is_income)
+                category_id = category_ids.get(key)
+                if category_id is None:
+                    category_id = category_ids[key] = len(category_ids) + 1
+                    category_rows.append((category_id, user_id, category,
+                                          get_category_emoji(category), 0 if is_income else 1,
+                                          created))
+                date = _db_date(moment)
+                # Транзакция хранит сумму в валюте операции, зеркало — в рублях
+                stored = original if original else amount
+                transaction_rows.append((user_id, stored, stored,
+                                         currency, category_id, text, date, date,
+                                         0 if is_income else 1, mention))
+                if expenses and not is_income:
+                    expense_rows.append((user_id, amount, category, text, date))
+                if currency != "RUB":
+                    stats.foreign_currency += 1
+                if mention:
+                    stats.mentions += 1
+                cached = cache.get(normalized)
+                cache[normalized] = (category, cached[1] + 1 if cached else 1)
+            if len(transaction_rows) >= batch_size:
+                flush()
+        flush()
+        for index in bulk_indexes:
+            index.create(conn)
+
+        now_text = _db_date(now)
+        conn.exec_driver_sql(
+            "INSERT INTO category_cache (description_hash, description, category_name, "
+            "confidence, created_at, last_used_at, use_count, is_corrected) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            [(description_hash(text), text, category, 0.9, created, now_text, uses)
+             for text, (category, uses) in cache.items()])
+        stats.cache_entries = len(cache)
+
+    if search_index:
+        ensure_search_index(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("db", help="Файл новой базы")
+    parser.add_argument("--preset", choices=PRESETS, help="Готовый размер: " + ", ".join(
+        f"{name} — {u} польз., {t:,} транз." for name, (u, t) in PRESETS.items()))
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--months", type=int, default=24, help="Глубина истории, месяцев")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=50_000,
+                        help="Строк в одном executemany")
+    parser.add_argument("--no-expenses", action="store_true",
+                        help="Не дублировать расходы в старую таблицу expenses")
+    parser.add_argument("--no-search-index", action="store_true",
+                        help="Не строить полнотекстовый индекс /search")
+    args = parser.parse_args()
+
+    users, transactions = PRESETS[args.preset] if args.preset else (args.users, args.transactions)
+    stats = generate(args.db, users, transactions, args.months, args.seed, args.batch_size,
+                     expenses=not args.no_expenses, search_index=not args.no_search_index)
+    print(stats.format())
+    print(f"Размер базы: {os.path.getsize(args.db) / 1024 / 1024:.0f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Локальная заглушка OpenAI-совместимого API (POST /v1/chat/completions)
+для прогонов категоризации и советов без сети.
+
+Категории отвечаются по таблице правил (подстрока описания -> категория) и
+не зависят от порядка запросов; категория не из списка "Доступные категории"
+запроса заменяется на "другое", как сделала бы модель по промпту. Задержка
+берется из распределения, а доля ошибок 500, ответов 429 с Retry-After и
+ответов не в ожидаемом формате настраивается; сбои выбираются генератором
+с фиксированным seed. Счетчики запросов и сбоев — на GET /stats.
+
+Бот направляется на заглушку через LLM_BASE_URL:
+    python -m benchmarks.mock_llm --port 8765 --latency lognormal:300:0.6 --rate-limit-rate 0.05
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+
+Распределения задержки (миллисекунды):
+    fixed:100, uniform:50:400, normal:200:50, lognormal:300:0.6 (медиана и sigma)
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# Правила категоризации: первая подстрока, найденная в описании, задает
+# категорию. В основном это то, чего нет в словаре товаров core.llm (его
+# совпадения до LLM не доходят)
+DEFAULT_RULES: List[Tuple[str, str]] = [
+    ("такси", "такси"), ("ситимобил", "такси"), ("uber", "такси"),
+    ("каршеринг", "транспорт"), ("электричка", "транспорт"), ("самокат", "транспорт"),
+    ("ресторан", "рестораны"), ("суши", "рестораны"), ("бар ", "рестораны"),
+    ("кофе", "кафе"), ("капучино", "кафе"), ("ланч", "кафе"), ("шоколадница", "кафе"),
+    ("пятерочка", "продукты"), ("пятёрочка", "продукты"), ("магнит", "продукты"),
+    ("вкусвилл", "продукты"), ("перекресток", "продукты"), ("продукты", "продукты"),
+    ("корм", "продукты"),
+    ("аптека", "здоровье"), ("стоматолог", "здоровье"), ("анализ", "здоровье"),
+    ("мтс", "связь"), ("билайн", "связь"), ("мегафон", "связь"), ("интернет", "связь"),
+    ("квартплата", "коммуналка"), ("жкх", "коммуналка"), ("электричество", "коммуналка"),
+    ("кино", "развлечения"), ("концерт", "развлечения"), ("театр", "развлечения"),
+    ("подписка", "развлечения"),
+    ("wildberries", "одежда"), ("lamoda", "одежда"), ("кроссовки", "одежда"),
+    ("футболка", "одежда"),
+    ("билет", "путешествия"), ("отель", "путешествия"), ("авиа", "путешествия"),
+    ("книг", "образование"), ("курс", "образование"), ("вебинар", "образование"),
+    ("зал", "спорт"), ("бассейн", "спорт"), ("йога", "спорт"),
+    ("подарок", "подарки"), ("цветы", "подарки"),
+    ("наушники", "техника"), ("ремонт телефона", "техника"), ("зарядка", "техника"),
+    ("зарплата", "зарплата"), ("кэшбэк", "доход"), ("фриланс", "доход"),
+]
+
+# Совет для запросов, которые не похожи на категоризацию (ask_cerebras)
+ADVICE = ("Больше всего уходит на кафе и такси: попробуйте задать на них "
+          "месячный лимит и откладывать 10% с каждой зарплаты.")
+
+# Ответы не в ожидаемом формате: пояснения вместо категории, пустой ответ,
+# список без номеров
+MALFORMED_ANSWERS = (
+    "Конечно! Судя по описанию, эта транзакция, скорее всего, относится к покупкам.",
+    "",
+    "Категория: ???",
+    "продукты\nкафе\nдругое",
+)
+
+SINGLE_PROMPT = re.compile(r'Определи категорию для: "(.*)"')
+BATCH_LINE = re.compile(r"^\s*(\d+)\.\s*(.+?)\s*$")
+AVAILABLE = re.compile(r"Доступные категории:\s*(.+)")
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Разбирает распределение задержки вида "имя:параметры" (миллисекунды)
+
+    Returns:
+        Callable[[random.Random], float]: выборка задержки в секундах
+
+    Raises:
+        ValueError: неизвестное распределение или неверные параметры
+    """
+    name, _, rest = spec.partition(":")
+    try:
+        params = [float(value) for value in rest.split(":")] if rest else []
+        if name == "fixed" and len(params) == 1:
+            return lambda rng: params[0] / 1000
+        if name == "uniform" and len(params) == 2:
+            return lambda rng: rng.uniform(params[0], params[1]) / 1000
+        if name == "normal" and len(params) == 2:
+            return lambda rng: max(rng.gauss(params[0], params[1]), 0.0) / 1000
+        if name == "lognormal" and len(params) == 2 and params[0] > 0:
+            mu = math.log(params[0])
+            return lambda rng: rng.lognormvariate(mu, params[1]) / 1000
+    except ValueError:
+        pass
+    raise ValueError(f"Неизвестное распределение задержки: {spec!r}")
+
+
+@dataclass
+class MockConfig:
+    """Поведение заглушки: задержка, доли сбоев и таблица правил"""
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    malformed_rate: float = 0.0
+    seed: int = 42
+    rules: List[Tuple[str, str]] = field(default_factory=lambda: list(DEFAULT_RULES))
+
+
+def categorize(description: str, available: List[str], rules: List[Tuple[str, str]]) -> str:
+    """Категория описания по таблице правил среди доступных категорий"""
+    text = description.lower()
+    for keyword, category in rules:
+        if keyword in text:
+            return category if not available or category in available else "другое"
+    return "другое"
+
+
+def answer(content: str, config: MockConfig) -> str:
+    """Ответ модели на последнее сообщение пользователя"""
+    match = AVAILABLE.search(content)
+    available = [name.strip() for name in match.group(1).split(",")] if match else []
+
+    if "Определи категории для транзакций:" in content:
+        head = content.split("Доступные категории:")[0]
+        lines = []
+        for line in head.splitlines()[1:]:
+            item = BATCH_LINE.match(line)
+            if item:
+                lines.append(f"{item.group(1)}. "
+                             f"{categorize(item.group(2), available, config.rules)}")
+        return "\n".join(lines)
+
+    single = SINGLE_PROMPT.search(content)
+    if single:
+        return categorize(single.group(1), available, config.rules)
+    return ADVICE
+
+
+class MockLLM:
+    """Обработчик запросов заглушки со счетчиками"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.latency = parse_latency(config.latency)
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def _error(status: int, message: str, kind: str, headers: Optional[Dict] = None):
+        return web.json_response({"error": {"message": message, "type": kind, "code": status}},
+                                 status=status, headers=headers)
+
+    async def handle_completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.stats["requests"] += 1
+        # Сбои и задержка выбираются сразу, чтобы не зависеть от того, в
+        # каком порядке завершатся одновременные запросы
+        roll = self.rng.random()
+        delay = self.latency(self.rng)
+        malformed = self.rng.random() < self.config.malformed_rate
+
+        if roll < self.config.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return self._error(429, "Rate limit exceeded", "rate_limit_error",
+                               {"Retry-After": f"{self.config.retry_after:g}"})
+        await asyncio.sleep(delay)
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.stats["errors"] += 1
+            return self._error(500, "Internal server error", "server_error")
+
+        messages = body.get("messages") or []
+        content = next((m.get("content", "") for m in reversed(messages)
+                        if m.get("role") == "user"), "")
+        if malformed:
+            self.stats["malformed"] += 1
+            text = self.rng.choice(MALFORMED_ANSWERS)
+        else:
+            self.stats["ok"] += 1
+            text = answer(content, self.config)
+
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = len(text) // 4
+        return web.json_response({
+            "id": f"chatcmpl-mock-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    async def handle_models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list",
+                                  "data": [{"id": "mock", "object": "model"}]})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+
+async def start_mock_llm(mock: MockLLM, host: str = "127.0.0.1", port: int = 0):
+    """
+    Запускает HTTP-сервер заглушки
+
+    Returns:
+        tuple: aiohttp.web.AppRunner (остановить через await runner.cleanup())
+        и фактический порт (при port=0 выбирается свободный)
+    """
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", mock.handle_completions)
+    app.router.add_get("/v1/models", mock.handle_models)
+    app.router.add_get("/stats", mock.handle_stats)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner, runner.addresses[0][1]
+
+
+class MockLLMServer:
+    """
+    Заглушка в фоновом потоке со своим event loop
+
+    Клиент OpenAI в боте синхронный и блокирует свой поток, поэтому в том же
+    процессе заглушка должна работать в другом потоке:
+
+        with MockLLMServer(MockConfig(latency="fixed:50")) as server:
+            settings.LLM_BASE_URL = server.base_url
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1",
+                 port: int = 0):
+        self.mock = MockLLM(config or MockConfig())
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True,
+                                        name="mock-llm")
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def stats(self) -> Counter:
+        return self.mock.stats
+
+    def __enter__(self) -> "MockLLMServer":
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            start_mock_llm(self.mock, self.host, self.port), self._loop)
+        self._runner, self.port = future.result(timeout=10)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Распределение задержки, мс: fixed:100, uniform:50:400, "
+                             "normal:200:50, lognormal:300:0.6")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="Retry-After в ответах 429, с")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Доля ответов не в ожидаемом формате")
+    parser.add_argument("--rules", help="JSON-файл с таблицей правил [[подстрока, категория], ...]")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                        malformed_rate=args.malformed_rate, seed=args.seed)
+    if args.rules:
+        with open(args.rules, encoding="utf-8") as f:
+            config.rules = [tuple(rule) for rule in json.load(f)]
+    mock = MockLLM(config)
+
+    async def serve() -> None:
+        runner, port = await start_mock_llm(mock, args.host, args.port)
+        print(f"Заглушка LLM: LLM_BASE_URL=http://{args.host}:{port}/v1 (Ctrl+C — остановить)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            print(f"Запросов: {dict(mock.stats)}")
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Графики расходов для /stats.
+
+Модуль намеренно не импортирует matplotlib на верхнем уровне: библиотека
+загружается лениво внутри процесса-рендерера, поэтому старт бота ее не
+оплачивает. Отрисовка выполняется в ProcessPoolExecutor, чтобы не блокировать
+event loop, а готовые PNG кэшируются по (пользователь, тип, период, версия
+данных) — повторный просмотр отдается из кэша без перерисовки.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from core.cache import LRUCache
+from core.versions import get_data_version
+
+# Данные графика: список пар (подпись, сумма)
+ChartData = List[Tuple[str, float]]
+
+# Сколько категорий показывать на круговой диаграмме отдельно
+PIE_TOP_CATEGORIES = 7
+
+
+def _load_pyplot():
+    """Лениво импортирует matplotlib с безоконным бэкендом"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _figure_to_png(plt, figure) -> bytes:
+    """Сохраняет фигуру в PNG и освобождает ее"""
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", dpi=120, bbox_inches="tight")
+    plt.close(figure)
+    return buffer.getvalue()
+
+
+def render_category_pie(data: ChartData, title: str) -> bytes:
+    """
+    Рисует круговую диаграмму расходов по категориям
+
+    Выполняется в процессе-рендерере.
+
+    Args:
+        data: пары (категория, сумма), отсортированные по убыванию суммы
+        title: заголовок графика
+
+    Returns:
+        bytes: изображение PNG
+    """
+    plt = _load_pyplot()
+
+    # Мелкие категории объединяем, чтобы подписи не налезали друг на друга
+    top = data[:PIE_TOP_CATEGORIES]
+    rest = sum(amount for _, amount in data[PIE_TOP_CATEGORIES:])
+    if rest > 0:
+        top = top + [("остальное", rest)]
+
+    figure, ax = plt.subplots(figsize=(6, 6))
+    ax.pie(
+        [amount for _, amount in top],
+        labels=[name.capitalize() for name, _ in top],
+        autopct="%1.0f%%",
+        startangle=90,
+        counterclock=False,
+    )
+    ax.set_title(title)
+    ax.axis("equal")
+    return _figure_to_png(plt, figure)
+
+
+def render_daily_bars(data: ChartData, title: str) -> bytes:
+    """
+    Рисует столбчатую диаграмму расходов по дням
+
+    Выполняется в процессе-рендерере.
+
+    Args:
+        data: пары (день в формате ДД.ММ, сумма) в хронологическом порядке
+        title: заголовок графика
+
+    Returns:
+        bytes: изображение PNG
+    """
+    plt = _load_pyplot()
+
+    figure, ax = plt.subplots(figsize=(8, 4))
+    ax.bar([day for day, _ in data], [amount for _, amount in data],
+           color="#4c72b0")
+    ax.set_title(title)
+    ax.set_ylabel("₽")
+    ax.tick_params(axis="x", labelrotation=90, labelsize=8)
+    ax.grid(axis="y", alpha=0.3)
+    return _figure_to_png(plt, figure)
+
+
+# Функции отрисовки по типу графика
+RENDERERS: Dict[str, Callable[[ChartData, str], bytes]] = {
+    "pie": render_category_pie,
+    "daily": render_daily_bars,
+}
+
+
+# Общий кэш графиков
+chart_cache: "LRUCache[bytes]" = LRUCache(settings.CHART_CACHE_SIZE)
+
+# Пул процессов-рендереров создается при первом графике
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Возвращает пул процессов для отрисовки, создавая его при необходимости"""
+    global _render_pool
+    if _render_pool is None:
+        # spawn вместо fork: родитель многопоточный (event loop, очередь записи)
+        _render_pool = ProcessPoolExecutor(
+            max_workers=settings.CHART_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    """Останавливает пул процессов-рендереров"""
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+async def get_chart(user_id: int, kind: str, period: str,
+                    load_data: Callable[[], ChartData], title: str) -> Optional[bytes]:
+    """
+    Возвращает PNG графика из кэша или рисует его в пуле процессов
+
+    Args:
+        user_id: ID пользователя в базе данных
+        kind: тип графика (ключ RENDERERS)
+        period: период графика, например "2024-03"
+        load_data: функция, загружающая данные графика (вызывается только
+            при промахе кэша)
+        title: заголовок графика
+
+    Returns:
+        Optional[bytes]: изображение PNG или None, если данных нет
+    """
+    key = (user_id, kind, period, get_data_version(user_id))
+    png = chart_cache.get(key)
+    if png is not None:
+        logging.info(f"График {kind} за {period} для {user_id} взят из кэша")
+        return png
+
+    data = load_data()
+    if not data:
+        return None
+
+    loop = asyncio.get_running_loop()
+    png = await loop.run_in_executor(get_render_pool(), RENDERERS[kind], data, title)
+    chart_cache.put(key, png)
+    return png
@@ -1,30 +1,45 @@
+import asyncio
+import html
 from aiogram import Router, types, F
-from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from aiogram.enums import ParseMode
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import logging
-from core.models import User, Expense, Transaction, Category, CategoryCache
+from core.models import (User, Expense, Transaction, Category, CategoryCache, Goal, GoalLink,
+                         Budget, DigestOptOut)
 from core.db import SessionLocal
 from core.llm import categorize_transaction
-from sqlalchemy import func, desc, and_, extract
+from core.writer import WriteOp, write_queue, insert, delete
+from sqlalchemy import func, desc, and_, extract, literal, select, tuple_
 import calendar
 from collections import defaultdict
 from aiogram.utils.markdown import code
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-import matplotlib.pyplot as plt
 import io
 import os
-import pandas as pd
-import numpy as np
-from typing import List, Dict, Any, Tuple
-
-
-# Создаем роутер для команд
+import re
+from typing import List, Dict, Any, Optional, Tuple
+from aiogram.types import BufferedInputFile
+from core.versions import bump_data_version
+from bot.charts import get_chart
+from bot.report_cache import cached_report
+from core.archive import archive_boundary, archive_entity, archived_transactions
+from core.search import parse_search_query, search_transactions
+from core.currency import currency_column, rate_day_column, rates
+from core.goals import add_goal_link, delete_goal, remove_contributions
+from core.budgets import month_key, month_spending, remove_spending, set_budget
+from core.digest import set_digest_enabled
+from config import settings
+from bot.export import EXPORT_FORMATS, SpooledInputFile, build_export, spool_size
+from bot.routing import command, button
+
+
+# Создаем роутер для команд: здесь остаются только обработчики inline-кнопок,
+# текстовые сообщения направляет классификатор из bot.routing
 router = Router()
 
 
@@ -53,7 +68,7 @@ def get_main_keyboard():
     return keyboard
 
 
-@router.message(Command("menu"))
+@command("menu", "меню")
 async def cmd_menu(message: Message):
     """
     Показывает кастомную клавиатуру меню
@@ -64,7 +79,7 @@ async def cmd_menu(message: Message):
     )
 
 
-@router.message(lambda message: message.text == "Скрыть меню")
+@button("Скрыть меню")
 async def hide_menu(message: Message):
     """
     Скрывает кастомную клавиатуру меню
@@ -75,31 +90,31 @@ async def hide_menu(message: Message):
     )
 
 
-@router.message(lambda message: message.text == "Статистика")
+@button("Статистика")
 async def show_stats_button(message: Message):
     """Обработчик кнопки Статистика"""
     await cmd_stats(message)
 
 
-@router.message(lambda message: message.text == "История")
+@button("История")
 async def show_history_button(message: Message):
     """Обработчик кнопки История"""
     await cmd_list_transactions(message)
 
 
-@router.message(lambda message: message.text == "Настройки")
+@button("Настройки")
 async def show_settings_button(message: Message):
     """Обработчик кнопки Настройки"""
     await cmd_categories(message)
 
 
-@router.message(lambda message: message.text == "Помощь")
+@button("Помощь")
 async def show_help_button(message: Message):
     """Обработчик кнопки Помощь"""
     await cmd_help(message)
 
 
-@router.message(lambda message: message.text == "Подписка")
+@button("Подписка")
 async def show_subscription_button(message: Message):
     """Обработчик кнопки Подписка"""
     await message.answer(
@@ -110,7 +125,7 @@ async def show_subscription_button(message: Message):
     )
 
 
-@router.message(Command("start"))
+@command("start")
 async def cmd_start(message: Message):
     """
     Обрабатывает команду /start:
@@ -139,11 +154,6 @@ async def cmd_start(message: Message):
                 first_name=first_name,
                 last_name=last_name
             )
-            db.add(user)
-            db.commit()
-            db.refresh(user)  # Обновляем объект, чтобы получить ID
-            is_new_user = True
-            logging.info(f"Создан новый пользователь: {user_id}")
 
             # Создаем стандартный набор категорий для нового пользователя
             standard_categories = [
@@ -164,17 +174,23 @@ async def cmd_start(message: Message):
                 {"name": "другое", "emoji": "💸", "is_expense": 0}
             ]
 
-            # Добавляем категории в БД
-            for cat_data in standard_categories:
-                category = Category(
-                    user_id=user.id,
-                    name=cat_data["name"].lower(),
-                    emoji=cat_data["emoji"],
-                    is_expense=cat_data["is_expense"]
-                )
-                db.add(category)
-
-            db.commit()
+            # Пользователь и его категории записываются одной операцией
+            def create_user_with_categories(write_db: Session) -> User:
+                write_db.add(user)
+                write_db.flush()  # Получаем ID пользователя
+                for cat_data in standard_categories:
+                    write_db.add(Category(
+                        user_id=user.id,
+                        name=cat_data["name"].lower(),
+                        emoji=cat_data["emoji"],
+                        is_expense=cat_data["is_expense"]
+                    ))
+                return user
+
+            await write_queue.submit(create_user_with_categories)
+            bump_data_version(user.id)
+            is_new_user = True
+            logging.info(f"Создан новый пользователь: {user_id}")
 
             # Перестраиваем кэш категорий для нового пользователя
             try:
@@ -221,13 +237,13 @@ async def cmd_start(message: Message):
         db.close()
 
 
-@router.message(lambda message: message.text == "Открыть меню")
+@button("Открыть меню")
 async def open_menu_button(message: Message):
     """Обработчик кнопки Открыть меню"""
     await cmd_menu(message)
 
 
-@router.message(Command("help"))
+@command("help", "помощь")
 async def cmd_help(message: Message):
     """
     Обрабатывает команду /help
@@ -242,6 +258,11 @@ async def cmd_help(message: Message):
         "/summary - Показать финансовую сводку за текущий месяц\n"
         "/stats - Подробная статистика расходов по категориям\n"
         "/list - Список последних транзакций\n"
+        "/search такси март - Поиск транзакций по описанию\n"
+        "/export - Выгрузить все транзакции (csv, gz или parquet)\n"
+        "/goal - Финансовые цели и прогресс по ним\n"
+        "/budget - Месячные бюджеты категорий\n"
+        "/digest - Ежедневные и еженедельные сводки\n"
         "\n"
 
         "<b>УПРАВЛЕНИЕ ТРАНЗАКЦИЯМИ</b>\n"
@@ -261,12 +282,131 @@ async def cmd_help(message: Message):
     await message.answer(help_text, parse_mode=ParseMode.HTML)
 
 
-@router.message(Command("summary"))
+def render_summary(db: Session, user_id: int, now: datetime) -> str:
+    """
+    Строит текст /summary: расходы за день, неделю и месяц, бюджеты и прогноз
+
+    Args:
+        db: сессия БД
+        user_id: ID пользователя в базе данных
+        now: момент построения отчета
+
+    Returns:
+        str: текст отчета (HTML)
+    """
+    today_start = datetime(now.year, now.month, now.day)
+    yesterday_start = today_start - timedelta(days=1)
+    week_start = today_start - timedelta(days=now.weekday())
+    prev_week_start = week_start - timedelta(days=7)
+    month_start = datetime(now.year, now.month, 1)
+
+    # Запрашиваем расходы за текущие периоды
+    day_expenses = db.query(Expense).filter(
+        Expense.user_id == user_id,
+        Expense.created_at >= today_start
+    ).all()
+
+    week_expenses = db.query(Expense).filter(
+        Expense.user_id == user_id,
+        Expense.created_at >= week_start
+    ).all()
+
+    month_expenses = db.query(Expense).filter(
+        Expense.user_id == user_id,
+        Expense.created_at >= month_start
+    ).all()
+
+    # Запрашиваем расходы за предыдущие периоды для сравнения
+    yesterday_expenses = db.query(Expense).filter(
+        Expense.user_id == user_id,
+        Expense.created_at >= yesterday_start,
+        Expense.created_at < today_start
+    ).all()
+
+    prev_week_expenses = db.query(Expense).filter(
+        Expense.user_id == user_id,
+        Expense.created_at >= prev_week_start,
+        Expense.created_at < week_start
+    ).all()
+
+    # Считаем суммы расходов
+    day_sum = sum(expense.amount for expense in day_expenses)
+    yesterday_sum = sum(expense.amount for expense in yesterday_expenses)
+    week_sum = sum(expense.amount for expense in week_expenses)
+    prev_week_sum = sum(expense.amount for expense in prev_week_expenses)
+    month_sum = sum(expense.amount for expense in month_expenses)
+
+    # Рассчитываем средние значения
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    days_passed = now.day
+
+    # Прогнозируем расходы на месяц, если прошло хотя бы 3 дня
+    monthly_forecast = 0
+    if days_passed >= 3:
+        daily_avg = month_sum / days_passed
+        monthly_forecast = daily_avg * days_in_month
+
+    # Определяем тенденции (рост/снижение)
+    day_trend = "➡️"  # нейтральный тренд по умолчанию
+    if yesterday_sum > 0:
+        day_trend = "📉" if day_sum < yesterday_sum else "📈" if day_sum > yesterday_sum else "➡️"
+
+    week_trend = "➡️"
+    if prev_week_sum > 0:
+        week_trend = "📉" if week_sum < prev_week_sum else "📈" if week_sum > prev_week_sum else "➡️"
+
+    # Прогресс по бюджетам категорий: счетчики месяца, без пересчета транзакций
+    budgets = db.query(Budget.category_id, Budget.amount).filter(
+        Budget.user_id == user_id
+    ).all()
+    if budgets:
+        spending = month_spending(db, user_id, month_key(now))
+        budget_total = sum(amount for _, amount in budgets)
+        budget_spent = sum(spending.get(category_id, 0) for category_id, _ in budgets)
+        progress_percent = min(100, int(budget_spent / budget_total * 100)) if budget_total else 100
+
+        # Создаем визуальный индикатор прогресса
+        progress_bar_length = 10
+        filled_blocks = int((progress_percent / 100) * progress_bar_length)
+        progress_bar = "█" * filled_blocks + "▒" * \
+            (progress_bar_length - filled_blocks)
+        budget_text = (
+            f"<b>Прогресс по бюджетам:</b> {progress_percent}% "
+            f"(<code>{budget_spent:.2f}</code> из <code>{budget_total:.2f}</code> ₽)\n"
+            f"<code>{progress_bar}</code>\n\n"
+        )
+    else:
+        budget_text = "<i>Бюджеты не заданы: /budget продукты 15000</i>\n\n"
+
+    # Получаем совет от LLM
+    # advice = get_advice(user_id, db) # Удалено
+    advice = "Нет доступного совета на текущий момент."  # Удалено
+
+    # Форматируем суммы
+    day_formatted = f"{day_sum:.2f}"
+    week_formatted = f"{week_sum:.2f}"
+    month_formatted = f"{month_sum:.2f}"
+    forecast_formatted = f"{monthly_forecast:.2f}" if monthly_forecast > 0 else "N/A"
+
+    # Формируем сообщение
+    return (
+        f"<b>ФИНАНСОВАЯ СВОДКА</b>\n\n"
+        f"<b>Сегодня:</b> {day_trend} <code>{day_formatted}</code> ₽\n"
+        f"<b>Неделя:</b> {week_trend} <code>{week_formatted}</code> ₽\n"
+        f"<b>Месяц:</b> <code>{month_formatted}</code> ₽\n\n"
+        f"{budget_text}"
+        f"<b>Прогноз на месяц:</b> <code>{forecast_formatted}</code> ₽\n\n"
+        f"<blockquote>{advice}</blockquote>\n\n"
+        f"<i>Используйте /stats для подробной статистики</i>"
+    )
+
+
+@command("summary", "отчет")
 async def cmd_summary(message: Message):
     """
     Обрабатывает команду /summary:
     - Показывает сводку по расходам за день, неделю и месяц
-    - Добавляет визуализацию прогресса по бюджету
+    - Показывает прогресс по бюджетам категорий (/budget)
     - Показывает тенденцию расходов (рост/снижение)
     - Добавляет персонализированный совет по финансам
     """
@@ -282,106 +422,11 @@ async def cmd_summary(message: Message):
             await message.answer("Для начала работы, пожалуйста, используйте команду /start")
             return
 
-        # Получаем текущую дату и время
+        # Отчет строится заново только после записи данных или в новый день
         now = datetime.now()
-        today_start = datetime(now.year, now.month, now.day)
-        yesterday_start = today_start - timedelta(days=1)
-        week_start = today_start - timedelta(days=now.weekday())
-        prev_week_start = week_start - timedelta(days=7)
-        month_start = datetime(now.year, now.month, 1)
-
-        # Запрашиваем расходы за текущие периоды
-        day_expenses = db.query(Expense).filter(
-            Expense.user_id == user.id,
-            Expense.created_at >= today_start
-        ).all()
-
-        week_expenses = db.query(Expense).filter(
-            Expense.user_id == user.id,
-            Expense.created_at >= week_start
-        ).all()
-
-        month_expenses = db.query(Expense).filter(
-            Expense.user_id == user.id,
-            Expense.created_at >= month_start
-        ).all()
-
-        # Запрашиваем расходы за предыдущие периоды для сравнения
-        yesterday_expenses = db.query(Expense).filter(
-            Expense.user_id == user.id,
-            Expense.created_at >= yesterday_start,
-            Expense.created_at < today_start
-        ).all()
-
-        prev_week_expenses = db.query(Expense).filter(
-            Expense.user_id == user.id,
-            Expense.created_at >= prev_week_start,
-            Expense.created_at < week_start
-        ).all()
-
-        # Считаем суммы расходов
-        day_sum = sum(expense.amount for expense in day_expenses)
-        yesterday_sum = sum(expense.amount for expense in yesterday_expenses)
-        week_sum = sum(expense.amount for expense in week_expenses)
-        prev_week_sum = sum(expense.amount for expense in prev_week_expenses)
-        month_sum = sum(expense.amount for expense in month_expenses)
-
-        # Рассчитываем средние значения
-        days_in_month = calendar.monthrange(now.year, now.month)[1]
-        days_passed = now.day
-
-        # Прогнозируем расходы на месяц, если прошло хотя бы 3 дня
-        monthly_forecast = 0
-        if days_passed >= 3:
-            daily_avg = month_sum / days_passed
-            monthly_forecast = daily_avg * days_in_month
-
-        # Определяем тенденции (рост/снижение)
-        day_trend = "➡️"  # нейтральный тренд по умолчанию
-        if yesterday_sum > 0:
-            day_trend = "📉" if day_sum < yesterday_sum else "📈" if day_sum > yesterday_sum else "➡️"
-
-        week_trend = "➡️"
-        if prev_week_sum > 0:
-            week_trend = "📉" if week_sum < prev_week_sum else "📈" if week_sum > prev_week_sum else "➡️"
-
-        # Создаем визуальный прогресс по месячному бюджету
-        # Предположим, что месячный бюджет - это прогноз или 2x от текущих расходов, если прогноза нет
-        monthly_budget = monthly_forecast if monthly_forecast > 0 else month_sum * 2
-        if monthly_budget == 0:  # Если нет расходов, установим минимальный бюджет
-            monthly_budget = 10000
-
-        progress_percent = min(100, int((month_sum / monthly_budget) * 100))
-
-        # Создаем визуальный индикатор прогресса
-        progress_bar_length = 10
-        filled_blocks = int((progress_percent / 100) * progress_bar_length)
-        progress_bar = "█" * filled_blocks + "▒" * \
-            (progress_bar_length - filled_blocks)
-
-        # Получаем совет от LLM
-        # advice = get_advice(user_id, db) # Удалено
-        advice = "Нет доступного совета на текущий момент."  # Удалено
-
-        # Форматируем суммы
-        day_formatted = f"{day_sum:.2f}"
-        week_formatted = f"{week_sum:.2f}"
-        month_formatted = f"{month_sum:.2f}"
-        forecast_formatted = f"{monthly_forecast:.2f}" if monthly_forecast > 0 else "N/A"
-
-        # Формируем сообщение
-        await message.answer(
-            f"<b>ФИНАНСОВАЯ СВОДКА</b>\n\n"
-            f"<b>Сегодня:</b> {day_trend} <code>{day_formatted}</code> ₽\n"
-            f"<b>Неделя:</b> {week_trend} <code>{week_formatted}</code> ₽\n"
-            f"<b>Месяц:</b> <code>{month_formatted}</code> ₽\n\n"
-            f"<b>Прогресс по бюджету:</b> {progress_percent}%\n"
-            f"<code>{progress_bar}</code>\n\n"
-            f"<b>Прогноз на месяц:</b> <code>{forecast_formatted}</code> ₽\n\n"
-            f"<blockquote>{advice}</blockquote>\n\n"
-            f"<i>Используйте /stats для подробной статистики</i>",
-            parse_mode=ParseMode.HTML
-        )
+        text = cached_report(user.id, "summary", now.strftime("%Y-%m-%d"),
+                             lambda: render_summary(db, user.id, now))
+        await message.answer(text, parse_mode=ParseMode.HTML)
     except Exception as e:
         logging.error(f"Ошибка при обработке команды /summary: {e}")
         await message.answer("Произошла ошибка при формировании отчета. Попробуйте позже.")
@@ -394,7 +439,197 @@ def format_amount_markdown(amount: float, currency: str = "₽") -> str:
     return f"`{amount:.2f}`"
 
 
-@router.message(Command("stats"))
+def render_stats(db: Session, user_id: int, now: datetime) -> str:
+    """
+    Строит текст /stats: расходы и доходы месяца по категориям, сравнение с
+    прошлым месяцем и дневная статистика
+
+    Args:
+        db: сессия БД
+        user_id: ID пользователя в базе данных
+        now: момент построения отчета
+
+    Returns:
+        str: текст отчета (HTML)
+    """
+    today_start = datetime(now.year, now.month, now.day)
+    month_start = datetime(now.year, now.month, 1)
+
+    # Определяем начало предыдущего месяца
+    if now.month == 1:
+        prev_month_start = datetime(now.year - 1, 12, 1)
+        prev_month_end = datetime(now.year, 1, 1)
+    else:
+        prev_month_start = datetime(now.year, now.month - 1, 1)
+        prev_month_end = month_start
+
+    # Суммы по категориям за текущий и предыдущий месяц в рублях
+    current_totals = category_totals(db, user_id, month_start)
+    prev_totals = category_totals(db, user_id, prev_month_start, prev_month_end)
+
+    # Группируем текущие расходы и доходы по категориям
+    expenses_by_category = {(name, emoji): amount for (is_expense, name, emoji), amount
+                            in current_totals.items() if is_expense == 1}
+    income_by_category = {(name, emoji): amount for (is_expense, name, emoji), amount
+                          in current_totals.items() if is_expense == 0}
+    expenses_total = sum(expenses_by_category.values())
+    income_total = sum(income_by_category.values())
+
+    # Предыдущий месяц для сравнения
+    prev_expenses_by_category = {(name, emoji): amount for (is_expense, name, emoji), amount
+                                 in prev_totals.items() if is_expense == 1}
+    prev_expenses_total = sum(prev_expenses_by_category.values())
+    prev_income_total = sum(amount for (is_expense, _, _), amount
+                            in prev_totals.items() if is_expense == 0)
+
+    # Создаем ответное сообщение
+    month_name = calendar.month_name[now.month]
+    prev_month_name = calendar.month_name[prev_month_start.month]
+
+    response_parts = [f"<b>СТАТИСТИКА ЗА {month_name.upper()}</b>\n"]
+
+    # Добавляем сводку по текущему месяцу
+    response_parts.append("<b>ОБЩАЯ СВОДКА:</b>")
+
+    # Сравниваем с предыдущим месяцем
+    expense_change = 0
+    expense_change_percent = 0
+    if prev_expenses_total > 0:
+        expense_change = expenses_total - prev_expenses_total
+        expense_change_percent = (
+            expense_change / prev_expenses_total) * 100
+
+    expense_trend = "➡️"
+    if expense_change_percent > 5:
+        expense_trend = "📈"
+    elif expense_change_percent < -5:
+        expense_trend = "📉"
+
+    income_change = 0
+    income_change_percent = 0
+    if prev_income_total > 0:
+        income_change = income_total - prev_income_total
+        income_change_percent = (income_change / prev_income_total) * 100
+
+    income_trend = "➡️"
+    if income_change_percent > 5:
+        income_trend = "📈"
+    elif income_change_percent < -5:
+        income_trend = "📉"
+
+    # Добавляем сравнение с прошлым месяцем
+    response_parts.append(
+        f"• Расходы: <code>{expenses_total:.2f}</code> ₽ {expense_trend}\n"
+        f"• Доходы: <code>{income_total:.2f}</code> ₽ {income_trend}\n"
+        f"• Баланс: <code>{income_total - expenses_total:.2f}</code> ₽\n"
+    )
+
+    if prev_expenses_total > 0 or prev_income_total > 0:
+        response_parts.append(
+            f"<i>По сравнению с {prev_month_name}:</i>\n"
+            f"• Расходы: {'+' if expense_change >= 0 else ''}{expense_change:.2f} ₽ ({'+' if expense_change_percent >= 0 else ''}{expense_change_percent:.1f}%)\n"
+            f"• Доходы: {'+' if income_change >= 0 else ''}{income_change:.2f} ₽ ({'+' if income_change_percent >= 0 else ''}{income_change_percent:.1f}%)\n"
+        )
+
+    # Добавляем расходы по категориям с визуализацией
+    if expenses_total > 0:
+        response_parts.append("\n<b>РАСХОДЫ ПО КАТЕГОРИЯМ:</b>")
+
+        # Сортируем категории по убыванию сумм
+        sorted_expenses = sorted(
+            expenses_by_category.items(),
+            key=lambda x: x[1],
+            reverse=True
+        )
+
+        # Создаем визуализацию для топ-5 категорий
+        top_categories = sorted_expenses[:5]
+        max_amount = top_categories[0][1] if top_categories else 0
+
+        for (category_name, category_emoji), amount in top_categories:
+            percentage = (amount / expenses_total) * 100
+            bar_length = int((amount / max_amount) *
+                             10) if max_amount > 0 else 0
+            bar = "█" * bar_length + "▒" * (10 - bar_length)
+
+            # Получаем изменение по сравнению с прошлым месяцем
+            prev_amount = prev_expenses_by_category.get(
+                (category_name, category_emoji), 0)
+            change_str = ""
+            if prev_amount > 0:
+                change = amount - prev_amount
+                change_percent = (change / prev_amount) * 100
+                change_symbol = "↗️" if change > 0 else "↘️" if change < 0 else "↔️"
+                change_str = f" {change_symbol} {change_percent:.1f}%"
+
+            response_parts.append(
+                f"{category_emoji} {category_name.capitalize()}: <code>{amount:.2f}</code> ₽ ({percentage:.1f}%){change_str}\n"
+                f"<code>{bar}</code>"
+            )
+
+        # Если есть еще категории, добавляем их в сокращенном виде
+        if len(sorted_expenses) > 5:
+            other_sum = sum(amount for (_, _),
+                            amount in sorted_expenses[5:])
+            other_percentage = (other_sum / expenses_total) * 100
+            response_parts.append(
+                f"\nДругие категории: <code>{other_sum:.2f}</code> ₽ ({other_percentage:.1f}%)")
+
+    # Добавляем доходы
+    if income_total > 0:
+        response_parts.append("\n<b>ДОХОДЫ:</b>")
+
+        sorted_income = sorted(
+            income_by_category.items(),
+            key=lambda x: x[1],
+            reverse=True
+        )
+
+        for (category_name, category_emoji), amount in sorted_income:
+            percentage = (amount / income_total) * 100
+            response_parts.append(
+                f"{category_emoji} {category_name.capitalize()}: <code>{amount:.2f}</code> ₽ ({percentage:.1f}%)")
+
+    # Добавляем дневную статистику
+    days_passed = now.day
+    avg_daily_expense = expenses_total / days_passed if days_passed > 0 else 0
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    days_left = days_in_month - days_passed
+
+    response_parts.append(
+        f"\n<b>ДНЕВНАЯ СТАТИСТИКА:</b>\n"
+        f"• В среднем за день: <code>{avg_daily_expense:.2f}</code> ₽\n"
+        f"• Дней прошло: {days_passed} из {days_in_month}\n"
+        f"• Прогноз на месяц: <code>{avg_daily_expense * days_in_month:.2f}</code> ₽"
+    )
+
+    # Добавляем советы по оптимизации расходов
+    if expenses_total > 0:
+        # Находим категорию с наибольшим ростом расходов
+        biggest_increase = None
+        biggest_increase_percent = 0
+
+        for (category_name, category_emoji), amount in expenses_by_category.items():
+            prev_amount = prev_expenses_by_category.get(
+                (category_name, category_emoji), 0)
+            if prev_amount > 0:
+                change_percent = (
+                    (amount - prev_amount) / prev_amount) * 100
+                if change_percent > biggest_increase_percent:
+                    biggest_increase = (category_name, category_emoji)
+                    biggest_increase_percent = change_percent
+
+        if biggest_increase and biggest_increase_percent > 20:
+            category_name, category_emoji = biggest_increase
+            response_parts.append(
+                f"\n💡 <i>Совет: Обратите внимание на категорию {category_emoji} {category_name.capitalize()} — "
+                f"расходы выросли на {biggest_increase_percent:.1f}% по сравнению с прошлым месяцем</i>"
+            )
+
+    return "\n".join(response_parts)
+
+
+@command("stats", "статистика")
 async def cmd_stats(message: Message):
     """
     Обрабатывает команду /stats или /statistics:
@@ -415,245 +650,378 @@ async def cmd_stats(message: Message):
             await message.answer("Для начала работы, пожалуйста, используйте команду /start")
             return
 
-        # Получаем текущую дату и время
+        # Отчет строится заново только после записи данных или в новый день
         now = datetime.now()
-        today_start = datetime(now.year, now.month, now.day)
-        month_start = datetime(now.year, now.month, 1)
+        text = cached_report(user.id, "stats", now.strftime("%Y-%m-%d"),
+                             lambda: render_stats(db, user.id, now))
 
-        # Определяем начало предыдущего месяца
-        if now.month == 1:
-            prev_month_start = datetime(now.year - 1, 12, 1)
-            prev_month_end = datetime(now.year, 1, 1)
-        else:
-            prev_month_start = datetime(now.year, now.month - 1, 1)
-            prev_month_end = month_start
+        # Кнопки графиков за текущий месяц
+        period = now.strftime("%Y-%m")
+        builder = InlineKeyboardBuilder()
+        builder.button(text="🥧 По категориям", callback_data=f"chart:pie:{period}")
+        builder.button(text="📊 По дням", callback_data=f"chart:daily:{period}")
+        builder.adjust(2)
 
-        # Запрашиваем расходы и доходы за текущий месяц
-        current_transactions = db.query(
-            Transaction,
-            Category.name.label('category_name'),
-            Category.emoji.label('category_emoji')
-        ).join(
-            Category,
-            Transaction.category_id == Category.id,
-            isouter=True
-        ).filter(
-            Transaction.user_id == user.id,
-            Transaction.transaction_date >= month_start
-        ).order_by(desc(Transaction.transaction_date)).all()
+        await message.answer(
+            text,
+            reply_markup=builder.as_markup(),
+            parse_mode=ParseMode.HTML
+        )
+    except Exception as e:
+        logging.error(f"Ошибка при обработке команды /stats: {e}")
+        await message.answer("Произошла ошибка при формировании статистики. Попробуйте позже.")
+    finally:
+        db.close()
 
-        # Запрашиваем расходы и доходы за предыдущий месяц для сравнения
-        prev_transactions = db.query(
-            Transaction,
-            Category.name.label('category_name'),
-            Category.emoji.label('category_emoji')
-        ).join(
+
+def category_totals(db: Session, user_id: int, since: datetime,
+                    until: Optional[datetime] = None) -> Dict[Tuple[int, str, str], float]:
+    """
+    Суммы по категориям за период в рублях одним GROUP BY запросом
+
+    Returns:
+        Dict[Tuple[int, str, str], float]: (is_expense, категория, эмодзи) -> сумма
+    """
+    category_name = func.coalesce(Category.name, "другое")
+    category_emoji = func.coalesce(Category.emoji, "💰")
+    filters = [Transaction.user_id == user_id, Transaction.transaction_date >= since]
+    if until is not None:
+        filters.append(Transaction.transaction_date < until)
+    group = (Transaction.is_expense, category_name, category_emoji,
+             currency_column(Transaction), rate_day_column(Transaction))
+    rows = db.query(*group, func.sum(Transaction.amount)).join(
+        Category,
+        Transaction.category_id == Category.id,
+        isouter=True
+    ).filter(*filters).group_by(*group).all()
+    return rates.convert_totals(rows)
+
+
+def load_chart_data(db: Session, user_id: int, kind: str,
+                    period_start: datetime, period_end: datetime) -> List[Tuple[str, float]]:
+    """
+    Загружает агрегированные расходы для графика одним GROUP BY запросом
+
+    Args:
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+        kind: "pie" — по категориям, "daily" — по дням
+        period_start: начало периода (включительно)
+        period_end: конец периода (не включительно)
+
+    Returns:
+        List[Tuple[str, float]]: пары (подпись, сумма)
+    """
+    period_filter = (
+        Transaction.user_id == user_id,
+        Transaction.is_expense == 1,
+        Transaction.transaction_date >= period_start,
+        Transaction.transaction_date < period_end
+    )
+
+    # Суммы по валютам пересчитываются в рубли после группировки
+    currency = (currency_column(Transaction), rate_day_column(Transaction))
+    if kind == "pie":
+        category_name = func.coalesce(Category.name, "другое")
+        rows = db.query(category_name, *currency, func.sum(Transaction.amount)).join(
             Category,
             Transaction.category_id == Category.id,
             isouter=True
-        ).filter(
-            Transaction.user_id == user.id,
-            Transaction.transaction_date >= prev_month_start,
-            Transaction.transaction_date < prev_month_end
-        ).all()
-
-        # Группируем текущие расходы по категориям
-        expenses_by_category = defaultdict(float)
-        expenses_total = 0
-        income_by_category = defaultdict(float)
-        income_total = 0
-
-        for tx, cat_name, cat_emoji in current_transactions:
-            category_name = cat_name or "другое"
-            category_emoji = cat_emoji or "💰"
-
-            if tx.is_expense == 1:  # Расход
-                expenses_by_category[(
-                    category_name, category_emoji)] += tx.amount
-                expenses_total += tx.amount
-            else:  # Доход
-                income_by_category[(
-                    category_name, category_emoji)] += tx.amount
-                income_total += tx.amount
-
-        # Группируем предыдущие расходы по категориям для сравнения
-        prev_expenses_by_category = defaultdict(float)
-        prev_expenses_total = 0
-        prev_income_total = 0
-
-        for tx, cat_name, cat_emoji in prev_transactions:
-            category_name = cat_name or "другое"
-            category_emoji = cat_emoji or "💰"
+        ).filter(*period_filter).group_by(category_name, *currency).all()
+        totals = rates.convert_totals(rows)
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
 
-            if tx.is_expense == 1:  # Расход
-                prev_expenses_by_category[(
-                    category_name, category_emoji)] += tx.amount
-                prev_expenses_total += tx.amount
-            else:  # Доход
-                prev_income_total += tx.amount
-
-        # Создаем ответное сообщение
-        month_name = calendar.month_name[now.month]
-        prev_month_name = calendar.month_name[prev_month_start.month]
-
-        response_parts = [f"<b>СТАТИСТИКА ЗА {month_name.upper()}</b>\n"]
-
-        # Добавляем сводку по текущему месяцу
-        response_parts.append("<b>ОБЩАЯ СВОДКА:</b>")
-
-        # Сравниваем с предыдущим месяцем
-        expense_change = 0
-        expense_change_percent = 0
-        if prev_expenses_total > 0:
-            expense_change = expenses_total - prev_expenses_total
-            expense_change_percent = (
-                expense_change / prev_expenses_total) * 100
-
-        expense_trend = "➡️"
-        if expense_change_percent > 5:
-            expense_trend = "📈"
-        elif expense_change_percent < -5:
-            expense_trend = "📉"
-
-        income_change = 0
-        income_change_percent = 0
-        if prev_income_total > 0:
-            income_change = income_total - prev_income_total
-            income_change_percent = (income_change / prev_income_total) * 100
-
-        income_trend = "➡️"
-        if income_change_percent > 5:
-            income_trend = "📈"
-        elif income_change_percent < -5:
-            income_trend = "📉"
-
-        # Добавляем сравнение с прошлым месяцем
-        response_parts.append(
-            f"• Расходы: <code>{expenses_total:.2f}</code> ₽ {expense_trend}\n"
-            f"• Доходы: <code>{income_total:.2f}</code> ₽ {income_trend}\n"
-            f"• Баланс: <code>{income_total - expenses_total:.2f}</code> ₽\n"
-        )
+    day = func.date(Transaction.transaction_date)
+    rows = db.query(day, *currency, func.sum(Transaction.amount)).filter(
+        *period_filter).group_by(day, *currency).all()
+    totals = rates.convert_totals(rows)
+    return [(datetime.strptime(day_str, "%Y-%m-%d").strftime("%d.%m"), totals[day_str])
+            for day_str in sorted(totals)]
 
-        if prev_expenses_total > 0 or prev_income_total > 0:
-            response_parts.append(
-                f"<i>По сравнению с {prev_month_name}:</i>\n"
-                f"• Расходы: {'+' if expense_change >= 0 else ''}{expense_change:.2f} ₽ ({'+' if expense_change_percent >= 0 else ''}{expense_change_percent:.1f}%)\n"
-                f"• Доходы: {'+' if income_change >= 0 else ''}{income_change:.2f} ₽ ({'+' if income_change_percent >= 0 else ''}{income_change_percent:.1f}%)\n"
-            )
 
-        # Добавляем расходы по категориям с визуализацией
-        if expenses_total > 0:
-            response_parts.append("\n<b>РАСХОДЫ ПО КАТЕГОРИЯМ:</b>")
+@router.callback_query(F.data.startswith("chart:"))
+async def process_chart(callback: CallbackQuery):
+    """
+    Отправляет график расходов за месяц (chart:<pie|daily>:<ГГГГ-ММ>)
 
-            # Сортируем категории по убыванию сумм
-            sorted_expenses = sorted(
-                expenses_by_category.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )
+    Повторные просмотры без новых записей отдаются из кэша графиков.
+    """
+    _, kind, period = callback.data.split(":")
+    user_id = callback.from_user.id
 
-            # Создаем визуализацию для топ-5 категорий
-            top_categories = sorted_expenses[:5]
-            max_amount = top_categories[0][1] if top_categories else 0
-
-            for (category_name, category_emoji), amount in top_categories:
-                percentage = (amount / expenses_total) * 100
-                bar_length = int((amount / max_amount) *
-                                 10) if max_amount > 0 else 0
-                bar = "█" * bar_length + "▒" * (10 - bar_length)
-
-                # Получаем изменение по сравнению с прошлым месяцем
-                prev_amount = prev_expenses_by_category.get(
-                    (category_name, category_emoji), 0)
-                change_str = ""
-                if prev_amount > 0:
-                    change = amount - prev_amount
-                    change_percent = (change / prev_amount) * 100
-                    change_symbol = "↗️" if change > 0 else "↘️" if change < 0 else "↔️"
-                    change_str = f" {change_symbol} {change_percent:.1f}%"
-
-                response_parts.append(
-                    f"{category_emoji} {category_name.capitalize()}: <code>{amount:.2f}</code> ₽ ({percentage:.1f}%){change_str}\n"
-                    f"<code>{bar}</code>"
-                )
+    # Создаем сессию БД
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == user_id).first()
 
-            # Если есть еще категории, добавляем их в сокращенном виде
-            if len(sorted_expenses) > 5:
-                other_sum = sum(amount for (_, _),
-                                amount in sorted_expenses[5:])
-                other_percentage = (other_sum / expenses_total) * 100
-                response_parts.append(
-                    f"\nДругие категории: <code>{other_sum:.2f}</code> ₽ ({other_percentage:.1f}%)")
-
-        # Добавляем доходы
-        if income_total > 0:
-            response_parts.append("\n<b>ДОХОДЫ:</b>")
-
-            sorted_income = sorted(
-                income_by_category.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )
+        if not user:
+            await callback.answer("Для начала работы используйте команду /start")
+            return
 
-            for (category_name, category_emoji), amount in sorted_income:
-                percentage = (amount / income_total) * 100
-                response_parts.append(
-                    f"{category_emoji} {category_name.capitalize()}: <code>{amount:.2f}</code> ₽ ({percentage:.1f}%)")
+        period_start = datetime.strptime(period, "%Y-%m")
+        days_in_month = calendar.monthrange(period_start.year, period_start.month)[1]
+        period_end = period_start + timedelta(days=days_in_month)
 
-        # Добавляем дневную статистику
-        days_passed = now.day
-        avg_daily_expense = expenses_total / days_passed if days_passed > 0 else 0
-        days_in_month = calendar.monthrange(now.year, now.month)[1]
-        days_left = days_in_month - days_passed
+        title = ("Расходы по категориям" if kind == "pie" else "Расходы по дням") + \
+            f", {period_start.strftime('%m.%Y')}"
 
-        response_parts.append(
-            f"\n<b>ДНЕВНАЯ СТАТИСТИКА:</b>\n"
-            f"• В среднем за день: <code>{avg_daily_expense:.2f}</code> ₽\n"
-            f"• Дней прошло: {days_passed} из {days_in_month}\n"
-            f"• Прогноз на месяц: <code>{avg_daily_expense * days_in_month:.2f}</code> ₽"
+        png = await get_chart(
+            user.id, kind, period,
+            lambda: load_chart_data(db, user.id, kind, period_start, period_end),
+            title
         )
 
-        # Добавляем советы по оптимизации расходов
-        if expenses_total > 0:
-            # Находим категорию с наибольшим ростом расходов
-            biggest_increase = None
-            biggest_increase_percent = 0
-
-            for (category_name, category_emoji), amount in expenses_by_category.items():
-                prev_amount = prev_expenses_by_category.get(
-                    (category_name, category_emoji), 0)
-                if prev_amount > 0:
-                    change_percent = (
-                        (amount - prev_amount) / prev_amount) * 100
-                    if change_percent > biggest_increase_percent:
-                        biggest_increase = (category_name, category_emoji)
-                        biggest_increase_percent = change_percent
-
-            if biggest_increase and biggest_increase_percent > 20:
-                category_name, category_emoji = biggest_increase
-                response_parts.append(
-                    f"\n💡 <i>Совет: Обратите внимание на категорию {category_emoji} {category_name.capitalize()} — "
-                    f"расходы выросли на {biggest_increase_percent:.1f}% по сравнению с прошлым месяцем</i>"
-                )
+        if png is None:
+            await callback.answer("За этот месяц нет расходов")
+            return
 
-        await message.answer("\n".join(response_parts), parse_mode=ParseMode.HTML)
+        await callback.message.answer_photo(
+            BufferedInputFile(png, filename=f"{kind}_{period}.png"),
+            caption=title
+        )
+        await callback.answer()
     except Exception as e:
-        logging.error(f"Ошибка при обработке команды /stats: {e}")
-        await message.answer("Произошла ошибка при формировании статистики. Попробуйте позже.")
+        logging.error(f"Ошибка при построении графика: {e}")
+        await callback.answer("Не удалось построить график. Попробуйте позже.")
     finally:
         db.close()
 
 
-@router.message(Command("list"))
-async def cmd_list_transactions(message: Message):
+# Транзакций на одной странице /list
+LIST_PAGE_SIZE = 15
+
+# Сколько категорий можно передать в callback_data кнопок листания
+# (Telegram ограничивает callback_data 64 байтами)
+LIST_MAX_FILTER_IDS = 4
+
+# Страница /list: строки (транзакция, название категории, эмодзи) от новых к
+# старым и признаки наличия более старых и более новых транзакций
+ListPage = Tuple[List[Tuple[Transaction, str, str]], bool, bool]
+
+
+def find_category_ids(db: Session, user_id: int, name: str) -> List[int]:
+    """
+    Находит категории пользователя по названию для фильтра /list
+
+    Сначала ищется точное совпадение (расход и доход с одним названием дают
+    две категории), затем — категории, название которых содержит текст.
+
+    Returns:
+        List[int]: ID категорий (пустой список, если ничего не найдено)
+    """
+    name = name.strip().lower()
+    ids = [category_id for category_id, in db.query(Category.id).filter(
+        Category.user_id == user_id,
+        func.lower(Category.name) == name
+    )]
+    if not ids:
+        ids = [category_id for category_id, in db.query(Category.id).filter(
+            Category.user_id == user_id,
+            func.lower(Category.name).contains(name)
+        )]
+    return ids[:LIST_MAX_FILTER_IDS]
+
+
+def fetch_transactions_page(db: Session, user_id: int,
+                            category_ids: Optional[List[int]] = None,
+                            cursor_id: Optional[int] = None,
+                            direction: str = "older",
+                            limit: int = LIST_PAGE_SIZE) -> ListPage:
+    """
+    Загружает страницу транзакций по ключу (transaction_date, id)
+
+    Страница ищется от курсора по индексу, без OFFSET, поэтому любая
+    страница читается так же быстро, как первая. Значение даты курсора
+    берется подзапросом прямо в SQL: так сравнение идет с тем же значением,
+    что хранится в базе. Архив старых транзакций читается тем же способом
+    и сливается со страницей, только когда его строки могут на нее попасть.
+
+    Args:
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+        category_ids: фильтр по категориям (None — все транзакции)
+        cursor_id: ID транзакции, от которой листать (None — первая страница)
+        direction: "older" — транзакции старше курсора, "newer" — новее
+        limit: размер страницы
+
+    Returns:
+        ListPage: строки страницы от новых к старым, есть ли старше, есть ли новее
+    """
+    newer = direction == "newer"
+    archived = archive_entity(db)
+
+    def cursor_date(table):
+        cursor_tx = table.alias()
+        return select(cursor_tx.c.transaction_date).where(
+            cursor_tx.c.id == cursor_id).scalar_subquery()
+
+    # Курсор может указывать и на архивную строку
+    cursor_key = tuple_(
+        func.coalesce(cursor_date(Transaction.__table__), cursor_date(archived_transactions))
+        if archived is not None else cursor_date(Transaction.__table__),
+        literal(cursor_id)
+    )
+
+    def page_query(entity, category_id: Optional[int]):
+        key = tuple_(entity.transaction_date, entity.id)
+        query = db.query(
+            entity,
+            Category.name.label('category_name'),
+            Category.emoji.label('category_emoji')
+        ).join(
+            Category,
+            entity.category_id == Category.id,
+            isouter=True
+        ).filter(
+            entity.user_id == user_id
+        )
+        if category_id is not None:
+            query = query.filter(entity.category_id == category_id)
+        if cursor_id is not None:
+            query = query.filter(key > cursor_key if newer else key < cursor_key)
+        if newer:
+            query = query.order_by(entity.transaction_date, entity.id)
+        else:
+            query = query.order_by(desc(entity.transaction_date), desc(entity.id))
+        return query.limit(limit + 1).all()
+
+    def source_rows(entity):
+        # По запросу на категорию: каждый идет по своему диапазону индекса
+        if category_ids:
+            return [row for category_id in category_ids
+                    for row in page_query(entity, category_id)]
+        return page_query(entity, None)
+
+    rows = source_rows(Transaction)
+    merged = bool(category_ids)
+    if archived is not None:
+        # Архив читается, только если его строки могут попасть на страницу:
+        # полная страница старше самой новой архивной строки его не требует
+        boundary = archive_boundary(db, user_id)
+        page_full = len(rows) > limit
+        if boundary is not None and (newer or not page_full or boundary >= min(
+                row[0].transaction_date for row in rows)):
+            rows += source_rows(archived)
+            merged = True
+    if merged:
+        # Страницы разных запросов сливаются
+        rows.sort(key=lambda row: (row[0].transaction_date, row[0].id), reverse=not newer)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newer:
+        rows.reverse()
+        return rows, True, has_more
+    return rows, has_more, cursor_id is not None
+
+
+def render_transactions_page(rows: List[Tuple[Transaction, str, str]],
+                             filter_name: Optional[str] = None) -> str:
+    """Формирует текст страницы /list: транзакции, сгруппированные по дням"""
+    # Группируем транзакции по дням
+    transactions_by_day = {}
+    subtotals = []
+    for tx, cat_name, cat_emoji in rows:
+        date_key = tx.transaction_date.strftime("%Y-%m-%d")
+        date_display = tx.transaction_date.strftime("%d.%m.%Y")
+
+        if date_key not in transactions_by_day:
+            transactions_by_day[date_key] = {
+                "display_date": date_display,
+                "transactions": [],
+                "expenses": 0,
+                "income": 0
+            }
+
+        category_name = cat_name or "другое"
+        category_emoji = cat_emoji or "💰"
+
+        # Суммы дня пересчитываются в рубли после группировки
+        subtotals.append((date_key, tx.is_expense, tx.currency, tx.transaction_date, tx.amount))
+
+        # Добавляем данные о транзакции
+        transactions_by_day[date_key]["transactions"].append({
+            "id": tx.id,
+            "amount": tx.amount,
+            "currency": tx.currency,
+            "category_name": category_name,
+            "category_emoji": category_emoji,
+            "is_expense": tx.is_expense == 1,
+            "description": tx.description
+        })
+
+    for (date_key, is_expense), amount in rates.convert_totals(subtotals).items():
+        transactions_by_day[date_key]["expenses" if is_expense == 1 else "income"] = amount
+
+    # Формируем сообщение
+    title = "<b>ИСТОРИЯ ТРАНЗАКЦИЙ</b>"
+    if filter_name:
+        title += f" • <i>{html.escape(filter_name)}</i>"
+    response = [title + "\n"]
+
+    # Добавляем транзакции по дням
+    for date_key, day_data in transactions_by_day.items():
+        # Добавляем заголовок дня
+        day_balance = day_data["income"] - day_data["expenses"]
+        balance_sign = "+" if day_balance >= 0 else "-"
+        balance_emoji = "📈" if day_balance >= 0 else "📉"
+
+        response.append(
+            f"\n<b>{day_data['display_date']} {balance_emoji}</b>\n\n"
+            f"<i>Расходы: <code>{day_data['expenses']:.2f}</code> ₽ • "
+            f"Доходы: <code>{day_data['income']:.2f}</code> ₽ • "
+            f"Баланс: <code>{balance_sign}{abs(day_balance):.2f}</code> ₽</i>\n"
+        )
+
+        # Добавляем транзакции за день
+        for tx in day_data["transactions"]:
+            icon = "➖" if tx["is_expense"] else "➕"
+            amount_str = f"{tx['amount']:.2f}"
+
+            response.append(
+                f"{icon} {tx['category_emoji']} <b>{tx['category_name'].capitalize()}</b>: "
+                f"<code>{amount_str}</code> {tx['currency']}"
+            )
+
+    if not filter_name:
+        # Добавляем подсказку для фильтрации
+        response.append(
+            f"\n<i>Используйте /list [категория] для фильтрации по категории</i>\n"
+            f"<i>Например: /list продукты или /list кафе</i>"
+        )
+
+    return "\n".join(response)
+
+
+def get_list_keyboard(rows: List[Tuple[Transaction, str, str]], has_older: bool,
+                      has_newer: bool, category_ids: Optional[List[int]]) -> Optional[InlineKeyboardMarkup]:
+    """
+    Создает кнопки листания /list
+
+    callback_data: list:<older|newer>:<id транзакции-курсора>:<id категорий через точку>
+    """
+    ids = ".".join(str(category_id) for category_id in category_ids or [])
+    buttons = []
+    if has_older:
+        buttons.append(InlineKeyboardButton(
+            text="⬅️ Раньше", callback_data=f"list:older:{rows[-1][0].id}:{ids}"))
+    if has_newer:
+        buttons.append(InlineKeyboardButton(
+            text="Позже ➡️", callback_data=f"list:newer:{rows[0][0].id}:{ids}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+
+
+@command("list", "список")
+async def cmd_list_transactions(message: Message, args: str = ""):
     """
-    Обрабатывает команду /list:
-    - Показывает список последних транзакций
+    Обрабатывает команду /list [категория]:
+    - Показывает страницу последних транзакций с кнопками листания
+    - Фильтрует по категории, если она указана
     - Группирует транзакции по дням
     - Отображает итоги за каждый день
     """
     user_id = message.from_user.id
-    limit = 15  # Увеличиваем количество транзакций для отображения
+    filter_name = args
 
     # Создаем сессию БД
     db = SessionLocal()
@@ -665,99 +1033,164 @@ async def cmd_list_transactions(message: Message):
             await message.answer("Для начала работы, пожалуйста, используйте команду /start")
             return
 
-        # Запрашиваем последние транзакции
-        transactions = db.query(
-            Transaction,
-            Category.name.label('category_name'),
-            Category.emoji.label('category_emoji')
-        ).join(
-            Category,
-            Transaction.category_id == Category.id,
-            isouter=True
-        ).filter(
-            Transaction.user_id == user.id
-        ).order_by(desc(Transaction.transaction_date)).limit(limit).all()
+        category_ids = None
+        if filter_name:
+            category_ids = find_category_ids(db, user.id, filter_name)
+            if not category_ids:
+                await message.answer(
+                    f"Категория <b>{html.escape(filter_name)}</b> не найдена. "
+                    f"Список категорий: /categories",
+                    parse_mode=ParseMode.HTML
+                )
+                return
+
+        rows, has_older, has_newer = fetch_transactions_page(db, user.id, category_ids)
 
-        if not transactions:
+        if not rows:
             await message.answer("У вас пока нет записанных транзакций.")
             return
 
-        # Группируем транзакции по дням
-        transactions_by_day = {}
-        for tx, cat_name, cat_emoji in transactions:
-            date_key = tx.transaction_date.strftime("%Y-%m-%d")
-            date_display = tx.transaction_date.strftime("%d.%m.%Y")
+        await message.answer(
+            render_transactions_page(rows, filter_name),
+            parse_mode=ParseMode.HTML,
+            reply_markup=get_list_keyboard(rows, has_older, has_newer, category_ids)
+        )
+    except Exception as e:
+        logging.error(f"Ошибка при обработке команды /list: {e}")
+        await message.answer("Произошла ошибка при получении списка транзакций. Попробуйте позже.")
+    finally:
+        db.close()
 
-            if date_key not in transactions_by_day:
-                transactions_by_day[date_key] = {
-                    "display_date": date_display,
-                    "transactions": [],
-                    "expenses": 0,
-                    "income": 0
-                }
 
-            category_name = cat_name or "другое"
-            category_emoji = cat_emoji or "💰"
+@router.callback_query(F.data.startswith("list:"))
+async def process_list_page(callback: CallbackQuery):
+    """Листает /list: заменяет текст того же сообщения соседней страницей"""
+    try:
+        _, direction, cursor_id, ids = callback.data.split(":")
+        category_ids = [int(category_id) for category_id in ids.split(".") if category_id]
+        cursor_id = int(cursor_id)
+    except ValueError:
+        await callback.answer("Некорректная кнопка")
+        return
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
+        if not user:
+            await callback.answer("Для начала работы используйте /start")
+            return
 
-            # Определяем тип транзакции и добавляем к соответствующей сумме
-            if tx.is_expense == 1:
-                transactions_by_day[date_key]["expenses"] += tx.amount
-            else:
-                transactions_by_day[date_key]["income"] += tx.amount
-
-            # Добавляем данные о транзакции
-            transactions_by_day[date_key]["transactions"].append({
-                "id": tx.id,
-                "amount": tx.amount,
-                "currency": tx.currency,
-                "category_name": category_name,
-                "category_emoji": category_emoji,
-                "is_expense": tx.is_expense == 1,
-                "description": tx.description
-            })
-
-        # Формируем сообщение
-        response = ["<b>ИСТОРИЯ ТРАНЗАКЦИЙ</b>\n"]
-
-        # Добавляем транзакции по дням
-        for date_key, day_data in transactions_by_day.items():
-            # Добавляем заголовок дня
-            day_balance = day_data["income"] - day_data["expenses"]
-            balance_sign = "+" if day_balance >= 0 else "-"
-            balance_emoji = "📈" if day_balance >= 0 else "📉"
+        filter_name = None
+        if category_ids:
+            names = {name for name, in db.query(Category.name).filter(
+                Category.user_id == user.id, Category.id.in_(category_ids))}
+            filter_name = ", ".join(sorted(names))
 
-            response.append(
-                f"\n<b>{day_data['display_date']} {balance_emoji}</b>\n\n"
-                f"<i>Расходы: <code>{day_data['expenses']:.2f}</code> ₽ • "
-                f"Доходы: <code>{day_data['income']:.2f}</code> ₽ • "
-                f"Баланс: <code>{balance_sign}{abs(day_balance):.2f}</code> ₽</i>\n"
-            )
+        rows, has_older, has_newer = fetch_transactions_page(
+            db, user.id, category_ids, cursor_id, direction)
+
+        # Курсор удален или страница опустела — показываем первую страницу
+        if not rows:
+            rows, has_older, has_newer = fetch_transactions_page(db, user.id, category_ids)
+        if not rows:
+            await callback.answer("Транзакций больше нет")
+            return
+
+        await callback.message.edit_text(
+            render_transactions_page(rows, filter_name),
+            parse_mode=ParseMode.HTML,
+            reply_markup=get_list_keyboard(rows, has_older, has_newer, category_ids)
+        )
+        await callback.answer()
+    except Exception as e:
+        logging.error(f"Ошибка при листании списка транзакций: {e}")
+        await callback.answer("Произошла ошибка")
+    finally:
+        db.close()
+
+
+# Сколько лучших совпадений показывать в /search
+SEARCH_RESULTS_LIMIT = 10
+
+
+@command("search", "поиск")
+async def cmd_search(message: Message, args: str = ""):
+    """
+    Обрабатывает команду /search <текст> [месяц|ММ.ГГГГ|ГГГГ] [#категория]:
+    - Ищет транзакции по словам описания (полнотекстовый индекс)
+    - Показывает лучшие совпадения и итоги по всем найденным
+    """
+    query = parse_search_query(args)
+    if not query.text and query.date_from is None and not query.category:
+        await message.answer(
+            "🔎 <b>Поиск транзакций</b>\n\n"
+            "Примеры:\n"
+            "<code>/search такси</code>\n"
+            "<code>/search такси март</code> — за март\n"
+            "<code>/search кофе 2024 #кафе</code> — за год в категории «кафе»",
+            parse_mode=ParseMode.HTML
+        )
+        return
 
-            # Добавляем транзакции за день
-            for tx in day_data["transactions"]:
-                icon = "➖" if tx["is_expense"] else "➕"
-                amount_str = f"{tx['amount']:.2f}"
+    user_id = message.from_user.id
 
-                response.append(
-                    f"{icon} {tx['category_emoji']} <b>{tx['category_name'].capitalize()}</b>: "
-                    f"<code>{amount_str}</code> {tx['currency']}"
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == user_id).first()
+
+        if not user:
+            await message.answer("Для начала работы, пожалуйста, используйте команду /start")
+            return
+
+        category_ids = None
+        if query.category:
+            category_ids = find_category_ids(db, user.id, query.category)
+            if not category_ids:
+                await message.answer(
+                    f"Категория <b>{html.escape(query.category)}</b> не найдена. "
+                    f"Список категорий: /categories",
+                    parse_mode=ParseMode.HTML
                 )
+                return
 
-        # Добавляем подсказку для фильтрации
+        result = search_transactions(
+            db, user.id, query.text, query.date_from, query.date_to,
+            category_ids, limit=SEARCH_RESULTS_LIMIT)
+
+        if not result.count:
+            await message.answer("Ничего не найдено.")
+            return
+
+        response = [f"🔎 <b>Найдено транзакций: {result.count}</b>"]
+        if query.date_from is not None:
+            last_day = query.date_to - timedelta(days=1)
+            response.append(
+                f"<i>{query.date_from.strftime('%d.%m.%Y')} — {last_day.strftime('%d.%m.%Y')}</i>")
         response.append(
-            f"\n<i>Используйте /list [категория] для фильтрации по категории</i>\n"
-            f"<i>Например: /list продукты или /list кафе</i>"
+            f"Расходы: <code>{result.total_expense:.2f}</code> ₽ • "
+            f"Доходы: <code>{result.total_income:.2f}</code> ₽\n"
         )
 
+        for tx, cat_name, cat_emoji in result.rows:
+            icon = "➖" if tx.is_expense == 1 else "➕"
+            response.append(
+                f"{icon} {tx.transaction_date.strftime('%d.%m.%Y')} "
+                f"{cat_emoji or '💰'} <code>{tx.amount:.2f}</code> {tx.currency} — "
+                f"{html.escape(tx.description or cat_name or 'другое')}"
+            )
+
+        if result.count > len(result.rows):
+            response.append(f"\n<i>Показаны {len(result.rows)} самых подходящих</i>")
+
         await message.answer("\n".join(response), parse_mode=ParseMode.HTML)
     except Exception as e:
-        logging.error(f"Ошибка при обработке команды /list: {e}")
-        await message.answer("Произошла ошибка при получении списка транзакций. Попробуйте позже.")
+        logging.error(f"Ошибка при поиске транзакций: {e}")
+        await message.answer("Произошла ошибка при поиске. Попробуйте позже.")
     finally:
         db.close()
 
 
-@router.message(Command("delete"))
+@command("delete", "удалить")
 async def cmd_delete_last(message: Message):
     """
     Обрабатывает команду /delete:
@@ -869,6 +1302,40 @@ async def process_delete_selection(callback: CallbackQuery):
     )
 
 
+def delete_transaction(user_id: int, transaction: Transaction,
+                       expense_id: Optional[int] = None) -> WriteOp:
+    """
+    Операция удаления транзакции вместе с ее долей в бюджете и целях
+
+    Повторное нажатие "подтвердить" ничего не удаляет, и счетчики бюджета и
+    целей второй раз не уменьшаются.
+
+    Args:
+        user_id: ID пользователя в базе данных
+        transaction: удаляемая транзакция
+        expense_id: ID парной записи в expenses (обратная совместимость)
+
+    Returns:
+        WriteOp: операция, возвращающая число удаленных транзакций (0 или 1)
+    """
+    tx_id = transaction.id
+    spending = [(transaction.category_id,
+                 rates.to_base(transaction.amount, transaction.currency,
+                               transaction.transaction_date),
+                 transaction.transaction_date)] if transaction.is_expense == 1 else []
+
+    def op(db: Session) -> int:
+        deleted = delete(Transaction, Transaction.id == tx_id)(db)
+        if deleted != 1:
+            return 0
+        remove_spending(db, user_id, spending)
+        remove_contributions(db, [tx_id])
+        if expense_id is not None:
+            delete(Expense, Expense.id == expense_id)(db)
+        return deleted
+    return op
+
+
 @router.callback_query(F.data.startswith("delete_confirm:"))
 async def process_delete_confirm(callback: CallbackQuery):
     """Обрабатывает подтверждение удаления транзакции"""
@@ -908,21 +1375,19 @@ async def process_delete_confirm(callback: CallbackQuery):
         currency = transaction.currency
         is_expense = transaction.is_expense == 1
 
-        # Удаляем запись из БД
-        db.delete(transaction)
-
         # Если это был расход, также удаляем соответствующую запись из таблицы expenses
         # для обратной совместимости
+        expense = None
         if is_expense:
             expense = db.query(Expense).filter(
                 Expense.user_id == user.id,
                 Expense.created_at == transaction.transaction_date
             ).first()
 
-            if expense:
-                db.delete(expense)
-
-        db.commit()
+        # Удаляем записи через очередь записи одной операцией
+        await write_queue.submit(delete_transaction(
+            user.id, transaction, expense.id if expense else None))
+        bump_data_version(user.id)
 
         # Определяем тип транзакции для сообщения
         transaction_type = "расход" if is_expense else "доход"
@@ -952,7 +1417,62 @@ async def process_delete_cancel(callback: CallbackQuery):
     )
 
 
-@router.message(Command("categories"))
+def render_categories(db: Session, user_id: int) -> str:
+    """
+    Строит текст /categories: категории расходов и доходов пользователя
+
+    Args:
+        db: сессия БД
+        user_id: ID пользователя в базе данных
+
+    Returns:
+        str: текст списка (HTML)
+    """
+    # Получаем категории пользователя
+    expense_categories = db.query(Category).filter(
+        Category.user_id == user_id,
+        Category.is_expense == 1
+    ).all()
+
+    income_categories = db.query(Category).filter(
+        Category.user_id == user_id,
+        Category.is_expense == 0
+    ).all()
+
+    # Если у пользователя нет категорий, предлагаем сбросить
+    if not expense_categories and not income_categories:
+        return (
+            "📋 <b>У вас пока нет настроенных категорий</b>\n\n"
+            "Вы можете создавать новые категории, просто используя их в транзакциях."
+        )
+
+    # Формируем сообщение о расходных категориях
+    message_text = "📋 <b>ВАШИ КАТЕГОРИИ</b>\n\n"
+
+    if expense_categories:
+        message_text += "<b>📤 Расходы:</b>\n"
+        for category in expense_categories:
+            message_text += f"  • {category.emoji} {category.name.capitalize()}\n"
+
+    # Добавляем информацию о категориях доходов
+    if income_categories:
+        message_text += "\n<b>📥 Доходы:</b>\n"
+        for category in income_categories:
+            message_text += f"  • {category.emoji} {category.name.capitalize()}\n"
+
+    # Добавляем инструкцию по использованию
+    message_text += (
+        "\n<b>КАК ИСПОЛЬЗОВАТЬ:</b>\n"
+        "• Просто укажите категорию при добавлении расхода\n"
+        "• Пример: <code>500 продукты</code> или <code>250 еда вне дома</code>\n"
+        "• Бот автоматически определит категорию по ключевым словам\n\n"
+        "<i>Вы можете создавать новые категории, просто используя их в транзакциях</i>"
+    )
+
+    return message_text
+
+
+@command("categories", "категории")
 async def cmd_categories(message: Message):
     """
     Показывает список доступных категорий пользователя с эмодзи
@@ -969,53 +1489,378 @@ async def cmd_categories(message: Message):
             await message.answer("Для начала работы, пожалуйста, используйте команду /start")
             return
 
-        # Получаем категории пользователя
-        expense_categories = db.query(Category).filter(
-            Category.user_id == user.id,
-            Category.is_expense == 1
-        ).all()
+        # Список строится заново только после записи категорий или транзакций
+        text = cached_report(user.id, "categories", "",
+                             lambda: render_categories(db, user.id))
+        await message.answer(text, parse_mode=ParseMode.HTML)
+
+    except Exception as e:
+        logging.error(f"Ошибка при отображении категорий: {e}")
+        await message.answer("Произошла ошибка при получении списка категорий")
+    finally:
+        db.close()
+
 
-        income_categories = db.query(Category).filter(
+BUDGET_HELP = (
+    "💼 <b>Бюджеты</b>\n\n"
+    "<code>/budget продукты 15000</code> — месячный бюджет категории\n"
+    "<code>/budget продукты 0</code> — удалить бюджет\n"
+    "<code>/budget</code> — бюджеты и расходы месяца\n\n"
+    "<i>Бот предупредит, когда расходы категории дойдут до 80% и 100% бюджета</i>"
+)
+
+
+@command("budget", "бюджет")
+async def cmd_budget(message: Message, args: str = ""):
+    """
+    Обрабатывает команду /budget:
+    - без аргументов показывает бюджеты категорий и расходы месяца по ним
+    - <категория> <сумма> задает месячный бюджет категории (0 — удаляет)
+    """
+    name, _, amount_text = args.rpartition(" ")
+    name = name.strip().lower()
+    try:
+        amount = float(amount_text.replace(",", ".")) if name else None
+    except ValueError:
+        amount = None
+    if args and amount is None:
+        await message.answer(BUDGET_HELP, parse_mode=ParseMode.HTML)
+        return
+
+    user_id = message.from_user.id
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == user_id).first()
+
+        if not user:
+            await message.answer("Для начала работы, пожалуйста, используйте команду /start")
+            return
+
+        if amount is None:
+            budgets = db.query(Budget.amount, Category.id, Category.name, Category.emoji).join(
+                Category, Category.id == Budget.category_id
+            ).filter(Budget.user_id == user.id).order_by(Category.name).all()
+            if not budgets:
+                await message.answer(BUDGET_HELP, parse_mode=ParseMode.HTML)
+                return
+            spending = month_spending(db, user.id, month_key(datetime.now()))
+            lines = ["💼 <b>БЮДЖЕТЫ НА МЕСЯЦ</b>\n"]
+            for limit, category_id, category_name, emoji in budgets:
+                spent = spending.get(category_id, 0)
+                percent = int(spent / limit * 100) if limit else 0
+                icon = "🚨" if percent >= 100 else "⚠️" if percent >= 80 else "✅"
+                lines.append(f"{icon} {emoji} {html.escape(category_name.capitalize())}: "
+                             f"<code>{spent:.2f}</code> из <code>{limit:.2f}</code> ₽ ({percent}%)")
+            await message.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+            return
+
+        category = db.query(Category).filter(
             Category.user_id == user.id,
-            Category.is_expense == 0
-        ).all()
+            Category.is_expense == 1,
+            Category.name == name
+        ).first()
+        if category is None:
+            await message.answer(
+                f"Категория расходов <b>{html.escape(name)}</b> не найдена. "
+                f"Список категорий: /categories",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        state = await write_queue.submit(set_budget(user.id, category.id, amount))
+        # Бюджеты входят в /summary
+        bump_data_version(user.id)
+        title = f"{category.emoji} {html.escape(category.name.capitalize())}"
+        if state is None:
+            await message.answer(f"Бюджет <b>{title}</b> удален.", parse_mode=ParseMode.HTML)
+        else:
+            await message.answer(
+                f"💼 Бюджет <b>{title}</b>: <code>{amount:.2f}</code> ₽ в месяц.\n"
+                f"Уже потрачено: <code>{state.spent:.2f}</code> ₽",
+                parse_mode=ParseMode.HTML
+            )
+    except Exception as e:
+        logging.error(f"Ошибка при обработке команды /budget: {e}")
+        await message.answer("Произошла ошибка при работе с бюджетами. Попробуйте позже.")
+    finally:
+        db.close()
+
+
+# Виды сводок в /digest и их русские синонимы
+DIGEST_ACTIONS = {
+    "daily": "daily", "день": "daily", "ежедневная": "daily",
+    "weekly": "weekly", "неделя": "weekly", "еженедельная": "weekly",
+}
+
+DIGEST_TITLES = {"daily": "Ежедневная сводка", "weekly": "Еженедельная сводка"}
+
+DIGEST_SWITCHES = {"on": True, "вкл": True, "off": False, "выкл": False}
+
+
+@command("digest", "сводки")
+async def cmd_digest(message: Message, args: str = ""):
+    """
+    Обрабатывает команду /digest:
+    - без аргументов показывает, какие сводки включены
+    - daily|weekly on|off включает или отключает сводку
+    """
+    words = args.lower().split()
+    kind = DIGEST_ACTIONS.get(words[0]) if len(words) == 2 else None
+    enabled = DIGEST_SWITCHES.get(words[1]) if kind else None
+    if words and enabled is None:
+        await message.answer(
+            "Используйте: <code>/digest daily off</code> или <code>/digest weekly on</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+
+    user_id = message.from_user.id
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == user_id).first()
+
+        if not user:
+            await message.answer("Для начала работы, пожалуйста, используйте команду /start")
+            return
+
+        if kind is not None:
+            await write_queue.submit(set_digest_enabled(user.id, kind, enabled))
+            await message.answer(
+                f"{DIGEST_TITLES[kind]} {'включена' if enabled else 'отключена'}."
+            )
+            return
+
+        opted_out = {kind for kind, in db.query(DigestOptOut.kind).filter(
+            DigestOptOut.user_id == user.id)}
+        lines = ["📬 <b>СВОДКИ</b>\n"]
+        for kind, title in DIGEST_TITLES.items():
+            state = "❌ отключена" if kind in opted_out else "✅ включена"
+            lines.append(f"{title} ({kind}): {state}")
+        lines.append(f"\n<i>Сводки приходят в {settings.DIGEST_HOUR}:00, еженедельная — "
+                     f"по понедельникам. Отключить: /digest daily off</i>")
+        await message.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+    except Exception as e:
+        logging.error(f"Ошибка при обработке команды /digest: {e}")
+        await message.answer("Произошла ошибка при настройке сводок. Попробуйте позже.")
+    finally:
+        db.close()
+
+
+# Подкоманды /goal и их русские синонимы
+GOAL_ACTIONS = {
+    "add": "add", "новая": "add",
+    "link": "link", "связать": "link",
+    "del": "del", "удалить": "del",
+}
+
+# Срок цели в конце /goal add: "до 01.08.2025" или просто "01.08.2025"
+GOAL_DEADLINE = re.compile(r'\s+(?:до\s+)?(\d{1,2}\.\d{1,2}\.\d{4})$', re.IGNORECASE)
+
+GOAL_HELP = (
+    "🎯 <b>Цели</b>\n\n"
+    "<code>/goal add 100000 Отпуск до 01.08.2025</code> — новая цель\n"
+    "<code>/goal link 1 зарплата</code> — пополнять цель 1 доходами категории "
+    "или со словом в описании\n"
+    "<code>/goal del 1</code> — удалить цель\n\n"
+    "<i>В цель попадают транзакции, добавленные после привязки</i>"
+)
+
+
+def format_goal(goal: Goal, links: List[str], now: datetime) -> str:
+    """Строка прогресса цели: читает только счетчик current_amount"""
+    current = goal.current_amount or 0
+    percent = min(100, int(current / goal.target_amount * 100)) if goal.target_amount > 0 else 100
+    filled = percent // 10
+    lines = [
+        f"🎯 <b>{goal.id}. {html.escape(goal.name)}</b>",
+        f"<code>{'█' * filled}{'▒' * (10 - filled)}</code> {percent}%",
+        f"<code>{current:.2f}</code> из <code>{goal.target_amount:.2f}</code> ₽",
+    ]
+    if goal.deadline is not None:
+        lines[-1] += f" до {goal.deadline.strftime('%d.%m.%Y')}"
+        left = goal.target_amount - current
+        months = (goal.deadline.year - now.year) * 12 + goal.deadline.month - now.month
+        if left > 0 and months > 0:
+            lines.append(f"Откладывать по <code>{left / months:.2f}</code> ₽ в месяц")
+    if links:
+        lines.append("Пополняют: " + ", ".join(html.escape(link) for link in links))
+    return "\n".join(lines)
+
+
+@command("goal", "цели")
+async def cmd_goal(message: Message, args: str = ""):
+    """
+    Обрабатывает команду /goal:
+    - без аргументов показывает цели и прогресс по ним
+    - add <сумма> <название> [до ДД.ММ.ГГГГ] создает цель
+    - link <номер> <категория или слово> привязывает пополнение
+    - del <номер> удаляет цель
+    """
+    parts = args.split(maxsplit=1)
+    action = GOAL_ACTIONS.get(parts[0].lower()) if parts else None
+    args = parts[1].strip() if len(parts) > 1 else ""
+    if parts and action is None:
+        await message.answer(GOAL_HELP, parse_mode=ParseMode.HTML)
+        return
+
+    user_id = message.from_user.id
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == user_id).first()
+
+        if not user:
+            await message.answer("Для начала работы, пожалуйста, используйте команду /start")
+            return
+
+        if action is None:
+            goals = db.query(Goal).filter(Goal.user_id == user.id).order_by(Goal.id).all()
+            if not goals:
+                await message.answer(GOAL_HELP, parse_mode=ParseMode.HTML)
+                return
+            links = defaultdict(list)
+            for goal_id, keyword, category_name in db.query(
+                GoalLink.goal_id, GoalLink.keyword, Category.name
+            ).outerjoin(Category, Category.id == GoalLink.category_id).filter(
+                GoalLink.user_id == user.id
+            ).order_by(GoalLink.id):
+                links[goal_id].append(f"#{category_name}" if category_name else keyword)
+            now = datetime.now()
+            await message.answer(
+                "\n\n".join(format_goal(goal, links[goal.id], now) for goal in goals),
+                parse_mode=ParseMode.HTML
+            )
+            return
 
-        # Если у пользователя нет категорий, предлагаем сбросить
-        if not expense_categories and not income_categories:
+        if action == "add":
+            deadline = None
+            match = GOAL_DEADLINE.search(args)
+            if match:
+                try:
+                    deadline = datetime.strptime(match.group(1), "%d.%m.%Y")
+                except ValueError:
+                    await message.answer("Неверная дата срока. Пример: 01.08.2025")
+                    return
+                args = args[:match.start()]
+            amount_text, _, name = args.partition(" ")
+            try:
+                target = float(amount_text.replace(",", "."))
+            except ValueError:
+                target = 0
+            if target <= 0 or not name.strip():
+                await message.answer(GOAL_HELP, parse_mode=ParseMode.HTML)
+                return
+            goal = await write_queue.submit(insert(Goal(
+                user_id=user.id, name=name.strip()[:100], target_amount=target,
+                current_amount=0.0, deadline=deadline)))
             await message.answer(
-                "📋 <b>У вас пока нет настроенных категорий</b>\n\n"
-                "Вы можете создавать новые категории, просто используя их в транзакциях.",
+                f"🎯 Цель <b>{goal.id}. {html.escape(goal.name)}</b> создана.\n"
+                f"Привяжите пополнение: <code>/goal link {goal.id} зарплата</code>",
                 parse_mode=ParseMode.HTML
             )
             return
 
-        # Формируем сообщение о расходных категориях
-        message_text = "📋 <b>ВАШИ КАТЕГОРИИ</b>\n\n"
-
-        if expense_categories:
-            message_text += "<b>📤 Расходы:</b>\n"
-            for category in expense_categories:
-                message_text += f"  • {category.emoji} {category.name.capitalize()}\n"
-
-        # Добавляем информацию о категориях доходов
-        if income_categories:
-            message_text += "\n<b>📥 Доходы:</b>\n"
-            for category in income_categories:
-                message_text += f"  • {category.emoji} {category.name.capitalize()}\n"
-
-        # Добавляем инструкцию по использованию
-        message_text += (
-            "\n<b>КАК ИСПОЛЬЗОВАТЬ:</b>\n"
-            "• Просто укажите категорию при добавлении расхода\n"
-            "• Пример: <code>500 продукты</code> или <code>250 еда вне дома</code>\n"
-            "• Бот автоматически определит категорию по ключевым словам\n\n"
-            "<i>Вы можете создавать новые категории, просто используя их в транзакциях</i>"
+        goal_ref, _, word = args.partition(" ")
+        goal = db.query(Goal).filter(
+            Goal.id == int(goal_ref),
+            Goal.user_id == user.id
+        ).first() if goal_ref.isdigit() else None
+        if goal is None:
+            await message.answer("Цель не найдена. Список целей: /goal")
+            return
+
+        if action == "del":
+            await write_queue.submit(delete_goal(user.id, goal.id))
+            await message.answer(f"🗑 Цель <b>{html.escape(goal.name)}</b> удалена.",
+                                 parse_mode=ParseMode.HTML)
+            return
+
+        word = word.strip().lstrip("#").lower()
+        if not word:
+            await message.answer(GOAL_HELP, parse_mode=ParseMode.HTML)
+            return
+        category_id = db.query(Category.id).filter(
+            Category.user_id == user.id,
+            Category.is_expense == 0,
+            Category.name == word
+        ).scalar()
+        await write_queue.submit(add_goal_link(
+            user.id, goal.id, category_id=category_id,
+            keyword=None if category_id else word))
+        source = f"доходы категории <b>{html.escape(word)}</b>" if category_id else \
+            f"доходы со словом <b>{html.escape(word)}</b>"
+        await message.answer(
+            f"🔗 Цель <b>{html.escape(goal.name)}</b> будут пополнять {source}.",
+            parse_mode=ParseMode.HTML
         )
+    except Exception as e:
+        logging.error(f"Ошибка при обработке команды /goal: {e}")
+        await message.answer("Произошла ошибка при работе с целями. Попробуйте позже.")
+    finally:
+        db.close()
+
+
+# Максимальный размер документа, который бот может отправить в Telegram
+TELEGRAM_DOCUMENT_LIMIT = 50 * 1024 * 1024
 
-        await message.answer(message_text, parse_mode=ParseMode.HTML)
+
+@command("export", "экспорт")
+async def cmd_export(message: Message, args: str = ""):
+    """
+    Обрабатывает команду /export [csv|gz|parquet]
+    Выгружает все транзакции пользователя файлом
+    """
+    format_name = args.lower() or "csv"
+    if format_name not in EXPORT_FORMATS:
+        await message.answer(
+            "Неизвестный формат. Используйте: <code>/export csv</code>, "
+            "<code>/export gz</code> или <code>/export parquet</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+
+    user_id = message.from_user.id
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == user_id).first()
+
+        if not user:
+            await message.answer("Для начала работы, пожалуйста, используйте команду /start")
+            return
+
+        # Чтение и запись файла выполняются в рабочем потоке со своей сессией
+        def export_in_thread():
+            thread_db = SessionLocal()
+            try:
+                return build_export(thread_db, user.id, format_name)
+            finally:
+                thread_db.close()
+
+        try:
+            spool = await asyncio.to_thread(export_in_thread)
+        except ImportError:
+            await message.answer("Формат parquet недоступен: на сервере не установлен pyarrow. "
+                                 "Используйте <code>/export csv</code> или <code>/export gz</code>.",
+                                 parse_mode=ParseMode.HTML)
+            return
+
+        with spool:
+            size = spool_size(spool)
+            if size > TELEGRAM_DOCUMENT_LIMIT:
+                await message.answer("Выгрузка больше 50 МБ и не может быть отправлена. "
+                                     "Попробуйте сжатый формат: <code>/export gz</code>",
+                                     parse_mode=ParseMode.HTML)
+                return
+
+            filename = f"finbot_{datetime.now():%Y%m%d}.{EXPORT_FORMATS[format_name].extension}"
+            await message.answer_document(SpooledInputFile(spool, filename),
+                                          caption="📦 Выгрузка транзакций")
 
     except Exception as e:
-        logging.error(f"Ошибка при отображении категорий: {e}")
-        await message.answer("Произошла ошибка при получении списка категорий")
+        logging.error(f"Ошибка при выгрузке транзакций: {e}")
+        await message.answer("Произошла ошибка при выгрузке транзакций. Попробуйте позже.")
     finally:
         db.close()
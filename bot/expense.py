@@ -1,5 +1,7 @@
+import asyncio
+import html
 import json
-from typing import Tuple, Optional, Dict, List
+from typing import Tuple, Optional, Dict, Iterable, List, Set
 from aiogram import Router, types, F
 from aiogram.types import Message
 from aiogram.enums import ParseMode
@@ -9,11 +11,19 @@ from datetime import datetime, timedelta
 import logging
 from core.models import User, Expense as ExpenseModel, Category, Transaction
 from core.db import SessionLocal
-from core.llm import categorize_transaction
+from core.llm import categorize_transaction, categorize_transactions, DEFAULT_CATEGORIES
+from core.writer import write_queue, insert, insert_rows
+from core.versions import bump_data_version
+from core.goals import insert_transaction_rows, track_transactions
+from core.budgets import BudgetAlert, add_spending, spending_items
+from core.currency import (BASE_CURRENCY, currency_column, normalize_currency, rate_day_column,
+                           rates)
 from typing import Optional, Dict, Any
 from sqlalchemy import desc, func
 # Импортируем функцию для получения клавиатуры меню
 from bot.commands import get_main_keyboard
+from config import settings
+from bot.routing import transaction_message
 import locale
 import calendar
 
@@ -77,79 +87,6 @@ def format_date_russian(date):
         return date.strftime("%d.%m.%Y")
 
 
-@router.message(F.text.regexp(r'^-\d+(?:[.,]\d+)?\s+\w+.*$'))
-async def process_expense_message(message: Message):
-    """
-    Обрабатывает сообщения о расходах в формате: -СУММА КАТЕГОРИЯ
-    Например: -150 кофе, -2500 продукты
-    """
-    user_id = message.from_user.id
-
-    try:
-        # Парсим сообщение с помощью регулярного выражения
-        match = re.match(r'^-(\d+(?:[.,]\d+)?)\s+(.+)$', message.text)
-        if not match:
-            await message.answer("Неверный формат. Используйте: -СУММА КАТЕГОРИЯ")
-            return
-
-        # Извлекаем сумму и категорию
-        amount_str = match.group(1).replace(',', '.')
-        amount = float(amount_str)
-        category_input = match.group(2).strip().lower()
-
-        # Создаем сессию БД
-        db = SessionLocal()
-        try:
-            # Получаем пользователя из БД
-            user = db.query(User).filter(User.telegram_id == user_id).first()
-
-            if not user:
-                # Если пользователя нет в базе, предлагаем начать с /start
-                await message.answer("Для начала работы, пожалуйста, используйте команду /start")
-                return
-
-            # Используем LLM для определения категории
-            category = categorize_transaction(category_input, db, user.id)
-
-            # Если категория не определена, используем введенную пользователем
-            if not category:
-                category = category_input
-
-            # Создаем новую запись о расходе
-            expense = ExpenseModel(
-                user_id=user.id,
-                amount=amount,
-                category=category,
-                description=message.text
-            )
-
-            db.add(expense)
-            db.commit()
-
-            # Получаем эмодзи для категории
-            category_emoji = get_category_emoji(category)
-
-            # Форматируем сумму в стиле Cointry
-            formatted_amount = f"`{amount:.2f}`"
-
-            # Отправляем подтверждение в стиле Cointry
-            await message.answer(
-                f"<b>{category_emoji} {category.capitalize()}</b>\n"
-                f"➖ {formatted_amount} ₽",
-                parse_mode=ParseMode.HTML
-            )
-
-        except Exception as e:
-            db.rollback()
-            logging.error(f"Ошибка при сохранении расхода: {e}")
-            await message.answer("Произошла ошибка при сохранении расхода. Попробуйте позже.")
-        finally:
-            db.close()
-
-    except Exception as e:
-        logging.error(f"Ошибка при обработке сообщения о расходе: {e}")
-        await message.answer("Произошла ошибка при обработке сообщения. Попробуйте позже.")
-
 # === NEW CODE ===
 
 
@@ -371,17 +308,15 @@ async def get_or_create_category(db: Session, user_id: int, category_name: str,
     ).first()
 
     if not category:
-        # Создаем новую категорию
+        # Создаем новую категорию через очередь записи и ждем ее id
         emoji = get_category_emoji(category_to_use)
-        category = Category(
+        category = await write_queue.submit(insert(Category(
             user_id=user_id,
             name=category_to_use,
             emoji=emoji,
             is_expense=1 if is_expense else 0
-        )
-        db.add(category)
-        db.commit()
-        db.refresh(category)
+        )))
+        bump_data_version(user_id)
 
     return category
 
@@ -394,7 +329,7 @@ def parse_transaction_message(text: str) -> Optional[Dict[str, Any]]:
     - 500 обед
     - -500 такси
     - +50000 зарплата
-    - 100 USD книги
+    - 100 USD книги, 20$ кофе, 15 GBP музей
     - 250 ресторан вчера
     - 1500 подарок @иван
 
@@ -418,19 +353,26 @@ def parse_transaction_message(text: str) -> Optional[Dict[str, Any]]:
         elif amount_str.startswith('-'):
             amount_str = amount_str[1:]
 
+        # Символ валюты может быть приписан к сумме: 50$, €20
+        currency = None
+        for symbol in (amount_str[:1], amount_str[-1:]):
+            if symbol and not symbol.isdigit() and normalize_currency(symbol):
+                currency = normalize_currency(symbol)
+                amount_str = amount_str.replace(symbol, "", 1)
+                break
+
         # Проверяем, является ли первая часть числом
         try:
             amount = float(amount_str)
         except ValueError:
             return None
 
-        # Проверяем валюту (если указана)
-        currency = "RUB"  # По умолчанию рубли
+        # Проверяем валюту (если указана): код ISO 4217 или символ
         currency_idx = 1
-
-        if len(parts) > 1 and parts[1].upper() in ["USD", "EUR", "RUB"]:
-            currency = parts[1].upper()
+        if currency is None and len(parts) > 1 and normalize_currency(parts[1]):
+            currency = normalize_currency(parts[1])
             currency_idx = 2
+        currency = currency or BASE_CURRENCY
 
         # Получаем описание транзакции (всё, что после суммы и валюты)
         description = " ".join(parts[currency_idx:])
@@ -460,18 +402,10 @@ def parse_transaction_message(text: str) -> Optional[Dict[str, Any]]:
                     description = description.replace(part, "").strip()
                     break
 
-        # Оригинальная сумма (в указанной валюте)
-        original_amount = amount
-
-        # Конвертируем в рубли, если валюта не рубли (упрощенно)
-        if currency == "USD":
-            amount *= 90  # Примерный курс
-        elif currency == "EUR":
-            amount *= 100  # Примерный курс
-
+        # Сумма хранится в валюте операции, в рубли ее пересчитывают отчеты
         return {
             "amount": amount,
-            "original_amount": original_amount,
+            "original_amount": amount,
             "currency": currency,
             "description": description,
             "date": transaction_date,
@@ -484,7 +418,7 @@ def parse_transaction_message(text: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-@router.message(F.text.regexp(r'^(-|\+)?\d+(?:[.,]\d+)?(?:\s+\S+)+$'))
+@transaction_message()
 async def process_transaction(message: Message):
     """
     Обрабатывает сообщения о транзакциях в расширенных форматах:
@@ -589,20 +523,31 @@ async def process_transaction(message: Message):
                 mentioned_user=transaction_data["mentioned_user"]
             )
 
-            db.add(transaction)
+            records = [transaction]
 
             # Для обратной совместимости также добавляем в таблицу expenses
             if transaction_data["is_expense"]:
                 expense = ExpenseModel(
                     user_id=user.id,
-                    amount=transaction_data["amount"],
+                    amount=expense_amount(transaction_data),
                     category=category_name,
                     description=message.text,
                     created_at=transaction_data["date"]
                 )
-                db.add(expense)
+                records.append(expense)
+
+            def save_records(write_db: Session) -> List[BudgetAlert]:
+                # Счетчики бюджетов обновляются до вставки транзакции
+                alerts = add_spending(write_db, user.id, [
+                    (category.id, expense_amount(transaction_data), transaction_data["date"])
+                ]) if transaction_data["is_expense"] else []
+                insert(*records)(write_db)
+                track_transactions(write_db, user.id, [transaction])
+                return alerts
 
-            db.commit()
+            # Ждем коммита группы, чтобы баланс ниже уже учитывал транзакцию
+            alerts = await write_queue.submit(save_records)
+            bump_data_version(user.id)
 
             # Округляем сумму до целого, если она целая
             amount = transaction_data["amount"]
@@ -623,19 +568,8 @@ async def process_transaction(message: Message):
             # Рассчитываем баланс за текущий месяц
             month_start = datetime(current_date.year, current_date.month, 1)
 
-            # Получаем все расходы за месяц
-            month_expenses = db.query(func.sum(Transaction.amount)).filter(
-                Transaction.user_id == user.id,
-                Transaction.is_expense == 1,
-                Transaction.transaction_date >= month_start
-            ).scalar() or 0
-
-            # Получаем все доходы за месяц
-            month_incomes = db.query(func.sum(Transaction.amount)).filter(
-                Transaction.user_id == user.id,
-                Transaction.is_expense == 0,
-                Transaction.transaction_date >= month_start
-            ).scalar() or 0
+            # Расходы и доходы за месяц в рублях
+            month_expenses, month_incomes = month_totals(db, user.id, month_start)
 
             # Рассчитываем баланс
             month_balance = month_incomes - month_expenses
@@ -656,12 +590,15 @@ async def process_transaction(message: Message):
 
             # Отправляем подтверждение в улучшенном стиле
             await message.answer(
-                f"{user_display_name} {action_text} <b>{amount}</b> RUB на <b>{category.emoji} {category.name.capitalize()}</b>\n"
+                f"{user_display_name} {action_text} <b>{amount}</b> {transaction_data['currency']} на <b>{category.emoji} {category.name.capitalize()}</b>\n"
                 f"{date_str}\n\n"
                 f"{transaction_description}\n\n"
                 f"{balance_indicator} Баланс за {current_month}: <b>{'-' if month_balance < 0 else ''}{abs(month_balance)}</b> ₽",
                 parse_mode=ParseMode.HTML
             )
+            if alerts:
+                await message.answer(format_budget_alerts(alerts, {category.id: category}),
+                                     parse_mode=ParseMode.HTML)
 
         except Exception as e:
             db.rollback()
@@ -673,3 +610,301 @@ async def process_transaction(message: Message):
     except Exception as e:
         logging.error(f"Ошибка при обработке сообщения о транзакции: {e}")
         await message.answer("Произошла ошибка при обработке сообщения. Попробуйте позже.")
+
+
+def expense_amount(transaction_data: Dict[str, Any]) -> float:
+    """Сумма для старой таблицы expenses: она хранит расходы только в рублях"""
+    return round(rates.to_base(transaction_data["amount"], transaction_data["currency"],
+                               transaction_data["date"]), 2)
+
+
+def month_totals(db: Session, user_id: int, since: datetime) -> Tuple[float, float]:
+    """
+    Расходы и доходы пользователя с даты в рублях одним GROUP BY запросом
+
+    Returns:
+        Tuple[float, float]: расходы и доходы
+    """
+    rows = db.query(
+        Transaction.is_expense, currency_column(Transaction), rate_day_column(Transaction),
+        func.sum(Transaction.amount)
+    ).filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= since
+    ).group_by(Transaction.is_expense, currency_column(Transaction),
+               rate_day_column(Transaction)).all()
+    totals = rates.convert_totals(rows)
+    return totals.get(1, 0), totals.get(0, 0)
+
+
+def format_budget_alerts(alerts: List[BudgetAlert], categories: Dict[int, Category]) -> str:
+    """Текст уведомлений о пройденных порогах бюджетов"""
+    lines = []
+    for alert in alerts:
+        category = categories[alert.category_id]
+        name = f"{category.emoji} {category.name.capitalize()}"
+        if alert.threshold >= 100:
+            lines.append(f"🚨 Бюджет <b>{name}</b> исчерпан: "
+                         f"<code>{_plain_amount(alert.spent)}</code> из "
+                         f"<code>{_plain_amount(alert.limit)}</code> ₽")
+        else:
+            lines.append(f"⚠️ Бюджет <b>{name}</b>: потрачено {alert.threshold}% — "
+                         f"<code>{_plain_amount(alert.spent)}</code> из "
+                         f"<code>{_plain_amount(alert.limit)}</code> ₽")
+    return "\n".join(lines)
+
+
+def _plain_amount(amount: float) -> str:
+    """Округляет сумму до целого, если она целая"""
+    return str(int(amount)) if amount == int(amount) else f"{amount:.2f}"
+
+
+def parse_bulk_message(text: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Парсит многострочное сообщение: каждая непустая строка — отдельная транзакция
+
+    Args:
+        text: текст сообщения
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[str]]: распознанные транзакции (с
+        исходной строкой в ключе "line") и нераспознанные строки
+    """
+    parsed = []
+    unrecognized = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        transaction_data = parse_transaction_message(line)
+        if transaction_data and transaction_data["description"]:
+            transaction_data["line"] = line
+            parsed.append(transaction_data)
+        else:
+            unrecognized.append(line)
+    return parsed, unrecognized
+
+
+def get_allowed_categories(db: Session, user_id: int) -> Dict[int, Set[str]]:
+    """
+    Возвращает допустимые категории расходов и доходов одним запросом
+
+    Если у пользователя нет категорий какого-то типа, допустимы стандартные.
+
+    Returns:
+        Dict[int, Set[str]]: is_expense -> названия категорий в нижнем регистре
+    """
+    allowed = {1: set(), 0: set()}
+    for name, is_expense in db.query(Category.name, Category.is_expense).filter(
+            Category.user_id == user_id):
+        allowed[is_expense].add(name.lower())
+    for is_expense in allowed:
+        if not allowed[is_expense]:
+            allowed[is_expense] = set(DEFAULT_CATEGORIES)
+    return allowed
+
+
+def resolve_categories(db: Session, user_id: int,
+                       keys: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], Category]:
+    """
+    Находит категории пользователя одним запросом и создает недостающие
+
+    Вызывается внутри операции записи: новые категории получают id при flush.
+
+    Args:
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+        keys: пары (название категории, is_expense)
+
+    Returns:
+        Dict[Tuple[str, int], Category]: все категории пользователя по
+        (название в нижнем регистре, is_expense)
+    """
+    categories = {
+        (category.name.lower(), category.is_expense): category
+        for category in db.query(Category).filter(Category.user_id == user_id)
+    }
+
+    new_categories = []
+    for key in keys:
+        if key not in categories:
+            categories[key] = Category(
+                user_id=user_id,
+                name=key[0],
+                emoji=get_category_emoji(key[0]),
+                is_expense=key[1]
+            )
+            new_categories.append(categories[key])
+    if new_categories:
+        db.add_all(new_categories)
+        db.flush()
+    return categories
+
+
+def save_bulk_transactions(user_id: int, items: List[Tuple[Dict[str, Any], str]],
+                           alerts: Optional[List[BudgetAlert]] = None):
+    """
+    Операция записи пачки транзакций одним коммитом
+
+    Недостающие категории создаются в той же операции, транзакции и расходы
+    вставляются двумя executemany.
+
+    Args:
+        user_id: ID пользователя в базе данных
+        items: пары (данные транзакции, название категории)
+        alerts: список, в который записываются пройденные пороги бюджетов
+
+    Returns:
+        WriteOp: операция, возвращающая словарь (название, is_expense) -> Category
+    """
+    def op(db: Session):
+        categories = resolve_categories(db, user_id, (
+            (category_name, 1 if transaction_data["is_expense"] else 0)
+            for transaction_data, category_name in items))
+
+        transaction_rows = []
+        expense_rows = []
+        for transaction_data, category_name in items:
+            is_expense = 1 if transaction_data["is_expense"] else 0
+            transaction_rows.append({
+                "user_id": user_id,
+                "amount": transaction_data["amount"],
+                "original_amount": transaction_data["original_amount"],
+                "currency": transaction_data["currency"],
+                "category_id": categories[(category_name, is_expense)].id,
+                "description": transaction_data["line"],
+                "transaction_date": transaction_data["date"],
+                "is_expense": is_expense,
+                "mentioned_user": transaction_data["mentioned_user"],
+            })
+            # Для обратной совместимости также добавляем в таблицу expenses
+            if is_expense:
+                expense_rows.append({
+                    "user_id": user_id,
+                    "amount": expense_amount(transaction_data),
+                    "category": category_name,
+                    "description": transaction_data["line"],
+                    "created_at": transaction_data["date"],
+                })
+
+        # Счетчики бюджетов обновляются до вставки транзакций
+        found = add_spending(db, user_id, spending_items(transaction_rows))
+        if alerts is not None:
+            alerts[:] = found
+        insert_transaction_rows(db, user_id, transaction_rows)
+        insert_rows(ExpenseModel, expense_rows)(db)
+        return categories
+    return op
+
+
+@transaction_message("bulk")
+async def process_bulk_transactions(message: Message):
+    """
+    Обрабатывает многострочное сообщение, по транзакции на строку:
+    500 обед
+    -150 такси
+    +50000 зарплата
+
+    Все описания категоризируются одним пакетом, транзакции сохраняются одним
+    коммитом, а пользователь получает одну сводку.
+    """
+    user_id = message.from_user.id
+
+    try:
+        parsed, unrecognized = parse_bulk_message(message.text)
+
+        if not parsed:
+            await message.answer("Не удалось распознать ни одной транзакции. "
+                                 "Каждая строка должна начинаться с суммы, например: <b>500 обед</b>",
+                                 parse_mode=ParseMode.HTML)
+            return
+
+        if len(parsed) > settings.BULK_MAX_LINES:
+            await message.answer(f"Слишком много строк: {len(parsed)}. "
+                                 f"За одно сообщение можно добавить не больше {settings.BULK_MAX_LINES} транзакций.")
+            return
+
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.telegram_id == user_id).first()
+
+            if not user:
+                await message.answer("Для начала работы, пожалуйста, используйте команду /start")
+                return
+
+            allowed = get_allowed_categories(db, user.id)
+
+            # Категоризируем все описания одним пакетом; запрос к LLM
+            # блокирующий, поэтому выполняется в отдельном потоке
+            llm_categories = await asyncio.to_thread(
+                categorize_transactions,
+                [transaction_data["description"] for transaction_data in parsed], db, user.id)
+
+            items = []
+            for transaction_data in parsed:
+                is_expense = 1 if transaction_data["is_expense"] else 0
+                category_name = llm_categories.get(
+                    transaction_data["description"].strip().lower(), "другое")
+                if category_name not in allowed[is_expense]:
+                    category_name = "другое"
+                items.append((transaction_data, category_name))
+
+            # Одна операция записи на всю пачку
+            alerts: List[BudgetAlert] = []
+            categories = await write_queue.submit(save_bulk_transactions(user.id, items, alerts))
+            bump_data_version(user.id)
+
+            # Баланс за текущий месяц одним запросом
+            current_date = datetime.now()
+            month_start = datetime(current_date.year, current_date.month, 1)
+            month_expenses, month_incomes = month_totals(db, user.id, month_start)
+            month_balance = month_incomes - month_expenses
+            current_month = RUSSIAN_MONTHS[current_date.month]
+
+            lines = []
+            subtotals = []
+            for transaction_data, category_name in items:
+                is_expense = 1 if transaction_data["is_expense"] else 0
+                category = categories[(category_name, is_expense)]
+                sign = "-" if is_expense else "+"
+                currency = transaction_data["currency"]
+                lines.append(
+                    f"{category.emoji} {sign}{_plain_amount(transaction_data['amount'])}"
+                    f"{'' if currency == BASE_CURRENCY else ' ' + currency} "
+                    f"{html.escape(transaction_data['description'].lower())} — "
+                    f"{html.escape(category.name.capitalize())}")
+                subtotals.append((is_expense, currency, transaction_data["date"],
+                                  transaction_data["amount"]))
+            totals = rates.convert_totals(subtotals)
+            total_expense = totals.get(1, 0)
+            total_income = totals.get(0, 0)
+
+            text = f"Добавлено транзакций: <b>{len(items)}</b>\n\n" + "\n".join(lines)
+            text += "\n"
+            if total_expense:
+                text += f"\nРасходы: <b>{_plain_amount(total_expense)}</b> ₽"
+            if total_income:
+                text += f"\nДоходы: <b>{_plain_amount(total_income)}</b> ₽"
+            if unrecognized:
+                text += "\n\nНе распознаны строки:\n" + "\n".join(
+                    f"<i>{html.escape(line)}</i>" for line in unrecognized)
+
+            balance_indicator = "❗" if month_balance < 0 else "✅"
+            text += (f"\n\n{balance_indicator} Баланс за {current_month}: "
+                     f"<b>{'-' if month_balance < 0 else ''}{abs(month_balance)}</b> ₽")
+            if alerts:
+                text += "\n\n" + format_budget_alerts(
+                    alerts, {category.id: category for category in categories.values()})
+
+            await message.answer(text, parse_mode=ParseMode.HTML)
+
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Ошибка при сохранении пачки транзакций: {e}")
+            await message.answer("Произошла ошибка при сохранении транзакций. Попробуйте позже.")
+        finally:
+            db.close()
+
+    except Exception as e:
+        logging.error(f"Ошибка при обработке многострочного сообщения: {e}")
+        await message.answer("Произошла ошибка при обработке сообщения. Попробуйте позже.")
@@ -0,0 +1,190 @@
+"""
+Выгрузка транзакций пользователя для /export.
+
+Строки читаются из базы потоково (yield_per) и сразу пишутся в
+SpooledTemporaryFile: небольшие выгрузки остаются в памяти, большие
+переливаются на диск, поэтому расход памяти не зависит от объема истории.
+Готовый файл отправляется документом частями, не загружаясь целиком.
+
+Форматы:
+- csv — CSV в UTF-8 с BOM (открывается в Excel);
+- gz — тот же CSV, сжатый gzip;
+- parquet — колоночный формат для аналитики (нужен пакет pyarrow).
+"""
+import csv
+import gzip
+import io
+import tempfile
+from typing import AsyncGenerator, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from aiogram.types import InputFile
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import settings
+from core.archive import archive_boundary, archive_entity
+from core.models import Category, Transaction
+
+# Колонки выгрузки
+EXPORT_COLUMNS = ["date", "type", "amount", "currency", "original_amount",
+                  "category", "description", "mentioned_user"]
+
+# Строка выгрузки в порядке EXPORT_COLUMNS
+ExportRow = Tuple
+
+
+class ExportFormat(NamedTuple):
+    """Формат выгрузки"""
+    extension: str
+    write: Callable[[Iterator[List[ExportRow]], BinaryIO], None]
+
+
+def iter_export_rows(db: Session, user_id: int,
+                     batch_size: Optional[int] = None) -> Iterator[List[ExportRow]]:
+    """
+    Потоково читает транзакции пользователя пачками
+
+    Args:
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+        batch_size: строк в пачке (по умолчанию EXPORT_BATCH_SIZE)
+
+    Yields:
+        List[ExportRow]: пачка строк в хронологическом порядке (сначала архив)
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+
+    # Архивные строки старше оперативных, поэтому архив выгружается первым
+    entities = [Transaction]
+    archived = archive_entity(db)
+    if archived is not None and archive_boundary(db, user_id) is not None:
+        entities.insert(0, archived)
+
+    for entity in entities:
+        query = select(
+            entity.transaction_date,
+            entity.is_expense,
+            entity.amount,
+            entity.currency,
+            entity.original_amount,
+            Category.name,
+            entity.description,
+            entity.mentioned_user,
+        ).outerjoin(
+            Category, entity.category_id == Category.id
+        ).where(
+            entity.user_id == user_id
+        ).order_by(
+            entity.transaction_date, entity.id
+        ).execution_options(yield_per=batch_size)
+
+        for partition in db.execute(query).partitions():
+            yield [
+                (date.isoformat(sep=" ", timespec="seconds") if date else None,
+                 "expense" if is_expense else "income",
+                 amount, currency or "RUB", original_amount, category or "другое",
+                 description, mentioned_user)
+                for date, is_expense, amount, currency, original_amount, category,
+                description, mentioned_user in partition
+            ]
+
+
+def write_csv(batches: Iterator[List[ExportRow]], output: BinaryIO) -> None:
+    """Пишет пачки строк в CSV (UTF-8 с BOM)"""
+    text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+    text.flush()
+    # Отсоединяем обертку, чтобы она не закрыла буфер
+    text.detach()
+
+
+def write_csv_gzip(batches: Iterator[List[ExportRow]], output: BinaryIO) -> None:
+    """Пишет пачки строк в CSV, сжатый gzip"""
+    with gzip.GzipFile(fileobj=output, mode="wb", compresslevel=6) as compressed:
+        write_csv(batches, compressed)
+
+
+def write_parquet(batches: Iterator[List[ExportRow]], output: BinaryIO) -> None:
+    """
+    Пишет пачки строк в Parquet, по группе строк на пачку
+
+    Raises:
+        ImportError: если пакет pyarrow не установлен
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("date", pa.string()),
+        ("type", pa.string()),
+        ("amount", pa.float64()),
+        ("currency", pa.string()),
+        ("original_amount", pa.float64()),
+        ("category", pa.string()),
+        ("description", pa.string()),
+        ("mentioned_user", pa.string()),
+    ])
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type)
+                 for column, field in zip(columns, schema)],
+                schema=schema))
+
+
+# Форматы по аргументу команды
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "csv": ExportFormat("csv", write_csv),
+    "gz": ExportFormat("csv.gz", write_csv_gzip),
+    "parquet": ExportFormat("parquet", write_parquet),
+}
+
+
+def build_export(db: Session, user_id: int, format_name: str) -> BinaryIO:
+    """
+    Строит выгрузку во временном файле
+
+    Выполняется в рабочем потоке: чтение и сжатие не блокируют event loop.
+
+    Args:
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+        format_name: ключ EXPORT_FORMATS
+
+    Returns:
+        BinaryIO: SpooledTemporaryFile, перемотанный в начало
+    """
+    spool = tempfile.SpooledTemporaryFile(
+        max_size=settings.EXPORT_SPOOL_MB * 1024 * 1024)
+    try:
+        EXPORT_FORMATS[format_name].write(iter_export_rows(db, user_id), spool)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def spool_size(spool: BinaryIO) -> int:
+    """Возвращает размер временного файла, не меняя позицию чтения"""
+    position = spool.tell()
+    size = spool.seek(0, io.SEEK_END)
+    spool.seek(position)
+    return size
+
+
+class SpooledInputFile(InputFile):
+    """Файл для отправки в Telegram, читаемый из открытого буфера частями"""
+
+    def __init__(self, spool: BinaryIO, filename: str, **kwargs):
+        super().__init__(filename=filename, **kwargs)
+        self.spool = spool
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        self.spool.seek(0)
+        while chunk := self.spool.read(self.chunk_size):
+            yield chunk
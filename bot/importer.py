@@ -0,0 +1,505 @@
+"""
+Импорт банковских выписок в формате CSV.
+
+Файл скачивается во временный файл и читается потоково в два прохода, так
+что в памяти одновременно находится не больше одной части строк:
+
+1. первый проход собирает уникальные описания — каждое категоризируется один
+   раз (кэш и словарь пакетно, промахи — пакетными запросами к LLM);
+2. второй проход вставляет строки частями по IMPORT_CHUNK_SIZE через очередь
+   записи (executemany) и обновляет сообщение о прогрессе.
+
+Разбор файла и категоризация выполняются в рабочих потоках, поэтому импорт
+не блокирует обработку сообщений других пользователей.
+"""
+import asyncio
+import csv
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from aiogram import F, Router
+from aiogram.enums import ParseMode
+from aiogram.types import Message
+from sqlalchemy.orm import Session, sessionmaker
+
+from config import settings
+from core.currency import BASE_CURRENCY, normalize_currency, rates
+from core.db import SessionLocal
+from core.budgets import add_spending, spending_items
+from core.goals import insert_transaction_rows
+from core.llm import categorize_transactions
+from core.models import User, Expense
+from core.versions import bump_data_version
+from core.writer import WriteQueue, write_queue, insert_rows
+from bot.expense import get_allowed_categories, resolve_categories
+from bot.sender import background_priority
+
+# Синонимы заголовков колонок (в нижнем регистре); используется первая
+# колонка, заголовок которой совпадает с синонимом или начинается с него
+COLUMN_ALIASES = {
+    "date": ("дата операции", "дата", "date", "transaction date", "posted"),
+    "amount": ("сумма операции", "сумма", "amount", "sum"),
+    "description": ("описание", "назначение", "комментарий", "описание операции",
+                    "контрагент", "description", "details", "memo", "payee"),
+    "currency": ("валюта операции", "валюта", "currency"),
+}
+
+# Форматы дат в выписках
+DATE_FORMATS = (
+    "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y", "%d.%m.%y",
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d", "%d/%m/%Y",
+)
+
+# Дата в формате ДД.ММ.ГГГГ с необязательным временем
+DATE_RU = re.compile(r"^(\d{2})\.(\d{2})\.(\d{4})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?$")
+
+# Символы, которые удаляются из суммы: пробелы-разделители разрядов и валюта
+AMOUNT_JUNK = re.compile(r"[\s₽$€]|руб\.?|rub", re.IGNORECASE)
+
+# Сколько байт читать для определения кодировки и разделителя
+SAMPLE_SIZE = 64 * 1024
+
+# Пользователи, у которых сейчас идет импорт (не больше одного на пользователя)
+_active_imports: Set[int] = set()
+
+# Ограничение одновременных импортов на весь бот
+_import_slots: Optional[asyncio.Semaphore] = None
+
+
+class StatementError(ValueError):
+    """Файл не похож на выписку: не найдены нужные колонки"""
+
+
+class StatementRow(NamedTuple):
+    """Строка выписки"""
+    date: datetime
+    amount: float  # отрицательная — расход, положительная — доход
+    description: str
+    currency: str
+
+
+class ImportResult(NamedTuple):
+    """Итог импорта"""
+    imported: int
+    skipped: int
+    descriptions: int  # уникальных описаний
+    elapsed: float  # секунды
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """
+    Разбирает сумму из выписки: "-1 234,56", "1234.56 ₽", "−500"
+
+    Returns:
+        Optional[float]: сумма со знаком или None
+    """
+    value = AMOUNT_JUNK.sub("", value).replace("−", "-").replace(",", ".")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    """Разбирает дату из выписки в одном из DATE_FORMATS"""
+    value = value.strip()
+
+    # Быстрый путь для самого частого формата ДД.ММ.ГГГГ[ ЧЧ:ММ[:СС]]:
+    # strptime на сотнях тысяч строк заметно медленнее
+    match = DATE_RU.match(value)
+    if match:
+        day, month, year, hour, minute, second = match.groups()
+        try:
+            return datetime(int(year), int(month), int(day), int(hour or 0),
+                            int(minute or 0), int(second or 0))
+        except ValueError:
+            return None
+
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Определяет кодировку файла: UTF-8 (с BOM или без) или cp1251"""
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Ошибка в последних байтах — обрезанный посередине символ
+        if e.start < len(sample) - 4:
+            return "cp1251"
+    return "utf-8-sig"
+
+
+def find_columns(header: List[str]) -> Dict[str, int]:
+    """
+    Сопоставляет колонки выписки с полями транзакции
+
+    Raises:
+        StatementError: если нет колонок даты, суммы или описания
+    """
+    names = [name.strip().strip('"').lower() for name in header]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            for index, name in enumerate(names):
+                if name == alias or name.startswith(alias):
+                    columns[field] = index
+                    break
+            if field in columns:
+                break
+
+    missing = [field for field in ("date", "amount", "description") if field not in columns]
+    if missing:
+        raise StatementError(
+            "Не найдены колонки: " + ", ".join(missing) +
+            ". Нужны колонки с датой, суммой и описанием операции.")
+    return columns
+
+
+class SemicolonDialect(csv.excel):
+    """CSV с разделителем ";" (так выгружает большинство российских банков)"""
+    delimiter = ";"
+
+
+class StatementReader:
+    """Потоковое чтение CSV-выписки"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            sample = f.read(SAMPLE_SIZE)
+        self.encoding = detect_encoding(sample)
+
+        text = sample.decode(self.encoding, errors="ignore")
+        try:
+            self.dialect = csv.Sniffer().sniff(text, delimiters=";,\t|")
+        except csv.Error:
+            self.dialect = SemicolonDialect if text.count(";") > text.count(",") else csv.excel
+
+        with self._open() as f:
+            header = next(csv.reader(f, self.dialect), None)
+        if not header:
+            raise StatementError("Файл пустой")
+        self.columns = find_columns(header)
+
+        # Строки, которые не удалось разобрать при последнем проходе
+        self.skipped = 0
+
+    def _open(self):
+        return open(self.path, encoding=self.encoding, errors="replace", newline="")
+
+    def _records(self) -> Iterator[List[str]]:
+        """Проходит по записям CSV без заголовка и пустых строк"""
+        width = max(self.columns.values()) + 1
+        with self._open() as f:
+            reader = csv.reader(f, self.dialect)
+            next(reader, None)  # заголовок
+            for record in reader:
+                if len(record) >= width:
+                    yield record
+                elif any(record):
+                    self.skipped += 1
+
+    def __iter__(self) -> Iterator[StatementRow]:
+        """Проходит по строкам файла, пропуская нераспознанные"""
+        self.skipped = 0
+        date_col = self.columns["date"]
+        amount_col = self.columns["amount"]
+        description_col = self.columns["description"]
+        currency_col = self.columns.get("currency")
+
+        for record in self._records():
+            date = parse_date(record[date_col])
+            amount = parse_amount(record[amount_col])
+            description = record[description_col].strip()
+            if date is None or not amount or not description:
+                self.skipped += 1
+                continue
+            currency = BASE_CURRENCY
+            if currency_col is not None:
+                currency = normalize_currency(record[currency_col]) or BASE_CURRENCY
+            yield StatementRow(date, amount, description, currency)
+
+    def descriptions(self) -> Iterator[Tuple[str, float]]:
+        """
+        Быстрый проход: только описания и суммы, без разбора дат
+
+        Строки с некорректной датой здесь не отсеиваются — они будут
+        пропущены при вставке.
+        """
+        self.skipped = 0
+        amount_col = self.columns["amount"]
+        description_col = self.columns["description"]
+        for record in self._records():
+            amount = parse_amount(record[amount_col])
+            description = record[description_col].strip()
+            if amount and description:
+                yield description, amount
+
+    def chunks(self, size: int) -> Iterator[List[StatementRow]]:
+        """Проходит по строкам файла частями по size строк"""
+        chunk = []
+        for row in self:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def scan_descriptions(reader: StatementReader) -> Tuple[Set[Tuple[str, int]], int]:
+    """
+    Первый проход: уникальные пары (описание, is_expense) и число строк
+
+    Описания нормализуются так же, как при категоризации; число строк —
+    оценка для прогресса (строки с некорректной датой еще не отсеяны).
+    """
+    keys = set()
+    rows = 0
+    for description, amount in reader.descriptions():
+        keys.add((description.lower(), 1 if amount < 0 else 0))
+        rows += 1
+    return keys, rows
+
+
+def categorize_statement(session_factory: Callable[[], Session], user_id: int,
+                         keys: Set[Tuple[str, int]]) -> Dict[Tuple[str, int], str]:
+    """
+    Категоризирует уникальные описания выписки
+
+    В LLM отправляется не больше IMPORT_LLM_LIMIT описаний, остальные
+    промахи кэша и словаря получают "другое".
+
+    Returns:
+        Dict[Tuple[str, int], str]: (описание, is_expense) -> категория
+    """
+    db = session_factory()
+    try:
+        allowed = get_allowed_categories(db, user_id)
+        llm_categories = categorize_transactions(
+            (description for description, _ in keys), db, user_id,
+            llm_limit=settings.IMPORT_LLM_LIMIT)
+    finally:
+        db.close()
+
+    result = {}
+    for description, is_expense in keys:
+        category_name = llm_categories.get(description, "другое")
+        result[(description, is_expense)] = (
+            category_name if category_name in allowed[is_expense] else "другое")
+    return result
+
+
+def ensure_categories(user_id: int, keys: Set[Tuple[str, int]]):
+    """
+    Операция записи: создает недостающие категории выписки
+
+    Returns:
+        WriteOp: операция, возвращающая (название, is_expense) -> id категории
+    """
+    def op(db: Session):
+        categories = resolve_categories(db, user_id, keys)
+        return {key: category.id for key, category in categories.items()}
+    return op
+
+
+def build_rows(user_id: int, chunk: List[StatementRow],
+               categories: Dict[Tuple[str, int], str],
+               category_ids: Dict[Tuple[str, int], int]) -> Tuple[List[dict], List[dict]]:
+    """Строит строки transactions и expenses для пакетной вставки"""
+    transaction_rows = []
+    expense_rows = []
+    for row in chunk:
+        is_expense = 1 if row.amount < 0 else 0
+        amount = abs(row.amount)
+        category_name = categories[(row.description.lower(), is_expense)]
+        transaction_rows.append({
+            "user_id": user_id,
+            "amount": amount,
+            "original_amount": amount,
+            "currency": row.currency,
+            "category_id": category_ids[(category_name, is_expense)],
+            "description": row.description,
+            "transaction_date": row.date,
+            "is_expense": is_expense,
+        })
+        # Для обратной совместимости также добавляем в таблицу expenses
+        if is_expense:
+            expense_rows.append({
+                "user_id": user_id,
+                "amount": round(rates.to_base(amount, row.currency, row.date), 2),
+                "category": category_name,
+                "description": row.description,
+                "created_at": row.date,
+            })
+    return transaction_rows, expense_rows
+
+
+def insert_statement_rows(user_id: int, transaction_rows: List[dict], expense_rows: List[dict]):
+    """Операция записи части выписки двумя executemany"""
+    def op(db: Session):
+        # Счетчики бюджетов; о порогах при импорте выписки не сообщаем
+        add_spending(db, user_id, spending_items(transaction_rows))
+        insert_transaction_rows(db, user_id, transaction_rows)
+        insert_rows(Expense, expense_rows)(db)
+        return len(transaction_rows)
+    return op
+
+
+# Функция прогресса: async def progress(stage, done, total)
+ProgressCallback = Callable[[str, int, int], Awaitable[None]]
+
+
+async def import_statement(path: str, user_id: int,
+                           progress: Optional[ProgressCallback] = None,
+                           queue: Optional[WriteQueue] = None,
+                           session_factory: Optional[sessionmaker] = None) -> ImportResult:
+    """
+    Импортирует CSV-выписку в транзакции пользователя
+
+    Args:
+        path: путь к файлу выписки
+        user_id: ID пользователя в базе данных
+        progress: вызывается после каждого этапа и каждой вставленной части
+        queue: очередь записи (по умолчанию общая)
+        session_factory: фабрика сессий для чтения (по умолчанию SessionLocal)
+
+    Returns:
+        ImportResult: итог импорта
+
+    Raises:
+        StatementError: если файл не похож на выписку
+    """
+    queue = queue or write_queue
+    session_factory = session_factory or SessionLocal
+    start = time.perf_counter()
+
+    async def report(stage: str, done: int, total: int) -> None:
+        if progress is not None:
+            await progress(stage, done, total)
+
+    reader = await asyncio.to_thread(StatementReader, path)
+
+    # Проход 1: уникальные описания
+    keys, total = await asyncio.to_thread(scan_descriptions, reader)
+    await report("categorize", 0, total)
+
+    categories = await asyncio.to_thread(categorize_statement, session_factory, user_id, keys)
+    category_ids = await queue.submit(ensure_categories(
+        user_id, {(name, is_expense) for (_, is_expense), name in categories.items()}))
+    bump_data_version(user_id)
+
+    # Проход 2: пакетная вставка частями
+    chunks = reader.chunks(settings.IMPORT_CHUNK_SIZE)
+    imported = 0
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        transaction_rows, expense_rows = build_rows(user_id, chunk, categories, category_ids)
+        imported += await queue.submit(insert_statement_rows(user_id, transaction_rows, expense_rows))
+        bump_data_version(user_id)
+        await report("insert", imported, total)
+
+    skipped = reader.skipped
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Импорт выписки для {user_id}: {imported} строк, {len(keys)} уникальных "
+        f"описаний, пропущено {skipped}, {elapsed:.1f} с")
+    return ImportResult(imported, skipped, len(keys), elapsed)
+
+
+def _get_import_slots() -> asyncio.Semaphore:
+    """Возвращает семафор одновременных импортов, создавая его в текущем loop"""
+    global _import_slots
+    if _import_slots is None:
+        _import_slots = asyncio.Semaphore(settings.IMPORT_CONCURRENCY)
+    return _import_slots
+
+
+# Роутер для документов
+router = Router()
+
+
+@router.message(F.document)
+async def process_statement_document(message: Message):
+    """Импортирует присланную CSV-выписку"""
+    document = message.document
+    file_name = (document.file_name or "").lower()
+    if not (file_name.endswith((".csv", ".txt")) or document.mime_type in ("text/csv", "text/plain")):
+        await message.answer("Для импорта пришлите выписку в формате CSV.")
+        return
+
+    if document.file_size and document.file_size > settings.IMPORT_MAX_FILE_MB * 1024 * 1024:
+        await message.answer(f"Файл слишком большой: максимум {settings.IMPORT_MAX_FILE_MB} МБ.")
+        return
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    finally:
+        db.close()
+
+    if not user:
+        await message.answer("Для начала работы, пожалуйста, используйте команду /start")
+        return
+
+    if user.id in _active_imports:
+        await message.answer("Предыдущий импорт еще не закончен, подождите немного.")
+        return
+
+    _active_imports.add(user.id)
+    status = await message.answer("📥 Загружаю выписку...")
+    path = None
+    last_edit = 0.0
+
+    async def progress(stage: str, done: int, total: int) -> None:
+        # Telegram ограничивает частоту редактирования: не чаще раза в секунду
+        nonlocal last_edit
+        now = time.monotonic()
+        if now - last_edit < 1 and done < total:
+            return
+        last_edit = now
+        if stage == "categorize":
+            text = f"🔎 Найдено операций: <b>{total}</b>. Определяю категории..."
+        else:
+            text = f"💾 Импортировано <b>{done}</b> из <b>{total}</b>"
+        try:
+            # Прогресс уступает в очереди отправки ответам другим пользователям
+            with background_priority():
+                await status.edit_text(text, parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logging.debug(f"Не удалось обновить прогресс импорта: {e}")
+
+    try:
+        async with _get_import_slots():
+            with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as f:
+                path = f.name
+            await message.bot.download(document, destination=path)
+            result = await import_statement(path, user.id, progress)
+
+        text = (f"✅ Импорт завершен: добавлено операций <b>{result.imported}</b> "
+                f"за {result.elapsed:.1f} с.")
+        if result.skipped:
+            text += f"\nПропущено строк без даты, суммы или описания: {result.skipped}."
+        await status.edit_text(text, parse_mode=ParseMode.HTML)
+
+    except StatementError as e:
+        await status.edit_text(f"Не удалось прочитать выписку. {e}")
+    except Exception as e:
+        logging.error(f"Ошибка при импорте выписки: {e}")
+        await status.edit_text("Произошла ошибка при импорте выписки. Попробуйте позже.")
+    finally:
+        _active_imports.discard(user.id)
+        if path:
+            os.unlink(path)
@@ -0,0 +1,137 @@
+"""
+Middleware обновлений: контекст логирования, время обработки и метрики.
+
+На время обработки обновления в contextvar кладутся update_id и user_id —
+все записи лога, сделанные обработчиками, получают эти поля. После
+обработки пишется одна запись с временем обработки: INFO (выборочно) или
+WARNING, если обновление обрабатывалось дольше LOG_SLOW_UPDATE_MS.
+
+HandlerMetricsMiddleware замеряет время конкретного обработчика для
+гистограммы finbot_handler_latency_seconds (см. core.metrics).
+
+TracingMiddleware и TracingRequestMiddleware строят дерево интервалов
+обновления (см. core.tracing): обработчик, SQL, LLM и запросы к Telegram.
+Обновления дольше TRACE_SLOW_UPDATE_MS пишутся в лог с этим деревом.
+
+SendQueueMiddleware отправляет сообщения обработчиков через очередь с
+лимитами Telegram (см. bot.sender).
+"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import (BaseRequestMiddleware,
+                                                     NextRequestMiddlewareType)
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+
+from bot.sender import SendQueue, send_priority, should_queue
+from config import settings
+from core.logs import current_update
+from core.metrics import HANDLER_LATENCY, UPDATES
+from core.tracing import span, start_trace
+
+# Логгер обработанных обновлений (INFO пишется выборочно, см. core.logs)
+logger = logging.getLogger("bot.updates")
+
+# Логгер деревьев медленных обновлений
+trace_logger = logging.getLogger("bot.trace")
+
+
+class UpdateLoggingMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: контекст лога и задержка обработчика"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        context = {"update_id": event.update_id}
+        if user is not None:
+            context["user_id"] = user.id
+        token = current_update.set(context)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            latency_ms = round((time.perf_counter() - start) * 1000, 2)
+            slow = latency_ms > settings.LOG_SLOW_UPDATE_MS
+            logger.log(logging.WARNING if slow else logging.INFO,
+                       "Обновление %s (%s) обработано за %.1f мс",
+                       event.update_id, event.event_type, latency_ms,
+                       extra={"latency_ms": latency_ms, "event_type": event.event_type,
+                              "slow": slow})
+            current_update.reset(token)
+            UPDATES.inc(event.event_type)
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """
+    Имя обработчика для меток метрик
+
+    Текстовые сообщения проходят через общий dispatch_message, поэтому для
+    них берется обработчик маршрута из классификатора (bot.routing).
+    """
+    route = data.get("route")
+    if route is not None:
+        return route.handler.__name__
+    handler = data.get("handler")
+    return getattr(handler.callback, "__name__", "unknown") if handler is not None else "unknown"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware событий: время обработчика по его имени"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        name = handler_name(data)
+        start = time.perf_counter()
+        try:
+            with span("handler", name):
+                return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: дерево интервалов и лог медленных обновлений"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if not settings.TRACE_ENABLED:
+            return await handler(event, data)
+        with start_trace(event.event_type, update_id=event.update_id) as trace:
+            result = await handler(event, data)
+        latency_ms = trace.duration * 1000
+        if latency_ms > settings.TRACE_SLOW_UPDATE_MS:
+            trace_logger.warning(
+                "Медленное обновление %s: %.1f мс, SQL %d за %.1f мс, LLM %d за %.1f мс, "
+                "Telegram %d за %.1f мс\n%s",
+                event.update_id, latency_ms,
+                trace.count("sql"), trace.total("sql") * 1000,
+                trace.count("llm"), trace.total("llm") * 1000,
+                trace.count("telegram"), trace.total("telegram") * 1000,
+                trace.format(), extra={"trace": trace.to_dict()})
+        return result
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: запросы к Telegram API в дереве обновления"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot,
+                       method: TelegramMethod) -> Any:
+        with span("telegram", type(method).__name__):
+            return await make_request(bot, method)
+
+
+class SendQueueMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: отправка и правка сообщений через очередь отправки"""
+
+    def __init__(self, queue: SendQueue):
+        self.queue = queue
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot,
+                       method: TelegramMethod) -> Any:
+        if not self.queue.running or not should_queue(method):
+            return await make_request(bot, method)
+        return await self.queue.request(lambda: make_request(bot, method), method.chat_id,
+                                        send_priority.get())
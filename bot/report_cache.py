@@ -0,0 +1,51 @@
+"""
+Кэш готовых текстов отчетов /stats, /summary и /categories.
+
+Ключ — (пользователь, команда, период, версия данных пользователя, версия
+курсов). Версия данных увеличивается после каждой записи транзакций,
+категорий или бюджетов пользователя (см. core.versions), курсы — после
+каждой загрузки, поэтому запись автоматически делает старые тексты
+недоступными, а повторный просмотр отчета — поиск в словаре без запросов
+к базе. Устаревшие записи не удаляются явно: их вытесняет LRU.
+"""
+from typing import Callable, Hashable, Tuple
+
+from config import settings
+from core.cache import LRUCache
+from core.currency import rates
+from core.metrics import REPORT_CACHE
+from core.versions import get_data_version
+
+
+# Общий кэш отчетов
+report_cache: "LRUCache[str]" = LRUCache(settings.REPORT_CACHE_SIZE)
+
+
+def report_key(user_id: int, command: str, period: str) -> Tuple[Hashable, ...]:
+    """Ключ отчета с текущими версиями данных пользователя и курсов"""
+    return (user_id, command, period, get_data_version(user_id), rates.version)
+
+
+def cached_report(user_id: int, command: str, period: str,
+                  render: Callable[[], str]) -> str:
+    """
+    Возвращает текст отчета из кэша или строит его
+
+    Args:
+        user_id: ID пользователя в базе данных
+        command: команда отчета ("stats", "summary", "categories")
+        period: от чего еще зависит отчет, например день "2024-03-15"
+        render: функция, строящая текст (вызывается только при промахе)
+
+    Returns:
+        str: текст отчета
+    """
+    key = report_key(user_id, command, period)
+    text = report_cache.get(key)
+    if text is not None:
+        REPORT_CACHE.inc(command, "hit")
+        return text
+    REPORT_CACHE.inc(command, "miss")
+    text = render()
+    report_cache.put(key, text)
+    return text
@@ -0,0 +1,167 @@
+"""
+Предварительная классификация текстовых сообщений.
+
+Вместо цепочки фильтров (лямбды на каждую кнопку, Command на каждую команду,
+пересекающиеся регулярные выражения) сообщение разбирается один раз и
+направляется нужному обработчику поиском в словарях:
+
+- текст кнопки меню -> BUTTONS
+- /команда или ее текстовый синоним ("статистика") -> COMMANDS
+- первое слово — сумма ("500 кофе", "-150 такси", "+1000 зарплата") -> транзакция
+- несколько строк, начинающихся с суммы -> пакет транзакций
+
+Обработчики регистрируются декораторами command, button и transaction_message в
+модулях bot.commands и bot.expense. Текст после слеш-команды разбирается здесь
+же (Route.args) и передается обработчику параметром args, если он его
+объявляет: async def cmd_list(message, args="").
+"""
+import inspect
+import re
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Set, Union
+
+from aiogram import Router
+from aiogram.types import Message
+
+from core.currency import CURRENCY_ALIASES
+
+# Обработчик сообщения: async def handler(message)
+MessageHandler = Callable[[Message], Awaitable[Any]]
+
+# Слеш-команды: "stats" -> обработчик
+COMMANDS: Dict[str, MessageHandler] = {}
+
+# Команды, обработчики которых принимают аргументы (параметр args)
+COMMANDS_WITH_ARGS: Set[str] = set()
+
+# Текстовые синонимы команд в нижнем регистре: "статистика" -> "stats"
+TEXT_ALIASES: Dict[str, str] = {}
+
+# Кнопки клавиатуры меню: точный текст кнопки -> обработчик
+BUTTONS: Dict[str, MessageHandler] = {}
+
+# Обработчики сообщений с суммой: "single" — одна транзакция,
+# "bulk" — несколько строк, по транзакции на строку
+TRANSACTION_HANDLERS: Dict[str, MessageHandler] = {}
+
+# Символы валют, которые пишут слитно с суммой: 20$, €20
+CURRENCY_SYMBOLS = re.escape("".join(
+    alias for alias in CURRENCY_ALIASES if len(alias) == 1 and not alias.isalpha()))
+
+# Первое слово сообщения о транзакции: сумма со знаком или без, символ
+# валюты до или после числа
+AMOUNT_TOKEN = re.compile(
+    rf'^[+-]?[{CURRENCY_SYMBOLS}]?\d+(?:[.,]\d+)?[{CURRENCY_SYMBOLS}]?$')
+
+
+class Route(NamedTuple):
+    """Результат классификации сообщения"""
+    kind: str  # "button", "command" или "transaction"
+    name: str  # имя команды, текст кнопки или вид транзакции
+    handler: MessageHandler
+    args: str  # текст после команды (для /list продукты — "продукты")
+
+
+def command(name: str, *aliases: str) -> Callable[[MessageHandler], MessageHandler]:
+    """
+    Регистрирует обработчик слеш-команды и ее текстовых синонимов
+
+    Args:
+        name: имя команды без "/"
+        aliases: текстовые синонимы ("статистика" для /stats)
+    """
+    def decorator(handler: MessageHandler) -> MessageHandler:
+        COMMANDS[name] = handler
+        if "args" in inspect.signature(handler).parameters:
+            COMMANDS_WITH_ARGS.add(name)
+        for alias in aliases:
+            TEXT_ALIASES[alias.lower()] = name
+        return handler
+    return decorator
+
+
+def button(text: str) -> Callable[[MessageHandler], MessageHandler]:
+    """
+    Регистрирует обработчик кнопки клавиатуры меню
+
+    Args:
+        text: точный текст кнопки
+    """
+    def decorator(handler: MessageHandler) -> MessageHandler:
+        BUTTONS[text] = handler
+        return handler
+    return decorator
+
+
+def transaction_message(kind: str = "single") -> Callable[[MessageHandler], MessageHandler]:
+    """
+    Регистрирует обработчик сообщений, начинающихся с суммы
+
+    Args:
+        kind: вид сообщения о транзакции
+    """
+    def decorator(handler: MessageHandler) -> MessageHandler:
+        TRANSACTION_HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def classify_message(text: str) -> Optional[Route]:
+    """
+    Определяет обработчик текстового сообщения за один разбор
+
+    Args:
+        text: текст сообщения
+
+    Returns:
+        Optional[Route]: маршрут или None, если сообщение не распознано
+    """
+    handler = BUTTONS.get(text)
+    if handler is not None:
+        return Route("button", text, handler, "")
+
+    # Разбиваем сообщение один раз: первое слово и остаток
+    parts = text.strip().split(maxsplit=1)
+    if not parts:
+        return None
+    first = parts[0]
+    rest = parts[1] if len(parts) > 1 else ""
+
+    if first.startswith("/"):
+        # /stats@finbot -> stats
+        name = first[1:].split("@", 1)[0].lower()
+        handler = COMMANDS.get(name)
+        return Route("command", name, handler, rest) if handler else None
+
+    if not rest:
+        name = TEXT_ALIASES.get(first.lower())
+        if name is not None:
+            return Route("command", name, COMMANDS[name], "")
+
+    if rest and AMOUNT_TOKEN.match(first):
+        kind = "bulk" if "\n" in rest.strip() else "single"
+        handler = TRANSACTION_HANDLERS.get(kind)
+        if handler is not None:
+            return Route("transaction", kind, handler, rest)
+
+    return None
+
+
+async def route_filter(message: Message) -> Union[bool, Dict[str, Route]]:
+    """Фильтр aiogram: классифицирует сообщение и передает маршрут обработчику"""
+    if not message.text:
+        return False
+    route = classify_message(message.text)
+    return {"route": route} if route is not None else False
+
+
+# Роутер с единственным обработчиком текстовых сообщений
+router = Router()
+
+
+@router.message(route_filter)
+async def dispatch_message(message: Message, route: Route):
+    """Вызывает обработчик, выбранный классификатором"""
+    if route.kind == "command" and route.name in COMMANDS_WITH_ARGS:
+        await route.handler(message, args=route.args)
+    else:
+        await route.handler(message)
@@ -0,0 +1,334 @@
+"""
+Очередь исходящих запросов к Telegram с ограничением частоты.
+
+Telegram ограничивает рассылку: около 30 сообщений в секунду на бота и
+примерно одно сообщение в секунду в один чат, а при превышении отвечает
+RetryAfter с паузой. Все отправки и правки сообщений проходят через одну
+очередь: ответы обработчиков попадают в нее через SendQueueMiddleware сессии
+бота, фоновые рассылки (сводки) — через send_queue.send.
+
+Очередь приоритетная: ответы пользователю (INTERACTIVE) отправляются раньше
+фоновых сообщений (BACKGROUND). Задачи очереди (SEND_WORKERS) перед
+запросом берут токен из ведра чата (SEND_CHAT_RATE с запасом
+SEND_CHAT_BURST) и из общего ведра (SEND_GLOBAL_RATE). Если чат исчерпал
+лимит, запрос откладывается до появления токена, а задача берет следующий,
+поэтому один чат не задерживает остальные. После RetryAfter вся очередь
+ждет указанное время и повторяет запрос, сетевые ошибки повторяются с
+растущей паузой (не больше SEND_MAX_RETRIES повторов). Обработчик получает
+ответ Telegram или исключение, как при прямом вызове.
+
+Фоновых сообщений в очереди не больше SEND_QUEUE_SIZE: рассылка ждет, пока
+освободится место, поэтому память не растет с числом получателей.
+
+Метрики: finbot_send_queue_depth{priority},
+finbot_send_latency_seconds{priority} (от постановки в очередь до ответа
+Telegram) и finbot_send_requests_total{priority,result}.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, NamedTuple, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import (TelegramForbiddenError, TelegramNetworkError,
+                                TelegramRetryAfter, TelegramServerError)
+from aiogram.methods import (EditMessageCaption, EditMessageReplyMarkup, EditMessageText,
+                             SendDocument, SendMediaGroup, SendMessage, SendPhoto)
+
+from config import settings
+from core.metrics import SEND_LATENCY, SEND_QUEUE_DEPTH, SEND_REQUESTS
+
+# Приоритеты: меньше — раньше
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Методы, на которые действуют лимиты сообщений Telegram
+LIMITED_METHODS = (SendMessage, SendPhoto, SendDocument, SendMediaGroup,
+                   EditMessageText, EditMessageReplyMarkup, EditMessageCaption)
+
+# Сколько ведер чатов держать, прежде чем удалять простаивающие
+MAX_CHAT_BUCKETS = 10000
+
+# Приоритет запросов текущей задачи (см. background_priority)
+send_priority: ContextVar[int] = ContextVar("send_priority", default=INTERACTIVE)
+
+# Запрос выполняет задача очереди: middleware пропускает его без очереди
+_in_worker: ContextVar[bool] = ContextVar("send_queue_worker", default=False)
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Запросы внутри блока уступают ответам пользователям (прогресс, уведомления)"""
+    token = send_priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+def should_queue(method: Any) -> bool:
+    """Запрос идет через очередь: отправка или правка сообщения в чате вне задач очереди"""
+    return (isinstance(method, LIMITED_METHODS) and getattr(method, "chat_id", None) is not None
+            and not _in_worker.get())
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """
+        Забирает токен, даже если его еще нет
+
+        Returns:
+            float: сколько секунд ждать, пока забранный токен появится
+        """
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        """Ведро полное: его можно удалить без потери ограничения"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class OutgoingRequest(NamedTuple):
+    """Запрос в очереди"""
+    priority: int
+    seq: int
+    chat_id: Union[int, str]
+    call: Callable[[], Awaitable[Any]]
+    # Ответ обработчику; у фоновых сообщений send() — None
+    future: Optional[asyncio.Future]
+    enqueued: float
+    # Токен чата уже взят: запрос откладывался до его появления
+    chat_ready: bool = False
+
+
+class SendQueue:
+    """Приоритетная очередь отправки с общим и чатовыми лимитами"""
+
+    def __init__(self, global_rate: Optional[float] = None,
+                 chat_rate: Optional[float] = None,
+                 chat_burst: Optional[int] = None,
+                 max_size: Optional[int] = None,
+                 workers: Optional[int] = None):
+        self.global_rate = global_rate or settings.SEND_GLOBAL_RATE
+        self.chat_rate = chat_rate or settings.SEND_CHAT_RATE
+        self.chat_burst = chat_burst or settings.SEND_CHAT_BURST
+        self.max_size = max_size or settings.SEND_QUEUE_SIZE
+        self.workers = workers or settings.SEND_WORKERS
+        self._bot: Optional[Bot] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: list = []
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._seq = itertools.count()
+        # Места для фоновых сообщений
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Незавершенные запросы, включая отложенные до токена чата
+        self._unfinished = 0
+        self._drained: Optional[asyncio.Event] = None
+        # До какого момента (time.monotonic) вся очередь ждет после RetryAfter
+        self._paused_until = 0.0
+
+        # Счетчики для логов и отчетов рассылки
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, bot: Bot) -> None:
+        """Запускает задачи отправки в текущем event loop"""
+        if self.running:
+            return
+        self._bot = bot
+        self._queue = asyncio.PriorityQueue()
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"send-queue-{index}")
+                       for index in range(self.workers)]
+        logging.info(f"Очередь отправки запущена ({self.global_rate:g} сообщений/с, "
+                     f"{self.chat_rate:g}/с в чат, {self.workers} задач)")
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Дожидается отправки очереди и останавливает задачи
+
+        Args:
+            timeout: сколько секунд ждать отправки; остаток очереди теряется
+        """
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Очередь отправки остановлена с {self._unfinished} "
+                            f"неотправленными сообщениями")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            _, _, request = self._queue.get_nowait()
+            if request.future is not None:
+                request.future.cancel()
+        logging.info(f"Очередь отправки остановлена: отправлено {self.sent}, "
+                     f"не доставлено {self.failed}, повторов {self.retried}")
+
+    async def send(self, chat_id: int, text: str, **kwargs: Any) -> None:
+        """
+        Ставит фоновое сообщение в очередь; ждет, если очередь заполнена
+
+        Args:
+            chat_id: чат получателя
+            text: текст сообщения
+            kwargs: остальные параметры bot.send_message (parse_mode и т.д.)
+        """
+        await self._slots.acquire()
+        self._put(BACKGROUND, chat_id,
+                  lambda: self._bot.send_message(chat_id, text, **kwargs))
+
+    async def request(self, call: Callable[[], Awaitable[Any]], chat_id: Union[int, str],
+                      priority: int = INTERACTIVE) -> Any:
+        """
+        Выполняет запрос к Telegram в порядке очереди
+
+        Returns:
+            Any: ответ Telegram; ошибки запроса пробрасываются вызывающему
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._put(priority, chat_id, call, future)
+        return await future
+
+    async def join(self) -> None:
+        """Ждет, пока будут отправлены все сообщения очереди"""
+        await self._drained.wait()
+
+    def _put(self, priority: int, chat_id: Union[int, str], call: Callable[[], Awaitable[Any]],
+             future: Optional[asyncio.Future] = None) -> None:
+        request = OutgoingRequest(priority, next(self._seq), chat_id, call, future,
+                                  time.monotonic())
+        self._unfinished += 1
+        self._drained.clear()
+        SEND_QUEUE_DEPTH.inc(PRIORITY_NAMES[priority])
+        self._queue.put_nowait((priority, request.seq, request))
+
+    def _finish(self, request: OutgoingRequest) -> None:
+        SEND_QUEUE_DEPTH.inc(PRIORITY_NAMES[request.priority], amount=-1)
+        if request.future is None:
+            self._slots.release()
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._drained.set()
+
+    def _chat_bucket(self, chat_id: Union[int, str], now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {key: value for key, value in self._chats.items()
+                               if not value.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _wait_turn(self) -> None:
+        """Ждет паузу после RetryAfter и токен общего ведра"""
+        now = time.monotonic()
+        if self._paused_until > now:
+            await asyncio.sleep(self._paused_until - now)
+            now = time.monotonic()
+        delay = self._global.reserve(now)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _worker(self) -> None:
+        _in_worker.set(True)
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, request = await self._queue.get()
+            if request.future is not None and request.future.done():
+                # Обработчик отменен, пока запрос ждал очереди
+                self._finish(request)
+                continue
+            if not request.chat_ready:
+                now = time.monotonic()
+                delay = self._chat_bucket(request.chat_id, now).reserve(now)
+                if delay > 0:
+                    # Чат исчерпал лимит: запрос вернется в очередь, когда
+                    # появится его токен, а задача берет следующий
+                    loop.call_later(delay, self._queue.put_nowait,
+                                    (request.priority, request.seq,
+                                     request._replace(chat_ready=True)))
+                    continue
+            try:
+                await self._deliver(request)
+            finally:
+                self._finish(request)
+
+    async def _deliver(self, request: OutgoingRequest) -> None:
+        """Выполняет запрос, повторяя после RetryAfter и сетевых ошибок"""
+        priority = PRIORITY_NAMES[request.priority]
+        error: Optional[Exception] = None
+        for attempt in range(settings.SEND_MAX_RETRIES + 1):
+            await self._wait_turn()
+            try:
+                result = await request.call()
+            except TelegramRetryAfter as e:
+                # Лимит превышен: вся очередь ждет, сколько попросил Telegram
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                SEND_REQUESTS.inc(priority, "retry_after")
+                logging.warning(f"Telegram просит подождать {e.retry_after} с")
+                error = e
+            except (TelegramNetworkError, TelegramServerError) as e:
+                SEND_REQUESTS.inc(priority, "network_error")
+                logging.warning(f"Ошибка запроса в чат {request.chat_id}: {e}")
+                error = e
+                if attempt < settings.SEND_MAX_RETRIES:
+                    await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                # Бот заблокирован, чат недоступен или запрос неверный — повтор не поможет
+                self._fail(request, priority, e)
+                return
+            else:
+                self.sent += 1
+                SEND_REQUESTS.inc(priority, "sent")
+                SEND_LATENCY.observe(time.monotonic() - request.enqueued, priority)
+                if request.future is not None and not request.future.done():
+                    request.future.set_result(result)
+                return
+            if attempt < settings.SEND_MAX_RETRIES:
+                self.retried += 1
+        self._fail(request, priority, error)
+
+    def _fail(self, request: OutgoingRequest, priority: str, error: Exception) -> None:
+        self.failed += 1
+        SEND_REQUESTS.inc(priority, "failed")
+        if request.future is not None:
+            if not request.future.done():
+                request.future.set_exception(error)
+        elif isinstance(error, TelegramForbiddenError):
+            logging.info(f"Сообщение в чат {request.chat_id} не доставлено: {error}")
+        else:
+            logging.error(f"Сообщение в чат {request.chat_id} не доставлено: {error}")
+
+
+# Общая очередь отправки приложения; запускается в main.py
+send_queue = SendQueue()
@@ -16,6 +16,176 @@ class Settings(BaseSettings):
     DB_PATH: str = Field(default="sqlite:///finbot.db",
                          description="Путь к базе данных SQLite")
 
+    # Сколько миллисекунд SQLite ждет освобождения блокировки записи
+    DB_BUSY_TIMEOUT_MS: int = Field(default=5000,
+                                    description="Таймаут ожидания блокировки SQLite, мс")
+
+    # Групповая запись: коммит после N операций или через T миллисекунд
+    WRITE_BATCH_SIZE: int = Field(default=64,
+                                  description="Максимум операций в одном коммите")
+    WRITE_BATCH_DELAY_MS: int = Field(default=5,
+                                      description="Сколько ждать добора группы, мс")
+
+    # Графики /stats: число процессов отрисовки и размер кэша PNG
+    CHART_WORKERS: int = Field(default=1,
+                               description="Процессов для отрисовки графиков")
+    CHART_CACHE_SIZE: int = Field(default=256,
+                                  description="Сколько графиков держать в кэше")
+    # Кэш готовых текстов /stats, /summary и /categories
+    REPORT_CACHE_SIZE: int = Field(default=2048,
+                                   description="Сколько отчетов держать в кэше")
+
+    # Бюджет времени старта (от запуска процесса до первого обработанного
+    # обновления); проверяется тестом tests/test_startup.py
+    STARTUP_BUDGET_MS: int = Field(default=4000,
+                                   description="Допустимое время старта бота, мс")
+
+    # OpenAI-совместимый API для категоризации и советов: адрес, таймаут
+    # запроса и число повторов клиента (в том числе после 429). Для
+    # прогонов без сети — локальная заглушка benchmarks.mock_llm
+    LLM_BASE_URL: str = Field(default="https://openrouter.ai/api/v1",
+                              description="Адрес OpenAI-совместимого API")
+    LLM_TIMEOUT: float = Field(default=30.0,
+                               description="Таймаут запроса к LLM, с")
+    LLM_MAX_RETRIES: int = Field(default=2,
+                                 description="Повторов запроса к LLM после ошибки")
+
+    # Курсы валют (core.currency): CSV "дата,валюта,курс к рублю" и адрес,
+    # откуда его обновлять раз в RATES_REFRESH_HOURS (пусто — не обновлять)
+    RATES_PATH: str = Field(default="rates.csv",
+                            description="Файл дневных курсов валют")
+    RATES_URL: str = Field(default="",
+                           description="Адрес CSV курсов для обновления (пусто — только файл)")
+    RATES_REFRESH_HOURS: int = Field(default=24,
+                                     description="Как часто обновлять курсы из RATES_URL, часов")
+
+    # Бюджеты категорий: пороги уведомлений в процентах от месячного бюджета
+    BUDGET_ALERT_THRESHOLDS: str = Field(default="80,100",
+                                         description="Пороги уведомлений о бюджете, % через запятую")
+
+    # Сводки (core.digest): ежедневная за вчера и еженедельная (по
+    # понедельникам) за прошлую неделю в DIGEST_HOUR часов; пользователи
+    # обрабатываются пачками по DIGEST_BATCH_USERS
+    DIGEST_DAILY: bool = Field(default=True,
+                               description="Рассылать ежедневную сводку")
+    DIGEST_WEEKLY: bool = Field(default=True,
+                                description="Рассылать еженедельную сводку")
+    DIGEST_HOUR: int = Field(default=9,
+                             description="Час рассылки сводок")
+    DIGEST_BATCH_USERS: int = Field(default=2000,
+                                    description="Пользователей в одной пачке расчета сводок")
+
+    # Очередь исходящих сообщений (bot.sender): общий лимит Telegram и лимит
+    # на чат (сообщений в секунду, запас для коротких всплесков), размер
+    # очереди, число одновременных запросов и повторы после ошибок
+    SEND_GLOBAL_RATE: float = Field(default=25.0,
+                                    description="Сообщений в секунду на всех")
+    SEND_CHAT_RATE: float = Field(default=1.0,
+                                  description="Сообщений в секунду в один чат")
+    SEND_CHAT_BURST: int = Field(default=3,
+                                 description="Сообщений подряд в один чат без ожидания")
+    SEND_QUEUE_SIZE: int = Field(default=1000,
+                                 description="Сообщений в очереди до ожидания отправителя")
+    SEND_WORKERS: int = Field(default=8,
+                              description="Одновременных запросов отправки")
+    SEND_MAX_RETRIES: int = Field(default=3,
+                                  description="Повторов отправки после RetryAfter и сетевых ошибок")
+
+    # Пакетная категоризация: сколько описаний отправлять в LLM одним запросом
+    LLM_BATCH_SIZE: int = Field(default=40,
+                                description="Описаний в одном запросе к LLM")
+
+    # Многострочный ввод: максимум строк-транзакций в одном сообщении
+    BULK_MAX_LINES: int = Field(default=100,
+                                description="Максимум транзакций в одном сообщении")
+
+    # Импорт выписок: строк в одной пакетной вставке, максимальный размер
+    # файла, сколько уникальных описаний отправлять в LLM и сколько импортов
+    # выполнять одновременно
+    IMPORT_CHUNK_SIZE: int = Field(default=5000,
+                                   description="Строк выписки в одной вставке")
+    IMPORT_MAX_FILE_MB: int = Field(default=20,
+                                    description="Максимальный размер выписки, МБ")
+    IMPORT_LLM_LIMIT: int = Field(default=200,
+                                  description="Описаний выписки для категоризации через LLM")
+    IMPORT_CONCURRENCY: int = Field(default=2,
+                                    description="Одновременных импортов выписок")
+
+    # Выгрузка /export: строк в пачке при чтении из базы и сколько мегабайт
+    # держать в памяти, прежде чем переливать файл на диск
+    EXPORT_BATCH_SIZE: int = Field(default=2000,
+                                   description="Строк в пачке при выгрузке")
+    EXPORT_SPOOL_MB: int = Field(default=8,
+                                 description="Размер выгрузки в памяти до записи на диск, МБ")
+
+    # Архив: транзакции старше ARCHIVE_AFTER_MONTHS месяцев переносятся в
+    # подключенную базу архива (по умолчанию рядом с основной:
+    # finbot.db -> finbot_archive.db) раз в ARCHIVE_INTERVAL_HOURS часов
+    ARCHIVE_AFTER_MONTHS: int = Field(default=12,
+                                      description="Горизонт архива, месяцев")
+    ARCHIVE_DB_PATH: str = Field(default="",
+                                 description="Файл базы архива (пусто — рядом с основной)")
+    ARCHIVE_INTERVAL_HOURS: int = Field(default=24,
+                                        description="Как часто переносить в архив, часов (0 — не переносить)")
+    ARCHIVE_BATCH_SIZE: int = Field(default=2000,
+                                    description="Строк в одной транзакции переноса")
+
+    # Резервные копии: каталог, период, сколько хранить, сжатие и размер шага
+    # онлайн-копирования (страниц) с паузой между шагами
+    BACKUP_DIR: str = Field(default="backups",
+                            description="Каталог резервных копий")
+    BACKUP_INTERVAL_HOURS: int = Field(default=24,
+                                       description="Как часто снимать копию, часов (0 — не снимать)")
+    BACKUP_KEEP: int = Field(default=7,
+                             description="Сколько последних копий хранить")
+    BACKUP_COMPRESS: bool = Field(default=True,
+                                  description="Сжимать копии gzip")
+    BACKUP_PAGES_PER_STEP: int = Field(default=1024,
+                                       description="Страниц базы за один шаг копирования")
+    BACKUP_STEP_SLEEP_MS: int = Field(default=10,
+                                      description="Пауза между шагами копирования, мс")
+    BACKUP_MAX_RESTARTS: int = Field(default=3,
+                                     description="Перезапусков постраничного копирования до копии одним шагом")
+
+    # Обслуживание базы (core.maintenance): строк в одной пачке удаления
+    MAINTENANCE_BATCH_SIZE: int = Field(default=5000,
+                                        description="Строк в одной пачке удаления при обслуживании")
+
+    # Логирование: файл (JSON-строки в UTF-8), ротация по размеру или по
+    # времени (LOG_ROTATE_WHEN, например "midnight"), выборка частых
+    # INFO-записей и порог медленного обновления
+    LOG_PATH: str = Field(default="finbot.log",
+                          description="Файл лога")
+    LOG_MAX_MB: int = Field(default=10,
+                            description="Размер файла лога до ротации, МБ")
+    LOG_ROTATE_WHEN: str = Field(default="",
+                                 description="Ротация по времени (midnight, H, D); пусто — по размеру")
+    LOG_BACKUP_COUNT: int = Field(default=5,
+                                  description="Сколько старых файлов лога хранить")
+    LOG_SAMPLE_EVERY: int = Field(default=10,
+                                  description="Писать одну из N INFO-записей об обновлениях")
+    LOG_SLOW_UPDATE_MS: int = Field(default=1000,
+                                    description="Обновление дольше стольких мс логируется как WARNING")
+
+    # Метрики Prometheus (core.metrics): страница /metrics встроенного
+    # HTTP-сервера; METRICS_PORT=0 — сервер не запускается, но метрики
+    # по-прежнему собираются
+    METRICS_HOST: str = Field(default="127.0.0.1",
+                              description="Адрес HTTP-сервера метрик")
+    METRICS_PORT: int = Field(default=9108,
+                              description="Порт HTTP-сервера метрик (0 — выключен)")
+    METRICS_LOOP_LAG_INTERVAL: float = Field(default=0.5,
+                                             description="Интервал замера задержки event loop, с")
+
+    # Трассировка обновлений (core.tracing): дерево SQL, LLM и запросов к
+    # Telegram; обновления дольше порога пишутся в лог с полным деревом
+    TRACE_ENABLED: bool = Field(default=True,
+                                description="Строить дерево интервалов для каждого обновления")
+    TRACE_SLOW_UPDATE_MS: int = Field(default=1000,
+                                      description="Обновление дольше стольких мс логируется с деревом")
+    TRACE_MAX_SPANS: int = Field(default=500,
+                                 description="Наибольшее число интервалов в дереве одного обновления")
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -0,0 +1,371 @@
+"""
+Архив старых транзакций (горячие и холодные данные).
+
+Почти все запросы бота читают текущий и прошлый месяц, поэтому транзакции
+старше ARCHIVE_AFTER_MONTHS переносятся из основной таблицы в подключенную
+(ATTACH) базу архива: индексы и рабочий набор основной базы перестают расти
+вместе с историей пользователей.
+
+Перенесенные строки сохраняют свой id, поэтому курсоры /list и ссылки на
+транзакции продолжают работать; transactions объявлена с AUTOINCREMENT, и id
+архивных строк не выдаются новым. /list, /search и /export объединяют обе
+таблицы, только когда у пользователя есть архивные строки в запрошенном
+периоде; остальные запросы читают одну основную таблицу, как раньше.
+
+Запуск вручную:
+    python -m core.archive --months 12
+"""
+import argparse
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, List, NamedTuple, Optional
+from weakref import WeakSet
+
+from sqlalchemy import (Column, DateTime, Float, Index, Integer, MetaData, String,
+                        Table, Text, event, func, select, text)
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.schema import CreateTable
+
+from config import settings
+from core.models import Transaction
+
+if TYPE_CHECKING:
+    from core.writer import WriteQueue
+
+# Схема, под которой база архива подключается к основной
+ARCHIVE_SCHEMA = "archive"
+
+# /stats и /summary читают текущий и прошлый месяц только из основной таблицы
+MIN_ARCHIVE_MONTHS = 2
+
+archive_metadata = MetaData()
+
+# Та же структура, что у transactions, но без внешних ключей: SQLite не
+# проверяет ссылки между разными файлами баз
+archived_transactions = Table(
+    "transactions", archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer),
+    Column("amount", Float, nullable=False),
+    Column("original_amount", Float, nullable=True),
+    Column("currency", String(3)),
+    Column("category_id", Integer, nullable=True),
+    Column("description", Text, nullable=True),
+    Column("transaction_date", DateTime),
+    Column("created_at", DateTime),
+    Column("is_expense", Integer),
+    Column("mentioned_user", String(100), nullable=True),
+    Index("ix_archive_transactions_user_date", "user_id", "transaction_date", "id"),
+    schema=ARCHIVE_SCHEMA,
+)
+
+# Колонки переноса в порядке таблицы
+ARCHIVE_COLUMNS = ", ".join(column.name for column in archived_transactions.columns)
+
+# Движки, к соединениям которых подключен архив
+_attached_engines: "WeakSet[Engine]" = WeakSet()
+
+
+class ArchiveResult(NamedTuple):
+    """Итог переноса в архив"""
+    moved: int
+    cutoff: datetime
+    elapsed: float
+
+
+def default_archive_path(db_url: str) -> Optional[str]:
+    """
+    Путь к файлу архива рядом с основной базой: finbot.db -> finbot_archive.db
+
+    Returns:
+        Optional[str]: путь или None для баз в памяти и не-SQLite
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    path = Path(url.database)
+    return str(path.with_name(f"{path.stem}_archive{path.suffix or '.db'}"))
+
+
+def attach_archive(engine: Engine, path: Optional[str] = None) -> bool:
+    """
+    Подключает базу архива ко всем соединениям движка и создает таблицу
+
+    Вызывается до первого использования движка (в init_db); открытые
+    соединения пула закрываются, чтобы новые получили ATTACH.
+
+    Args:
+        engine: движок основной базы
+        path: файл архива (по умолчанию ARCHIVE_DB_PATH или рядом с основной)
+
+    Returns:
+        bool: подключен ли архив
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    path = path or settings.ARCHIVE_DB_PATH or default_archive_path(str(engine.url))
+    if not path:
+        return False
+    if engine in _attached_engines:
+        return True
+
+    @event.listens_for(engine, "connect")
+    def _attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+        cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL")
+        cursor.close()
+
+    engine.dispose()
+    archive_metadata.create_all(engine)
+    _attached_engines.add(engine)
+    logging.info(f"Архив транзакций подключен: {path}")
+    return True
+
+
+def is_attached(db: Session) -> bool:
+    """Подключен ли архив к базе сессии"""
+    return db.get_bind() in _attached_engines
+
+
+def archive_entity(db: Session):
+    """
+    Сущность Transaction поверх таблицы архива для запросов ORM
+
+    Строки архива загружаются как обычные Transaction (id не пересекаются).
+
+    Returns:
+        aliased Transaction или None, если архив не подключен
+    """
+    if not is_attached(db):
+        return None
+    return aliased(Transaction, archived_transactions, adapt_on_names=True)
+
+
+def archive_boundary(db: Session, user_id: int) -> Optional[datetime]:
+    """
+    Дата самой новой архивной транзакции пользователя
+
+    Один поиск по индексу; по нему запросы решают, нужен ли архив.
+
+    Returns:
+        Optional[datetime]: дата или None, если архивных строк нет
+    """
+    if not is_attached(db):
+        return None
+    return db.execute(
+        select(func.max(archived_transactions.c.transaction_date))
+        .where(archived_transactions.c.user_id == user_id)
+    ).scalar()
+
+
+def archive_cutoff(months: int, now: Optional[datetime] = None) -> datetime:
+    """
+    Граница архива: начало месяца, отстоящего на months от текущего
+
+    Returns:
+        datetime: транзакции раньше этой даты переносятся в архив
+    """
+    months = max(months, MIN_ARCHIVE_MONTHS)
+    now = now or datetime.now()
+    index = now.year * 12 + now.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def archive_batch(cutoff: datetime, batch_size: int) -> Callable[[Session], int]:
+    """
+    Операция записи: переносит в архив одну пачку транзакций старше cutoff
+
+    В WAL-режиме коммит по нескольким файлам не атомарен как целое, поэтому
+    вставка в архив идемпотентна (INSERT OR IGNORE по id): если процесс
+    прервался между вставкой и удалением, повторный запуск дочистит основную
+    таблицу. Строка, чей id в архиве занят другими данными, не теряется:
+    пачка откатывается с ошибкой.
+
+    Args:
+        cutoff: граница архива
+        batch_size: строк в пачке
+
+    Returns:
+        операция для WriteQueue, возвращающая число перенесенных строк
+    """
+    def op(db: Session) -> int:
+        if not is_attached(db):
+            raise RuntimeError("Архив доступен только для файловой базы SQLite")
+        ids: List[int] = list(db.execute(text(
+            "SELECT id FROM main.transactions WHERE transaction_date < :cutoff "
+            "ORDER BY id LIMIT :limit"
+        ), {"cutoff": cutoff, "limit": batch_size}).scalars())
+        if not ids:
+            return 0
+
+        params = {f"id{i}": row_id for i, row_id in enumerate(ids)}
+        placeholders = ", ".join(f":{name}" for name in params)
+        inserted = db.execute(text(
+            f"INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.transactions ({ARCHIVE_COLUMNS}) "
+            f"SELECT {ARCHIVE_COLUMNS} FROM main.transactions WHERE id IN ({placeholders})"
+        ), params).rowcount
+        if inserted != len(ids):
+            # Пропущенные строки должны уже лежать в архиве без изменений
+            conflicts = db.execute(text(
+                f"SELECT id FROM (SELECT {ARCHIVE_COLUMNS} FROM main.transactions "
+                f"WHERE id IN ({placeholders}) EXCEPT SELECT {ARCHIVE_COLUMNS} "
+                f"FROM {ARCHIVE_SCHEMA}.transactions WHERE id IN ({placeholders}))"
+            ), params).scalars().all()
+            if conflicts:
+                raise RuntimeError(f"id транзакций уже заняты в архиве: {conflicts[:10]}")
+        db.execute(text(
+            f"DELETE FROM main.transactions WHERE id IN ({placeholders})"
+        ), params)
+        return len(ids)
+    return op
+
+
+def archive_transactions(engine: Engine, months: Optional[int] = None,
+                         batch_size: Optional[int] = None,
+                         now: Optional[datetime] = None) -> ArchiveResult:
+    """
+    Переносит транзакции старше горизонта в архив пачками (скрипты и тесты)
+
+    Каждая пачка — отдельная короткая транзакция. Бот переносит пачки
+    через очередь записи (archive_queued), а не этой функцией.
+
+    Args:
+        engine: движок основной базы с подключенным архивом
+        months: горизонт в месяцах (по умолчанию ARCHIVE_AFTER_MONTHS)
+        batch_size: строк в пачке (по умолчанию ARCHIVE_BATCH_SIZE)
+        now: текущая дата (для тестов)
+
+    Returns:
+        ArchiveResult: сколько строк перенесено, граница и время
+    """
+    if engine not in _attached_engines and not attach_archive(engine):
+        raise RuntimeError("Архив доступен только для файловой базы SQLite")
+
+    start = time.perf_counter()
+    cutoff = archive_cutoff(months or settings.ARCHIVE_AFTER_MONTHS, now)
+    op = archive_batch(cutoff, batch_size or settings.ARCHIVE_BATCH_SIZE)
+    moved = 0
+    while True:
+        with Session(engine) as db, db.begin():
+            count = op(db)
+        if not count:
+            break
+        moved += count
+    return _archive_result(moved, cutoff, start)
+
+
+async def archive_queued(queue: "WriteQueue", months: Optional[int] = None,
+                         batch_size: Optional[int] = None) -> ArchiveResult:
+    """
+    Переносит старые транзакции пачками через очередь записи бота
+
+    Пачки фиксируются единственным писателем вместе с остальными записями,
+    поэтому перенос не соперничает с обработчиками за блокировку базы.
+
+    Args:
+        queue: запущенная очередь записи
+        months: горизонт в месяцах (по умолчанию ARCHIVE_AFTER_MONTHS)
+        batch_size: строк в пачке (по умолчанию ARCHIVE_BATCH_SIZE)
+
+    Returns:
+        ArchiveResult: сколько строк перенесено, граница и время
+    """
+    start = time.perf_counter()
+    cutoff = archive_cutoff(months or settings.ARCHIVE_AFTER_MONTHS)
+    op = archive_batch(cutoff, batch_size or settings.ARCHIVE_BATCH_SIZE)
+    moved = 0
+    while True:
+        count = await queue.submit(op)
+        if not count:
+            break
+        moved += count
+    return _archive_result(moved, cutoff, start)
+
+
+def _archive_result(moved: int, cutoff: datetime, start: float) -> ArchiveResult:
+    """Логирует и возвращает итог переноса"""
+    elapsed = time.perf_counter() - start
+    if moved:
+        logging.info(f"В архив перенесено {moved} транзакций старше "
+                     f"{cutoff:%d.%m.%Y} за {elapsed:.1f} с")
+    return ArchiveResult(moved, cutoff, elapsed)
+
+
+def enable_autoincrement(engine: Engine) -> bool:
+    """
+    Миграция: пересоздает transactions с AUTOINCREMENT
+
+    Без AUTOINCREMENT SQLite выдает новым строкам max(id) + 1, и после
+    переноса или удаления последних строк id архивной транзакции мог бы
+    достаться новой. Счетчик sqlite_sequence поднимается до максимального
+    id основной таблицы и архива. Строки сохраняют свои id, поэтому
+    полнотекстовый индекс остается верным; его триггеры пересоздает
+    ensure_search_index.
+
+    Returns:
+        bool: была ли таблица пересоздана
+    """
+    table = Transaction.__table__
+    with engine.begin() as conn:
+        sql = conn.execute(text(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = :name"
+        ), {"name": table.name}).scalar() or ""
+        rebuilt = "AUTOINCREMENT" not in sql.upper()
+        if rebuilt:
+            columns = ", ".join(column.name for column in table.columns)
+            new_name = f"{table.name}_new"
+            ddl = str(CreateTable(table).compile(conn)).replace(
+                f"CREATE TABLE {table.name} ", f"CREATE TABLE {new_name} ", 1)
+            conn.execute(text(ddl))
+            conn.execute(text(f"INSERT INTO {new_name} ({columns}) "
+                              f"SELECT {columns} FROM {table.name}"))
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {new_name} RENAME TO {table.name}"))
+            for index in table.indexes:
+                index.create(conn)
+
+        top = conn.execute(text("SELECT max(id) FROM main.transactions")).scalar() or 0
+        schemas = {row[1] for row in conn.execute(text("PRAGMA database_list"))}
+        if ARCHIVE_SCHEMA in schemas:
+            top = max(top, conn.execute(text(
+                f"SELECT max(id) FROM {ARCHIVE_SCHEMA}.transactions")).scalar() or 0)
+        seq = conn.execute(text(
+            "SELECT seq FROM main.sqlite_sequence WHERE name = :name"
+        ), {"name": table.name}).scalar()
+        if seq is None:
+            conn.execute(text("INSERT INTO main.sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                         {"name": table.name, "seq": top})
+        elif seq < top:
+            conn.execute(text("UPDATE main.sqlite_sequence SET seq = :seq WHERE name = :name"),
+                         {"name": table.name, "seq": top})
+    if rebuilt:
+        logging.info("Таблица transactions пересоздана с AUTOINCREMENT")
+    return rebuilt
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Перенос старых транзакций в архив")
+    parser.add_argument("--months", type=int, default=settings.ARCHIVE_AFTER_MONTHS,
+                        help="Переносить транзакции старше стольких месяцев")
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                        help="Строк в одной транзакции переноса")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    # При запуске через -m этот файл — модуль __main__, а init_db подключает
+    # архив через core.archive; берем функции оттуда же
+    from core import archive
+    from core.db import engine, init_db
+    init_db()
+    result = archive.archive_transactions(engine, args.months, args.batch_size)
+    print(f"Перенесено {result.moved} транзакций старше {result.cutoff:%d.%m.%Y} "
+          f"за {result.elapsed:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Резервные копии базы через онлайн-API резервного копирования SQLite.
+
+Копия снимается страницами по BACKUP_PAGES_PER_STEP с паузой между шагами,
+поэтому бот продолжает читать и писать во время копирования, а память не
+растет с размером базы. Копия согласована: если другой процесс меняет базу
+во время копирования, SQLite начинает копирование заново; после
+BACKUP_MAX_RESTARTS перезапусков копия снимается одним шагом (в WAL-режиме
+это одно чтение, которое не блокирует писателей).
+
+Копии называются <база>-ГГГГММДД_ЧЧММСС.db[.gz], хранятся в BACKUP_DIR и
+ротируются: остаются BACKUP_KEEP последних для каждой базы (основной и архива).
+
+Запуск вручную:
+    python -m core.backup create
+    python -m core.backup list
+    python -m core.backup verify backups/finbot-20250712_151057.db.gz
+"""
+import argparse
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy.engine import make_url
+
+from config import settings
+from core.archive import default_archive_path
+
+# Формат метки времени в имени копии
+STAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+
+class BackupResult(NamedTuple):
+    """Итог снятия копии"""
+    path: Path
+    size: int
+    pages: int
+    restarts: int
+    elapsed: float
+
+
+class VerifyResult(NamedTuple):
+    """Итог проверки копии"""
+    ok: bool
+    messages: List[str]  # ответ PRAGMA integrity_check
+    tables: Dict[str, int]  # строк в каждой таблице
+    elapsed: float
+
+
+class BackupRestarted(Exception):
+    """Копирование постранично перезапускалось слишком часто"""
+
+
+def database_path(db_url: Optional[str] = None) -> Optional[str]:
+    """
+    Путь к файлу SQLite из URL базы (по умолчанию DB_PATH)
+
+    Returns:
+        Optional[str]: путь или None для баз в памяти и не-SQLite
+    """
+    url = make_url(db_url or settings.DB_PATH)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+
+def _copy_pages(source: sqlite3.Connection, target: sqlite3.Connection,
+                pages: int, sleep: float, max_restarts: int) -> tuple:
+    """Копирует базу шагами; возвращает (страниц, перезапусков)"""
+    state = {"total": 0, "remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        # Оставшихся страниц стало больше — источник изменился, копирование
+        # началось заново
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise BackupRestarted()
+        state["remaining"], state["total"] = remaining, total
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=sleep)
+    except BackupRestarted:
+        logging.warning("База меняется слишком часто, копия снимается одним шагом")
+        source.backup(target)
+    return state["total"], state["restarts"]
+
+
+def backup_database(source_path: str, backup_dir: Optional[str] = None,
+                    compress: Optional[bool] = None,
+                    now: Optional[datetime] = None) -> BackupResult:
+    """
+    Снимает согласованную копию работающей базы
+
+    Копия пишется во временный файл в каталоге копий и переименовывается
+    после завершения, поэтому в каталоге не бывает недописанных копий.
+
+    Args:
+        source_path: файл базы
+        backup_dir: каталог копий (по умолчанию BACKUP_DIR)
+        compress: сжимать ли копию gzip (по умолчанию BACKUP_COMPRESS)
+        now: время в имени копии (для тестов)
+
+    Returns:
+        BackupResult: путь и размер копии, страниц, перезапусков и время
+    """
+    start = time.perf_counter()
+    backup_dir = Path(backup_dir or settings.BACKUP_DIR)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    compress = settings.BACKUP_COMPRESS if compress is None else compress
+
+    stem = Path(source_path).stem
+    name = f"{stem}-{(now or datetime.now()).strftime(STAMP_FORMAT)}.db"
+    fd, temp_path = tempfile.mkstemp(prefix=f".{stem}-", suffix=".tmp", dir=backup_dir)
+    os.close(fd)
+    try:
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+        target = sqlite3.connect(temp_path)
+        try:
+            pages, restarts = _copy_pages(
+                source, target, settings.BACKUP_PAGES_PER_STEP,
+                settings.BACKUP_STEP_SLEEP_MS / 1000, settings.BACKUP_MAX_RESTARTS)
+            # Копия самодостаточна: один файл без журнала WAL
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.close()
+
+        if compress:
+            name += ".gz"
+            compressed_path = f"{temp_path}.gz"
+            with open(temp_path, "rb") as raw, gzip.open(compressed_path, "wb", compresslevel=6) as packed:
+                shutil.copyfileobj(raw, packed, length=1024 * 1024)
+            os.replace(compressed_path, temp_path)
+
+        path = backup_dir / name
+        os.replace(temp_path, path)
+    except BaseException:
+        for leftover in (temp_path, f"{temp_path}.gz"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+    elapsed = time.perf_counter() - start
+    size = path.stat().st_size
+    logging.info(f"Резервная копия {path} ({size / 1024 / 1024:.1f} МБ, {pages} страниц) "
+                 f"за {elapsed:.1f} с")
+    return BackupResult(path, size, pages, restarts, elapsed)
+
+
+def list_backups(stem: str, backup_dir: Optional[str] = None) -> List[Path]:
+    """Копии базы от новых к старым"""
+    backup_dir = Path(backup_dir or settings.BACKUP_DIR)
+    if not backup_dir.is_dir():
+        return []
+    return sorted(
+        (path for pattern in (f"{stem}-*.db", f"{stem}-*.db.gz")
+         for path in backup_dir.glob(pattern)),
+        key=lambda path: path.name, reverse=True)
+
+
+def rotate_backups(stem: str, keep: Optional[int] = None,
+                   backup_dir: Optional[str] = None) -> List[Path]:
+    """
+    Удаляет старые копии базы, оставляя keep последних
+
+    Returns:
+        List[Path]: удаленные файлы
+    """
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    removed = list_backups(stem, backup_dir)[keep:]
+    for path in removed:
+        path.unlink()
+        logging.info(f"Удалена старая резервная копия {path}")
+    return removed
+
+
+def run_backup(db_url: Optional[str] = None) -> List[BackupResult]:
+    """
+    Снимает копии основной базы и архива и ротирует старые
+
+    Выполняется в рабочем потоке: копирование не блокирует event loop.
+
+    Returns:
+        List[BackupResult]: копии по базам
+    """
+    source = database_path(db_url)
+    if source is None:
+        logging.warning("Резервное копирование доступно только для файловой базы SQLite")
+        return []
+
+    sources = [source]
+    archive = settings.ARCHIVE_DB_PATH or default_archive_path(db_url or settings.DB_PATH)
+    if archive and os.path.exists(archive):
+        sources.append(archive)
+
+    now = datetime.now()
+    results = []
+    for path in sources:
+        results.append(backup_database(path, now=now))
+        rotate_backups(Path(path).stem)
+    return results
+
+
+def verify_backup(path: str) -> VerifyResult:
+    """
+    Проверяет, что из копии можно восстановиться
+
+    Сжатая копия распаковывается во временный файл; копия открывается только
+    на чтение, проверяется PRAGMA integrity_check и считаются строки таблиц.
+
+    Returns:
+        VerifyResult: прошла ли проверка, ответ integrity_check, строки таблиц
+    """
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        database = path
+        if path.endswith(".gz"):
+            database = os.path.join(tmp, "restore.db")
+            try:
+                with gzip.open(path, "rb") as packed, open(database, "wb") as raw:
+                    shutil.copyfileobj(packed, raw, length=1024 * 1024)
+            except (OSError, EOFError) as e:
+                return VerifyResult(False, [f"архив поврежден: {e}"], {},
+                                    time.perf_counter() - start)
+
+        conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+        try:
+            messages = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            tables = {
+                name: conn.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+                for name, in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' "
+                    "AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL%' "
+                    "AND name NOT LIKE '%_fts_%' ORDER BY name")
+            }
+        except sqlite3.DatabaseError as e:
+            messages, tables = [str(e)], {}
+        finally:
+            conn.close()
+
+    return VerifyResult(messages == ["ok"], messages, tables, time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Резервные копии базы")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="Снять копию основной базы и архива")
+    commands.add_parser("list", help="Показать копии")
+    verify = commands.add_parser("verify", help="Проверить копию (integrity_check)")
+    verify.add_argument("path", help="Файл копии (.db или .db.gz)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "create":
+        for result in run_backup():
+            print(f"{result.path}: {result.size / 1024 / 1024:.1f} МБ, "
+                  f"{result.pages} страниц, {result.elapsed:.1f} с")
+    elif args.command == "list":
+        source = database_path()
+        archive = settings.ARCHIVE_DB_PATH or (default_archive_path(settings.DB_PATH) or "")
+        for stem in {Path(path).stem for path in (source, archive) if path}:
+            for path in list_backups(stem):
+                print(f"{path}  {path.stat().st_size / 1024 / 1024:.1f} МБ")
+    else:
+        result = verify_backup(args.path)
+        for name, count in result.tables.items():
+            print(f"{name:<24}{count:>12}")
+        print(f"integrity_check: {'; '.join(result.messages)} ({result.elapsed:.1f} с)")
+        raise SystemExit(0 if result.ok else 1)
+
+
+if __name__ == "__main__":
+    main()
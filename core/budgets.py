@@ -0,0 +1,271 @@
+"""
+Месячные бюджеты категорий.
+
+Для каждой категории с бюджетом ведется счетчик расходов за месяц
+(budget_spending) и его копия в памяти процесса. Запись расхода прибавляет
+сумму к счетчику и сравнивает его с бюджетом — без запросов к транзакциям,
+поэтому уведомления о порогах (BUDGET_ALERT_THRESHOLDS, по умолчанию 80% и
+100%) ничего не стоят отчетам. Транзакции суммируются только однажды, когда
+счетчика категории за месяц еще нет.
+
+Все функции вызываются внутри операций очереди записи. Копия в памяти
+меняется только после коммита сессии: если группа откатилась и операции
+повторяются по одной, счетчики не учитываются дважды.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from core.currency import currency_column, rate_day_column, rates
+from core.models import Budget, BudgetSpending, Transaction
+from core.writer import WriteOp
+
+# Ключ счетчика: (ID пользователя, ID категории, "ГГГГ-ММ")
+SpendingKey = Tuple[int, int, str]
+
+# Расход для счетчиков: (ID категории, сумма в рублях, дата)
+SpendingItem = Tuple[Optional[int], float, datetime]
+
+# Ключ session.info со счетчиками, которые переносятся в память после коммита
+_PENDING = "budget_pending"
+
+
+class SpendingState(NamedTuple):
+    """Состояние счетчика: потрачено и последний порог уведомления"""
+    spent: float
+    alerted: int
+
+
+class BudgetAlert(NamedTuple):
+    """Уведомление о пройденном пороге бюджета"""
+    category_id: int
+    threshold: int  # процент бюджета
+    spent: float
+    limit: float
+
+
+# Бюджеты по ID пользователя: ID категории -> сумма; заполняются при первой записи
+_limits: Dict[int, Dict[int, float]] = {}
+
+# Зафиксированные счетчики
+_spent: Dict[SpendingKey, SpendingState] = {}
+
+
+def alert_thresholds() -> List[int]:
+    """Пороги уведомлений из настроек по возрастанию"""
+    return sorted(int(value) for value in settings.BUDGET_ALERT_THRESHOLDS.split(",")
+                  if value.strip())
+
+
+def month_key(day: datetime) -> str:
+    return day.strftime("%Y-%m")
+
+
+def reached_threshold(spent: float, limit: float) -> int:
+    """Наибольший пройденный порог (0 — ни одного)"""
+    reached = 0
+    for threshold in alert_thresholds():
+        if limit > 0 and spent >= limit * threshold / 100:
+            reached = threshold
+    return reached
+
+
+def get_limits(db: Session, user_id: int) -> Dict[int, float]:
+    """Бюджеты пользователя (из кэша или одним запросом)"""
+    limits = _limits.get(user_id)
+    if limits is None:
+        limits = _limits[user_id] = dict(db.execute(
+            select(Budget.category_id, Budget.amount).where(Budget.user_id == user_id)
+        ).all())
+    return limits
+
+
+def invalidate_limits(user_id: int) -> None:
+    """Сбрасывает кэш бюджетов пользователя после их изменения"""
+    _limits.pop(user_id, None)
+
+
+def _pending(db: Session) -> Dict[SpendingKey, SpendingState]:
+    return db.info.setdefault(_PENDING, {})
+
+
+def category_month_spent(db: Session, user_id: int, category_id: int, month: str) -> float:
+    """Расходы категории за месяц в рублях по транзакциям (GROUP BY по валютам)"""
+    start = datetime.strptime(month, "%Y-%m")
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    rows = db.execute(
+        select(currency_column(Transaction), rate_day_column(Transaction),
+               func.sum(Transaction.amount))
+        .where(Transaction.user_id == user_id, Transaction.category_id == category_id,
+               Transaction.is_expense == 1, Transaction.transaction_date >= start,
+               Transaction.transaction_date < end)
+        .group_by(currency_column(Transaction), rate_day_column(Transaction))
+    ).all()
+    return rates.convert_totals(rows).get((), 0.0)
+
+
+def _state(db: Session, key: SpendingKey, limit: float) -> SpendingState:
+    """
+    Текущее состояние счетчика с учетом изменений этой сессии
+
+    Если счетчика нет ни в памяти, ни в базе, он создается по сумме
+    транзакций месяца; поэтому счетчики обновляются до вставки транзакций.
+    """
+    state = _known_state(db, key)
+    if state is not None:
+        return state
+
+    user_id, category_id, month = key
+    spent = category_month_spent(db, user_id, category_id, month)
+    state = SpendingState(spent, reached_threshold(spent, limit))
+    db.add(BudgetSpending(user_id=user_id, category_id=category_id, month=month,
+                          spent=state.spent, alerted=state.alerted))
+    db.flush()
+    _pending(db)[key] = state
+    return state
+
+
+def _known_state(db: Session, key: SpendingKey) -> Optional[SpendingState]:
+    """Состояние счетчика из сессии, памяти или базы; None, если его еще нет"""
+    pending = _pending(db)
+    if key in pending:
+        return pending[key]
+    state = _spent.get(key)
+    if state is not None:
+        return state
+
+    user_id, category_id, month = key
+    row = db.execute(
+        select(BudgetSpending.spent, BudgetSpending.alerted)
+        .where(BudgetSpending.user_id == user_id, BudgetSpending.category_id == category_id,
+               BudgetSpending.month == month)
+    ).first()
+    if row is None:
+        return None
+    pending[key] = SpendingState(*row)
+    return pending[key]
+
+
+def _set_state(db: Session, key: SpendingKey, state: SpendingState) -> None:
+    _pending(db)[key] = state
+    user_id, category_id, month = key
+    db.execute(
+        update(BudgetSpending)
+        .where(BudgetSpending.user_id == user_id, BudgetSpending.category_id == category_id,
+               BudgetSpending.month == month)
+        .values(spent=state.spent, alerted=state.alerted))
+
+
+def add_spending(db: Session, user_id: int, items: Iterable[SpendingItem],
+                 now: Optional[datetime] = None) -> List[BudgetAlert]:
+    """
+    Прибавляет расходы к счетчикам категорий с бюджетом
+
+    Вызывается до вставки транзакций в той же операции записи.
+
+    Returns:
+        List[BudgetAlert]: впервые пройденные в этом месяце пороги
+    """
+    limits = get_limits(db, user_id)
+    if not limits:
+        return []
+
+    current_month = month_key(now or datetime.now())
+    alerts: Dict[int, BudgetAlert] = {}
+    for category_id, amount, day in items:
+        limit = limits.get(category_id)
+        if limit is None or not amount:
+            continue
+        key = (user_id, category_id, month_key(day))
+        state = _state(db, key, limit)
+        spent = round(state.spent + amount, 2)
+        reached = reached_threshold(spent, limit)
+        if reached > state.alerted and key[2] == current_month:
+            alerts[category_id] = BudgetAlert(category_id, reached, spent, limit)
+        _set_state(db, key, SpendingState(spent, max(state.alerted, reached)))
+    return list(alerts.values())
+
+
+def remove_spending(db: Session, user_id: int, items: Iterable[SpendingItem]) -> None:
+    """
+    Вычитает удаленные расходы; порог уведомления снижается вместе с суммой
+
+    Вызывается после удаления транзакций. Счетчик, которого еще нет, не
+    создается: при первом обращении он посчитается по оставшимся транзакциям.
+    """
+    limits = get_limits(db, user_id)
+    for category_id, amount, day in items:
+        limit = limits.get(category_id)
+        if limit is None or not amount:
+            continue
+        key = (user_id, category_id, month_key(day))
+        state = _known_state(db, key)
+        if state is None:
+            continue
+        spent = round(max(state.spent - amount, 0.0), 2)
+        _set_state(db, key, SpendingState(
+            spent, min(state.alerted, reached_threshold(spent, limit))))
+
+
+def spending_items(rows: Iterable[dict]) -> Iterator[SpendingItem]:
+    """
+    Расходы из строк пакетной вставки transactions (суммы в рублях)
+
+    Генератор: у пользователей без бюджетов строки не перебираются.
+    """
+    return ((row["category_id"],
+             rates.to_base(row["amount"], row.get("currency"), row["transaction_date"]),
+             row["transaction_date"])
+            for row in rows if row["is_expense"])
+
+
+def month_spending(db: Session, user_id: int, month: str) -> Dict[int, float]:
+    """Счетчики пользователя за месяц: ID категории -> потрачено"""
+    return dict(db.execute(
+        select(BudgetSpending.category_id, BudgetSpending.spent)
+        .where(BudgetSpending.user_id == user_id, BudgetSpending.month == month)
+    ).all())
+
+
+def set_budget(user_id: int, category_id: int, amount: float,
+               now: Optional[datetime] = None) -> WriteOp:
+    """
+    Операция установки бюджета категории (0 — удалить бюджет)
+
+    Returns:
+        WriteOp: операция, возвращающая состояние счетчика текущего месяца
+        (None, если бюджет удален)
+    """
+    def op(db: Session):
+        db.execute(delete(Budget).where(Budget.user_id == user_id,
+                                        Budget.category_id == category_id))
+        invalidate_limits(user_id)
+        key = (user_id, category_id, month_key(now or datetime.now()))
+        if amount <= 0:
+            return None
+        db.add(Budget(user_id=user_id, category_id=category_id, amount=amount))
+        # Новый бюджет: порог уведомления считается заново от текущей суммы
+        state = _state(db, key, amount)
+        state = SpendingState(state.spent, reached_threshold(state.spent, amount))
+        _set_state(db, key, state)
+        return state
+    return op
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    """Переносит зафиксированные счетчики сессии в память"""
+    _spent.update(session.info.pop(_PENDING, {}))
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    """
+    Отбрасывает счетчики откатившейся сессии; кэш бюджетов мог заполниться
+    незафиксированными изменениями, поэтому он тоже сбрасывается
+    """
+    if session.info.pop(_PENDING, None) is not None:
+        _limits.clear()
@@ -0,0 +1,41 @@
+"""
+Ограниченный LRU-кэш для готовых результатов (изображений графиков, текстов
+отчетов).
+
+Ключ должен включать все, от чего зависит результат (например, версию данных
+пользователя из core.versions), поэтому устаревшие записи не удаляются
+явно: их вытесняют новые.
+"""
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Ограниченный кэш, вытесняющий давно не использованные записи"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, V]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Возвращает значение из кэша или None"""
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Кладет значение в кэш, вытесняя самые старые записи"""
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        """Очищает кэш"""
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,290 @@
+"""
+Валюты и курсы.
+
+Транзакции хранят сумму в валюте операции (amount и currency). Отчеты
+складывают суммы в SQL с группировкой по валюте и дню курса и пересчитывают
+промежуточные итоги в рубли одним проходом convert_totals — курс
+применяется к итогу группы, а не к каждой строке. Строки в рублях
+сворачиваются в одну группу без дня: для них курс не нужен.
+
+Курсы дневные, из CSV-файла RATES_PATH со строками "дата,валюта,курс"
+(сколько рублей стоит единица валюты); файл можно обновлять из RATES_URL.
+Курс на дату без котировки — последний известный до нее, а для валют без
+котировок — FALLBACK_RATES. Найденные курсы кэшируются в памяти по
+(валюта, дата).
+
+Запуск вручную:
+    python -m core.currency --refresh   # скачать курсы из RATES_URL в RATES_PATH
+"""
+import argparse
+import bisect
+import csv
+import io
+import logging
+import threading
+import urllib.request
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import case, func, text
+from sqlalchemy.engine import Engine
+
+from config import settings
+from core.archive import ARCHIVE_SCHEMA
+
+# Валюта отчетов: в ней хранятся итоги и показываются балансы
+BASE_CURRENCY = "RUB"
+
+# Курсы на случай, если в таблице нет ни одной котировки валюты
+FALLBACK_RATES = {"RUB": 1.0, "USD": 90.0, "EUR": 100.0}
+
+# Символы и написания, которыми пользователи обозначают валюты
+CURRENCY_ALIASES = {
+    "$": "USD", "€": "EUR", "₽": "RUB", "£": "GBP", "₸": "KZT", "₴": "UAH",
+    "РУБ": "RUB", "Р": "RUB", "RUR": "RUB", "ЕВРО": "EUR",
+}
+
+# Частые валюты распознаются в любом регистре; остальные коды — только
+# заглавными буквами, иначе "50 pen" или "100 cup" стали бы валютой
+COMMON_CODES = frozenset(("RUB", "USD", "EUR", "GBP", "CNY", "JPY", "CHF", "KZT",
+                          "UAH", "BYN", "GEL", "AED", "THB"))
+
+# Действующие коды ISO 4217
+ISO_CODES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB
+    BRL BSD BTN BWP BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP
+    DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF
+    IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT LAK
+    LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN
+    NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF
+    SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP STN SYP SZL THB TJS TMT TND TOP
+    TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XOF XPF YER ZAR
+    ZMW ZWL
+""".split())
+
+Day = Union[date, str, None]
+
+
+def normalize_currency(token: str) -> Optional[str]:
+    """
+    Приводит обозначение валюты к коду ISO 4217
+
+    Returns:
+        Optional[str]: код валюты или None, если это не валюта
+    """
+    token = token.strip()
+    code = CURRENCY_ALIASES.get(token.upper(), token.upper())
+    if code in COMMON_CODES or code != token.upper():
+        return code
+    return code if token.isupper() and code in ISO_CODES else None
+
+
+def _as_date(day: Day) -> Optional[date]:
+    if day is None or isinstance(day, date) and not isinstance(day, datetime):
+        return day
+    if isinstance(day, datetime):
+        return day.date()
+    return date.fromisoformat(day[:10])
+
+
+class RateTable:
+    """Дневные курсы валют к рублю с кэшем найденных значений"""
+
+    def __init__(self):
+        # Валюта -> отсортированные даты и курсы на них
+        self._dates: Dict[str, List[date]] = {}
+        self._values: Dict[str, List[float]] = {}
+        self._cache: Dict[Tuple[str, Optional[date]], float] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        # Номер загрузки курсов: кэши отчетов в рублях используют его в ключе
+        self.version = 0
+
+    def load_csv(self, content: str) -> int:
+        """
+        Заменяет курсы содержимым CSV "дата,валюта,курс" (заголовок необязателен)
+
+        Returns:
+            int: число загруженных котировок
+        """
+        quotes: Dict[str, List[Tuple[date, float]]] = defaultdict(list)
+        for row in csv.reader(io.StringIO(content)):
+            if len(row) < 3:
+                continue
+            code = normalize_currency(row[1])
+            try:
+                day, rate = date.fromisoformat(row[0].strip()), float(row[2])
+            except ValueError:
+                continue  # заголовок или битая строка
+            if code and rate > 0:
+                quotes[code].append((day, rate))
+
+        dates, values = {}, {}
+        for code, items in quotes.items():
+            items.sort()
+            dates[code] = [day for day, _ in items]
+            values[code] = [rate for _, rate in items]
+        with self._lock:
+            self._dates, self._values, self._cache = dates, values, {}
+            self._loaded = True
+            self.version += 1
+        return sum(len(items) for items in quotes.values())
+
+    def load_file(self, path: str) -> int:
+        """Загружает курсы из файла; отсутствующий файл — пустая таблица"""
+        file = Path(path)
+        if not file.exists():
+            with self._lock:
+                self._loaded = True
+            return 0
+        count = self.load_csv(file.read_text(encoding="utf-8"))
+        logging.info(f"Загружено курсов валют: {count} из {path}")
+        return count
+
+    def rate(self, currency: Optional[str], day: Day = None) -> float:
+        """
+        Курс валюты к рублю на дату
+
+        Args:
+            currency: код валюты (None — рубли)
+            day: дата курса; None — последний известный курс
+
+        Returns:
+            float: сколько рублей стоит единица валюты
+        """
+        code = currency or BASE_CURRENCY
+        if code == BASE_CURRENCY:
+            return 1.0
+        if not self._loaded:
+            self.load_file(settings.RATES_PATH)
+
+        key = (code, _as_date(day))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        dates = self._dates.get(code)
+        if dates:
+            index = len(dates) if key[1] is None else bisect.bisect_right(dates, key[1])
+            # До первой котировки берем самую раннюю
+            value = self._values[code][max(index - 1, 0)]
+        else:
+            value = FALLBACK_RATES.get(code)
+            if value is None:
+                logging.warning(f"Нет курса валюты {code}, сумма учтена как рубли")
+                value = 1.0
+        self._cache[key] = value
+        return value
+
+    def currencies(self) -> List[str]:
+        """Валюты, для которых есть котировки или запасной курс"""
+        return sorted(set(self._dates) | set(FALLBACK_RATES))
+
+    def to_base(self, amount: float, currency: Optional[str], day: Day = None) -> float:
+        """Пересчитывает одну сумму в рубли"""
+        return amount * self.rate(currency, day)
+
+    def convert_totals(self, rows: Iterable[tuple]) -> Dict[Hashable, float]:
+        """
+        Пересчитывает промежуточные итоги по валютам в рубли и складывает их
+
+        Args:
+            rows: строки (*ключ, валюта, день курса, сумма) — результат
+                GROUP BY по ключу, currency_column и rate_day_column
+
+        Returns:
+            Dict[Hashable, float]: ключ (кортеж; одно значение — без кортежа,
+            без ключа — ()) -> сумма в рублях
+        """
+        totals: Dict[Hashable, float] = defaultdict(float)
+        for *key, currency, day, amount in rows:
+            if amount:
+                group = key[0] if len(key) == 1 else tuple(key)
+                totals[group] += amount * self.rate(currency, day)
+        return {group: round(total, 2) for group, total in totals.items()}
+
+
+# Курсы процесса: загружаются из RATES_PATH при первом пересчете
+rates = RateTable()
+
+
+def currency_column(entity):
+    """Валюта строки для GROUP BY; у старых строк без валюты — рубли"""
+    return func.coalesce(entity.currency, BASE_CURRENCY)
+
+
+def rate_day_column(entity):
+    """
+    День курса для GROUP BY: дата операции, а для рублей NULL — рублевые
+    строки сворачиваются в одну группу
+    """
+    return case((currency_column(entity) == BASE_CURRENCY, None),
+                else_=func.date(entity.transaction_date))
+
+
+def refresh_rates(url: Optional[str] = None, path: Optional[str] = None) -> int:
+    """
+    Скачивает CSV курсов, сохраняет в файл и подменяет таблицу процесса
+
+    Returns:
+        int: число загруженных котировок
+    """
+    url = url or settings.RATES_URL
+    path = path or settings.RATES_PATH
+    with urllib.request.urlopen(url, timeout=30) as response:
+        content = response.read().decode("utf-8")
+    count = RateTable().load_csv(content)
+    if not count:
+        raise ValueError(f"В ответе {url} нет курсов")
+    Path(path).write_text(content, encoding="utf-8")
+    rates.load_csv(content)
+    logging.info(f"Курсы валют обновлены: {count} котировок")
+    return count
+
+
+def migrate_amounts(engine: Engine) -> int:
+    """
+    Переводит старые строки на хранение суммы в валюте операции
+
+    Раньше amount валютных транзакций хранился уже пересчитанным в рубли по
+    фиксированному курсу, а сумма в валюте — в original_amount.
+
+    Returns:
+        int: число исправленных строк
+    """
+    tables = ["transactions"]
+    with engine.begin() as conn:
+        schemas = {row[1] for row in conn.execute(text("PRAGMA database_list"))}
+        if ARCHIVE_SCHEMA in schemas:
+            tables.append(f"{ARCHIVE_SCHEMA}.transactions")
+        fixed = 0
+        for table in tables:
+            fixed += conn.execute(text(
+                f"UPDATE {table} SET amount = original_amount "
+                f"WHERE currency IS NOT NULL AND currency != :base "
+                f"AND original_amount IS NOT NULL AND amount != original_amount"
+            ), {"base": BASE_CURRENCY}).rowcount
+    if fixed:
+        logging.info(f"Суммы валютных транзакций переведены в валюту операции: {fixed}")
+    return fixed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Курсы валют")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Скачать курсы из RATES_URL в RATES_PATH")
+    parser.add_argument("--url", help="Адрес CSV курсов (по умолчанию RATES_URL)")
+    args = parser.parse_args()
+
+    if args.refresh:
+        print(f"Загружено котировок: {refresh_rates(args.url)}")
+    else:
+        rates.load_file(settings.RATES_PATH)
+        for code in rates.currencies():
+            print(f"{code}: {rates.rate(code):g}")
+
+
+if __name__ == "__main__":
+    main()
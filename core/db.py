@@ -1,30 +1,130 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
 import logging
 from pathlib import Path
+from typing import Any, Callable, List
 
 # Создаем базовый класс для моделей
 Base = declarative_base()
 
+
+def _casefold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+def configure_sqlite(engine: Engine) -> Engine:
+    """
+    Настраивает подключения SQLite для конкурентной работы бота
+
+    WAL позволяет читать во время записи, а busy_timeout заставляет писателей
+    ждать освобождения блокировки, а не падать с "database is locked".
+
+    Args:
+        engine: движок SQLAlchemy
+
+    Returns:
+        Engine: тот же движок (для удобства цепочек)
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Действует только для новой базы (до создания таблиц); старые
+        # переключаются командой "python -m core.maintenance vacuum --enable"
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+        cursor.close()
+        # lower() в SQLite меняет регистр только латиницы; casefold() — для
+        # поиска без учета регистра по кириллице (LIKE вне индекса FTS5)
+        dbapi_connection.create_function("casefold", 1, _casefold, deterministic=True)
+
+    return engine
+
+
 # Создаем движок SQLAlchemy
-engine = create_engine(settings.DB_PATH)
+engine = configure_sqlite(create_engine(settings.DB_PATH))
 
 # Создаем фабрику сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def _migrations() -> List[Callable[[Engine], Any]]:
+    """
+    Миграции данных по порядку: номер миграции — позиция в списке, начиная с 1
+
+    Новые миграции добавляются только в конец списка.
+    """
+    # Валютные суммы старых строк были пересчитаны в рубли при записи
+    from core.currency import migrate_amounts
+    # id транзакций, перенесенных в архив, не должны выдаваться повторно
+    from core.archive import enable_autoincrement
+    return [migrate_amounts, enable_autoincrement]
+
+
+def run_migrations(bind: Engine) -> int:
+    """
+    Выполняет миграции данных, которые еще не применялись к базе
+
+    Номер последней выполненной миграции хранится в PRAGMA user_version
+    основной базы, поэтому при обычном старте миграции не читают таблицы.
+    Версия записывается после каждой миграции; миграция, прерванная до
+    записи версии, при следующем старте повторяется целиком.
+
+    Args:
+        bind: движок основной базы SQLite
+
+    Returns:
+        int: сколько миграций выполнено
+    """
+    if bind.dialect.name != "sqlite":
+        return 0
+    with bind.connect() as conn:
+        version = conn.execute(text("PRAGMA main.user_version")).scalar()
+
+    migrations = _migrations()
+    for number, migration in enumerate(migrations[version:], start=version + 1):
+        migration(bind)
+        with bind.begin() as conn:
+            conn.execute(text(f"PRAGMA main.user_version = {number}"))
+        logging.info(f"Миграция {number} ({migration.__name__}) выполнена")
+    return max(len(migrations) - version, 0)
+
+
 def init_db() -> None:
     """
     Инициализирует базу данных и создает таблицы, если их нет
     """
     try:
         # Импортируем модели, чтобы они были доступны при создании таблиц
-        from core.models import User, Expense, Goal, Category, Transaction, CategoryCache
+        from core.models import (User, Expense, Goal, GoalLink, GoalContribution, Budget,
+                                 BudgetSpending, DigestOptOut, Category, Transaction,
+                                 CategoryCache)
         
+        # Подключаем базу архива старых транзакций ко всем соединениям
+        from core.archive import attach_archive
+        attach_archive(engine)
+
         # Создаем таблицы
         Base.metadata.create_all(bind=engine)
+
+        # create_all не добавляет новые индексы в уже существующие таблицы
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+
+        # Разовые миграции данных старых баз
+        run_migrations(engine)
+
+        # Полнотекстовый индекс описаний для /search
+        from core.search import ensure_search_index
+        ensure_search_index(engine)
         logging.info("БД инициализирована успешно")
     except Exception as e:
         logging.error(f"Ошибка при инициализации БД: {e}")
@@ -39,4 +139,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
@@ -0,0 +1,309 @@
+"""
+Ежедневные и еженедельные сводки.
+
+Сводки всех пользователей считаются не обработчиком для каждого, а
+несколькими GROUP BY запросами на пачку из DIGEST_BATCH_USERS
+пользователей (выборка пользователей — по возрастанию id от последнего
+обработанного): итоги расходов и доходов за период и предыдущий период и
+суммы по категориям. Транзакции читаются по индексу (user_id,
+transaction_date) только за нужные дни. В памяти одновременно одна пачка
+и очередь отправки, а пачка считается в рабочем потоке и не задерживает
+обработку сообщений.
+
+Сводку получают пользователи с транзакциями за период, кроме отказавшихся
+(/digest). Отправка идет через bot.sender.SendQueue с лимитами Telegram.
+
+Запуск вручную (посчитать, ничего не отправляя):
+    python -m core.digest daily [--now 2024-06-15]
+    python -m core.digest weekly --show 3
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import (Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional,
+                    Sequence, Tuple)
+
+from sqlalchemy import case, exists, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from config import settings
+from core.currency import currency_column, rate_day_column, rates
+from core.db import engine as default_engine
+from core.models import Category, DigestOptOut, Transaction, User
+from core.writer import WriteOp
+
+DIGEST_KINDS = ("daily", "weekly")
+
+RUSSIAN_MONTHS_GENITIVE = {
+    1: "января", 2: "февраля", 3: "марта", 4: "апреля", 5: "мая", 6: "июня",
+    7: "июля", 8: "августа", 9: "сентября", 10: "октября", 11: "ноября", 12: "декабря",
+}
+
+# Отправка сводки: async def send(chat_id, text)
+SendFunc = Callable[[int, str], Awaitable[None]]
+
+
+class DigestPeriod(NamedTuple):
+    """Период сводки и предыдущий период для сравнения"""
+    kind: str
+    start: datetime
+    end: datetime
+    previous_start: datetime
+
+
+class Digest(NamedTuple):
+    """Сводка одного пользователя"""
+    telegram_id: int
+    expenses: float
+    incomes: float
+    count: int
+    previous_expenses: float
+    top_category: Optional[Tuple[str, str, float]]  # (название, эмодзи, сумма)
+
+
+class DigestStats(NamedTuple):
+    """Итог рассылки"""
+    users: int
+    digests: int
+    compute_seconds: float
+    elapsed: float
+
+    def format(self) -> str:
+        return (f"пользователей {self.users}, сводок {self.digests}, расчет "
+                f"{self.compute_seconds:.1f} с, всего {self.elapsed:.1f} с")
+
+
+def digest_period(kind: str, now: Optional[datetime] = None) -> DigestPeriod:
+    """
+    Период сводки: для daily — вчерашний день, для weekly — прошлая неделя
+    (с понедельника по воскресенье)
+    """
+    now = now or datetime.now()
+    today = datetime(now.year, now.month, now.day)
+    if kind == "daily":
+        end = today
+        start = end - timedelta(days=1)
+    elif kind == "weekly":
+        end = today - timedelta(days=today.weekday())
+        start = end - timedelta(days=7)
+    else:
+        raise ValueError(f"Неизвестный вид сводки: {kind}")
+    return DigestPeriod(kind, start, end, start - (end - start))
+
+
+def _user_batches(db: Session, kind: str, size: int) -> Iterator[List[Tuple[int, int]]]:
+    """Пачки (id, telegram_id) пользователей без отказа от сводки, по возрастанию id"""
+    opted_out = exists().where(DigestOptOut.user_id == User.id, DigestOptOut.kind == kind)
+    last_id = 0
+    while True:
+        batch = db.execute(
+            select(User.id, User.telegram_id)
+            .where(User.id > last_id, ~opted_out)
+            .order_by(User.id)
+            .limit(size)
+        ).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def compute_batch(db: Session, users: Sequence[Tuple[int, int]],
+                  period: DigestPeriod) -> List[Digest]:
+    """
+    Сводки пачки пользователей двумя GROUP BY запросами
+
+    Returns:
+        List[Digest]: сводки пользователей с транзакциями за период
+    """
+    user_ids = [user_id for user_id, _ in users]
+    current = case((Transaction.transaction_date >= period.start, 1), else_=0)
+    in_range = (Transaction.user_id.in_(user_ids),
+                Transaction.transaction_date >= period.previous_start,
+                Transaction.transaction_date < period.end)
+
+    # Итоги: пользователь, период (1 — текущий), расход или доход
+    group = (Transaction.user_id, current, Transaction.is_expense,
+             currency_column(Transaction), rate_day_column(Transaction))
+    rows = db.execute(
+        select(*group, func.sum(Transaction.amount), func.count())
+        .where(*in_range).group_by(*group)
+    ).all()
+    counts: Dict[int, int] = {}
+    for user_id, is_current, _, _, _, _, count in rows:
+        if is_current:
+            counts[user_id] = counts.get(user_id, 0) + count
+    if not counts:
+        return []
+    totals = rates.convert_totals(row[:-1] for row in rows)
+
+    # Суммы расходов по категориям за текущий период
+    group = (Transaction.user_id, Transaction.category_id,
+             currency_column(Transaction), rate_day_column(Transaction))
+    category_totals = rates.convert_totals(db.execute(
+        select(*group, func.sum(Transaction.amount))
+        .where(Transaction.user_id.in_(list(counts)), Transaction.is_expense == 1,
+               Transaction.transaction_date >= period.start,
+               Transaction.transaction_date < period.end)
+        .group_by(*group)
+    ).all())
+    top: Dict[int, Tuple[Optional[int], float]] = {}
+    for (user_id, category_id), amount in category_totals.items():
+        if amount > top.get(user_id, (None, 0.0))[1]:
+            top[user_id] = (category_id, amount)
+    names = dict((category_id, (name, emoji)) for category_id, name, emoji in db.execute(
+        select(Category.id, Category.name, Category.emoji)
+        .where(Category.id.in_([category_id for category_id, _ in top.values()
+                                if category_id is not None]))
+    ))
+
+    digests = []
+    for user_id, telegram_id in users:
+        if user_id not in counts:
+            continue
+        top_category = None
+        if user_id in top:
+            category_id, amount = top[user_id]
+            name, emoji = names.get(category_id, ("другое", "💰"))
+            top_category = (name, emoji, amount)
+        digests.append(Digest(
+            telegram_id=telegram_id,
+            expenses=totals.get((user_id, 1, 1), 0.0),
+            incomes=totals.get((user_id, 1, 0), 0.0),
+            count=counts[user_id],
+            previous_expenses=totals.get((user_id, 0, 1), 0.0),
+            top_category=top_category,
+        ))
+    return digests
+
+
+def iter_digests(period: DigestPeriod, bind: Optional[Engine] = None,
+                 batch_size: Optional[int] = None) -> Iterator[Tuple[int, List[Digest]]]:
+    """
+    Сводки всех пользователей пачками; в памяти только текущая пачка
+
+    Yields:
+        Tuple[int, List[Digest]]: число пользователей пачки и их сводки
+    """
+    session = sessionmaker(bind=bind or default_engine)()
+    try:
+        for users in _user_batches(session, period.kind,
+                                   batch_size or settings.DIGEST_BATCH_USERS):
+            yield len(users), compute_batch(session, users, period)
+    finally:
+        session.close()
+
+
+def _money(amount: float) -> str:
+    return f"{amount:,.0f}".replace(",", " ")
+
+
+def format_digest(digest: Digest, period: DigestPeriod) -> str:
+    """Текст сводки (HTML)"""
+    last_day = period.end - timedelta(days=1)
+    if period.kind == "daily":
+        title = (f"☀️ <b>Итоги дня, {last_day.day} "
+                 f"{RUSSIAN_MONTHS_GENITIVE[last_day.month]}</b>")
+        previous = "к позавчера"
+    else:
+        first = str(period.start.day)
+        if period.start.month != last_day.month:
+            first += f" {RUSSIAN_MONTHS_GENITIVE[period.start.month]}"
+        title = (f"📅 <b>Итоги недели, {first} — {last_day.day} "
+                 f"{RUSSIAN_MONTHS_GENITIVE[last_day.month]}</b>")
+        previous = "к прошлой неделе"
+
+    lines = [title, "", f"Расходы: <b>{_money(digest.expenses)}</b> ₽"]
+    if digest.previous_expenses > 0:
+        change = (digest.expenses - digest.previous_expenses) / digest.previous_expenses * 100
+        trend = "📈" if change > 0 else "📉" if change < 0 else "➡️"
+        lines[-1] += f" {trend} {change:+.0f}% {previous}"
+    if digest.incomes:
+        lines.append(f"Доходы: <b>{_money(digest.incomes)}</b> ₽")
+    lines.append(f"Транзакций: {digest.count}")
+    if digest.top_category is not None:
+        name, emoji, amount = digest.top_category
+        lines.append(f"Больше всего: {emoji} {name.capitalize()} — {_money(amount)} ₽")
+    lines += ["", "<i>Подробнее: /stats • отключить сводки: /digest</i>"]
+    return "\n".join(lines)
+
+
+async def send_digests(kind: str, send: SendFunc, now: Optional[datetime] = None,
+                       bind: Optional[Engine] = None,
+                       batch_size: Optional[int] = None) -> DigestStats:
+    """
+    Считает и отправляет сводки всем пользователям
+
+    Пачки считаются в рабочем потоке; send ставит сообщение в очередь
+    отправки и ждет, если она заполнена, поэтому расчет не уходит далеко
+    вперед отправки.
+    """
+    period = digest_period(kind, now)
+    start = time.perf_counter()
+    compute_seconds = 0.0
+    users = digests = 0
+    batches = iter_digests(period, bind, batch_size)
+    try:
+        while True:
+            batch_start = time.perf_counter()
+            batch = await asyncio.to_thread(next, batches, None)
+            compute_seconds += time.perf_counter() - batch_start
+            if batch is None:
+                break
+            batch_users, batch_digests = batch
+            for digest in batch_digests:
+                await send(digest.telegram_id, format_digest(digest, period))
+            users += batch_users
+            digests += len(batch_digests)
+    finally:
+        try:
+            batches.close()
+        except ValueError:
+            # Отмена во время расчета: пачка еще считается в потоке
+            pass
+    stats = DigestStats(users, digests, compute_seconds, time.perf_counter() - start)
+    logging.info(f"Сводки {kind}: {stats.format()}")
+    return stats
+
+
+def set_digest_enabled(user_id: int, kind: str, enabled: bool) -> WriteOp:
+    """Операция записи: включает или отключает сводку вида kind"""
+    def op(db: Session) -> None:
+        db.query(DigestOptOut).filter(DigestOptOut.user_id == user_id,
+                                      DigestOptOut.kind == kind).delete()
+        if not enabled:
+            db.add(DigestOptOut(user_id=user_id, kind=kind))
+    return op
+
+
+def next_digest_time(now: datetime) -> datetime:
+    """Ближайший момент рассылки в DIGEST_HOUR часов"""
+    run_at = datetime(now.year, now.month, now.day, settings.DIGEST_HOUR)
+    return run_at if run_at > now else run_at + timedelta(days=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Расчет сводок без отправки")
+    parser.add_argument("kind", choices=DIGEST_KINDS)
+    parser.add_argument("--now", type=datetime.fromisoformat,
+                        help="Момент рассылки (по умолчанию сейчас)")
+    parser.add_argument("--show", type=int, default=0, help="Показать N сводок")
+    args = parser.parse_args()
+
+    shown = []
+
+    async def collect(chat_id: int, text: str) -> None:
+        if len(shown) < args.show:
+            shown.append(f"[{chat_id}]\n{text}")
+
+    stats = asyncio.run(send_digests(args.kind, collect, args.now))
+    for text in shown:
+        print(text, end="\n\n")
+    print(stats.format())
+
+
+if __name__ == "__main__":
+    main()
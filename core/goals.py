@@ -0,0 +1,206 @@
+"""
+Финансовые цели.
+
+Цель пополняется доходами, подходящими под ее правила (goal_links):
+доходами привязанной категории или доходами со словом в описании. Расходы
+цели не меняют, даже если в описании есть слово правила ("3000 отель
+отпуск" — трата, а не взнос в отпуск); перевод в копилку записывается
+доходом: "+5000 копилка отпуск". Прогресс цели (goals.current_amount) — счетчик: при записи
+транзакции к нему прибавляется ее сумма в рублях, при удалении вычитается
+сохраненный вклад (goal_contributions). Показ прогресса читает одну строку
+цели и никогда не пересчитывает историю; в цель попадают транзакции,
+записанные после привязки правила.
+
+Правила пользователя кэшируются в памяти и сбрасываются операциями записи,
+которые их меняют, поэтому у пользователей без целей проверка транзакции не
+делает запросов к базе.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from core.currency import rates
+from core.models import Goal, GoalContribution, GoalLink, Transaction
+from core.writer import WriteOp, insert_rows
+
+# Данные транзакции для проверки правил:
+# (id, category_id, описание, is_expense, сумма, валюта, дата)
+TrackedTransaction = Tuple[int, Optional[int], Optional[str], int, float, Optional[str], datetime]
+
+
+class GoalRule(NamedTuple):
+    """Правила одной цели"""
+    goal_id: int
+    category_ids: FrozenSet[int]  # категории доходов
+    keywords: Tuple[str, ...]  # слова описания доходов в нижнем регистре
+
+
+# Правила по ID пользователя в БД; заполняются при первой проверке
+_rules: Dict[int, Tuple[GoalRule, ...]] = {}
+
+
+def get_rules(db: Session, user_id: int) -> Tuple[GoalRule, ...]:
+    """Правила целей пользователя (из кэша или одним запросом)"""
+    rules = _rules.get(user_id)
+    if rules is None:
+        links = db.execute(
+            select(GoalLink.goal_id, GoalLink.category_id, GoalLink.keyword)
+            .where(GoalLink.user_id == user_id)
+            .order_by(GoalLink.goal_id, GoalLink.id)
+        ).all()
+        grouped: Dict[int, Tuple[set, list]] = {}
+        for goal_id, category_id, keyword in links:
+            category_ids, keywords = grouped.setdefault(goal_id, (set(), []))
+            if category_id is not None:
+                category_ids.add(category_id)
+            if keyword:
+                keywords.append(keyword.lower())
+        rules = _rules[user_id] = tuple(
+            GoalRule(goal_id, frozenset(category_ids), tuple(keywords))
+            for goal_id, (category_ids, keywords) in grouped.items())
+    return rules
+
+
+def invalidate_rules(user_id: int) -> None:
+    """Сбрасывает кэш правил пользователя после их изменения"""
+    _rules.pop(user_id, None)
+
+
+def match_goal(rules: Sequence[GoalRule], category_id: Optional[int],
+               description: Optional[str], is_expense: int) -> Optional[int]:
+    """
+    Находит цель, которую пополняет транзакция (только доходы)
+
+    Returns:
+        Optional[int]: ID первой (самой старой) подходящей цели или None
+    """
+    if is_expense:
+        return None
+    text = (description or "").lower()
+    for rule in rules:
+        if category_id in rule.category_ids:
+            return rule.goal_id
+        if any(keyword in text for keyword in rule.keywords):
+            return rule.goal_id
+    return None
+
+
+def _apply_deltas(db: Session, deltas: Dict[int, float]) -> None:
+    """Сдвигает счетчики прогресса целей"""
+    for goal_id, delta in deltas.items():
+        db.execute(update(Goal).where(Goal.id == goal_id).values(
+            current_amount=func.coalesce(Goal.current_amount, 0) + delta))
+
+
+def add_contributions(db: Session, user_id: int,
+                      transactions: Iterable[TrackedTransaction]) -> int:
+    """
+    Учитывает записанные транзакции в целях пользователя
+
+    Returns:
+        int: число транзакций, пополнивших цели
+    """
+    rules = get_rules(db, user_id)
+    if not rules:
+        return 0
+
+    rows: List[dict] = []
+    deltas: Dict[int, float] = defaultdict(float)
+    for tx_id, category_id, description, is_expense, amount, currency, day in transactions:
+        goal_id = match_goal(rules, category_id, description, is_expense)
+        if goal_id is None:
+            continue
+        value = round(rates.to_base(amount, currency, day), 2)
+        rows.append({"goal_id": goal_id, "user_id": user_id,
+                     "transaction_id": tx_id, "amount": value})
+        deltas[goal_id] += value
+
+    insert_rows(GoalContribution, rows)(db)
+    _apply_deltas(db, deltas)
+    return len(rows)
+
+
+def track_transactions(db: Session, user_id: int, transactions: Sequence[Transaction]) -> int:
+    """Учитывает в целях ORM-транзакции, добавленные в сессию этой операции"""
+    if not get_rules(db, user_id):
+        return 0
+    db.flush()  # нужны id транзакций
+    return add_contributions(db, user_id, (
+        (tx.id, tx.category_id, tx.description, tx.is_expense, tx.amount,
+         tx.currency, tx.transaction_date)
+        for tx in transactions))
+
+
+def insert_transaction_rows(db: Session, user_id: int, rows: Sequence[dict]) -> int:
+    """
+    Пакетная вставка транзакций (insert_rows) с учетом в целях
+
+    Если у пользователя есть цели, id новых строк читаются после вставки:
+    писатель один, поэтому строки получают id подряд после прежнего максимума.
+
+    Returns:
+        int: количество вставленных строк
+    """
+    if not rows or not get_rules(db, user_id):
+        return insert_rows(Transaction, rows)(db)
+
+    before = db.execute(select(func.max(Transaction.id))).scalar() or 0
+    insert_rows(Transaction, rows)(db)
+    ids = db.execute(
+        select(Transaction.id)
+        .where(Transaction.user_id == user_id, Transaction.id > before)
+        .order_by(Transaction.id)
+    ).scalars().all()
+    add_contributions(db, user_id, (
+        (tx_id, row["category_id"], row.get("description"), row["is_expense"],
+         row["amount"], row.get("currency"), row["transaction_date"])
+        for tx_id, row in zip(ids, rows)))
+    return len(rows)
+
+
+def remove_contributions(db: Session, transaction_ids: Sequence[int]) -> int:
+    """
+    Вычитает из целей вклады удаляемых транзакций
+
+    Returns:
+        int: число целей, у которых изменился прогресс
+    """
+    totals = db.execute(
+        select(GoalContribution.goal_id, func.sum(GoalContribution.amount))
+        .where(GoalContribution.transaction_id.in_(transaction_ids))
+        .group_by(GoalContribution.goal_id)
+    ).all()
+    if not totals:
+        return 0
+    _apply_deltas(db, {goal_id: -total for goal_id, total in totals})
+    db.execute(delete(GoalContribution).where(
+        GoalContribution.transaction_id.in_(transaction_ids)))
+    return len(totals)
+
+
+def add_goal_link(user_id: int, goal_id: int, category_id: Optional[int] = None,
+                  keyword: Optional[str] = None) -> WriteOp:
+    """Операция привязки к цели категории дохода или слова описания"""
+    def op(db: Session):
+        link = GoalLink(goal_id=goal_id, user_id=user_id, category_id=category_id,
+                        keyword=keyword.lower() if keyword else None)
+        db.add(link)
+        invalidate_rules(user_id)
+        return link
+    return op
+
+
+def delete_goal(user_id: int, goal_id: int) -> WriteOp:
+    """Операция удаления цели вместе с правилами и вкладами"""
+    def op(db: Session):
+        removed = db.execute(delete(Goal).where(
+            Goal.id == goal_id, Goal.user_id == user_id)).rowcount
+        if removed:
+            db.execute(delete(GoalContribution).where(GoalContribution.goal_id == goal_id))
+            db.execute(delete(GoalLink).where(GoalLink.goal_id == goal_id))
+            invalidate_rules(user_id)
+        return removed
+    return op
@@ -1,22 +1,42 @@
-# Импортируем OpenAI
-from openai import OpenAI
 import os
 import logging
 import hashlib
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from datetime import datetime, timedelta
 from config import settings
 from sqlalchemy.orm import Session
 from core.models import User, Expense, Category, Transaction, CategoryCache
+from core.writer import (write_queue, touch_category_cache, put_category_cache,
+                         put_category_cache_many, delete)
+from core.metrics import CATEGORIZATION, track_llm_call
+from core.tracing import span
 from sqlalchemy import func
 import difflib
 import re
 
-# Инициализация клиента OpenAI с OpenRouter
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=settings.OPENROUTER_API_KEY
-)
+# Клиент OpenAI создается при первом запросе к LLM, а не при импорте:
+# пакет openai тяжелый, и старт бота не должен его дожидаться
+_client = None
+
+
+def get_client():
+    """
+    Возвращает клиент OpenAI для LLM_BASE_URL, создавая его при первом вызове
+
+    Returns:
+        OpenAI: клиент API
+    """
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(
+            base_url=settings.LLM_BASE_URL,
+            api_key=settings.OPENROUTER_API_KEY,
+            timeout=settings.LLM_TIMEOUT,
+            max_retries=settings.LLM_MAX_RETRIES
+        )
+    return _client
+
 
 # Флаг доступности LLM
 LLM_AVAILABLE = True
@@ -275,11 +295,138 @@ def ask_cerebras(messages: List[Dict[str, str]]) -> str:
         return "Не удалось получить совет, LLM не установлен."
 
     try:
-        response = client.chat.completions.create(
+        with track_llm_call(), span("llm", "advice"):
+            response = get_client().chat.completions.create(
+                model="mistralai/mistral-7b-instruct:free",
+                messages=messages,
+                temperature=0.2,
+                max_tokens=300,
+                top_p=1,
+                extra_headers={
+                    # Optional. Site URL for rankings on openrouter.ai
+                    "HTTP-Referer": "https://finbot.app",
+                    "X-Title": "FinBot",  # Optional. Site title for rankings on openrouter.ai
+                },
+                extra_body={}
+            )
+        return response.choices[0].message.content
+    except Exception as e:
+        logging.error(f"Ошибка при запросе к LLM API: {e}")
+        return "Не удалось получить совет, попробуйте позже."
+
+
+# Стандартные категории, если у пользователя еще нет своих
+DEFAULT_CATEGORIES = [
+    "продукты", "кафе", "рестораны", "транспорт", "такси",
+    "одежда", "развлечения", "здоровье", "связь", "коммуналка",
+    "образование", "спорт", "путешествия", "подарки", "техника",
+    "зарплата", "доход", "другое", "канцтовары", "бытовая химия"
+]
+
+
+def description_hash(normalized_description: str) -> str:
+    """Возвращает MD5-хеш нормализованного описания для кэша категорий"""
+    return hashlib.md5(normalized_description.encode()).hexdigest()
+
+
+def get_categories_list(db: Session, user_id: int) -> List[str]:
+    """
+    Возвращает названия категорий пользователя или стандартные категории
+
+    Args:
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+
+    Returns:
+        List[str]: список допустимых категорий
+    """
+    user_categories = db.query(Category.name).filter(
+        Category.user_id == user_id).all()
+
+    # Если у пользователя есть категории, используем их, иначе используем стандартные
+    if user_categories:
+        return [name for name, in user_categories]
+    return DEFAULT_CATEGORIES
+
+
+def _get_examples(db: Session, user_id: int) -> List[str]:
+    """Формирует примеры категоризации из последних транзакций пользователя"""
+    recent_transactions = db.query(
+        Transaction, Category.name.label('category_name')
+    ).join(
+        Category, Transaction.category_id == Category.id
+    ).filter(
+        Transaction.user_id == user_id
+    ).order_by(Transaction.transaction_date.desc()).limit(10).all()
+
+    examples = []
+    for tx, cat_name in recent_transactions:
+        if tx.description and cat_name:
+            examples.append(
+                f"Описание: {tx.description} -> Категория: {cat_name}")
+    return examples
+
+
+def _build_system_prompt(examples: List[str], batch: bool = False) -> str:
+    """
+    Формирует системный промпт для категоризации
+
+    Args:
+        examples: примеры категоризации из истории пользователя
+        batch: промпт для пакетного запроса (ответ — нумерованный список)
+
+    Returns:
+        str: системный промпт
+    """
+    if batch:
+        answer_format = ("Отвечай ТОЛЬКО нумерованным списком в формате "
+                         "\"номер. категория\", по одной строке на каждое описание, "
+                         "без дополнительных пояснений.")
+    else:
+        answer_format = ("Отвечай ТОЛЬКО названием категории из предложенного списка, "
+                         "без дополнительных пояснений или знаков препинания.")
+
+    system_prompt = f"""Ты - система категоризации финансовых транзакций. 
+        Твоя задача - определить наиболее подходящую категорию для описания транзакции.
+        
+        ВАЖНО: Ты ДОЛЖЕН выбрать категорию ТОЛЬКО из предоставленного списка категорий.
+        НЕ СОЗДАВАЙ новые категории. Если не можешь точно определить категорию, выбери "другое".
+        
+        НИКОГДА не используй нецензурную лексику или оскорбительные слова в категориях.
+        
+        {answer_format}
+        """
+
+    # Добавляем примеры в системный промпт, если они есть
+    if examples:
+        system_prompt += "\n\nПримеры категоризации:\n" + \
+            "\n".join(examples)
+
+    # Добавляем информацию о словаре товаров
+    system_prompt += "\n\nСправочная информация о категориях товаров:\n"
+    system_prompt += "- Продукты: хлеб, молоко, сыр, яйца, мясо, овощи, фрукты, крупы\n"
+    system_prompt += "- Магазины продуктов: магнит, пятерочка, перекресток, ашан, лента, дикси, спар, вкусвилл\n"
+    system_prompt += "- Канцтовары: ручка, карандаш, тетрадь, блокнот, бумага, степлер\n"
+    system_prompt += "- Бытовая химия: мыло, шампунь, зубная паста, стиральный порошок\n"
+    system_prompt += "- Одежда: футболка, рубашка, брюки, джинсы, куртка, платье\n"
+    system_prompt += "- Обувь: туфли, кроссовки, ботинки, сапоги\n"
+    system_prompt += "- Кафе: кофе, чай, завтрак, обед, ужин, пицца, фастфуд, макдоналдс, kfc\n"
+    return system_prompt
+
+
+def _request_categories(messages: List[Dict[str, str]], max_tokens: int) -> str:
+    """
+    Отправляет запрос категоризации к LLM
+
+    Raises:
+        Exception: при ошибке API
+    """
+    with track_llm_call(), span("llm", "categorize", max_tokens=max_tokens):
+        response = get_client().chat.completions.create(
             model="mistralai/mistral-7b-instruct:free",
             messages=messages,
             temperature=0.2,
-            max_tokens=300,
+            max_tokens=max_tokens,
             top_p=1,
             extra_headers={
                 # Optional. Site URL for rankings on openrouter.ai
@@ -288,10 +435,31 @@ def ask_cerebras(messages: List[Dict[str, str]]) -> str:
             },
             extra_body={}
         )
-        return response.choices[0].message.content
-    except Exception as e:
-        logging.error(f"Ошибка при запросе к LLM API: {e}")
-        return "Не удалось получить совет, попробуйте позже."
+    return response.choices[0].message.content
+
+
+def _validate_category(category: str, categories_list: List[str]) -> Tuple[str, float]:
+    """
+    Приводит ответ LLM к одной из допустимых категорий
+
+    Args:
+        category: категория из ответа LLM (в нижнем регистре)
+        categories_list: допустимые категории
+
+    Returns:
+        Tuple[str, float]: категория и уверенность
+    """
+    # Проверяем, что категория есть в списке доступных
+    if category in categories_list:
+        return category, 1.0  # Высокая уверенность, если категория точно совпадает
+
+    # Если точного совпадения нет, проверяем частичное совпадение
+    for available_category in categories_list:
+        if available_category in category or category in available_category:
+            return available_category, 0.8  # Средняя уверенность при частичном совпадении
+
+    # Если нет даже частичного совпадения, используем "другое"
+    return "другое", 0.5  # Низкая уверенность
 
 
 def categorize_transaction(description: str, db: Session, user_id: int) -> Optional[str]:
@@ -312,50 +480,34 @@ def categorize_transaction(description: str, db: Session, user_id: int) -> Optio
         normalized_description = description.strip().lower()
 
         # Создаем хеш описания для поиска в кэше
-        description_hash = hashlib.md5(
-            normalized_description.encode()).hexdigest()
-
-        # Определяем стандартные категории
-        default_categories = [
-            "продукты", "кафе", "рестораны", "транспорт", "такси",
-            "одежда", "развлечения", "здоровье", "связь", "коммуналка",
-            "образование", "спорт", "путешествия", "подарки", "техника",
-            "зарплата", "доход", "другое", "канцтовары", "бытовая химия"
-        ]
+        cache_key = description_hash(normalized_description)
 
-        # Получаем существующие категории пользователя
-        user_categories = db.query(Category).filter(
-            Category.user_id == user_id).all()
-
-        # Если у пользователя есть категории, используем их, иначе используем стандартные
-        if user_categories:
-            categories_list = [category.name for category in user_categories]
-        else:
-            categories_list = default_categories
+        # Получаем категории пользователя (или стандартные)
+        categories_list = get_categories_list(db, user_id)
 
         # Проверяем, есть ли результат в кэше
         cached_result = db.query(CategoryCache).filter(
-            CategoryCache.description_hash == description_hash
+            CategoryCache.description_hash == cache_key
         ).first()
 
         if cached_result:
             # Проверяем, что категория из кэша находится в списке разрешенных категорий
             if cached_result.category_name in categories_list or cached_result.category_name == "другое":
                 # Обновляем счетчик использований и время последнего использования
-                cached_result.use_count += 1
-                cached_result.last_used_at = datetime.now()
-                db.commit()
+                # (через очередь записи, не дожидаясь коммита)
+                write_queue.enqueue(touch_category_cache(cache_key))
 
                 # Возвращаем категорию из кэша
                 logging.info(
                     f"Категория '{cached_result.category_name}' для '{description}' взята из кэша")
+                CATEGORIZATION.inc("cache")
                 return cached_result.category_name
             else:
                 # Если категория из кэша не в списке разрешенных, удаляем её из кэша
                 logging.warning(
                     f"Обнаружена некорректная категория '{cached_result.category_name}' в кэше. Удаляем запись.")
-                db.delete(cached_result)
-                db.commit()
+                write_queue.enqueue(
+                    delete(CategoryCache, CategoryCache.id == cached_result.id))
 
         # Пытаемся определить категорию по словарю товаров
         matched_category, confidence = match_product_to_category(
@@ -364,69 +516,20 @@ def categorize_transaction(description: str, db: Session, user_id: int) -> Optio
             # Проверяем, что категория из словаря находится в списке разрешенных
             if matched_category in categories_list:
                 # Сохраняем результат в кэш
-                cache_entry = CategoryCache(
-                    description_hash=description_hash,
-                    description=normalized_description,
-                    category_name=matched_category,
-                    confidence=confidence
-                )
-                db.add(cache_entry)
-                db.commit()
+                write_queue.enqueue(put_category_cache(
+                    cache_key, normalized_description,
+                    matched_category, confidence))
 
                 logging.info(
                     f"Категория '{matched_category}' для '{description}' определена с помощью словаря товаров")
+                CATEGORIZATION.inc("dictionary")
                 return matched_category
 
         # Если не удалось определить категорию по словарю, используем историю транзакций и LLM
-        # Получаем историю транзакций пользователя для обучения модели
-        recent_transactions = db.query(
-            Transaction, Category.name.label('category_name')
-        ).join(
-            Category, Transaction.category_id == Category.id
-        ).filter(
-            Transaction.user_id == user_id
-        ).order_by(Transaction.transaction_date.desc()).limit(10).all()
-
-        # Формируем примеры для обучения
-        examples = []
-
-        if recent_transactions:
-            for tx, cat_name in recent_transactions:
-                if tx.description and cat_name:
-                    examples.append(
-                        f"Описание: {tx.description} -> Категория: {cat_name}")
-
-        # Формируем запрос к LLM
-        system_prompt = """Ты - система категоризации финансовых транзакций. 
-        Твоя задача - определить наиболее подходящую категорию для описания транзакции.
-        
-        ВАЖНО: Ты ДОЛЖЕН выбрать категорию ТОЛЬКО из предоставленного списка категорий.
-        НЕ СОЗДАВАЙ новые категории. Если не можешь точно определить категорию, выбери "другое".
-        
-        НИКОГДА не используй нецензурную лексику или оскорбительные слова в категориях.
-        
-        Отвечай ТОЛЬКО названием категории из предложенного списка, без дополнительных пояснений или знаков препинания.
-        """
-
-        # Добавляем примеры в системный промпт, если они есть
-        if examples:
-            system_prompt += "\n\nПримеры категоризации:\n" + \
-                "\n".join(examples)
-
-        # Добавляем информацию о словаре товаров
-        system_prompt += "\n\nСправочная информация о категориях товаров:\n"
-        system_prompt += "- Продукты: хлеб, молоко, сыр, яйца, мясо, овощи, фрукты, крупы\n"
-        system_prompt += "- Магазины продуктов: магнит, пятерочка, перекресток, ашан, лента, дикси, спар, вкусвилл\n"
-        system_prompt += "- Канцтовары: ручка, карандаш, тетрадь, блокнот, бумага, степлер\n"
-        system_prompt += "- Бытовая химия: мыло, шампунь, зубная паста, стиральный порошок\n"
-        system_prompt += "- Одежда: футболка, рубашка, брюки, джинсы, куртка, платье\n"
-        system_prompt += "- Обувь: туфли, кроссовки, ботинки, сапоги\n"
-        system_prompt += "- Кафе: кофе, чай, завтрак, обед, ужин, пицца, фастфуд, макдоналдс, kfc\n"
-
         messages = [
             {
                 "role": "system",
-                "content": system_prompt
+                "content": _build_system_prompt(_get_examples(db, user_id))
             },
             {
                 "role": "user",
@@ -440,50 +543,18 @@ def categorize_transaction(description: str, db: Session, user_id: int) -> Optio
         # Отправляем запрос к LLM
         if LLM_AVAILABLE:
             try:
-                response = client.chat.completions.create(
-                    model="mistralai/mistral-7b-instruct:free",
-                    messages=messages,
-                    temperature=0.2,
-                    max_tokens=50,
-                    top_p=1,
-                    extra_headers={
-                        # Optional. Site URL for rankings on openrouter.ai
-                        "HTTP-Referer": "https://finbot.app",
-                        "X-Title": "FinBot",  # Optional. Site title for rankings on openrouter.ai
-                    },
-                    extra_body={}
-                )
-                category = response.choices[0].message.content.strip().lower()
+                category = _request_categories(messages, max_tokens=50).strip().lower()
             except Exception as e:
                 logging.error(f"Ошибка при запросе к LLM API: {e}")
-                # В случае ошибки используем словарный подход и вероятности
-                category = "другое"
-                confidence = 0.1
-                # Выходим из блока try-except раньше
-                return category
+                # В случае ошибки возвращаем "другое" без записи в кэш
+                CATEGORIZATION.inc("default")
+                return "другое"
         else:
             logging.warning(
                 "LLM не установлен, используем словарный метод")
             category = "другое"  # Значение по умолчанию, если LLM недоступна
-            confidence = 0.1
 
-        # Проверяем, что категория есть в списке доступных
-        if category in categories_list:
-            confidence = 1.0  # Высокая уверенность, если категория точно совпадает
-        else:
-            # Если точного совпадения нет, проверяем частичное совпадение
-            matched = False
-            for available_category in categories_list:
-                if available_category in category or category in available_category:
-                    category = available_category
-                    confidence = 0.8  # Средняя уверенность при частичном совпадении
-                    matched = True
-                    break
-
-            # Если нет даже частичного совпадения, используем "другое"
-            if not matched:
-                category = "другое"
-                confidence = 0.5  # Низкая уверенность
+        category, confidence = _validate_category(category, categories_list)
 
         # Дополнительная проверка на недопустимые категории
         if category not in categories_list and category != "другое":
@@ -493,19 +564,150 @@ def categorize_transaction(description: str, db: Session, user_id: int) -> Optio
             confidence = 0.1  # Очень низкая уверенность
 
         # Сохраняем результат в кэш
-        cache_entry = CategoryCache(
-            description_hash=description_hash,
-            description=normalized_description,
-            category_name=category,
-            confidence=confidence
-        )
-        db.add(cache_entry)
-        db.commit()
+        write_queue.enqueue(put_category_cache(
+            cache_key, normalized_description, category, confidence))
 
         logging.info(
             f"Категория '{category}' для '{description}' определена с помощью LLM и сохранена в кэш")
+        CATEGORIZATION.inc("llm" if LLM_AVAILABLE else "default")
         return category
 
     except Exception as e:
         logging.error(f"Ошибка при категоризации транзакции: {e}")
+        CATEGORIZATION.inc("default")
         return "другое"  # В случае ошибки возвращаем "другое" вместо None
+
+
+# Сколько хешей проверять в кэше одним запросом (лимит параметров SQLite)
+CACHE_LOOKUP_CHUNK = 500
+
+# Строка ответа пакетной категоризации: "3. продукты"
+BATCH_ANSWER_LINE = re.compile(r'^\s*(\d+)\s*[.):-]\s*(.+?)\s*$')
+
+
+def _categorize_with_llm_batch(descriptions: List[str], categories_list: List[str],
+                               examples: List[str]) -> Dict[str, Tuple[str, float]]:
+    """
+    Категоризирует несколько описаний одним запросом к LLM
+
+    Args:
+        descriptions: нормализованные описания
+        categories_list: допустимые категории
+        examples: примеры категоризации из истории пользователя
+
+    Returns:
+        Dict[str, Tuple[str, float]]: описание -> (категория, уверенность);
+        описания, на которые LLM не ответила, отсутствуют
+    """
+    numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(descriptions, 1))
+    messages = [
+        {"role": "system", "content": _build_system_prompt(examples, batch=True)},
+        {"role": "user", "content": f"""Определи категории для транзакций:
+{numbered}
+
+Доступные категории: {", ".join(categories_list)}
+"""}
+    ]
+    answer = _request_categories(messages, max_tokens=20 * len(descriptions) + 50)
+
+    results = {}
+    for line in answer.splitlines():
+        match = BATCH_ANSWER_LINE.match(line)
+        if not match:
+            continue
+        index = int(match.group(1)) - 1
+        if 0 <= index < len(descriptions):
+            category = match.group(2).strip().strip('"\'').lower()
+            results[descriptions[index]] = _validate_category(category, categories_list)
+    return results
+
+
+def categorize_transactions(descriptions: Iterable[str], db: Session, user_id: int,
+                            llm_limit: Optional[int] = None) -> Dict[str, str]:
+    """
+    Пакетная категоризация: кэш и словарь для всех описаний сразу, затем один
+    запрос к LLM для оставшихся (частями по LLM_BATCH_SIZE)
+
+    Args:
+        descriptions: описания транзакций (повторы допускаются)
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+        llm_limit: сколько описаний не больше отправлять в LLM (None — без
+            ограничения); остальные получают "другое"
+
+    Returns:
+        Dict[str, str]: нормализованное описание -> категория
+    """
+    # Нормализуем и убираем повторы, сохраняя порядок
+    unique = list(dict.fromkeys(d.strip().lower() for d in descriptions))
+    if not unique:
+        return {}
+
+    categories_list = get_categories_list(db, user_id)
+    allowed = set(categories_list) | {"другое"}
+    hashes = {text: description_hash(text) for text in unique}
+    results: Dict[str, str] = {}
+
+    # 1. Кэш: один запрос на каждые CACHE_LOOKUP_CHUNK описаний
+    all_hashes = list(hashes.values())
+    cached = {}
+    for start in range(0, len(all_hashes), CACHE_LOOKUP_CHUNK):
+        cached.update(db.query(CategoryCache.description_hash, CategoryCache.category_name).filter(
+            CategoryCache.description_hash.in_(all_hashes[start:start + CACHE_LOOKUP_CHUNK])
+        ).all())
+    hits = []
+    for text in unique:
+        category = cached.get(hashes[text])
+        if category in allowed:
+            results[text] = category
+            hits.append(hashes[text])
+    for start in range(0, len(hits), CACHE_LOOKUP_CHUNK):
+        write_queue.enqueue(touch_category_cache(*hits[start:start + CACHE_LOOKUP_CHUNK]))
+
+    # 2. Словарь товаров
+    new_entries = []
+    misses = []
+    for text in unique:
+        if text in results:
+            continue
+        matched_category, confidence = match_product_to_category(text)
+        if matched_category and confidence >= 0.7 and matched_category in categories_list:
+            results[text] = matched_category
+            new_entries.append((hashes[text], text, matched_category, confidence))
+        else:
+            misses.append(text)
+
+    # 3. LLM для оставшихся описаний
+    llm_misses = misses if llm_limit is None else misses[:llm_limit]
+    if llm_misses and LLM_AVAILABLE:
+        examples = _get_examples(db, user_id)
+        for start in range(0, len(llm_misses), settings.LLM_BATCH_SIZE):
+            chunk = llm_misses[start:start + settings.LLM_BATCH_SIZE]
+            try:
+                answers = _categorize_with_llm_batch(chunk, categories_list, examples)
+            except Exception as e:
+                logging.error(f"Ошибка при пакетном запросе к LLM API: {e}")
+                continue
+            for text, (category, confidence) in answers.items():
+                results[text] = category
+                new_entries.append((hashes[text], text, category, confidence))
+
+    # Все новые результаты кэшируем одной операцией записи
+    if new_entries:
+        write_queue.enqueue(put_category_cache_many(new_entries))
+
+    # Нераспознанные описания получают "другое" (без записи в кэш)
+    for text in unique:
+        results.setdefault(text, "другое")
+
+    dictionary_count = len(unique) - len(hits) - len(misses)
+    llm_count = len(new_entries) - dictionary_count
+    CATEGORIZATION.inc("cache", amount=len(hits))
+    CATEGORIZATION.inc("dictionary", amount=dictionary_count)
+    CATEGORIZATION.inc("llm", amount=llm_count)
+    CATEGORIZATION.inc("default", amount=len(misses) - llm_count)
+
+    logging.info(
+        f"Пакетная категоризация {len(unique)} описаний: {len(hits)} из кэша, "
+        f"{len(llm_misses)} отправлено в LLM")
+    return results
@@ -0,0 +1,141 @@
+"""
+Логирование без блокировки event loop.
+
+Обработчики бота пишут записи в очередь (QueueHandler) — это только
+добавление в deque; форматирование и запись в файл и консоль выполняет
+QueueListener в фоновом потоке. Файл лога ротируется по размеру
+(LOG_MAX_MB) или по времени (LOG_ROTATE_WHEN) и пишется в UTF-8 строками
+JSON с полями update_id, user_id и latency_ms, если запись сделана при
+обработке обновления.
+
+Частые INFO-записи (например, об обработке каждого обновления) пишутся
+выборочно: одна из LOG_SAMPLE_EVERY. Предупреждения и ошибки пишутся всегда.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime
+from itertools import count
+from typing import Dict, Optional
+
+from config import settings
+
+# Обновление, которое обрабатывается в текущей задаче asyncio
+current_update: ContextVar[Optional[Dict[str, int]]] = ContextVar("current_update", default=None)
+
+# Логгеры с INFO-записью на каждое обновление
+SAMPLED_LOGGERS = {"aiogram.event", "bot.updates"}
+
+# Формат консоли
+CONSOLE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Поля LogRecord, которые не переносятся в JSON как дополнительные
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class UpdateContextFilter(logging.Filter):
+    """
+    Добавляет к записи update_id и user_id обрабатываемого обновления
+
+    Работает в потоке, который пишет в лог, до постановки в очередь: в
+    фоновом потоке контекст задачи asyncio уже недоступен.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = current_update.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает одну из every INFO-записей частых логгеров"""
+
+    def __init__(self, every: int, loggers=SAMPLED_LOGGERS):
+        super().__init__()
+        self.every = max(every, 1)
+        self.loggers = set(loggers)
+        self._counter = count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.INFO or record.name not in self.loggers:
+            return True
+        # Медленные обновления важнее выборки
+        if getattr(record, "slow", False):
+            return True
+        return next(self._counter) % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        # update_id, user_id, latency_ms и любые поля из extra=
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _file_handler(path: str) -> logging.Handler:
+    """Файловый обработчик с ротацией по времени или по размеру"""
+    if settings.LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=settings.LOG_ROTATE_WHEN,
+            backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=settings.LOG_MAX_MB * 1024 * 1024,
+        backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8")
+
+
+def setup_logging(path: Optional[str] = None, console: bool = True,
+                  level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """
+    Направляет корневой логгер через очередь в фоновый поток
+
+    Args:
+        path: файл лога (по умолчанию LOG_PATH)
+        console: дублировать ли записи в stdout
+        level: уровень корневого логгера
+
+    Returns:
+        QueueListener: запущенный слушатель; остановить при завершении,
+        чтобы дописать очередь
+    """
+    handlers = []
+    file_handler = _file_handler(path or settings.LOG_PATH)
+    file_handler.setFormatter(JsonFormatter())
+    handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(UpdateContextFilter())
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,322 @@
+"""
+Обслуживание базы: статистика планировщика, освобождение места, контрольные
+точки WAL, проверка целостности, чистка «сирот» и удаление данных.
+
+Заменяет разовые скрипты clean_db.py и purge_db.py. Каждая команда
+обходит основную базу и подключенный архив и сообщает время и сколько
+места освобождено. Удаление идет пачками по MAINTENANCE_BATCH_SIZE строк в
+отдельных коротких транзакциях, поэтому запущенный бот не ждет блокировку
+дольше одной пачки.
+
+Запуск:
+    python -m core.maintenance analyze
+    python -m core.maintenance vacuum [--enable] [--pages N]
+    python -m core.maintenance checkpoint
+    python -m core.maintenance integrity [--full]
+    python -m core.maintenance orphans
+    python -m core.maintenance purge --user TELEGRAM_ID
+    python -m core.maintenance purge --all --yes
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from config import settings
+from core.archive import ARCHIVE_SCHEMA
+
+
+class MaintenanceReport(NamedTuple):
+    """Итог команды обслуживания"""
+    command: str
+    elapsed: float
+    size_before: int  # байт на диске (базы и WAL)
+    size_after: int
+    details: List[str]
+
+    @property
+    def reclaimed(self) -> int:
+        return self.size_before - self.size_after
+
+    def format(self) -> str:
+        lines = [f"{self.command}: {self.elapsed:.2f} с, "
+                 f"{self.size_before / 1024 / 1024:.1f} -> {self.size_after / 1024 / 1024:.1f} МБ "
+                 f"(освобождено {self.reclaimed / 1024 / 1024:.1f} МБ)"]
+        lines += [f"  {detail}" for detail in self.details]
+        return "\n".join(lines)
+
+
+# Таблицы с user_id в порядке удаления (зависимые раньше)
+USER_TABLES = ["transactions", "expenses", "goal_contributions", "goal_links",
+               "goals", "budget_spending", "budgets", "digest_optouts", "categories"]
+
+
+def _schemas(conn: Connection) -> List[str]:
+    """Базы соединения: main и подключенные (архив)"""
+    return [name for _, name, _ in conn.exec_driver_sql("PRAGMA database_list")
+            if name != "temp"]
+
+
+def _files_size(conn: Connection) -> int:
+    """Размер файлов баз соединения вместе с WAL"""
+    size = 0
+    for _, _, path in conn.exec_driver_sql("PRAGMA database_list"):
+        for name in (path, f"{path}-wal"):
+            if name and os.path.exists(name):
+                size += os.path.getsize(name)
+    return size
+
+
+def _run(engine: Engine, command: str, action) -> MaintenanceReport:
+    """Выполняет action(conn) -> details вне транзакции и замеряет время и место"""
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        size_before = _files_size(conn)
+        start = time.perf_counter()
+        details = action(conn)
+        elapsed = time.perf_counter() - start
+        size_after = _files_size(conn)
+    report = MaintenanceReport(command, elapsed, size_before, size_after, details)
+    logging.info(report.format())
+    return report
+
+
+def _delete_batched(engine: Engine, statement: str, params: Optional[Dict] = None,
+                    batch_size: Optional[int] = None) -> int:
+    """
+    Выполняет DELETE/UPDATE с подзапросом "... LIMIT :limit" пачками
+
+    Каждая пачка — отдельная транзакция; цикл идет, пока пачка не пуста.
+
+    Returns:
+        int: сколько строк затронуто всего
+    """
+    params = dict(params or {}, limit=batch_size or settings.MAINTENANCE_BATCH_SIZE)
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            affected = conn.execute(text(statement), params).rowcount
+        total += affected
+        if affected < params["limit"]:
+            return total
+
+
+def analyze(engine: Engine) -> MaintenanceReport:
+    """ANALYZE и PRAGMA optimize: свежая статистика для планировщика запросов"""
+    def action(conn):
+        details = []
+        for schema in _schemas(conn):
+            conn.exec_driver_sql(f"ANALYZE {schema}")
+            details.append(f"{schema}: ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+        return details
+    return _run(engine, "analyze", action)
+
+
+def vacuum(engine: Engine, enable: bool = False, pages: int = 0) -> MaintenanceReport:
+    """
+    Возвращает свободные страницы файловой системе
+
+    Инкрементальная очистка работает только при auto_vacuum=INCREMENTAL; в
+    новых базах он включается при создании (configure_sqlite), а для старых
+    --enable переключает режим одним полным VACUUM.
+
+    Args:
+        engine: движок базы
+        enable: переключить базы без auto_vacuum=INCREMENTAL полным VACUUM
+        pages: сколько страниц освободить (0 — все свободные)
+    """
+    def action(conn):
+        details = []
+        for schema in _schemas(conn):
+            mode = conn.exec_driver_sql(f"PRAGMA {schema}.auto_vacuum").scalar()
+            free = conn.exec_driver_sql(f"PRAGMA {schema}.freelist_count").scalar()
+            if mode == 2:
+                conn.exec_driver_sql(f"PRAGMA {schema}.incremental_vacuum({pages or free})")
+                details.append(f"{schema}: incremental_vacuum, свободных страниц было {free}")
+            elif enable:
+                conn.exec_driver_sql(f"PRAGMA {schema}.auto_vacuum=INCREMENTAL")
+                conn.exec_driver_sql(f"VACUUM {schema}")
+                details.append(f"{schema}: включен auto_vacuum=INCREMENTAL (полный VACUUM)")
+            else:
+                details.append(f"{schema}: auto_vacuum выключен, свободных страниц {free}; "
+                               f"запустите с --enable")
+        # Освобожденные страницы попадают в файл базы при контрольной точке
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        return details
+    return _run(engine, "vacuum", action)
+
+
+def checkpoint(engine: Engine) -> MaintenanceReport:
+    """Переносит WAL в файлы баз и обрезает журнал"""
+    def action(conn):
+        details = []
+        for schema in _schemas(conn):
+            busy, log_frames, done = conn.exec_driver_sql(
+                f"PRAGMA {schema}.wal_checkpoint(TRUNCATE)").one()
+            details.append(f"{schema}: кадров в журнале {log_frames}, перенесено {done}"
+                           + (" (база занята, журнал не обрезан)" if busy else ""))
+        return details
+    return _run(engine, "checkpoint", action)
+
+
+def integrity(engine: Engine, full: bool = False) -> MaintenanceReport:
+    """
+    Проверяет целостность баз
+
+    По умолчанию quick_check (без сверки индексов с таблицами, в разы
+    быстрее); full — полная integrity_check.
+    """
+    pragma = "integrity_check" if full else "quick_check"
+
+    def action(conn):
+        details = []
+        for schema in _schemas(conn):
+            messages = [row[0] for row in conn.exec_driver_sql(f"PRAGMA {schema}.{pragma}")]
+            details.append(f"{schema}: {'; '.join(messages[:10])}")
+        return details
+    return _run(engine, pragma, action)
+
+
+def clean_orphans(engine: Engine) -> MaintenanceReport:
+    """
+    Чистит ссылки на удаленные записи
+
+    - транзакции с удаленной категорией получают category_id = NULL
+      (в отчетах они показываются как «другое»);
+    - строки пользователей, которых больше нет, удаляются.
+    """
+    def action(conn):
+        schemas = ["main"] + ([ARCHIVE_SCHEMA] if ARCHIVE_SCHEMA in _schemas(conn) else [])
+        details = []
+        for schema in schemas:
+            fixed = _delete_batched(engine, f"""
+                UPDATE {schema}.transactions SET category_id = NULL WHERE id IN (
+                    SELECT t.id FROM {schema}.transactions t
+                    LEFT JOIN main.categories c ON c.id = t.category_id
+                    WHERE t.category_id IS NOT NULL AND c.id IS NULL
+                    LIMIT :limit)
+            """)
+            details.append(f"{schema}.transactions: категория сброшена у {fixed}")
+
+        tables = [f"main.{table}" for table in USER_TABLES]
+        if ARCHIVE_SCHEMA in schemas:
+            tables.insert(0, f"{ARCHIVE_SCHEMA}.transactions")
+        for table in tables:
+            removed = _delete_batched(engine, f"""
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table}
+                    WHERE user_id NOT IN (SELECT id FROM main.users)
+                    LIMIT :limit)
+            """)
+            details.append(f"{table}: удалено строк без пользователя {removed}")
+        return details
+    return _run(engine, "orphans", action)
+
+
+def purge_user(engine: Engine, telegram_id: int) -> MaintenanceReport:
+    """Удаляет пользователя и все его данные пачками"""
+    def action(conn):
+        user_id = conn.execute(text("SELECT id FROM users WHERE telegram_id = :telegram_id"),
+                               {"telegram_id": telegram_id}).scalar()
+        if user_id is None:
+            return [f"пользователь {telegram_id} не найден"]
+
+        tables = [f"main.{table}" for table in USER_TABLES]
+        if ARCHIVE_SCHEMA in _schemas(conn):
+            tables.insert(0, f"{ARCHIVE_SCHEMA}.transactions")
+        details = []
+        for table in tables:
+            removed = _delete_batched(engine, f"""
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} WHERE user_id = :user_id LIMIT :limit)
+            """, {"user_id": user_id})
+            details.append(f"{table}: удалено {removed}")
+        with engine.begin() as write:
+            write.execute(text("DELETE FROM users WHERE id = :user_id"), {"user_id": user_id})
+        details.append(f"пользователь {telegram_id} удален")
+        return details
+    return _run(engine, "purge", action)
+
+
+def purge_all(engine: Engine) -> MaintenanceReport:
+    """
+    Удаляет все данные, сохраняя структуру
+
+    Перед удалением снимается резервная копия (core.backup).
+    """
+    from core.backup import database_path, backup_database
+
+    def action(conn):
+        details = []
+        source = database_path(str(engine.url))
+        if source:
+            details.append(f"резервная копия: {backup_database(source).path}")
+
+        tables = [f"main.{table}" for table in USER_TABLES + ["category_cache", "users"]]
+        if ARCHIVE_SCHEMA in _schemas(conn):
+            tables.insert(0, f"{ARCHIVE_SCHEMA}.transactions")
+        for table in tables:
+            removed = _delete_batched(engine, f"""
+                DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} LIMIT :limit)
+            """)
+            details.append(f"{table}: удалено {removed}")
+        return details
+    return _run(engine, "purge --all", action)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("analyze", help="ANALYZE и PRAGMA optimize")
+    vacuum_parser = commands.add_parser("vacuum", help="Инкрементальная очистка свободных страниц")
+    vacuum_parser.add_argument("--enable", action="store_true",
+                               help="Включить auto_vacuum=INCREMENTAL полным VACUUM")
+    vacuum_parser.add_argument("--pages", type=int, default=0,
+                               help="Сколько страниц освободить (0 — все)")
+    commands.add_parser("checkpoint", help="Контрольная точка WAL с обрезкой журнала")
+    integrity_parser = commands.add_parser("integrity", help="Проверка целостности")
+    integrity_parser.add_argument("--full", action="store_true",
+                                  help="Полная integrity_check вместо quick_check")
+    commands.add_parser("orphans", help="Чистка ссылок на удаленные категории и пользователей")
+    purge_parser = commands.add_parser("purge", help="Удаление данных")
+    target = purge_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int, help="Telegram ID пользователя")
+    target.add_argument("--all", action="store_true", help="Все данные (с резервной копией)")
+    purge_parser.add_argument("--yes", action="store_true", help="Не спрашивать подтверждение")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    # Функции берутся из core.maintenance, а не из __main__: init_db
+    # подключает архив через модули core
+    from core import maintenance
+    from core.db import engine, init_db
+    init_db()
+
+    if args.command == "analyze":
+        maintenance.analyze(engine)
+    elif args.command == "vacuum":
+        maintenance.vacuum(engine, args.enable, args.pages)
+    elif args.command == "checkpoint":
+        maintenance.checkpoint(engine)
+    elif args.command == "integrity":
+        maintenance.integrity(engine, args.full)
+    elif args.command == "orphans":
+        maintenance.clean_orphans(engine)
+    else:
+        if args.all and not args.yes:
+            print("ВНИМАНИЕ! Эта операция удалит ВСЕ данные из базы данных!")
+            if input("Введите 'да' для подтверждения: ").lower() != "да":
+                print("Операция отменена.")
+                return
+        # Отчет печатается в лог внутри команды
+        maintenance.purge_all(engine) if args.all else maintenance.purge_user(engine, args.user)
+
+
+if __name__ == "__main__":
+    main()
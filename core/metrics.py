@@ -0,0 +1,252 @@
+"""
+Метрики в текстовом формате Prometheus.
+
+Счетчики и гистограммы — словари в памяти процесса под одной блокировкой на
+метрику: увеличение стоит порядка микросекунды, поэтому метрики включены в
+продакшене постоянно. Страница /metrics отдается встроенным HTTP-сервером
+aiohttp (METRICS_PORT; 0 — сервер не запускается).
+
+Серии:
+- finbot_updates_total{event_type} — обработанные обновления;
+- finbot_handler_latency_seconds{handler} — время обработчиков;
+- finbot_db_queries_total{statement}, finbot_db_query_seconds{statement} —
+  запросы к базе и их время;
+- finbot_llm_request_seconds, finbot_llm_errors_total{error} — запросы к LLM;
+- finbot_categorization_total{tier} — откуда взята категория: cache,
+  dictionary, llm или default;
+- finbot_event_loop_lag_seconds — задержка event loop;
+- finbot_send_queue_depth{priority}, finbot_send_latency_seconds{priority},
+  finbot_send_requests_total{priority,result} — очередь отправки в Telegram
+  (см. bot.sender);
+- finbot_report_cache_total{command,result} — попадания в кэш отчетов
+  (см. bot.report_cache).
+"""
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Границы корзин по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Все метрики процесса в порядке объявления
+REGISTRY: List["Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Метрика с метками; значения хранятся по кортежу значений меток"""
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Монотонный счетчик"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in values]
+
+
+class Gauge(Counter):
+    """Значение, которое может уменьшаться"""
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Гистограмма: счетчики по корзинам, сумма и количество наблюдений"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики корзин (последняя — +Inf), сумма]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, (list(state[0]), state[1]))
+                            for labels, state in self._values.items())
+        lines = []
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket"
+                             f"{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+UPDATES = Counter("finbot_updates_total", "Обработанные обновления", ["event_type"])
+HANDLER_LATENCY = Histogram("finbot_handler_latency_seconds",
+                            "Время обработчика", ["handler"])
+DB_QUERIES = Counter("finbot_db_queries_total", "Запросы к базе", ["statement"])
+DB_QUERY_TIME = Histogram("finbot_db_query_seconds", "Время запроса к базе", ["statement"],
+                          buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+LLM_LATENCY = Histogram("finbot_llm_request_seconds", "Время запроса к LLM",
+                        buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60))
+LLM_ERRORS = Counter("finbot_llm_errors_total", "Ошибки запросов к LLM", ["error"])
+CATEGORIZATION = Counter("finbot_categorization_total",
+                         "Откуда взята категория транзакции", ["tier"])
+LOOP_LAG = Histogram("finbot_event_loop_lag_seconds", "Задержка event loop",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+SEND_QUEUE_DEPTH = Gauge("finbot_send_queue_depth", "Запросы в очереди отправки",
+                         ["priority"])
+SEND_LATENCY = Histogram("finbot_send_latency_seconds",
+                         "Время запроса от постановки в очередь до ответа Telegram",
+                         ["priority"],
+                         buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900))
+SEND_REQUESTS = Counter("finbot_send_requests_total", "Запросы очереди отправки",
+                        ["priority", "result"])
+REPORT_CACHE = Counter("finbot_report_cache_total", "Обращения к кэшу отчетов",
+                       ["command", "result"])
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+@contextmanager
+def track_llm_call() -> Iterator[None]:
+    """Замеряет запрос к LLM; исключение считается ошибкой по имени класса"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        LLM_ERRORS.inc(type(e).__name__)
+        raise
+    finally:
+        LLM_LATENCY.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Считает запросы движка и их время по виду (SELECT, INSERT, ...)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        kind = statement.lstrip()[:6].upper()
+        if kind not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            kind = "OTHER"
+        DB_QUERIES.inc(kind)
+        DB_QUERY_TIME.observe(elapsed, kind)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        if context.connection is not None:
+            starts = context.connection.info.get("metrics_start")
+            if starts:
+                starts.pop()
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Измеряет, насколько позже запланированного просыпается event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(loop.time() - start - interval, 0.0))
+
+
+async def start_metrics_server(host: str, port: int):
+    """
+    Запускает HTTP-сервер с единственной страницей /metrics
+
+    Returns:
+        aiohttp.web.AppRunner: остановить через await runner.cleanup()
+    """
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain",
+                            headers={"X-Content-Type-Options": "nosniff"},
+                            charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.db import Base
@@ -52,6 +52,71 @@ class Goal(Base):
     user = relationship("User", back_populates="goals")
 
 
+class GoalLink(Base):
+    """Правило пополнения цели: категория дохода или слово в описании"""
+    __tablename__ = "goal_links"
+
+    id = Column(Integer, primary_key=True, index=True)
+    goal_id = Column(Integer, ForeignKey("goals.id", ondelete="CASCADE"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    keyword = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+
+class GoalContribution(Base):
+    """Вклад транзакции в цель (в рублях на момент записи)"""
+    __tablename__ = "goal_contributions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    goal_id = Column(Integer, ForeignKey("goals.id", ondelete="CASCADE"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    # Транзакция может уйти в архив, поэтому без внешнего ключа
+    transaction_id = Column(Integer, nullable=False, index=True)
+    amount = Column(Float, nullable=False)
+
+
+class Budget(Base):
+    """Месячный бюджет категории расходов (в рублях)"""
+    __tablename__ = "budgets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+
+class BudgetSpending(Base):
+    """Счетчик расходов категории с бюджетом за месяц"""
+    __tablename__ = "budget_spending"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    category_id = Column(Integer, nullable=False)
+    month = Column(String(7), nullable=False)  # "ГГГГ-ММ"
+    spent = Column(Float, nullable=False, default=0.0)
+    # Наибольший порог уведомления (в процентах), о котором уже сообщили
+    alerted = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_budget_spending_key", "user_id", "category_id", "month", unique=True),
+    )
+
+
+class DigestOptOut(Base):
+    """Отказ пользователя от сводок одного вида (daily или weekly)"""
+    __tablename__ = "digest_optouts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    kind = Column(String(10), nullable=False)
+
+    __table_args__ = (
+        Index("ix_digest_optouts_user_kind", "user_id", "kind", unique=True),
+    )
+
+
 class Category(Base):
     """Модель категории расходов/доходов"""
     __tablename__ = "categories"
@@ -84,6 +149,16 @@ class Transaction(Base):
     # Упомянутый пользователь (@username)
     mentioned_user = Column(String(100), nullable=True)
 
+    # Индексы для постраничного /list: страница ищется по (дата, id) от
+    # курсора, поэтому любая страница читается так же быстро, как первая
+    __table_args__ = (
+        Index("ix_transactions_user_date", "user_id", "transaction_date", "id"),
+        Index("ix_transactions_user_category_date",
+              "user_id", "category_id", "transaction_date", "id"),
+        # id не выдаются повторно: перенесенные в архив строки сохраняют свои
+        {"sqlite_autoincrement": True},
+    )
+
     # Отношения
     user = relationship("User")
     category = relationship("Category")
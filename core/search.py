@@ -0,0 +1,305 @@
+"""
+Полнотекстовый поиск по описаниям транзакций (SQLite FTS5).
+
+Виртуальная таблица transactions_fts хранит только индекс (external content:
+текст берется из transactions.description) и синхронизируется триггерами на
+вставку, удаление и изменение описания. Поиск идет по индексу с ранжированием
+bm25 вместо полного просмотра LIKE '%...%'.
+
+Если SQLite собран без FTS5, поиск выполняется через LIKE; так же ищутся
+транзакции, перенесенные в архив (core.archive).
+"""
+import calendar
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import column, func, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from core.archive import archive_boundary, archive_entity
+from core.currency import currency_column, rate_day_column, rates
+from core.models import Category, Transaction
+
+# Индекс создается в init_db; False — FTS5 недоступен, используется LIKE
+FTS_AVAILABLE = False
+
+# Виртуальная таблица для соединения в запросах
+transactions_fts = table("transactions_fts", column("rowid"))
+
+# DDL индекса и триггеров синхронизации. user_id индексируется как токен:
+# фильтр по владельцу пересекается со списком совпадений внутри FTS5, и
+# частые слова других пользователей не читаются. unicode61 приводит кириллицу к
+# нижнему регистру, remove_diacritics убирает различие «е»/«ё» в латинице,
+# prefix ускоряет префиксные запросы ("такс*")
+FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        description,
+        user_id,
+        content='transactions',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts(rowid, description, user_id)
+        VALUES (new.id, new.description, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, user_id)
+        VALUES ('delete', old.id, old.description, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, user_id)
+        VALUES ('delete', old.id, old.description, old.user_id);
+        INSERT INTO transactions_fts(rowid, description, user_id)
+        VALUES (new.id, new.description, new.user_id);
+    END
+    """,
+]
+
+# Названия месяцев во всех падежах, которые встречаются в запросах:
+# "март", "марта", "марте"
+MONTH_STEMS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12,
+}
+MONTH_WORD = re.compile(
+    r"^(январ|феврал|март|апрел|ма|июн|июл|август|сентябр|октябр|ноябр|декабр)"
+    r"(ь|я|е|а|й|ю)?$")
+
+# Фильтры в тексте запроса
+YEAR_TOKEN = re.compile(r"^(20\d\d)$")
+MONTH_TOKEN = re.compile(r"^(\d{1,2})\.(20\d\d)$")
+DAY_TOKEN = re.compile(r"^(\d{1,2})\.(\d{1,2})\.(20\d\d)$")
+
+# Слово поискового запроса
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchQuery(NamedTuple):
+    """Разобранный запрос /search"""
+    text: str  # слова для полнотекстового поиска
+    date_from: Optional[datetime]
+    date_to: Optional[datetime]  # не включительно
+    category: Optional[str]  # название категории из "#кафе"
+
+
+class SearchResult(NamedTuple):
+    """Результат поиска: лучшие совпадения и итоги по всем совпадениям"""
+    rows: List[Tuple[Transaction, str, str]]
+    count: int
+    total_expense: float
+    total_income: float
+
+
+def ensure_search_index(engine: Engine) -> bool:
+    """
+    Создает FTS5-индекс и триггеры, при первом создании заполняет индекс
+
+    Returns:
+        bool: доступен ли полнотекстовый поиск
+    """
+    global FTS_AVAILABLE
+    if engine.dialect.name != "sqlite":
+        return False
+
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'")).first()
+            for statement in FTS_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Индексируем транзакции, записанные до появления поиска
+                conn.execute(text(
+                    "INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+                logging.info("Полнотекстовый индекс транзакций построен")
+    except Exception as e:
+        logging.warning(f"FTS5 недоступен, поиск будет работать через LIKE: {e}")
+        FTS_AVAILABLE = False
+        return False
+
+    FTS_AVAILABLE = True
+    return True
+
+
+def _month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    """Возвращает начало месяца и начало следующего"""
+    start = datetime(year, month, 1)
+    days = calendar.monthrange(year, month)[1]
+    return start, start + timedelta(days=days)
+
+
+def parse_search_query(query: str, today: Optional[datetime] = None) -> SearchQuery:
+    """
+    Разбирает текст /search на слова и фильтры
+
+    Фильтры:
+    - "март", "в марте" — месяц (текущего года или прошлого, если еще не наступил)
+    - "03.2024" — месяц, "2024" — год, "15.03.2024" — день
+    - "#кафе" — категория
+
+    Args:
+        query: текст после команды
+        today: текущая дата (для тестов)
+
+    Returns:
+        SearchQuery: разобранный запрос
+    """
+    today = today or datetime.now()
+    words = []
+    date_from = date_to = None
+    category = None
+
+    for token in query.split():
+        lowered = token.lower().strip(",.;")
+        month_word = MONTH_WORD.match(lowered)
+        if lowered.startswith("#") and len(lowered) > 1:
+            category = lowered[1:]
+        elif lowered == "в":
+            continue  # "такси в марте"
+        elif month_word:
+            month = MONTH_STEMS[month_word.group(1)]
+            year = today.year if month <= today.month else today.year - 1
+            date_from, date_to = _month_range(year, month)
+        elif DAY_TOKEN.match(lowered):
+            day, month, year = map(int, DAY_TOKEN.match(lowered).groups())
+            date_from = datetime(year, month, day)
+            date_to = date_from + timedelta(days=1)
+        elif MONTH_TOKEN.match(lowered):
+            month, year = map(int, MONTH_TOKEN.match(lowered).groups())
+            date_from, date_to = _month_range(year, month)
+        elif YEAR_TOKEN.match(lowered):
+            year = int(lowered)
+            date_from, date_to = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+        else:
+            words.append(token)
+
+    return SearchQuery(" ".join(words), date_from, date_to, category)
+
+
+def build_match_query(words: str, user_id: Optional[int] = None) -> Optional[str]:
+    """
+    Строит выражение MATCH: все слова обязательны, каждое ищется как префикс
+
+    Слова берутся в кавычки, поэтому спецсимволы FTS5 во вводе пользователя
+    не ломают запрос. "такси домой" -> "такси"* "домой"*
+    С user_id добавляется фильтр по владельцу: user_id:"1" AND description:(...)
+
+    Returns:
+        Optional[str]: выражение MATCH или None, если слов нет
+    """
+    tokens = WORD.findall(words.lower())
+    if not tokens:
+        return None
+    match = " ".join(f'"{token}"*' for token in tokens)
+    if user_id is not None:
+        match = f'user_id:"{int(user_id)}" AND description:({match})'
+    return match
+
+
+def search_transactions(db: Session, user_id: int, words: str,
+                        date_from: Optional[datetime] = None,
+                        date_to: Optional[datetime] = None,
+                        category_ids: Optional[List[int]] = None,
+                        limit: int = 10) -> SearchResult:
+    """
+    Ищет транзакции пользователя по словам описания
+
+    Args:
+        db: сессия базы данных
+        user_id: ID пользователя в базе данных
+        words: слова для поиска (пустая строка — только фильтры)
+        date_from: начало периода (включительно)
+        date_to: конец периода (не включительно)
+        category_ids: фильтр по категориям
+        limit: сколько лучших совпадений вернуть
+
+    Returns:
+        SearchResult: лучшие совпадения (по релевантности, затем по дате) и
+        итоги по всем совпадениям
+    """
+    match = build_match_query(words, user_id)
+
+    def apply_filters(query, entity=Transaction, ranked: bool = False):
+        # Владелец уже в выражении MATCH; отдельное условие на user_id
+        # увело бы план на индекс транзакций с проверкой MATCH по строке
+        use_fts = match is not None and FTS_AVAILABLE and entity is Transaction
+        if not use_fts:
+            query = query.filter(entity.user_id == user_id)
+        if use_fts and ranked:
+            # Соединение нужно для bm25
+            query = query.join(
+                transactions_fts, transactions_fts.c.rowid == Transaction.id
+            ).filter(text("transactions_fts MATCH :match")).params(match=match)
+        elif use_fts:
+            # Для итогов — подзапрос: список совпадений строится один раз
+            query = query.filter(Transaction.id.in_(
+                select(transactions_fts.c.rowid).where(text("transactions_fts MATCH :match"))
+            )).params(match=match)
+        elif match is not None:
+            # casefold регистрируется в core.db.configure_sqlite: lower()
+            # SQLite не меняет регистр кириллицы
+            for token in WORD.findall(words.casefold()):
+                query = query.filter(
+                    func.casefold(entity.description).contains(token, autoescape=True))
+        if date_from is not None:
+            query = query.filter(entity.transaction_date >= date_from)
+        if date_to is not None:
+            query = query.filter(entity.transaction_date < date_to)
+        if category_ids:
+            query = query.filter(entity.category_id.in_(category_ids))
+        return query
+
+    def totals(entity):
+        # Суммы по валютам пересчитываются в рубли после группировки
+        group = (entity.is_expense, currency_column(entity), rate_day_column(entity))
+        rows = apply_filters(db.query(
+            *group, func.count(entity.id), func.sum(entity.amount)
+        ), entity).group_by(*group).all()
+        amounts = rates.convert_totals(
+            (is_expense, currency, day, amount) for is_expense, currency, day, _, amount in rows)
+        return sum(row[3] for row in rows), amounts.get(1, 0), amounts.get(0, 0)
+
+    def top_rows(entity, ranked: bool, count: int):
+        query = apply_filters(db.query(
+            entity,
+            Category.name.label('category_name'),
+            Category.emoji.label('category_emoji')
+        ).join(
+            Category,
+            entity.category_id == Category.id,
+            isouter=True
+        ), entity, ranked=ranked)
+        if ranked and match is not None and FTS_AVAILABLE:
+            query = query.order_by(text("bm25(transactions_fts)"))
+        return query.order_by(entity.transaction_date.desc()).limit(count).all()
+
+    count, total_expense, total_income = totals(Transaction)
+    rows = top_rows(Transaction, True, limit) if count else []
+
+    # Архив: индекса FTS в нем нет, старые периоды ищутся через LIKE только
+    # тогда, когда у пользователя есть архивные строки в запрошенном периоде
+    archived = archive_entity(db)
+    if archived is not None:
+        boundary = archive_boundary(db, user_id)
+        if boundary is not None and (date_from is None or date_from <= boundary):
+            archived_count, archived_expense, archived_income = totals(archived)
+            if archived_count:
+                count += archived_count
+                total_expense = (total_expense or 0) + (archived_expense or 0)
+                total_income = (total_income or 0) + (archived_income or 0)
+                if len(rows) < limit:
+                    rows += top_rows(archived, False, limit - len(rows))
+
+    return SearchResult(rows, count, total_expense or 0, total_income or 0)
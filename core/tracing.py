@@ -0,0 +1,200 @@
+"""
+Трассировка обработки обновлений.
+
+Для каждого обновления строится дерево интервалов (span): обработчик,
+SQL-запросы с длительностью, запросы к LLM и к Telegram API. Корень дерева
+хранится в contextvar, поэтому интервалы, открытые в обработчике и в
+asyncio.to_thread, попадают в дерево своего обновления. Вне обновления
+(фоновые задачи, очередь записи) интервалы не создаются.
+
+Обновления дольше TRACE_SLOW_UPDATE_MS пишутся в лог с полным деревом
+(см. bot.middleware.TracingMiddleware). В тестах collect_traces() собирает
+деревья завершенных обновлений, а assert_query_ceilings() проверяет, что
+обработчики не делают больше заданного числа запросов к базе.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+# Самый глубокий открытый интервал текущего обновления
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# Длина текста SQL-запроса в дереве
+SQL_PREVIEW = 200
+
+# Списки, в которые collect_traces() собирает завершенные деревья
+_collectors: List[List["Span"]] = []
+
+
+class Span:
+    """Интервал трассировки: вид, имя, время и вложенные интервалы"""
+
+    __slots__ = ("kind", "name", "start", "duration", "children", "attrs",
+                 "root", "size", "dropped")
+
+    def __init__(self, kind: str, name: str, root: Optional["Span"] = None, **attrs: Any):
+        self.kind = kind
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.children: List["Span"] = []
+        self.attrs = attrs
+        # Корень дерева считает записанные интервалы и не поместившиеся
+        # в TRACE_MAX_SPANS
+        self.root = root or self
+        self.size = 0
+        self.dropped = 0
+
+    def add(self, child: "Span") -> None:
+        root = self.root
+        if root.size >= settings.TRACE_MAX_SPANS:
+            root.dropped += 1
+            return
+        root.size += 1
+        self.children.append(child)
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.start
+
+    def walk(self) -> Iterator["Span"]:
+        """Интервал и все вложенные, в глубину"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def count(self, kind: str) -> int:
+        return sum(1 for span in self.walk() if span.kind == kind)
+
+    def total(self, kind: str) -> float:
+        return sum(span.duration for span in self.walk() if span.kind == kind)
+
+    def format(self, depth: int = 0) -> str:
+        """Дерево в виде текста с отступами и временем в миллисекундах"""
+        offset = (self.start - self.root.start) * 1000
+        lines = [f"{'  ' * depth}{self.kind} {self.name} "
+                 f"+{offset:.1f} мс, {self.duration * 1000:.1f} мс"]
+        lines.extend(child.format(depth + 1) for child in self.children)
+        if self is self.root and self.dropped:
+            lines.append(f"  … еще {self.dropped} интервалов не записано")
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"kind": self.kind, "name": self.name,
+                "ms": round(self.duration * 1000, 2), **self.attrs}
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+
+class Trace(Span):
+    """Корень дерева одного обновления"""
+
+    def __init__(self, name: str, **attrs: Any):
+        super().__init__("update", name, **attrs)
+
+
+@contextmanager
+def start_trace(name: str, **attrs: Any) -> Iterator[Trace]:
+    """Открывает дерево обновления; по завершении отдает его collect_traces()"""
+    trace = Trace(name, **attrs)
+    token = current_span.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        current_span.reset(token)
+        for collected in _collectors:
+            collected.append(trace)
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """Вложенный интервал; вне обновления ничего не записывает"""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(kind, name, parent.root, **attrs)
+    parent.add(child)
+    token = current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        current_span.reset(token)
+
+
+def trace_engine(engine: Engine) -> None:
+    """Добавляет SQL-запросы движка в дерево текущего обновления"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = current_span.get()
+        if parent is not None:
+            sql = Span("sql", " ".join(statement.split())[:SQL_PREVIEW], parent.root)
+            parent.add(sql)
+            conn.info.setdefault("trace_spans", []).append(sql)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        if current_span.get() is not None:
+            conn.info["trace_spans"].pop().finish()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection else None
+        if spans and current_span.get() is not None:
+            failed = spans.pop()
+            failed.finish()
+            failed.attrs["error"] = type(context.original_exception).__name__
+
+
+@contextmanager
+def collect_traces() -> Iterator[List[Trace]]:
+    """Собирает деревья обновлений, завершенных внутри блока (для тестов)"""
+    collected: List[Trace] = []
+    _collectors.append(collected)
+    try:
+        yield collected
+    finally:
+        _collectors.remove(collected)
+
+
+def query_counts(traces: List[Trace]) -> Dict[str, int]:
+    """Наибольшее число SQL-запросов за один вызов каждого обработчика"""
+    counts: Dict[str, int] = {}
+    for trace in traces:
+        for handler in trace.walk():
+            if handler.kind == "handler":
+                counts[handler.name] = max(counts.get(handler.name, 0), handler.count("sql"))
+    return counts
+
+
+def assert_query_ceilings(traces: List[Trace], ceilings: Dict[str, int]) -> None:
+    """
+    Проверяет, что обработчики не превышают число запросов к базе
+
+    Args:
+        traces: деревья из collect_traces()
+        ceilings: имя обработчика -> допустимое число запросов
+
+    Raises:
+        AssertionError: обработчик не вызывался или превысил потолок;
+        в сообщении — дерево самого тяжелого вызова
+    """
+    counts = query_counts(traces)
+    for handler, ceiling in ceilings.items():
+        assert handler in counts, f"Обработчик {handler} не вызывался"
+        if counts[handler] > ceiling:
+            heaviest = max((span for trace in traces for span in trace.walk()
+                            if span.kind == "handler" and span.name == handler),
+                           key=lambda span: span.count("sql"))
+            raise AssertionError(
+                f"{handler}: {counts[handler]} запросов к базе при потолке {ceiling}\n"
+                f"{heaviest.format()}")
@@ -0,0 +1,40 @@
+"""
+Версии данных пользователей.
+
+Счетчик увеличивается при каждой записи транзакций или категорий
+пользователя. Кэши, построенные на данных пользователя (например, графики),
+используют версию в ключе, поэтому любая запись автоматически делает старые
+записи кэша недоступными.
+"""
+from collections import defaultdict
+from typing import Dict
+
+# Версия данных по ID пользователя в БД
+_versions: Dict[int, int] = defaultdict(int)
+
+
+def get_data_version(user_id: int) -> int:
+    """
+    Возвращает текущую версию данных пользователя
+
+    Args:
+        user_id: ID пользователя в базе данных
+
+    Returns:
+        int: номер версии
+    """
+    return _versions[user_id]
+
+
+def bump_data_version(user_id: int) -> int:
+    """
+    Увеличивает версию данных пользователя после записи
+
+    Args:
+        user_id: ID пользователя в базе данных
+
+    Returns:
+        int: новый номер версии
+    """
+    _versions[user_id] += 1
+    return _versions[user_id]
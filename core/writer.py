@@ -0,0 +1,325 @@
+"""
+Очередь групповой записи в SQLite.
+
+SQLite допускает только одного писателя, поэтому каждый отдельный коммит из
+обработчиков ждет файловую блокировку. Вместо этого обработчики отправляют
+операции записи в очередь, а единственная фоновая задача собирает их в группы
+(до WRITE_BATCH_SIZE операций или WRITE_BATCH_DELAY_MS миллисекунд) и
+фиксирует одним коммитом. Каждый обработчик получает future, который
+разрешается, когда его запись зафиксирована.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete as sa_delete, insert as sa_insert, update as sa_update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from config import settings
+from core.db import engine as default_engine
+from core.models import CategoryCache
+
+# Операция записи: функция, получающая сессию и возвращающая результат
+WriteOp = Callable[[Session], Any]
+
+# Результат выполнения операции: (значение, исключение)
+OpResult = Tuple[Any, Optional[BaseException]]
+
+# Маркер остановки фоновой задачи
+_STOP = object()
+
+
+class WriteQueue:
+    """Единственный писатель, фиксирующий операции группами"""
+
+    def __init__(self, bind: Optional[Engine] = None,
+                 max_batch: Optional[int] = None,
+                 max_delay_ms: Optional[int] = None):
+        # autoflush сохраняет порядок: вставки, добавленные раньше
+        # DELETE/UPDATE из следующей операции группы, попадут в БД до них
+        self._session_factory = sessionmaker(
+            bind=bind or default_engine, expire_on_commit=False)
+        self.max_batch = max_batch or settings.WRITE_BATCH_SIZE
+        self.max_delay = (max_delay_ms if max_delay_ms is not None
+                          else settings.WRITE_BATCH_DELAY_MS) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Счетчики для логов и бенчмарков
+        self.ops_committed = 0
+        self.batches_committed = 0
+
+    @property
+    def running(self) -> bool:
+        """Запущена ли фоновая задача записи"""
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Запускает фоновую задачу записи в текущем event loop"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="write-queue")
+        logging.info(
+            f"Очередь записи запущена (группа до {self.max_batch} операций, "
+            f"{self.max_delay * 1000:.0f} мс)")
+
+    async def stop(self) -> None:
+        """Фиксирует все оставшиеся операции и останавливает задачу"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logging.info(
+            f"Очередь записи остановлена: {self.ops_committed} операций "
+            f"в {self.batches_committed} коммитах")
+
+    def submit(self, op: WriteOp) -> "asyncio.Future":
+        """
+        Ставит операцию в очередь
+
+        Если очередь не запущена (скрипты, тесты), операция выполняется
+        сразу в отдельной сессии.
+
+        Args:
+            op: функция, выполняющая запись в переданной сессии
+
+        Returns:
+            asyncio.Future: разрешается результатом op после коммита
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._accepts_from_current_thread():
+            self._queue.put_nowait((op, future))
+            return future
+
+        value, error = self._commit_batch([op])[0]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+        return future
+
+    def enqueue(self, op: WriteOp) -> None:
+        """
+        Ставит операцию в очередь без ожидания результата
+
+        Подходит для синхронного кода (например, обновления кэша категорий),
+        который вызывается из обработчиков или из рабочих потоков
+        (asyncio.to_thread). Если очередь не запущена, операция выполняется
+        сразу.
+
+        Args:
+            op: функция, выполняющая запись в переданной сессии
+        """
+        if not self._accepts_from_current_thread():
+            if self.running:
+                # Рабочий поток: передаем операцию в цикл писателя
+                self._loop.call_soon_threadsafe(self._put_nowait, op)
+                return
+            value, error = self._commit_batch([op])[0]
+            if error is not None:
+                logging.error(f"Ошибка фоновой записи: {error}")
+            return
+
+        self._put_nowait(op)
+
+    def _put_nowait(self, op: WriteOp) -> None:
+        """Кладет операцию без ожидания в очередь (из потока event loop)"""
+        future = self._loop.create_future()
+        future.add_done_callback(_log_failed_write)
+        self._queue.put_nowait((op, future))
+
+    def _accepts_from_current_thread(self) -> bool:
+        """Можно ли положить операцию в очередь из текущего потока"""
+        if not self.running:
+            return False
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def _run(self) -> None:
+        """Основной цикл писателя: собирает группы и фиксирует их"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+
+            # Добираем группу, пока не наберется N операций или не истечет T
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            ops = [op for op, _ in batch]
+            results = await asyncio.to_thread(self._commit_batch, ops)
+
+            for (_, future), (value, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(value)
+
+    def _commit_batch(self, ops: List[WriteOp]) -> List[OpResult]:
+        """
+        Выполняет группу операций одним коммитом
+
+        Если коммит группы не удался, операции повторяются по одной, чтобы
+        ошибка одной операции не отменяла записи остальных обработчиков.
+
+        Args:
+            ops: операции записи
+
+        Returns:
+            List[OpResult]: результат или исключение для каждой операции
+        """
+        db = self._session_factory()
+        try:
+            values = [op(db) for op in ops]
+            db.commit()
+            self.ops_committed += len(ops)
+            self.batches_committed += 1
+            return [(value, None) for value in values]
+        except Exception as e:
+            db.rollback()
+            if len(ops) == 1:
+                return [(None, e)]
+        finally:
+            db.close()
+
+        results = []
+        for op in ops:
+            results.extend(self._commit_batch([op]))
+        return results
+
+
+def _log_failed_write(future: "asyncio.Future") -> None:
+    """Логирует ошибку операции, результат которой никто не ждет"""
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(f"Ошибка фоновой записи: {future.exception()}")
+
+
+def insert(*objects: Any) -> WriteOp:
+    """
+    Операция вставки ORM-объектов
+
+    Returns:
+        WriteOp: операция, возвращающая переданные объекты; id заполняются
+        при коммите группы, одним пакетным INSERT на таблицу
+    """
+    def op(db: Session):
+        db.add_all(objects)
+        return objects[0] if len(objects) == 1 else objects
+    return op
+
+
+def insert_rows(model: Any, rows: Sequence[dict]) -> WriteOp:
+    """
+    Операция пакетной вставки словарей одним executemany (без ORM-объектов)
+
+    Вставка идет напрямую в таблицу на уровне Core, минуя ORM bulk insert:
+    для больших пачек это заметно быстрее.
+
+    Returns:
+        WriteOp: операция, возвращающая количество вставленных строк
+    """
+    def op(db: Session):
+        if rows:
+            db.connection().execute(sa_insert(model.__table__), list(rows))
+        return len(rows)
+    return op
+
+
+def delete(model: Any, *criteria: Any) -> WriteOp:
+    """
+    Операция удаления строк модели по условиям
+
+    Returns:
+        WriteOp: операция, возвращающая количество удаленных строк
+    """
+    def op(db: Session):
+        return db.execute(sa_delete(model).where(*criteria)).rowcount
+    return op
+
+
+def touch_category_cache(*description_hashes: str) -> WriteOp:
+    """Операция увеличения счетчика использований записей кэша категорий"""
+    def op(db: Session):
+        db.execute(
+            sa_update(CategoryCache)
+            .where(CategoryCache.description_hash.in_(description_hashes))
+            .values(use_count=CategoryCache.use_count + 1,
+                    last_used_at=datetime.now())
+        )
+    return op
+
+
+def put_category_cache(description_hash: str, description: str,
+                       category_name: str, confidence: float) -> WriteOp:
+    """
+    Операция добавления записи в кэш категорий
+
+    Повторная вставка того же описания (две одновременные категоризации)
+    обновляет запись, а не падает на уникальном индексе.
+    """
+    return put_category_cache_many(
+        [(description_hash, description, category_name, confidence)])
+
+
+def put_category_cache_many(entries: Sequence[Tuple[str, str, str, float]]) -> WriteOp:
+    """
+    Операция добавления нескольких записей в кэш категорий одним executemany
+
+    Запись того же описания с другой категорией заменяется: иначе чужая или
+    устаревшая категория, которой нет у пользователя, навсегда превращала бы
+    обращения к кэшу в промахи.
+
+    Args:
+        entries: кортежи (хеш описания, описание, категория, уверенность)
+    """
+    rows = [
+        {"description_hash": description_hash, "description": description,
+         "category_name": category_name, "confidence": confidence}
+        for description_hash, description, category_name, confidence in entries
+    ]
+
+    def op(db: Session):
+        statement = sqlite_insert(CategoryCache)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["description_hash"],
+                set_={"category_name": statement.excluded.category_name,
+                      "confidence": statement.excluded.confidence,
+                      "is_corrected": False},
+                where=CategoryCache.category_name != statement.excluded.category_name),
+            rows
+        )
+    return op
+
+
+# Общая очередь записи приложения; запускается в main.py
+write_queue = WriteQueue()
@@ -1,18 +1,31 @@
 import asyncio
 import logging
-import sys
 import os
-from aiogram import Bot, Dispatcher, types
+from datetime import datetime
+from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.filters import CommandStart
-from aiogram.types import BotCommand, BotCommandScopeDefault, Message
+from aiogram.types import BotCommand, BotCommandScopeDefault
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 from dotenv import load_dotenv
+from bot.routing import router as routing_router
 from bot.commands import router as commands_router
 from bot.expense import router as expense_router
-from core.db import init_db
-from core.models import User, Expense, Goal, Category, Transaction
+from bot.importer import router as importer_router
+from bot.middleware import (HandlerMetricsMiddleware, SendQueueMiddleware, TracingMiddleware,
+                           TracingRequestMiddleware, UpdateLoggingMiddleware)
+from core.db import engine, init_db
+from core.archive import archive_queued
+from core.backup import run_backup
+from core.currency import refresh_rates
+from core.digest import next_digest_time, send_digests
+from config import settings
+from core.writer import write_queue
+from bot.sender import send_queue
+from core.logs import setup_logging
+from core.metrics import instrument_engine, monitor_event_loop, start_metrics_server
+from core.tracing import trace_engine
+from bot.charts import shutdown_render_pool
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
@@ -20,32 +33,9 @@ load_dotenv()
 # Получаем токен бота из переменных окружения
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO, filename='finbot.log', filemode='a',
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-# Добавляем вывод логов в консоль
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logging.getLogger().addHandler(console_handler)
-
 # Получаем логгер для текущего модуля
 logger = logging.getLogger(__name__)
 
-# Словарь соответствия текстовых команд и их слеш-аналогов
-TEXT_COMMANDS = {
-    "помощь": "help",
-    "статистика": "stats",
-    "список": "list",
-    "отчет": "summary",
-    "категории": "categories",
-    "удалить": "delete",
-    "меню": "menu"
-}
-
 
 async def set_commands(bot: Bot):
     """Устанавливает команды бота в меню"""
@@ -56,6 +46,11 @@ async def set_commands(bot: Bot):
         BotCommand(command="list", description="Список транзакций"),
         BotCommand(command="summary", description="Отчет за месяц"),
         BotCommand(command="categories", description="Категории"),
+        BotCommand(command="search", description="Поиск транзакций"),
+        BotCommand(command="export", description="Выгрузить транзакции"),
+        BotCommand(command="digest", description="Настроить сводки"),
+        BotCommand(command="budget", description="Бюджеты категорий"),
+        BotCommand(command="goal", description="Цели и прогресс"),
         BotCommand(command="delete", description="Удалить транзакцию"),
         BotCommand(command="menu", description="Показать меню бота")
     ]
@@ -64,56 +59,154 @@ async def set_commands(bot: Bot):
     logging.info("Команды бота установлены")
 
 
-async def main():
-    """Основная функция запуска бота"""
+def create_dispatcher() -> Dispatcher:
+    """
+    Создает диспетчер со всеми роутерами и обработчиками
 
-    # Инициализируем бота и диспетчер с хранилищем состояний
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(
-        parse_mode=ParseMode.HTML))
+    Вынесено из main(), чтобы бенчмарки и тесты могли прогонять обновления
+    через настоящий диспетчер без запуска поллинга.
+
+    Returns:
+        Dispatcher: настроенный диспетчер
+    """
     dp = Dispatcher(storage=MemoryStorage())
 
-    # Регистрируем роутеры
+    # update_id и user_id в записях лога и время обработки каждого обновления
+    dp.update.outer_middleware(UpdateLoggingMiddleware())
+    # Дерево SQL, LLM и запросов к Telegram; медленные обновления — в лог
+    dp.update.outer_middleware(TracingMiddleware())
+    # Время обработчиков для метрик; middleware диспетчера действуют и во
+    # вложенных роутерах
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    # Регистрируем роутеры: классификатор текстовых сообщений идет первым,
+    # остальные роутеры обрабатывают inline-кнопки и прочие события
+    dp.include_router(routing_router)
     dp.include_router(commands_router)
     dp.include_router(expense_router)
+    dp.include_router(importer_router)
+
+    return dp
+
+
+async def archive_periodically() -> None:
+    """Раз в ARCHIVE_INTERVAL_HOURS переносит старые транзакции в архив"""
+    while True:
+        try:
+            await archive_queued(write_queue)
+        except Exception as e:
+            logger.error(f"Ошибка при переносе транзакций в архив: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_HOURS * 3600)
+
+
+async def backup_periodically() -> None:
+    """Раз в BACKUP_INTERVAL_HOURS снимает резервную копию работающей базы"""
+    while True:
+        await asyncio.sleep(settings.BACKUP_INTERVAL_HOURS * 3600)
+        try:
+            await asyncio.to_thread(run_backup)
+        except Exception as e:
+            logger.error(f"Ошибка при резервном копировании: {e}")
+
+
+async def rates_periodically() -> None:
+    """Раз в RATES_REFRESH_HOURS обновляет курсы валют из RATES_URL"""
+    while True:
+        try:
+            await asyncio.to_thread(refresh_rates)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении курсов валют: {e}")
+        await asyncio.sleep(settings.RATES_REFRESH_HOURS * 3600)
+
+
+async def digests_periodically() -> None:
+    """
+    Каждый день в DIGEST_HOUR часов рассылает ежедневные сводки, а по
+    понедельникам — еженедельные
+    """
+    while True:
+        run_at = next_digest_time(datetime.now())
+        await asyncio.sleep((run_at - datetime.now()).total_seconds())
+        kinds = []
+        if settings.DIGEST_DAILY:
+            kinds.append("daily")
+        if settings.DIGEST_WEEKLY and run_at.weekday() == 0:
+            kinds.append("weekly")
+        for kind in kinds:
+            try:
+                await send_digests(kind, send_queue.send, now=run_at)
+            except Exception as e:
+                logger.error(f"Ошибка при рассылке сводок {kind}: {e}")
+
 
-    # Обработчик для текстовых команд
-    @dp.message(lambda message: message.text and message.text.lower() in TEXT_COMMANDS)
-    async def process_text_command(message: Message):
-        """Обрабатывает текстовые команды и перенаправляет на соответствующие слеш-команды"""
-        command = TEXT_COMMANDS[message.text.lower()]
-
-        # Вместо изменения объекта message, вызываем соответствующий обработчик напрямую
-        if command == "help":
-            from bot.commands import cmd_help
-            await cmd_help(message)
-        elif command == "stats":
-            from bot.commands import cmd_stats
-            await cmd_stats(message)
-        elif command == "list":
-            from bot.commands import cmd_list_transactions
-            await cmd_list_transactions(message)
-        elif command == "summary":
-            from bot.commands import cmd_summary
-            await cmd_summary(message)
-        elif command == "categories":
-            from bot.commands import cmd_categories
-            await cmd_categories(message)
-        elif command == "delete":
-            from bot.commands import cmd_delete_last
-            await cmd_delete_last(message)
-        elif command == "menu":
-            from bot.commands import cmd_menu
-            await cmd_menu(message)
+async def main():
+    """Основная функция запуска бота"""
+
+    # Лог пишется фоновым потоком: JSON-строки в UTF-8 с ротацией
+    log_listener = setup_logging()
+
+    # Инициализируем бота и диспетчер с хранилищем состояний
+    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(
+        parse_mode=ParseMode.HTML))
+    bot.session.middleware(TracingRequestMiddleware())
+    # Ответы обработчиков идут через очередь отправки раньше фоновых рассылок
+    bot.session.middleware(SendQueueMiddleware(send_queue))
+    dp = create_dispatcher()
 
     # Создаем таблицы в БД, если их нет
     init_db()
 
+    # SQL-запросы в дереве трассировки обновления
+    if settings.TRACE_ENABLED:
+        trace_engine(engine)
+
+    # Метрики Prometheus: запросы к базе, задержка event loop и страница /metrics
+    instrument_engine(engine)
+    metrics_runner = None
+    lag_task = None
+    if settings.METRICS_PORT:
+        metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+        lag_task = asyncio.create_task(monitor_event_loop(settings.METRICS_LOOP_LAG_INTERVAL))
+
     # Настраиваем команды бота
     await set_commands(bot)
 
+    # Запускаем единственного писателя БД с групповыми коммитами
+    await write_queue.start()
+    # Исходящие сообщения идут через очередь с лимитами Telegram
+    await send_queue.start(bot)
+
+    # Перенос старых транзакций в архив идет фоном, пачками
+    archive_task = None
+    if settings.ARCHIVE_INTERVAL_HOURS > 0:
+        archive_task = asyncio.create_task(archive_periodically())
+    backup_task = None
+    if settings.BACKUP_INTERVAL_HOURS > 0:
+        backup_task = asyncio.create_task(backup_periodically())
+    rates_task = None
+    if settings.RATES_URL and settings.RATES_REFRESH_HOURS > 0:
+        rates_task = asyncio.create_task(rates_periodically())
+    digest_task = None
+    if settings.DIGEST_DAILY or settings.DIGEST_WEEKLY:
+        digest_task = asyncio.create_task(digests_periodically())
+
     # Запускаем бота
     logger.info("Запуск бота...")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        for task in (archive_task, backup_task, rates_task, digest_task, lag_task):
+            if task is not None:
+                task.cancel()
+        # Досылаем то, что уже в очереди отправки, но не дольше 30 секунд
+        await send_queue.stop(timeout=30)
+        # Фиксируем операции, оставшиеся в очереди записи
+        await write_queue.stop()
+        shutdown_render_pool()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        log_listener.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,46 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.db import Base, configure_sqlite
+from core.writer import WriteQueue
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """
+    Временная файловая БД со всеми таблицами и настройками SQLite бота
+
+    Модули тестов добавляют свои данные, переопределяя фикстуру:
+    def engine(engine): <данные>; return engine
+    """
+    engine = configure_sqlite(create_engine(f"sqlite:///{tmp_path / 'test.db'}"))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def run_writes(engine):
+    """
+    Выполняет операции записи через очередь над БД теста
+
+    Операции отправляются разом и фиксируются одной группой; возвращается
+    список их результатов или исключений.
+    """
+    def run(*ops):
+        async def scenario():
+            queue = WriteQueue(bind=engine, max_delay_ms=50)
+            await queue.start()
+            futures = [queue.submit(op) for op in ops]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            await queue.stop()
+            return results
+        return asyncio.run(scenario())
+    return run
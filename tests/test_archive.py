@@ -0,0 +1,199 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.archive import (archive_boundary, archive_cutoff, archive_queued,
+                          archive_transactions, archived_transactions, attach_archive,
+                          enable_autoincrement)
+from core.db import Base, configure_sqlite
+from core.models import User, Category, Transaction
+from core.search import ensure_search_index, search_transactions
+from core.writer import WriteQueue
+from bot.commands import fetch_transactions_page
+from bot.export import iter_export_rows
+
+NOW = datetime(2024, 6, 15)
+
+
+@pytest.fixture
+def engine(engine, tmp_path):
+    """Файловая БД с архивом и двумя годами истории: по транзакции в день"""
+    attach_archive(engine, str(tmp_path / "test_archive.db"))
+    ensure_search_index(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id=1, telegram_id=100))
+        db.add(Category(id=1, user_id=1, name="такси", is_expense=1))
+        start = datetime(2022, 7, 1)
+        db.add_all([
+            Transaction(user_id=1, amount=100 + day, category_id=1, is_expense=1,
+                        description="такси аэропорт" if day % 30 == 0 else "такси",
+                        transaction_date=start + timedelta(days=day))
+            for day in range(714)
+        ])
+        db.commit()
+    return engine
+
+
+def monthly_totals(db):
+    """Суммы по месяцам по основной таблице и архиву вместе"""
+    totals = {}
+    for table in (Transaction.__table__, archived_transactions):
+        month = func.strftime("%Y-%m", table.c.transaction_date)
+        for month, total in db.query(month, func.sum(table.c.amount)).group_by(month):
+            totals[month] = totals.get(month, 0) + total
+    return totals
+
+
+class TestArchive:
+    """Тесты переноса старых транзакций в архив"""
+
+    def test_cutoff(self):
+        """Граница — начало месяца; меньше двух месяцев горизонт не бывает"""
+        assert archive_cutoff(12, NOW) == datetime(2023, 6, 1)
+        assert archive_cutoff(0, NOW) == datetime(2024, 4, 1)
+
+    def test_move_keeps_totals(self, engine):
+        """Старые строки переносятся пачками, месячные суммы не меняются"""
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            before = monthly_totals(db)
+
+        result = archive_transactions(engine, months=12, batch_size=100, now=NOW)
+
+        with Session() as db:
+            assert result.moved == db.query(archived_transactions).count() == 335
+            assert db.query(func.min(Transaction.transaction_date)).scalar() == datetime(2023, 6, 1)
+            assert archive_boundary(db, 1) == datetime(2023, 5, 31)
+            assert monthly_totals(db) == before
+
+        # Повторный запуск ничего не переносит
+        assert archive_transactions(engine, months=12, now=NOW).moved == 0
+
+    def test_archived_ids_not_reused(self, engine):
+        """Новые транзакции не получают id строк, перенесенных в архив"""
+        archive_transactions(engine, months=0, now=NOW)
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            archived_max = db.query(func.max(archived_transactions.c.id)).scalar()
+            db.query(Transaction).delete()
+            tx = Transaction(user_id=1, amount=1, category_id=1, transaction_date=NOW)
+            db.add(tx)
+            db.commit()
+            assert tx.id > archived_max
+
+    def test_conflicting_archive_id_fails(self, engine):
+        """Занятый в архиве другими данными id не теряет строку основной таблицы"""
+        with engine.begin() as conn:
+            conn.execute(insert(archived_transactions).values(
+                id=1, user_id=1, amount=1, transaction_date=datetime(2020, 1, 1)))
+
+        with pytest.raises(RuntimeError, match="уже заняты"):
+            archive_transactions(engine, months=12, now=NOW)
+
+        with sessionmaker(bind=engine)() as db:
+            assert db.get(Transaction, 1).amount == 100
+
+    def test_archive_through_write_queue(self, engine):
+        """Бот переносит пачки через очередь записи"""
+        async def scenario():
+            queue = WriteQueue(bind=engine)
+            await queue.start()
+            try:
+                return await archive_queued(queue, months=24, batch_size=100)
+            finally:
+                await queue.stop()
+
+        result = asyncio.run(scenario())
+        with sessionmaker(bind=engine)() as db:
+            assert result.moved == db.query(archived_transactions).count() > 0
+            assert db.query(Transaction).filter(
+                Transaction.transaction_date < result.cutoff).count() == 0
+
+    def test_enable_autoincrement_migration(self, tmp_path):
+        """Старая таблица пересоздается с AUTOINCREMENT, счетчик учитывает архив"""
+        engine = configure_sqlite(create_engine(f"sqlite:///{tmp_path / 'old.db'}"))
+        attach_archive(engine, str(tmp_path / "old_archive.db"))
+        table = Transaction.__table__
+        old_ddl = str(CreateTable(table).compile(engine)).replace(" AUTOINCREMENT", "")
+        with engine.begin() as conn:
+            conn.execute(text(old_ddl))
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(table), [
+                {"id": row_id, "user_id": 1, "amount": row_id, "transaction_date": NOW}
+                for row_id in (1, 2, 3)])
+            conn.execute(insert(archived_transactions).values(
+                id=10, user_id=1, amount=10, transaction_date=datetime(2020, 1, 1)))
+
+        assert enable_autoincrement(engine)
+        assert not enable_autoincrement(engine)
+        with engine.begin() as conn:
+            assert list(conn.execute(text("SELECT amount FROM transactions")).scalars()) == [1, 2, 3]
+            new_id = conn.execute(insert(table).values(
+                user_id=1, amount=4, transaction_date=NOW)).inserted_primary_key[0]
+            assert new_id == 11
+            indexes = {row[1] for row in conn.execute(text("PRAGMA index_list(transactions)"))}
+            assert "ix_transactions_user_date" in indexes
+        engine.dispose()
+
+    def test_archive_search_ignores_cyrillic_case(self, engine):
+        """Архив ищется без FTS5, но регистр кириллицы не мешает поиску"""
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            db.add(Transaction(user_id=1, amount=900, category_id=1, is_expense=1,
+                               description="Такси до Шереметьево",
+                               transaction_date=datetime(2022, 9, 3, 12)))
+            db.add(Transaction(user_id=1, amount=100, category_id=1, is_expense=1,
+                               description="такси", transaction_date=NOW))
+            db.commit()
+
+        archive_transactions(engine, months=12, now=NOW)
+
+        with Session() as db:
+            assert db.query(archived_transactions).filter(
+                archived_transactions.c.amount == 900).count() == 1
+            found = search_transactions(db, 1, "шереметьево")
+            assert found.count == 1 and found.total_expense == 900
+            assert search_transactions(db, 1, "ШЕРЕМЕТЬЕВО такси").count == 1
+
+    def test_reads_union_archive(self, engine):
+        """/list листает в архив, /search и выгрузка включают архивные строки"""
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            found_before = search_transactions(db, 1, "аэропорт")
+            exported_before = [row for batch in iter_export_rows(db, 1) for row in batch]
+
+        archive_transactions(engine, months=12, now=NOW)
+
+        with Session() as db:
+            found = search_transactions(db, 1, "аэропорт", limit=100)
+            assert (found.count, found.total_expense) == (found_before.count, found_before.total_expense)
+            assert len(found.rows) == found.count
+
+            old = search_transactions(db, 1, "такси", datetime(2022, 8, 1), datetime(2022, 9, 1))
+            assert old.count == 31
+
+            exported = [row for batch in iter_export_rows(db, 1) for row in batch]
+            assert exported == exported_before
+
+            # Листаем всю историю страницами и возвращаемся на страницу назад
+            seen, cursor, has_older = [], None, True
+            while has_older:
+                rows, has_older, _ = fetch_transactions_page(db, 1, cursor_id=cursor, limit=50)
+                seen += [tx.transaction_date for tx, _, _ in rows]
+                cursor = rows[-1][0].id
+            assert len(seen) == 714
+            assert seen == sorted(seen, reverse=True)
+
+            rows, _, has_newer = fetch_transactions_page(db, 1, cursor_id=cursor, direction="newer", limit=50)
+            assert has_newer
+            assert [tx.transaction_date for tx, _, _ in rows] == seen[-51:-1]
@@ -0,0 +1,86 @@
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core import backup
+from core.backup import backup_database, rotate_backups, verify_backup
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Файловая БД в WAL-режиме на несколько сотен страниц"""
+    path = tmp_path / "finbot.db"
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY, description TEXT)")
+    conn.executemany("INSERT INTO transactions (description) VALUES (?)",
+                     [(f"покупка {i}" * 5,) for i in range(20000)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+class TestBackup:
+    """Тесты резервного копирования"""
+
+    def test_backup_while_writing(self, database, tmp_path, monkeypatch):
+        """Копия снимается шагами, пока в базу пишут, и проходит проверку"""
+        monkeypatch.setattr(backup.settings, "BACKUP_PAGES_PER_STEP", 16)
+        monkeypatch.setattr(backup.settings, "BACKUP_STEP_SLEEP_MS", 0)
+        stop = threading.Event()
+
+        def writer():
+            conn = sqlite3.connect(database)
+            while not stop.is_set():
+                conn.execute("INSERT INTO transactions (description) VALUES ('новая')")
+                conn.commit()
+            conn.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            result = backup_database(str(database), str(tmp_path / "backups"), compress=True)
+        finally:
+            stop.set()
+            thread.join()
+
+        assert result.path.name.endswith(".db.gz")
+        assert result.pages > 16
+        assert not list((tmp_path / "backups").glob(".*"))  # временные файлы убраны
+
+        check = verify_backup(str(result.path))
+        assert check.ok
+        assert check.tables["transactions"] >= 20000
+
+    def test_verify_detects_damage(self, database, tmp_path):
+        """Поврежденная копия не проходит проверку"""
+        result = backup_database(str(database), str(tmp_path), compress=False)
+        data = bytearray(result.path.read_bytes())
+        data[4096 * 3:4096 * 3 + 512] = b"\xff" * 512
+        result.path.write_bytes(bytes(data))
+
+        assert not verify_backup(str(result.path)).ok
+
+        broken = tmp_path / "finbot-20240101_000000.db.gz"
+        broken.write_bytes(b"not gzip")
+        assert not verify_backup(str(broken)).ok
+
+    def test_rotation(self, database, tmp_path):
+        """Остаются только последние копии"""
+        start = datetime(2024, 1, 1)
+        for day in range(4):
+            backup_database(str(database), str(tmp_path), compress=False,
+                            now=start + timedelta(days=day))
+
+        removed = rotate_backups("finbot", keep=2, backup_dir=str(tmp_path))
+
+        assert [path.name for path in removed] == ["finbot-20240102_000000.db",
+                                                    "finbot-20240101_000000.db"]
+        assert len(list(tmp_path.glob("finbot-*.db"))) == 2
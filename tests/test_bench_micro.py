@@ -0,0 +1,35 @@
+import random
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import bench_micro
+from core import llm
+
+
+class TestMicroBenchmarks:
+    """Тесты набора микробенчмарков"""
+
+    def test_inputs_reproducible(self):
+        """Входные данные зависят только от seed"""
+        first = bench_micro.make_messages(random.Random(7), 50)
+        assert first == bench_micro.make_messages(random.Random(7), 50)
+        assert first != bench_micro.make_messages(random.Random(8), 50)
+
+    def test_suite_and_compare(self, tmp_path, monkeypatch):
+        """Все бенчмарки проходят, сравнение находит замедление"""
+        # build_cases подменяет LLM и очередь записи; после теста вернем их
+        for name in ("write_queue", "LLM_AVAILABLE", "_client"):
+            monkeypatch.setattr(llm, name, getattr(llm, name))
+
+        results = bench_micro.run_suite(size=20, repeat=1, min_time=0.001)
+        assert set(results) == {case.name for case in bench_micro.build_cases(size=5)}
+        assert all(value > 0 for value in results.values())
+
+        path = tmp_path / "baseline.json"
+        bench_micro.save_baseline(results, path)
+        baseline = bench_micro.load_baseline(path)
+        slower = dict(results, get_category_emoji=baseline["get_category_emoji"] * 2)
+        assert bench_micro.compare(slower, baseline, threshold=0.5) == ["get_category_emoji"]
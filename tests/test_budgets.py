@@ -0,0 +1,111 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bot.commands import delete_transaction
+from bot.expense import parse_bulk_message, save_bulk_transactions
+from core import budgets
+from core.budgets import BudgetAlert, SpendingState, add_spending, remove_spending, set_budget
+from core.models import BudgetSpending, Category, Transaction, User
+from core.writer import insert
+
+NOW = datetime(2024, 3, 20)
+
+
+@pytest.fixture
+def engine(engine, monkeypatch):
+    """Временная БД с пользователем, категорией и расходом в марте"""
+    monkeypatch.setattr(budgets, "_limits", {})
+    monkeypatch.setattr(budgets, "_spent", {})
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id=1, telegram_id=100))
+        db.add(Category(id=1, user_id=1, name="кафе", emoji="☕", is_expense=1))
+        db.add(Transaction(user_id=1, amount=3000, currency="RUB", category_id=1,
+                           transaction_date=datetime(2024, 3, 2), is_expense=1))
+        db.commit()
+    return engine
+
+
+def spend(amount, day=NOW):
+    def op(db):
+        return add_spending(db, 1, [(1, amount, day)], now=NOW)
+    return op
+
+
+def stored(engine, month="2024-03"):
+    with sessionmaker(bind=engine)() as db:
+        return db.query(BudgetSpending.spent, BudgetSpending.alerted).filter(
+            BudgetSpending.month == month).one()
+
+
+class TestBudgets:
+    """Тесты бюджетов со счетчиками расходов"""
+
+    def test_thresholds(self, engine, run_writes):
+        """Счетчик начинается с расходов месяца, каждый порог сообщается однажды"""
+        assert run_writes(set_budget(1, 1, 5000, now=NOW)) == [SpendingState(3000, 0)]
+
+        assert run_writes(spend(1000)) == [[BudgetAlert(1, 80, 4000, 5000)]]
+        assert run_writes(spend(500)) == [[]]
+        assert run_writes(spend(600)) == [[BudgetAlert(1, 100, 5100, 5000)]]
+        # Расход прошлого месяца считается, но не уведомляет
+        assert run_writes(spend(4500, datetime(2024, 2, 10))) == [[]]
+        assert stored(engine) == (5100, 100)
+        assert stored(engine, "2024-02") == (4500, 80)
+
+        # Удаление снижает порог, и он может сработать снова
+        def refund(db):
+            remove_spending(db, 1, [(1, 1500, NOW)])
+        run_writes(refund)
+        assert stored(engine) == (3600, 0)
+        assert run_writes(spend(400)) == [[BudgetAlert(1, 80, 4000, 5000)]]
+
+    def test_counters_survive_restart_and_rollback(self, engine, monkeypatch, run_writes):
+        """После перезапуска счетчик читается из базы; откат группы не удваивает сумму"""
+        run_writes(set_budget(1, 1, 10000, now=NOW))
+        monkeypatch.setattr(budgets, "_spent", {})
+        monkeypatch.setattr(budgets, "_limits", {})
+
+        def fail(db):
+            raise RuntimeError("сбой операции")
+
+        results = run_writes(spend(1000), fail)
+        assert results[0] == []
+        assert isinstance(results[1], RuntimeError)
+        assert stored(engine) == (4000, 0)
+        assert budgets._spent[(1, 1, "2024-03")] == SpendingState(4000, 0)
+
+    def test_bulk_reports_alerts(self, engine, run_writes):
+        """Пачка транзакций возвращает пройденные пороги через список alerts"""
+        run_writes(set_budget(1, 1, 2000))
+        parsed, _ = parse_bulk_message("1500 капучино\n900 круассан")
+        alerts = []
+        run_writes(save_bulk_transactions(1, [(item, "кафе") for item in parsed], alerts))
+        assert [(alert.threshold, alert.spent) for alert in alerts] == [(100, 2400)]
+        assert stored(engine, datetime.now().strftime("%Y-%m")) == (2400, 100)
+
+    def test_repeated_delete_decrements_once(self, engine, run_writes):
+        """Повторное подтверждение удаления не уменьшает счетчик второй раз"""
+        run_writes(set_budget(1, 1, 5000, now=NOW), spend(1000))
+        with sessionmaker(bind=engine)() as db:
+            transaction = db.get(Transaction, 1)
+        delete_op = delete_transaction(1, transaction)
+
+        assert run_writes(delete_op) == [1]
+        assert run_writes(delete_op) == [0]
+        assert stored(engine) == (1000, 0)
+        assert budgets._spent[(1, 1, "2024-03")] == SpendingState(1000, 0)
+
+        # Счетчика месяца еще нет: он посчитается по оставшимся транзакциям
+        february = Transaction(user_id=1, amount=700, currency="RUB", category_id=1,
+                               transaction_date=datetime(2024, 2, 5), is_expense=1)
+        run_writes(insert(february))
+        assert run_writes(delete_transaction(1, february)) == [1]
+        with sessionmaker(bind=engine)() as db:
+            assert db.query(BudgetSpending).filter(BudgetSpending.month == "2024-02").count() == 0
@@ -0,0 +1,144 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot
+
+from benchmarks.fakes import FAKE_TOKEN, RecordingSession, make_message
+from bot import expense
+from core import llm
+from core.models import User, Category, CategoryCache, Expense, Transaction
+from core.writer import WriteQueue
+from bot.expense import (parse_bulk_message, process_bulk_transactions,
+                         save_bulk_transactions)
+
+
+@pytest.fixture
+def engine(engine):
+    """Временная файловая БД с пользователем"""
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id=1, telegram_id=100))
+        db.add(Category(user_id=1, name="кафе", emoji="☕", is_expense=1))
+        db.commit()
+    return engine
+
+
+class FakeCompletions:
+    """Заглушка LLM: отвечает нумерованным списком и считает запросы"""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=self.answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class TestBulkEntry:
+    """Тесты многострочного ввода транзакций"""
+
+    def test_parse_bulk_message(self):
+        """Каждая строка разбирается отдельно, мусорные строки возвращаются"""
+        parsed, unrecognized = parse_bulk_message(
+            "500 обед\n\n-150 такси\nпросто текст\n+50000 зарплата")
+
+        assert [item["amount"] for item in parsed] == [500.0, 150.0, 50000.0]
+        assert [item["is_expense"] for item in parsed] == [True, True, False]
+        assert parsed[1]["line"] == "-150 такси"
+        assert unrecognized == ["просто текст"]
+
+    def test_save_bulk_single_commit(self, engine):
+        """Пачка сохраняется одним коммитом вместе с новыми категориями"""
+        commits = []
+        event.listen(engine, "commit", lambda conn: commits.append(1))
+        parsed, _ = parse_bulk_message("300 капучино\n1200 магнит\n+1000 кэшбэк")
+        items = list(zip(parsed, ["кафе", "продукты", "доход"]))
+
+        async def scenario():
+            queue = WriteQueue(bind=engine)
+            await queue.start()
+            categories = await queue.submit(save_bulk_transactions(1, items))
+            await queue.stop()
+            return categories
+
+        categories = asyncio.run(scenario())
+
+        assert len(commits) == 1
+        assert categories[("кафе", 1)].id == 1
+        with sessionmaker(bind=engine)() as db:
+            assert db.query(Transaction).count() == 3
+            assert db.query(Expense).count() == 2
+            assert {name for name, in db.query(Category.name)} == {"кафе", "продукты", "доход"}
+
+    def test_categorize_transactions_one_llm_call(self, engine, monkeypatch):
+        """Промахи кэша и словаря категоризируются одним запросом к LLM"""
+        completions = FakeCompletions("1. кафе\n2. развлечения")
+        monkeypatch.setattr(llm, "_client", SimpleNamespace(
+            chat=SimpleNamespace(completions=completions)))
+        monkeypatch.setattr(llm, "write_queue", WriteQueue(bind=engine))
+
+        with sessionmaker(bind=engine)() as db:
+            result = llm.categorize_transactions(
+                ["Капучино у дома", "хлеб", "капучино у дома", "билеты в кино"], db, 1)
+
+            assert completions.calls == 1
+            assert result["капучино у дома"] == "кафе"
+            assert result["билеты в кино"] == "другое"  # нет у пользователя
+            assert db.query(CategoryCache).count() == 2
+
+            # Повторная категоризация берется из кэша без запросов к LLM
+            llm.categorize_transactions(["капучино у дома"], db, 1)
+            assert completions.calls == 1
+
+    def test_stale_cache_entry_is_replaced(self, engine, monkeypatch):
+        """Категория из кэша, которой нет у пользователя, заменяется новым ответом"""
+        completions = FakeCompletions("1. кафе")
+        monkeypatch.setattr(llm, "_client", SimpleNamespace(
+            chat=SimpleNamespace(completions=completions)))
+        monkeypatch.setattr(llm, "write_queue", WriteQueue(bind=engine))
+
+        with sessionmaker(bind=engine)() as db:
+            db.add(CategoryCache(description_hash=llm.description_hash("капучино у дома"),
+                                 description="капучино у дома", category_name="путешествия"))
+            db.commit()
+
+            assert llm.categorize_transactions(["капучино у дома"], db, 1) == {
+                "капучино у дома": "кафе"}
+            assert llm.categorize_transactions(["капучино у дома"], db, 1) == {
+                "капучино у дома": "кафе"}
+            assert completions.calls == 1
+            db.expire_all()
+            assert db.query(CategoryCache.category_name).scalar() == "кафе"
+
+    def test_bulk_reply_escapes_user_text(self, engine, monkeypatch):
+        """Описания и нераспознанные строки экранируются в HTML-ответе"""
+        queue = WriteQueue(bind=engine)
+        monkeypatch.setattr(expense, "SessionLocal", sessionmaker(bind=engine))
+        monkeypatch.setattr(expense, "write_queue", queue)
+        monkeypatch.setattr(llm, "write_queue", queue)
+        monkeypatch.setattr(llm, "LLM_AVAILABLE", False)
+        session = RecordingSession()
+        message = make_message(100, "150 кофе <3\n200 чай & сахар\nпривет <b>").as_(
+            Bot(token=FAKE_TOKEN, session=session))
+
+        async def scenario():
+            await queue.start()
+            await process_bulk_transactions(message)
+            await queue.stop()
+
+        asyncio.run(scenario())
+
+        text = session.calls("SendMessage")[-1].text
+        assert "Добавлено транзакций: <b>2</b>" in text
+        assert "кофе &lt;3" in text and "чай &amp; сахар" in text
+        assert "<i>привет &lt;b&gt;</i>" in text
@@ -0,0 +1,76 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import bot.charts as charts
+from bot.charts import render_category_pie, render_daily_bars
+from core.cache import LRUCache
+from core.versions import bump_data_version
+
+
+class TestChartRendering:
+    """Тесты отрисовки графиков"""
+
+    def test_renderers_return_png(self):
+        """Графики рисуются в PNG"""
+        pie = render_category_pie(
+            [("продукты", 5000.0), ("кафе", 1200.0), ("такси", 300.0)], "Тест")
+        bars = render_daily_bars([("01.03", 500.0), ("02.03", 750.0)], "Тест")
+
+        assert pie.startswith(b"\x89PNG")
+        assert bars.startswith(b"\x89PNG")
+
+
+class TestChartCache:
+    """Тесты кэша графиков"""
+
+    def test_lru_eviction(self):
+        """Кэш вытесняет давно не использованные записи"""
+        cache = LRUCache(max_size=2)
+        cache.put("a", b"1")
+        cache.put("b", b"2")
+        cache.get("a")
+        cache.put("c", b"3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        assert len(cache) == 2
+        cache.clear()
+        assert len(cache) == 0 and cache.get("a") is None
+
+    def test_repeated_view_served_from_cache(self, monkeypatch):
+        """Повторный просмотр не перерисовывает график, запись данных — перерисовывает"""
+        renders = []
+
+        def fake_render(data, title):
+            renders.append(title)
+            return b"png"
+
+        class InlinePool:
+            """Выполняет отрисовку в текущем процессе"""
+            def submit(self, fn, *args):
+                from concurrent.futures import Future
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+
+        monkeypatch.setitem(charts.RENDERERS, "pie", fake_render)
+        monkeypatch.setattr(charts, "chart_cache", LRUCache(max_size=10))
+        monkeypatch.setattr(charts, "get_render_pool", lambda: InlinePool())
+
+        def load():
+            return [("продукты", 100.0)]
+
+        async def view():
+            return await charts.get_chart(777, "pie", "2024-03", load, "Март")
+
+        assert asyncio.run(view()) == b"png"
+        assert asyncio.run(view()) == b"png"
+        assert len(renders) == 1
+
+        bump_data_version(777)
+        asyncio.run(view())
+        assert len(renders) == 2
@@ -0,0 +1,140 @@
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bot.commands import category_totals
+from bot.expense import month_totals, parse_transaction_message
+from core.currency import RateTable, migrate_amounts, normalize_currency
+from core.db import run_migrations
+from core.models import Category, Transaction, User
+
+RATES_CSV = """date,currency,rate
+2024-01-01,USD,90
+2024-01-10,USD,92.5
+2024-01-01,EUR,100
+"""
+
+
+@pytest.fixture
+def table():
+    rates = RateTable()
+    rates.load_csv(RATES_CSV)
+    return rates
+
+
+@pytest.fixture
+def db(engine, table, monkeypatch):
+    """Временная БД с пользователем и курсами из RATES_CSV"""
+    for module in ("core.currency", "bot.expense", "bot.commands"):
+        monkeypatch.setattr(f"{module}.rates", table)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, telegram_id=100))
+    session.add(Category(id=1, user_id=1, name="путешествия", emoji="✈️", is_expense=True))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add(db, amount: float, code: str, day: datetime, is_expense: bool = True) -> None:
+    db.add(Transaction(user_id=1, amount=amount, original_amount=amount, currency=code,
+                       category_id=1, description=f"{amount} {code}",
+                       transaction_date=day, is_expense=is_expense))
+    db.commit()
+
+
+class TestCurrency:
+    """Тесты валют и таблицы курсов"""
+
+    def test_normalize_currency(self):
+        """Коды, символы и написания приводятся к ISO 4217"""
+        assert normalize_currency("usd") == "USD"
+        assert normalize_currency("$") == "USD"
+        assert normalize_currency("€") == "EUR"
+        assert normalize_currency("руб") == "RUB"
+        assert normalize_currency("PEN") == "PEN"
+        # Редкие коды в нижнем регистре — обычные слова
+        assert normalize_currency("pen") is None
+        assert normalize_currency("кофе") is None
+
+    def test_rate_by_date(self, table):
+        """Курс на дату — последний известный, без котировок — запасной"""
+        assert table.rate("RUB") == 1.0
+        assert table.rate("USD", date(2024, 1, 5)) == 90
+        assert table.rate("USD", "2024-01-10 12:00:00.000000") == 92.5
+        assert table.rate("USD", date(2023, 12, 1)) == 90
+        assert table.rate("USD") == 92.5
+        assert table.rate("EUR", date(2024, 6, 1)) == 100
+        assert table.rate("GBP") == 1.0
+        assert ("USD", date(2024, 1, 5)) in table._cache
+
+    def test_convert_totals(self, table):
+        """Промежуточные итоги по валютам складываются в рубли по ключу"""
+        rows = [
+            (1, "RUB", None, 500.0),
+            (1, "USD", "2024-01-05", 10.0),
+            (1, "USD", "2024-01-11", 2.0),
+            (0, "EUR", "2024-01-02", 1.0),
+        ]
+        assert table.convert_totals(rows) == {1: 1585.0, 0: 100.0}
+        assert table.convert_totals([("a", "b", "RUB", None, 1.0)]) == {("a", "b"): 1.0}
+
+    def test_parse_keeps_original_currency(self):
+        """Сумма хранится в валюте операции"""
+        result = parse_transaction_message("50 USD книги")
+        assert (result["amount"], result["currency"]) == (50.0, "USD")
+        result = parse_transaction_message("20$ кофе")
+        assert (result["amount"], result["currency"]) == (20.0, "USD")
+        result = parse_transaction_message("300 обед")
+        assert (result["amount"], result["currency"]) == (300.0, "RUB")
+
+    def test_reports_convert_by_day(self, db):
+        """Итоги месяца и категорий пересчитываются по курсу дня операции"""
+        add(db, 1000, "RUB", datetime(2024, 1, 3))
+        add(db, 10, "USD", datetime(2024, 1, 5))
+        add(db, 10, "USD", datetime(2024, 1, 12))
+        add(db, 5, "EUR", datetime(2024, 1, 15), is_expense=False)
+
+        expenses, incomes = month_totals(db, 1, datetime(2024, 1, 1))
+        assert expenses == 1000 + 900 + 925
+        assert incomes == 500
+        totals = category_totals(db, 1, datetime(2024, 1, 1), datetime(2024, 1, 10))
+        assert totals == {(1, "путешествия", "✈️"): 1900}
+
+    def test_migrate_amounts(self, engine):
+        """Рублевые суммы старых валютных строк заменяются суммой в валюте"""
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO transactions (user_id, amount, original_amount, currency, "
+                "transaction_date, is_expense) VALUES "
+                "(1, 4500, 50, 'USD', '2024-01-01', 1), (1, 300, 300, 'RUB', '2024-01-01', 1)"))
+        assert migrate_amounts(engine) == 1
+        assert migrate_amounts(engine) == 0
+        with engine.connect() as conn:
+            amounts = conn.execute(text("SELECT amount FROM transactions ORDER BY id")).scalars()
+            assert list(amounts) == [50, 300]
+
+    def test_migrations_run_once(self, engine):
+        """Миграции выполняются один раз, следующий старт их пропускает"""
+        insert_row = text(
+            "INSERT INTO transactions (user_id, amount, original_amount, currency, "
+            "transaction_date, is_expense) VALUES (1, 4500, 50, 'USD', '2024-01-01', 1)")
+        with engine.begin() as conn:
+            conn.execute(insert_row)
+        applied = run_migrations(engine)
+        assert applied >= 1
+
+        # Строка после миграции не исправляется: таблица больше не сканируется
+        with engine.begin() as conn:
+            conn.execute(insert_row)
+        assert run_migrations(engine) == 0
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA user_version")).scalar() == applied
+            amounts = conn.execute(text("SELECT amount FROM transactions ORDER BY id")).scalars()
+            assert list(amounts) == [50, 4500]
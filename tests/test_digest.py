@@ -0,0 +1,158 @@
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bot.sender import SendQueue
+from core import currency
+from core.currency import RateTable
+from core.digest import digest_period, format_digest, iter_digests, send_digests
+from core.models import Category, DigestOptOut, Transaction, User
+
+# Понедельник: ежедневная сводка за воскресенье 16.06, недельная — за 10–16.06
+NOW = datetime(2024, 6, 17, 9)
+
+
+@pytest.fixture
+def engine(engine, monkeypatch):
+    """Временная БД: активные пользователи, неактивный и отказавшийся от сводок"""
+    table = RateTable()
+    table.load_csv("date,currency,rate\n2024-06-01,USD,90\n")
+    monkeypatch.setattr(currency, "rates", table)
+    monkeypatch.setattr("core.digest.rates", table)
+
+    with sessionmaker(bind=engine)() as db:
+        for user_id in range(1, 5):
+            db.add(User(id=user_id, telegram_id=100 + user_id))
+            db.add(Category(id=user_id * 10, user_id=user_id, name="кафе", emoji="☕",
+                            is_expense=1))
+            db.add(Category(id=user_id * 10 + 1, user_id=user_id, name="такси", emoji="🚕",
+                            is_expense=1))
+
+        def tx(user_id, amount, day, category=0, is_expense=1, currency="RUB"):
+            db.add(Transaction(user_id=user_id, amount=amount, currency=currency,
+                               category_id=user_id * 10 + category, is_expense=is_expense,
+                               transaction_date=day))
+
+        # Пользователь 1: рубли и доллары, доход, расходы прошлой недели
+        tx(1, 500, datetime(2024, 6, 16, 12))
+        tx(1, 10, datetime(2024, 6, 16, 18), category=1, currency="USD")
+        tx(1, 30000, datetime(2024, 6, 14), is_expense=0)
+        tx(1, 1000, datetime(2024, 6, 5))
+        tx(1, 200, datetime(2024, 6, 15))
+        # Пользователь 2: только на неделе, вчера ничего
+        tx(2, 700, datetime(2024, 6, 11))
+        # Пользователь 3: давно неактивен
+        tx(3, 100, datetime(2024, 1, 1))
+        # Пользователь 4: активен, но отказался от ежедневной сводки
+        tx(4, 300, datetime(2024, 6, 16))
+        db.add(DigestOptOut(user_id=4, kind="daily"))
+        db.commit()
+    return engine
+
+
+def collect(period, engine, batch_size=2):
+    return {digest.telegram_id: digest
+            for _, batch in iter_digests(period, engine, batch_size) for digest in batch}
+
+
+class TestDigest:
+    """Тесты расчета и рассылки сводок"""
+
+    def test_daily(self, engine):
+        """Сводка за вчера только активным пользователям без отказа, валюты в рублях"""
+        period = digest_period("daily", NOW)
+        assert (period.start, period.end) == (datetime(2024, 6, 16), datetime(2024, 6, 17))
+        digests = collect(period, engine)
+        assert list(digests) == [101]
+        digest = digests[101]
+        assert (digest.expenses, digest.incomes, digest.count) == (1400, 0, 2)
+        assert digest.previous_expenses == 200
+        assert digest.top_category == ("такси", "🚕", 900)
+        text = format_digest(digest, period)
+        assert "16 июня" in text and "1 400" in text and "+600%" in text
+
+    def test_weekly(self, engine):
+        """Недельная сводка с понедельника по воскресенье и сравнение с прошлой неделей"""
+        period = digest_period("weekly", NOW)
+        assert (period.start, period.previous_start) == (datetime(2024, 6, 10),
+                                                         datetime(2024, 6, 3))
+        digests = collect(period, engine, batch_size=1)
+        assert sorted(digests) == [101, 102, 104]
+        assert (digests[101].expenses, digests[101].incomes,
+                digests[101].previous_expenses) == (1600, 30000, 1000)
+        assert digests[102].top_category == ("кафе", "☕", 700)
+
+    def test_send_digests(self, engine):
+        """Рассылка проходит по всем пользователям и отправляет только активным"""
+        sent = []
+
+        async def send(chat_id, text):
+            sent.append(chat_id)
+
+        stats = asyncio.run(send_digests("daily", send, NOW, engine, batch_size=2))
+        assert sent == [101]
+        assert (stats.users, stats.digests) == (3, 1)
+
+
+class FakeBot:
+    """Бот, записывающий время отправки; первые ответы могут быть ошибками"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, time.monotonic()))
+
+
+def deliver(bot, messages, **options):
+    async def scenario():
+        queue = SendQueue(workers=4, **options)
+        await queue.start(bot)
+        for chat_id in messages:
+            await queue.send(chat_id, "текст")
+        await queue.stop()
+        return queue
+    return asyncio.run(scenario())
+
+
+class TestSendQueue:
+    """Тесты очереди отправки с ограничением частоты"""
+
+    def test_rate_limits(self):
+        """Общий лимит и лимит чата растягивают отправку"""
+        bot = FakeBot()
+        start = time.monotonic()
+        queue = deliver(bot, [1, 2, 3, 4, 5, 6] + [7] * 3,
+                        global_rate=20, chat_rate=10, chat_burst=1)
+        assert queue.sent == 9
+        # 20 токенов про запас на всю очередь, но чат 7 — не чаще 10 в секунду
+        chat_times = [at for chat_id, at in bot.sent if chat_id == 7]
+        assert chat_times[-1] - chat_times[0] >= 0.18
+        assert time.monotonic() - start >= 0.18
+
+    def test_retry_after_and_forbidden(self):
+        """RetryAfter ставит очередь на паузу и повторяет, заблокированный чат пропускается"""
+        method = SendMessage(chat_id=1, text="текст")
+        bot = FakeBot([TelegramRetryAfter(method=method, message="Flood", retry_after=0.2),
+                       TelegramForbiddenError(method=method, message="blocked")])
+        start = time.monotonic()
+        queue = deliver(bot, [1], global_rate=100, chat_rate=100)
+        assert (queue.sent, queue.failed, queue.retried) == (0, 1, 1)
+
+        bot = FakeBot([TelegramRetryAfter(method=method, message="Flood", retry_after=0.2)])
+        queue = deliver(bot, [1, 2], global_rate=100, chat_rate=100)
+        assert (queue.sent, queue.failed, queue.retried) == (2, 0, 1)
+        assert time.monotonic() - start >= 0.4
@@ -0,0 +1,64 @@
+import csv
+import gzip
+import io
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.models import User, Category, Transaction
+from bot.export import EXPORT_COLUMNS, build_export, iter_export_rows, spool_size
+
+
+@pytest.fixture
+def db(engine):
+    """Временная БД с пятью транзакциями пользователя и одной чужой"""
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id=1, telegram_id=100), User(id=2, telegram_id=200),
+                     Category(id=1, user_id=1, name="кафе", is_expense=1)])
+    for day in range(5, 0, -1):
+        session.add(Transaction(user_id=1, amount=100 * day, currency="RUB",
+                                category_id=1 if day % 2 else None,
+                                description=f"{100 * day} кофе, с молоком",
+                                transaction_date=datetime(2024, 3, day), is_expense=1))
+    session.add(Transaction(user_id=2, amount=1, description="чужая",
+                            transaction_date=datetime(2024, 3, 1), is_expense=1))
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestExport:
+    """Тесты выгрузки транзакций"""
+
+    def test_rows_are_streamed_in_batches(self, db):
+        """Строки читаются пачками заданного размера в хронологическом порядке"""
+        batches = list(iter_export_rows(db, 1, batch_size=2))
+
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        rows = [row for batch in batches for row in batch]
+        assert [row[0] for row in rows][:2] == ["2024-03-01 00:00:00", "2024-03-02 00:00:00"]
+        assert rows[0][5] == "кафе"
+        assert rows[1][5] == "другое"  # транзакция без категории
+
+    def test_csv(self, db):
+        """CSV содержит заголовок и только транзакции пользователя"""
+        with build_export(db, 1, "csv") as spool:
+            text = spool.read().decode("utf-8-sig")
+
+        rows = list(csv.reader(io.StringIO(text)))
+        assert rows[0] == EXPORT_COLUMNS
+        assert len(rows) == 6
+        assert rows[1][1:3] == ["expense", "100.0"]
+        assert rows[1][6] == "100 кофе, с молоком"
+
+    def test_gzip(self, db):
+        """Сжатая выгрузка распаковывается в тот же CSV"""
+        with build_export(db, 1, "csv") as plain, build_export(db, 1, "gz") as packed:
+            assert gzip.decompress(packed.read()) == plain.read()
+            assert spool_size(packed) > 0
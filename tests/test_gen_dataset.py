@@ -0,0 +1,62 @@
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import gen_dataset
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+
+def dump(path: Path) -> list:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT user_id, amount, original_amount, currency, category_id, "
+                            "description, transaction_date, is_expense, mentioned_user "
+                            "FROM transactions ORDER BY id").fetchall()
+
+
+class TestGenDataset:
+    """Тесты генератора синтетической базы"""
+
+    def test_counts_and_schema(self, tmp_path):
+        """Все строки на месте, индексы и поиск работают"""
+        path = tmp_path / "data.db"
+        stats = gen_dataset.generate(str(path), users=5, transactions=3000, months=12,
+                                     batch_size=500, now=NOW)
+
+        assert stats.transactions == 3000
+        with sqlite3.connect(path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 3000
+            assert conn.execute("SELECT COUNT(DISTINCT user_id) FROM transactions").fetchone()[0] == 5
+            assert conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0] == stats.expenses
+            assert conn.execute("SELECT COUNT(*) FROM category_cache").fetchone()[0] == stats.cache_entries
+            # Доходы, валюта и упоминания есть, будущих дат нет
+            assert conn.execute("SELECT COUNT(*) FROM transactions WHERE is_expense = 0").fetchone()[0]
+            assert conn.execute("SELECT COUNT(*) FROM transactions "
+                                "WHERE currency != 'RUB' AND amount = original_amount").fetchone()[0]
+            assert conn.execute("SELECT COUNT(*) FROM transactions "
+                                "WHERE mentioned_user IS NOT NULL").fetchone()[0]
+            assert conn.execute("SELECT MAX(transaction_date) FROM transactions").fetchone()[0] < str(NOW)
+            # Каждая транзакция ссылается на категорию своего пользователя
+            assert conn.execute("SELECT COUNT(*) FROM transactions t JOIN categories c "
+                                "ON c.id = t.category_id AND c.user_id = t.user_id").fetchone()[0] == 3000
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            assert {"ix_transactions_user_date", "ix_transactions_user_category_date"} <= indexes
+            assert conn.execute("SELECT COUNT(*) FROM transactions_fts "
+                                "WHERE transactions_fts MATCH 'кофе'").fetchone()[0]
+
+        with pytest.raises(FileExistsError):
+            gen_dataset.generate(str(path), users=1, transactions=10, now=NOW)
+
+    def test_reproducible(self, tmp_path):
+        """Одинаковый seed дает одинаковую базу"""
+        for name, seed in (("a.db", 1), ("b.db", 1), ("c.db", 2)):
+            gen_dataset.generate(str(tmp_path / name), users=3, transactions=500, seed=seed,
+                                 expenses=False, search_index=False, now=NOW)
+        assert dump(tmp_path / "a.db") == dump(tmp_path / "b.db")
+        assert dump(tmp_path / "a.db") != dump(tmp_path / "c.db")
@@ -0,0 +1,101 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bot.commands import format_goal
+from bot.expense import parse_bulk_message, save_bulk_transactions
+from core import goals
+from core.goals import (add_goal_link, delete_goal, remove_contributions,
+                        track_transactions)
+from core.models import Category, Goal, GoalContribution, GoalLink, Transaction, User
+from core.writer import insert
+
+
+@pytest.fixture
+def engine(engine, monkeypatch):
+    """Временная БД с пользователем, категорией дохода и целью"""
+    monkeypatch.setattr(goals, "_rules", {})
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id=1, telegram_id=100))
+        db.add(Category(id=1, user_id=1, name="подработка", emoji="💼", is_expense=0))
+        db.add(Goal(id=1, user_id=1, name="Отпуск", target_amount=100000, current_amount=0))
+        db.commit()
+    return engine
+
+
+def progress(engine) -> float:
+    with sessionmaker(bind=engine)() as db:
+        return db.get(Goal, 1).current_amount
+
+
+class TestGoals:
+    """Тесты целей со счетчиками прогресса"""
+
+    def test_bulk_insert_and_delete(self, engine, run_writes):
+        """Доходы по правилам пополняют цель, расходы — нет; удаление вычитает вклад"""
+        parsed, _ = parse_bulk_message(
+            "+20000 подработка\n+5000 копилка отпуск\n300 кофе\n+1000 кэшбэк\n"
+            "3000 отель отпуск")
+        items = list(zip(parsed, ["подработка", "другое", "кафе", "кэшбэк", "путешествия"]))
+        run_writes(
+            add_goal_link(1, 1, category_id=1),
+            add_goal_link(1, 1, keyword="Отпуск"),
+            save_bulk_transactions(1, items))
+
+        assert progress(engine) == 25000
+        with sessionmaker(bind=engine)() as db:
+            contributions = db.query(GoalContribution.transaction_id).all()
+            kept = db.query(Transaction.id).filter(Transaction.description == "+20000 подработка").scalar()
+        assert len(contributions) == 2
+
+        def drop(db):
+            return remove_contributions(db, [kept])
+        assert run_writes(drop) == [1]
+        assert progress(engine) == 5000
+
+        # Удаление цели убирает ее правила и вклады
+        assert run_writes(delete_goal(1, 1)) == [1]
+        with sessionmaker(bind=engine)() as db:
+            assert db.query(GoalLink).count() == 0
+            assert db.query(GoalContribution).count() == 0
+        assert goals._rules == {}
+
+    def test_single_insert_without_goals_skips_queries(self, engine, run_writes):
+        """Без правил проверка транзакции не обращается к базе повторно"""
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        def save(amount):
+            transaction = Transaction(user_id=1, amount=amount, currency="USD", category_id=1,
+                                      description="+10 подработка", is_expense=0,
+                                      transaction_date=datetime(2024, 1, 5))
+
+            def op(db):
+                insert(transaction)(db)
+                return track_transactions(db, 1, [transaction])
+            return op
+
+        assert run_writes(save(10), save(10)) == [0, 0]
+        assert sum("goal_links" in statement for statement in statements) == 1
+
+        # После привязки доход в валюте пересчитывается в рубли
+        assert run_writes(add_goal_link(1, 1, category_id=1), save(10))[1] == 1
+        assert progress(engine) == 900
+
+    def test_format_goal(self):
+        """Прогресс и ежемесячный взнос до срока"""
+        goal = Goal(id=2, name="Ноутбук", target_amount=120000, current_amount=30000,
+                    deadline=datetime(2024, 7, 1))
+        text = format_goal(goal, ["#подработка", "ноутбук"], datetime(2024, 1, 15))
+        assert "25%" in text
+        assert "до 01.07.2024" in text
+        assert "<code>15000.00</code> ₽ в месяц" in text
+        assert "#подработка, ноутбук" in text
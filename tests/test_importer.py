@@ -0,0 +1,123 @@
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core import llm
+from core.models import User, Category, Expense, Transaction
+from core.writer import WriteQueue
+from bot import importer
+from bot.importer import (StatementError, StatementReader, find_columns,
+                          import_statement, parse_amount, parse_date)
+
+STATEMENT = (
+    "Дата операции;Сумма операции;Валюта;Описание\n"
+    "01.03.2024 12:30:00;-1 250,50;RUB;Пятерочка\n"
+    "02.03.2024;-300,00;RUB;Кофе\n"
+    "02.03.2024;-300,00;RUB;кофе\n"
+    "не дата;-10;RUB;Мусор\n"
+    "\n"
+    "05.03.2024;75 000,00;RUB;Зарплата\n"
+)
+
+
+@pytest.fixture
+def engine(engine):
+    """Временная файловая БД с пользователем"""
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id=1, telegram_id=100))
+        db.add(Category(user_id=1, name="продукты", is_expense=1))
+        db.add(Category(user_id=1, name="кафе", is_expense=1))
+        db.add(Category(user_id=1, name="зарплата", is_expense=0))
+        db.commit()
+    return engine
+
+
+class TestStatementParsing:
+    """Тесты разбора выписок"""
+
+    def test_amounts_and_dates(self):
+        """Суммы с пробелами и запятой, даты в разных форматах"""
+        assert parse_amount("-1 250,50") == -1250.5
+        assert parse_amount("1\xa0000.00 ₽") == 1000.0
+        assert parse_amount("−500") == -500.0
+        assert parse_amount("abc") is None
+        assert parse_date("01.03.2024 12:30:00") == datetime(2024, 3, 1, 12, 30)
+        assert parse_date("2024-03-01") == datetime(2024, 3, 1)
+        assert parse_date("31.02.2024") is None
+
+    def test_columns(self):
+        """Колонки находятся по синонимам, без обязательных — ошибка"""
+        columns = find_columns(["Дата операции", "Дата платежа", "Сумма", "Описание"])
+        assert columns == {"date": 0, "amount": 2, "description": 3}
+        with pytest.raises(StatementError):
+            find_columns(["Дата", "Комментарий"])
+
+    def test_cp1251_statement(self, tmp_path):
+        """Выписка в cp1251 читается, мусорные строки пропускаются"""
+        path = tmp_path / "statement.csv"
+        path.write_bytes(STATEMENT.encode("cp1251"))
+
+        reader = StatementReader(str(path))
+        rows = list(reader)
+
+        assert reader.encoding == "cp1251"
+        assert [row.amount for row in rows] == [-1250.5, -300.0, -300.0, 75000.0]
+        assert rows[0].description == "Пятерочка"
+        assert reader.skipped == 1
+
+
+class TestImportStatement:
+    """Тесты импорта выписки в базу"""
+
+    def test_import(self, engine, tmp_path, monkeypatch):
+        """Строки вставляются частями, каждое описание категоризируется один раз"""
+        path = tmp_path / "statement.csv"
+        path.write_text(STATEMENT, encoding="utf-8")
+        monkeypatch.setattr(llm, "LLM_AVAILABLE", False)
+        monkeypatch.setattr(importer.settings, "IMPORT_CHUNK_SIZE", 2)
+
+        categorized = []
+        original = importer.categorize_transactions
+
+        def categorize_spy(descriptions, db, user_id, llm_limit=None):
+            descriptions = list(descriptions)
+            categorized.append(descriptions)
+            return original(descriptions, db, user_id, llm_limit)
+
+        monkeypatch.setattr(importer, "categorize_transactions", categorize_spy)
+        progress = []
+
+        async def on_progress(stage, done, total):
+            progress.append((stage, done))
+
+        async def scenario():
+            queue = WriteQueue(bind=engine)
+            monkeypatch.setattr(llm, "write_queue", queue)
+            await queue.start()
+            result = await import_statement(
+                str(path), 1, on_progress, queue=queue,
+                session_factory=sessionmaker(bind=engine))
+            await queue.stop()
+            return result
+
+        result = asyncio.run(scenario())
+
+        assert result.imported == 4
+        assert result.skipped == 1
+        assert len(categorized) == 1
+        assert sorted(categorized[0]) == ["зарплата", "кофе", "мусор", "пятерочка"]
+        assert progress == [("categorize", 0), ("insert", 2), ("insert", 4)]
+        with sessionmaker(bind=engine)() as db:
+            assert db.query(Transaction).count() == 4
+            assert db.query(Expense).count() == 3
+            categories = dict(db.query(Transaction.description, Category.name)
+                              .join(Category, Transaction.category_id == Category.id))
+            assert categories["Пятерочка"] == "продукты"
+            assert categories["Кофе"] == "кафе"
@@ -0,0 +1,103 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.models import User, Category, Transaction
+from bot.commands import fetch_transactions_page, find_category_ids
+
+
+@pytest.fixture
+def engine(engine):
+    """Временная БД: 23 транзакции, часть с одинаковым временем"""
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        User(id=1, telegram_id=100),
+        Category(id=1, user_id=1, name="кафе", is_expense=1),
+        Category(id=2, user_id=1, name="подарки", is_expense=1),
+        Category(id=3, user_id=1, name="подарки", is_expense=0),
+    ])
+    start = datetime(2024, 3, 1)
+    for i in range(23):
+        db.add(Transaction(user_id=1, amount=i, category_id=1 + i % 3,
+                           # по три транзакции с одинаковым временем
+                           transaction_date=start + timedelta(hours=i // 3)))
+    db.commit()
+    db.close()
+    return engine
+
+
+def expected_order(db, category_ids=None):
+    """Все транзакции от новых к старым"""
+    query = db.query(Transaction)
+    if category_ids:
+        query = query.filter(Transaction.category_id.in_(category_ids))
+    return [tx.id for tx in sorted(query, key=lambda tx: (tx.transaction_date, tx.id),
+                                   reverse=True)]
+
+
+def walk_older(db, category_ids=None, limit=5):
+    """Листает от первой страницы к последней, возвращает id всех строк"""
+    rows, has_older, has_newer = fetch_transactions_page(db, 1, category_ids, limit=limit)
+    assert not has_newer
+    seen = [tx.id for tx, _, _ in rows]
+    while has_older:
+        rows, has_older, has_newer = fetch_transactions_page(
+            db, 1, category_ids, cursor_id=seen[-1], direction="older", limit=limit)
+        assert has_newer
+        seen.extend(tx.id for tx, _, _ in rows)
+    return seen
+
+
+class TestListPagination:
+    """Тесты постраничного /list"""
+
+    def test_walk_all_pages(self, engine):
+        """Листание назад проходит каждую транзакцию ровно один раз"""
+        with sessionmaker(bind=engine)() as db:
+            assert walk_older(db) == expected_order(db)
+
+    def test_newer_returns_previous_page(self, engine):
+        """Кнопка «позже» возвращает ту же страницу, с которой пришли"""
+        with sessionmaker(bind=engine)() as db:
+            first, _, _ = fetch_transactions_page(db, 1, limit=5)
+            second, _, _ = fetch_transactions_page(
+                db, 1, cursor_id=first[-1][0].id, direction="older", limit=5)
+            back, has_older, has_newer = fetch_transactions_page(
+                db, 1, cursor_id=second[0][0].id, direction="newer", limit=5)
+
+            assert [row[0].id for row in back] == [row[0].id for row in first]
+            assert has_older and not has_newer
+
+    def test_category_filter(self, engine):
+        """Фильтр по названию находит расход и доход, листание идет по обеим"""
+        with sessionmaker(bind=engine)() as db:
+            ids = find_category_ids(db, 1, "Подарки")
+            assert sorted(ids) == [2, 3]
+            assert find_category_ids(db, 1, "каф") == [1]
+            assert walk_older(db, ids, limit=4) == expected_order(db, ids)
+
+    def test_pages_use_index(self, engine):
+        """Запрос страницы идет по индексу, без сортировки во временном дереве"""
+        plans = []
+
+        @event.listens_for(engine, "before_cursor_execute", retval=True)
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT transactions.id"):
+                plans.extend(row[3] for row in conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + statement, parameters))
+            return statement, parameters
+
+        with sessionmaker(bind=engine)() as db:
+            rows, _, _ = fetch_transactions_page(db, 1, limit=5)
+            fetch_transactions_page(db, 1, [2], cursor_id=rows[-1][0].id, limit=5)
+
+        assert any("ix_transactions_user_date" in plan for plan in plans)
+        assert any("ix_transactions_user_category_date" in plan for plan in plans)
+        assert not any("TEMP B-TREE" in plan for plan in plans)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+from aiogram import Bot, Dispatcher
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fakes import FAKE_TOKEN, RecordingSession, make_message_update
+from bot.middleware import UpdateLoggingMiddleware
+from core import logs
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    """Лог через очередь во временный файл; после теста прежние обработчики возвращаются"""
+    monkeypatch.setattr(logs.settings, "LOG_SAMPLE_EVERY", 5)
+    monkeypatch.setattr(logs.settings, "LOG_SLOW_UPDATE_MS", 50)
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+
+    path = tmp_path / "finbot.log"
+    listener = logs.setup_logging(str(path), console=False)
+
+    def read():
+        listener.stop()
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+    yield read
+    if listener._thread is not None:
+        listener.stop()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.handlers = saved_handlers
+    root.setLevel(saved_level)
+
+
+class TestLogs:
+    """Тесты структурированного логирования"""
+
+    def test_update_context_and_latency(self, log_file):
+        """Записи обработчика получают update_id и user_id, медленное обновление — WARNING"""
+        dp = Dispatcher()
+        dp.update.outer_middleware(UpdateLoggingMiddleware())
+
+        @dp.message()
+        async def handler(message):
+            logging.getLogger("bot.expense").info("Сохранена транзакция «кофе»")
+            await asyncio.sleep(0.06)
+
+        update = make_message_update(42, "250 кофе")
+        bot = Bot(token=FAKE_TOKEN, session=RecordingSession())
+        asyncio.run(dp.feed_update(bot, update))
+
+        entries = log_file()
+        saved = next(entry for entry in entries if entry["logger"] == "bot.expense")
+        assert saved["msg"] == "Сохранена транзакция «кофе»"
+        assert (saved["update_id"], saved["user_id"]) == (update.update_id, 42)
+
+        handled = next(entry for entry in entries if entry["logger"] == "bot.updates")
+        assert handled["level"] == "WARNING"
+        assert handled["latency_ms"] >= 50
+        assert handled["update_id"] == update.update_id
+
+    def test_sampling(self, log_file):
+        """Частые INFO пишутся выборочно, предупреждения и прочие логгеры — всегда"""
+        updates = logging.getLogger("bot.updates")
+        for i in range(20):
+            updates.info("обновление %s", i)
+        updates.warning("медленно")
+        logging.getLogger("core.writer").info("коммит")
+
+        entries = log_file()
+        assert [entry["msg"] for entry in entries] == [
+            "обновление 0", "обновление 5", "обновление 10", "обновление 15",
+            "медленно", "коммит"]
@@ -0,0 +1,93 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core import maintenance
+from core.archive import archive_transactions, archived_transactions, attach_archive
+from core.models import User, Category, Expense, Transaction
+from core.search import ensure_search_index
+
+
+@pytest.fixture
+def engine(engine, tmp_path, monkeypatch):
+    """Файловая БД с архивом: два пользователя, часть истории в архиве"""
+    monkeypatch.setattr(maintenance.settings, "MAINTENANCE_BATCH_SIZE", 300)
+    attach_archive(engine, str(tmp_path / "test_archive.db"))
+    ensure_search_index(engine)
+    with sessionmaker(bind=engine)() as db:
+        for user_id in (1, 2):
+            db.add(User(id=user_id, telegram_id=100 + user_id))
+            db.add(Category(id=user_id, user_id=user_id, name="кафе", is_expense=1))
+        db.add_all([
+            Transaction(user_id=user_id, amount=100, category_id=user_id, is_expense=1,
+                        description="кофе " * 50,
+                        transaction_date=datetime(2023, 1, 1) + timedelta(hours=i))
+            for user_id in (1, 2) for i in range(1000)
+        ])
+        db.add_all([Expense(user_id=1, amount=100) for _ in range(10)])
+        db.commit()
+    archive_transactions(engine, months=2, now=datetime(2023, 4, 1))
+    return engine
+
+
+def count(engine, table, **filters):
+    with engine.connect() as conn:
+        query = table.select()
+        for name, value in filters.items():
+            query = query.where(table.c[name] == value)
+        return len(conn.execute(query).all())
+
+
+class TestMaintenance:
+    """Тесты команд обслуживания"""
+
+    def test_orphans(self, engine):
+        """Ссылки на удаленную категорию сбрасываются в основной таблице и архиве"""
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM categories WHERE id = 2")
+
+        report = maintenance.clean_orphans(engine)
+
+        transactions = Transaction.__table__
+        assert count(engine, transactions, category_id=2) == 0
+        assert count(engine, archived_transactions, category_id=2) == 0
+        assert count(engine, transactions, category_id=1) > 0
+        assert any("main.transactions: категория сброшена" in line for line in report.details)
+
+    def test_purge_user_and_vacuum(self, engine):
+        """Пользователь удаляется пачками, место возвращается инкрементальной очисткой"""
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        assert count(engine, archived_transactions, user_id=1) == 744
+        maintenance.purge_user(engine, 101)
+
+        assert count(engine, User.__table__) == 1
+        assert count(engine, Transaction.__table__, user_id=1) == 0
+        assert count(engine, archived_transactions, user_id=1) == 0
+        assert count(engine, Expense.__table__) == 0
+        assert count(engine, Transaction.__table__, user_id=2) > 0
+        # 744 архивные строки пачками по 300 — несколько коротких удалений
+        assert sum("DELETE FROM archive.transactions" in s for s in statements) >= 3
+
+        report = maintenance.vacuum(engine)
+        assert report.reclaimed > 0
+        assert maintenance.integrity(engine, full=True).details == ["main: ok", "archive: ok"]
+
+    def test_analyze_and_checkpoint(self, engine):
+        """ANALYZE заполняет статистику, контрольная точка обрезает WAL"""
+        maintenance.analyze(engine)
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT count(*) FROM sqlite_stat1").scalar() > 0
+
+        report = maintenance.checkpoint(engine)
+        assert report.size_after <= report.size_before
+        assert all("занята" not in line for line in report.details)
@@ -0,0 +1,89 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router
+from sqlalchemy import create_engine, text
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fakes import FAKE_TOKEN, RecordingSession, make_message_update
+from bot.middleware import HandlerMetricsMiddleware, UpdateLoggingMiddleware
+from core import metrics
+
+
+class TestMetrics:
+    """Тесты метрик Prometheus"""
+
+    def test_exposition_format(self):
+        """Счетчик с метками и накопительные корзины гистограммы"""
+        counter = metrics.Counter("test_requests_total", "Запросы", ["kind"])
+        histogram = metrics.Histogram("test_latency_seconds", "Время", ["kind"],
+                                      buckets=(0.1, 1))
+        metrics.REGISTRY.remove(counter)
+        metrics.REGISTRY.remove(histogram)
+        counter.inc('a"b')
+        counter.inc('a"b', amount=2)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, "x")
+
+        assert counter.render() == [
+            "# HELP test_requests_total Запросы",
+            "# TYPE test_requests_total counter",
+            'test_requests_total{kind="a\\"b"} 3',
+        ]
+        assert histogram.render()[2:] == [
+            'test_latency_seconds_bucket{kind="x",le="0.1"} 1',
+            'test_latency_seconds_bucket{kind="x",le="1"} 2',
+            'test_latency_seconds_bucket{kind="x",le="+Inf"} 3',
+            'test_latency_seconds_sum{kind="x"} 5.55',
+            'test_latency_seconds_count{kind="x"} 3',
+        ]
+
+    def test_handler_and_db_metrics(self):
+        """Время обработчика во вложенном роутере, обновления и запросы к базе"""
+        engine = create_engine("sqlite://")
+        metrics.instrument_engine(engine)
+        selects = metrics.DB_QUERIES.value("SELECT")
+
+        dp = Dispatcher()
+        dp.update.outer_middleware(UpdateLoggingMiddleware())
+        dp.message.middleware(HandlerMetricsMiddleware())
+        router = Router()
+        dp.include_router(router)
+
+        @router.message()
+        async def metrics_test_handler(message):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        updates = metrics.UPDATES.value("message")
+        bot = Bot(token=FAKE_TOKEN, session=RecordingSession())
+        asyncio.run(dp.feed_update(bot, make_message_update(1, "кофе 250")))
+
+        assert metrics.HANDLER_LATENCY.count("metrics_test_handler") == 1
+        assert metrics.UPDATES.value("message") == updates + 1
+        assert metrics.DB_QUERIES.value("SELECT") == selects + 1
+        assert metrics.DB_QUERY_TIME.count("SELECT") >= 1
+
+    def test_server(self):
+        """Страница /metrics отдается встроенным сервером"""
+        metrics.CATEGORIZATION.inc("cache")
+
+        async def scrape():
+            runner = await metrics.start_metrics_server("127.0.0.1", 0)
+            try:
+                port = runner.addresses[0][1]
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                        return response.status, response.headers["Content-Type"], await response.text()
+            finally:
+                await runner.cleanup()
+
+        status, content_type, body = asyncio.run(scrape())
+        assert status == 200
+        assert content_type.startswith("text/plain")
+        assert "# TYPE finbot_handler_latency_seconds histogram" in body
+        assert 'finbot_categorization_total{tier="cache"}' in body
@@ -0,0 +1,77 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.mock_llm import MockConfig, MockLLMServer, parse_latency
+from config import settings
+from core import llm
+from core.models import User
+from core.writer import WriteQueue
+
+
+@pytest.fixture
+def db(engine, monkeypatch):
+    """Временная БД; клиент LLM создается заново для адреса заглушки"""
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, telegram_id=100))
+    session.commit()
+
+    monkeypatch.setattr(llm, "write_queue", WriteQueue(bind=engine))
+    monkeypatch.setattr(llm, "LLM_AVAILABLE", True)
+    monkeypatch.setattr(llm, "_client", None)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    yield session
+    session.close()
+
+
+def use(server: MockLLMServer, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "LLM_BASE_URL", server.base_url)
+
+
+class TestMockLLM:
+    """Тесты локальной заглушки LLM"""
+
+    def test_parse_latency(self):
+        """Распределения задержки разбираются, неизвестные отклоняются"""
+        import random
+
+        rng = random.Random(1)
+        assert parse_latency("fixed:250")(rng) == 0.25
+        assert 0.05 <= parse_latency("uniform:50:100")(rng) <= 0.1
+        assert parse_latency("lognormal:100:0.5")(rng) > 0
+        for spec in ("pareto:1", "fixed", "uniform:1:x"):
+            with pytest.raises(ValueError):
+                parse_latency(spec)
+
+    def test_categories_by_rules(self, db, monkeypatch):
+        """Одиночный и пакетный запросы получают категории из таблицы правил"""
+        with MockLLMServer() as server:
+            use(server, monkeypatch)
+            assert llm.categorize_transaction("поездка ситимобил", db, 1) == "такси"
+
+            results = llm.categorize_transactions(
+                ["абонемент в зал", "онлайн-курс", "что-то странное"], db, 1)
+            assert results == {"абонемент в зал": "спорт", "онлайн-курс": "образование",
+                               "что-то странное": "другое"}
+            assert llm.ask_cerebras([{"role": "user", "content": "Совет?"}])
+        # Пакет ушел одним запросом
+        assert server.stats["requests"] == 3
+
+    @pytest.mark.parametrize("config, counter", [
+        (MockConfig(rate_limit_rate=1.0), "rate_limited"),
+        (MockConfig(error_rate=1.0), "errors"),
+        (MockConfig(malformed_rate=1.0, seed=3), "malformed"),
+    ])
+    def test_faults_fall_back(self, db, monkeypatch, config, counter):
+        """При 429, 500 и ответе не в формате категоризация возвращает "другое" """
+        with MockLLMServer(config) as server:
+            use(server, monkeypatch)
+            assert llm.categorize_transaction("поездка ситимобил", db, 1) == "другое"
+            assert llm.categorize_transactions(["онлайн-курс"], db, 1) == {
+                "онлайн-курс": "другое"}
+        assert server.stats[counter] == 2
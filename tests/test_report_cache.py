@@ -0,0 +1,85 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import bot.report_cache as report_cache
+from bot.commands import render_categories, render_stats, render_summary
+from bot.report_cache import cached_report
+from core.cache import LRUCache
+from core.currency import RateTable
+from core.models import Category, Expense, Transaction, User
+from core.versions import bump_data_version
+
+NOW = datetime(2024, 3, 20, 12)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Пустой кэш отчетов и своя таблица курсов"""
+    cache = LRUCache(max_size=10)
+    monkeypatch.setattr(report_cache, "report_cache", cache)
+    monkeypatch.setattr(report_cache, "rates", RateTable())
+    return cache
+
+
+@pytest.fixture
+def db(engine):
+    """Временная БД с пользователем, категориями и транзакциями марта"""
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, telegram_id=100))
+    session.add(Category(id=1, user_id=1, name="кафе", emoji="☕", is_expense=1))
+    session.add(Category(id=2, user_id=1, name="зарплата", emoji="💰", is_expense=0))
+    session.add(Transaction(user_id=1, amount=1500, currency="RUB", category_id=1,
+                            transaction_date=datetime(2024, 3, 18), is_expense=1))
+    session.add(Transaction(user_id=1, amount=50000, currency="RUB", category_id=2,
+                            transaction_date=datetime(2024, 3, 5), is_expense=0))
+    session.add(Expense(user_id=1, amount=1500, category="кафе",
+                        created_at=datetime(2024, 3, 18)))
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestReportCache:
+    """Тесты кэша отчетов с версиями данных"""
+
+    def test_versioned_keys(self, cache):
+        """Повтор — из кэша; запись данных, новые курсы или новый день — пересчет"""
+        renders = []
+
+        def render():
+            renders.append(1)
+            return f"отчет {len(renders)}"
+
+        assert cached_report(901, "stats", "2024-03-20", render) == "отчет 1"
+        assert cached_report(901, "stats", "2024-03-20", render) == "отчет 1"
+        assert cached_report(902, "stats", "2024-03-20", render) == "отчет 2"
+
+        bump_data_version(901)
+        assert cached_report(901, "stats", "2024-03-20", render) == "отчет 3"
+        report_cache.rates.load_csv("2024-03-01,USD,90\n")
+        assert cached_report(901, "stats", "2024-03-20", render) == "отчет 4"
+        assert cached_report(901, "stats", "2024-03-21", render) == "отчет 5"
+        assert cached_report(901, "summary", "2024-03-21", render) == "отчет 6"
+        # Новые курсы меняют рублевые суммы отчетов всех пользователей
+        assert cached_report(902, "stats", "2024-03-20", render) == "отчет 7"
+        assert len(renders) == 7
+
+    def test_reports_render(self, db, cache):
+        """Отчеты строятся из базы и отдаются из кэша без изменений"""
+        stats = cached_report(1, "stats", "2024-03-20", lambda: render_stats(db, 1, NOW))
+        assert "1500.00" in stats and "50000.00" in stats
+        assert cached_report(1, "stats", "2024-03-20", lambda: "не вызывается") == stats
+
+        summary = render_summary(db, 1, NOW)
+        assert "ФИНАНСОВАЯ СВОДКА" in summary and "1500.00" in summary
+
+        categories = render_categories(db, 1)
+        assert "☕ Кафе" in categories and "💰 Зарплата" in categories
+        assert "нет настроенных категорий" in render_categories(db, 2)
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Импорт модулей регистрирует обработчики в классификаторе
+from bot import commands, expense, routing
+from bot.routing import classify_message
+
+
+class TestMessageClassifier:
+    """Тесты предварительной классификации сообщений"""
+
+    def test_menu_buttons(self):
+        """Кнопки меню направляются по точному тексту"""
+        assert classify_message("Статистика").handler is commands.show_stats_button
+        assert classify_message("Скрыть меню").handler is commands.hide_menu
+
+    def test_slash_commands_and_aliases(self):
+        """Слеш-команды и их текстовые синонимы ведут к одному обработчику"""
+        assert classify_message("/stats").handler is commands.cmd_stats
+        assert classify_message("статистика").handler is commands.cmd_stats
+        assert classify_message("Отчет").handler is commands.cmd_summary
+        assert classify_message("/help@finbot").handler is commands.cmd_help
+
+    def test_command_arguments(self):
+        """Текст после команды передается как аргументы"""
+        route = classify_message("/list продукты")
+        assert route.name == "list"
+        assert route.args == "продукты"
+
+    def test_transactions(self):
+        """Сообщения с суммой в начале — транзакции, включая расходы с минусом"""
+        for text in ("500 кофе", "-150 такси", "+50000 зарплата", "99,90 USD книги",
+                     "20$ кофе", "€20 кофе", "-15£ музей", "+1000₽ возврат"):
+            route = classify_message(text)
+            assert route.kind == "transaction", text
+            assert route.handler is expense.process_transaction
+
+    def test_bulk_transactions(self):
+        """Несколько строк с суммами направляются пакетному обработчику"""
+        route = classify_message("500 кофе\n-150 такси\n+50000 зарплата")
+        assert route.name == "bulk"
+        assert route.handler is expense.process_bulk_transactions
+        assert classify_message("500 кофе\n").name == "single"
+
+    def test_unrecognized_text(self):
+        """Неизвестный текст и сумма без описания не распознаются"""
+        assert classify_message("привет") is None
+        assert classify_message("500") is None
+        assert classify_message("$ кофе") is None
+        assert classify_message("20$$ кофе") is None
+        assert classify_message("/unknown") is None
+        assert classify_message("статистика за март") is None
+
+    def test_dispatch_passes_arguments(self):
+        """Разобранные аргументы передаются обработчику, объявившему параметр args"""
+        calls = []
+
+        async def fake_list(message, args=""):
+            calls.append(("list", args))
+
+        async def fake_stats(message):
+            calls.append(("stats", None))
+
+        for text, handler in (("/list продукты", fake_list), ("/stats", fake_stats)):
+            route = classify_message(text)._replace(handler=handler)
+            asyncio.run(routing.dispatch_message(None, route))
+
+        assert calls == [("list", "продукты"), ("stats", None)]
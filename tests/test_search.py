@@ -0,0 +1,108 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core import search
+from core.models import User, Category, Transaction
+from core.search import build_match_query, parse_search_query, search_transactions
+
+
+@pytest.fixture
+def db(engine):
+    """Временная БД; часть транзакций записана до создания индекса"""
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id=1, telegram_id=100), User(id=2, telegram_id=200),
+                     Category(id=1, user_id=1, name="такси", is_expense=1),
+                     Category(id=2, user_id=1, name="кафе", is_expense=1)])
+    session.add(Transaction(user_id=1, amount=500, category_id=1, is_expense=1,
+                            description="500 Такси до дома",
+                            transaction_date=datetime(2024, 3, 5)))
+    session.commit()
+
+    search.ensure_search_index(engine)
+    session.add_all([
+        Transaction(user_id=1, amount=700, category_id=1, is_expense=1,
+                    description="700 такси в аэропорт", transaction_date=datetime(2024, 4, 1)),
+        Transaction(user_id=1, amount=300, category_id=2, is_expense=1,
+                    description="300 кофе и круассан", transaction_date=datetime(2024, 3, 7)),
+        Transaction(user_id=2, amount=999, is_expense=1,
+                    description="999 такси", transaction_date=datetime(2024, 3, 6)),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestSearchQuery:
+    """Тесты разбора запроса /search"""
+
+    def test_filters(self):
+        """Месяц, год, день и категория извлекаются из текста"""
+        today = datetime(2024, 5, 10)
+        query = parse_search_query("такси в марте #Транспорт", today)
+        assert query.text == "такси"
+        assert (query.date_from, query.date_to) == (datetime(2024, 3, 1), datetime(2024, 4, 1))
+        assert query.category == "транспорт"
+
+        # Месяц, который еще не наступил, — прошлого года
+        assert parse_search_query("декабрь", today).date_from == datetime(2023, 12, 1)
+        assert parse_search_query("кофе 2023", today).date_to == datetime(2024, 1, 1)
+        assert parse_search_query("кофе 15.03.2024", today).date_from == datetime(2024, 3, 15)
+
+    def test_match_query_is_quoted(self):
+        """Спецсимволы FTS5 из ввода не попадают в выражение MATCH"""
+        assert build_match_query('Такси "OR" дом*') == '"такси"* "or"* "дом"*'
+        assert build_match_query("!!!") is None
+        assert build_match_query("такси", 7) == 'user_id:"7" AND description:("такси"*)'
+
+
+class TestSearch:
+    """Тесты полнотекстового поиска"""
+
+    def test_search_with_totals(self, db):
+        """Находятся только транзакции пользователя, итоги по всем совпадениям"""
+        result = search_transactions(db, 1, "такси")
+
+        assert result.count == 2
+        assert result.total_expense == 1200
+        assert {tx.id for tx, _, _ in result.rows} == {1, 2}
+
+    def test_prefix_and_filters(self, db):
+        """Поиск по началу слова, фильтры по периоду и категории"""
+        march = search_transactions(db, 1, "такс", datetime(2024, 3, 1), datetime(2024, 4, 1))
+        assert [tx.amount for tx, _, _ in march.rows] == [500]
+
+        assert search_transactions(db, 1, "кофе", category_ids=[1]).count == 0
+        assert search_transactions(db, 1, "", category_ids=[2]).count == 1
+
+    def test_index_follows_updates_and_deletes(self, db):
+        """Триггеры обновляют индекс при изменении и удалении транзакций"""
+        tx = db.get(Transaction, 3)
+        tx.description = "300 чай"
+        db.commit()
+        assert search_transactions(db, 1, "кофе").count == 0
+        assert search_transactions(db, 1, "чай").count == 1
+
+        db.delete(db.get(Transaction, 2))
+        db.commit()
+        assert search_transactions(db, 1, "аэропорт").count == 0
+
+    def test_like_fallback_escapes_wildcards(self, db, monkeypatch):
+        """Без FTS5 символы _ и % в запросе ищутся буквально, а не как шаблон LIKE"""
+        monkeypatch.setattr(search, "FTS_AVAILABLE", False)
+        db.add_all([
+            Transaction(user_id=1, amount=100, is_expense=1, description="100 тариф a_b",
+                        transaction_date=datetime(2024, 3, 8)),
+            Transaction(user_id=1, amount=200, is_expense=1, description="200 тариф axb",
+                        transaction_date=datetime(2024, 3, 9)),
+        ])
+        db.commit()
+
+        assert search_transactions(db, 1, "a_b").count == 1
+        assert search_transactions(db, 1, "такси").count == 2
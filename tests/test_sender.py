@@ -0,0 +1,103 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bot.middleware import SendQueueMiddleware
+from bot.sender import SendQueue, background_priority, send_priority, BACKGROUND
+from core.metrics import SEND_LATENCY, SEND_QUEUE_DEPTH
+
+
+class FakeBot:
+    """Бот, записывающий порядок отправленных сообщений"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def run(scenario, **options):
+    async def wrapper():
+        queue = SendQueue(**options)
+        bot = FakeBot()
+        await queue.start(bot)
+        try:
+            await scenario(queue, bot)
+            await queue.join()
+        finally:
+            await queue.stop()
+        return queue, bot
+    return asyncio.run(wrapper())
+
+
+class TestSendQueuePriority:
+    """Тесты приоритетов и лимитов очереди отправки"""
+
+    def test_interactive_before_background(self):
+        """Ответ пользователю обгоняет накопленную фоновую рассылку"""
+        async def scenario(queue, bot):
+            for chat_id in range(1, 11):
+                await queue.send(chat_id, "сводка")
+            await asyncio.sleep(0.05)
+
+            async def reply():
+                bot.sent.append((99, "ответ"))
+                return "ok"
+            assert await queue.request(reply, 99) == "ok"
+
+        latency_before = SEND_LATENCY.count("interactive")
+        queue, bot = run(scenario, global_rate=5, workers=1)
+        position = bot.sent.index((99, "ответ"))
+        assert position < 8
+        assert len(bot.sent) == 11 and queue.sent == 11
+        assert SEND_LATENCY.count("interactive") == latency_before + 1
+        assert SEND_QUEUE_DEPTH.value("background") == 0
+
+    def test_busy_chat_does_not_block_others(self):
+        """Сообщения чата сверх лимита откладываются, остальные чаты идут сразу"""
+        async def scenario(queue, bot):
+            for _ in range(3):
+                await queue.send(1, "в первый чат")
+            await queue.send(2, "во второй чат")
+
+        _, bot = run(scenario, global_rate=100, chat_rate=5, chat_burst=1, workers=1)
+        assert [chat_id for chat_id, _ in bot.sent] == [1, 2, 1, 1]
+
+
+class TestSendQueueMiddleware:
+    """Тесты middleware сессии бота"""
+
+    def test_requests_go_through_queue(self):
+        """Отправка идет через очередь, ответ и ошибки возвращаются обработчику"""
+        calls = []
+
+        async def make_request(bot, method):
+            calls.append((type(method).__name__, send_priority.get()))
+            if getattr(method, "text", None) == "ошибка":
+                raise TelegramBadRequest(method=method, message="message is not modified")
+            return "ответ"
+
+        async def scenario(queue, bot):
+            middleware = SendQueueMiddleware(queue)
+            result = await middleware(make_request, None, SendMessage(chat_id=1, text="текст"))
+            assert result == "ответ"
+            with pytest.raises(TelegramBadRequest):
+                await middleware(make_request, None, SendMessage(chat_id=1, text="ошибка"))
+            # Ответ на нажатие кнопки не ограничен и идет мимо очереди
+            await middleware(make_request, None, AnswerCallbackQuery(callback_query_id="1"))
+            with background_priority():
+                assert send_priority.get() == BACKGROUND
+                await middleware(make_request, None, SendMessage(chat_id=2, text="прогресс"))
+
+        queue, _ = run(scenario, global_rate=100, chat_rate=100)
+        assert [name for name, _ in calls] == ["SendMessage", "SendMessage",
+                                               "AnswerCallbackQuery", "SendMessage"]
+        assert (queue.sent, queue.failed) == (2, 1)
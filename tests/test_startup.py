@@ -0,0 +1,35 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_startup import measure_startup
+from config import settings
+
+# Время старта зависит от машины, поэтому проверка бюджета включается явно:
+# FINBOT_STARTUP_TEST=1 python -m pytest tests/test_startup.py
+STARTUP_TEST = os.environ.get("FINBOT_STARTUP_TEST") == "1"
+
+
+class TestStartupBudget:
+    """Тест бюджета времени старта бота"""
+
+    @pytest.mark.skipif(not STARTUP_TEST, reason="нужен FINBOT_STARTUP_TEST=1")
+    def test_startup_within_budget(self):
+        """От запуска процесса до первого обработанного обновления укладываемся в бюджет"""
+        # Берем лучший из двух запусков, чтобы не ловить шум холодного кэша диска
+        report = min((measure_startup() for _ in range(2)),
+                     key=lambda r: r.total_ms)
+
+        assert report.total_ms <= settings.STARTUP_BUDGET_MS, report.format()
+
+    def test_heavy_libraries_not_imported_on_startup(self):
+        """openai и библиотеки графиков не импортируются при старте"""
+        report = measure_startup(profile_imports=True)
+        imported = {name for name, _ in report.imports_ms}
+
+        assert not imported & {"openai", "matplotlib", "pandas", "numpy"}
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+from aiogram import Bot
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fakes import FAKE_TOKEN, RecordingSession, make_message_update
+from bot import expense
+from bot.middleware import TracingRequestMiddleware
+from core import llm, tracing
+from core.models import User, Category
+from core.writer import WriteQueue
+from main import create_dispatcher
+
+
+@pytest.fixture
+def engine(engine, monkeypatch):
+    """Временная БД с трассировкой запросов; обработчики транзакций пишут в нее"""
+    tracing.trace_engine(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(id=1, telegram_id=100, first_name="Аня"))
+        db.add(Category(user_id=1, name="кафе", emoji="☕", is_expense=1))
+        db.commit()
+
+    queue = WriteQueue(bind=engine)
+    monkeypatch.setattr(expense, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(expense, "write_queue", queue)
+    monkeypatch.setattr(llm, "write_queue", queue)
+    monkeypatch.setattr(llm, "LLM_AVAILABLE", False)
+    return engine
+
+
+@pytest.fixture(scope="module")
+def dp():
+    """Настоящий диспетчер; роутеры модулей подключаются к нему один раз"""
+    return create_dispatcher()
+
+
+def run_updates(dp, *texts):
+    """Прогоняет сообщения через диспетчер и возвращает деревья обновлений"""
+    session = RecordingSession()
+    session.middleware(TracingRequestMiddleware())
+    bot = Bot(token=FAKE_TOKEN, session=session)
+
+    async def scenario():
+        await expense.write_queue.start()
+        for text in texts:
+            await dp.feed_update(bot, make_message_update(100, text))
+        await expense.write_queue.stop()
+
+    with tracing.collect_traces() as traces:
+        asyncio.run(scenario())
+    return traces
+
+
+class TestTracing:
+    """Тесты трассировки обновлений"""
+
+    def test_query_ceiling(self, dp, engine):
+        """Сохранение транзакции укладывается в заданное число запросов"""
+        traces = run_updates(dp, "250 кофе", "-150 такси")
+
+        # Пользователь, категории, кэш, примеры для LLM — дважды (повторная
+        # категоризация в get_or_create_category), поиск категории, два SUM баланса
+        tracing.assert_query_ceilings(traces, {"process_transaction": 11})
+        handler = next(span for span in traces[0].walk() if span.kind == "handler")
+        assert handler.name == "process_transaction"
+        assert any(span.kind == "telegram" and span.name == "SendMessage"
+                   for span in handler.walk())
+        assert all(span.duration > 0 for span in handler.walk() if span.kind == "sql")
+
+        with pytest.raises(AssertionError, match="process_transaction: \\d+ запросов"):
+            tracing.assert_query_ceilings(traces, {"process_transaction": 1})
+
+    def test_slow_update_logged(self, dp, engine, monkeypatch, caplog):
+        """Медленное обновление пишется в лог с деревом интервалов"""
+        monkeypatch.setattr(tracing.settings, "TRACE_SLOW_UPDATE_MS", 0)
+        with caplog.at_level(logging.WARNING, logger="bot.trace"):
+            run_updates(dp, "250 кофе")
+
+        record = next(r for r in caplog.records if r.name == "bot.trace")
+        assert "Медленное обновление" in record.getMessage()
+        assert "handler process_transaction" in record.getMessage()
+        handler = record.trace["children"][0]
+        assert handler["name"] == "process_transaction"
+        assert any(child["kind"] == "sql" for child in handler["children"])
+
+    def test_span_limit(self, monkeypatch):
+        """Дерево обновления ограничено TRACE_MAX_SPANS интервалами"""
+        monkeypatch.setattr(tracing.settings, "TRACE_MAX_SPANS", 3)
+        with tracing.start_trace("message") as trace:
+            for i in range(5):
+                with tracing.span("sql", f"SELECT {i}"):
+                    pass
+        with tracing.span("sql", "вне обновления") as outside:
+            assert outside is None
+
+        assert trace.count("sql") == 3
+        assert trace.dropped == 2
+        assert "еще 2 интервалов" in trace.format()
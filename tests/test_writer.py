@@ -0,0 +1,73 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy import event, func
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.models import User, Transaction
+from core.writer import WriteQueue, insert, delete
+
+
+def count_commits(engine):
+    """Подсчитывает коммиты, выполненные через движок"""
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    return commits
+
+
+class TestWriteQueue:
+    """Тесты очереди групповой записи"""
+
+    def test_concurrent_inserts_are_grouped(self, engine):
+        """Одновременные вставки фиксируются меньшим числом коммитов"""
+        commits = count_commits(engine)
+
+        async def scenario():
+            queue = WriteQueue(bind=engine, max_batch=50, max_delay_ms=20)
+            await queue.start()
+            futures = [
+                queue.submit(insert(Transaction(user_id=1, amount=i)))
+                for i in range(100)
+            ]
+            results = await asyncio.gather(*futures)
+            await queue.stop()
+            return results
+
+        results = asyncio.run(scenario())
+
+        assert all(tx.id is not None for tx in results)
+        assert len(commits) < 100
+        with engine.connect() as conn:
+            assert conn.execute(func.count(Transaction.id).select()).scalar() == 100
+
+    def test_failed_operation_does_not_break_group(self, engine):
+        """Ошибка одной операции не отменяет остальные записи группы"""
+        def broken(db):
+            raise ValueError("сломанная операция")
+
+        async def scenario():
+            queue = WriteQueue(bind=engine, max_batch=10, max_delay_ms=50)
+            await queue.start()
+            good = queue.submit(insert(User(telegram_id=1)))
+            bad = queue.submit(broken)
+            other = queue.submit(insert(User(telegram_id=2)))
+            results = await asyncio.gather(good, bad, other, return_exceptions=True)
+            await queue.stop()
+            return results
+
+        good, bad, other = asyncio.run(scenario())
+
+        assert isinstance(bad, ValueError)
+        assert good.id is not None and other.id is not None
+
+    def test_submit_without_running_queue_writes_immediately(self, engine):
+        """Без запущенной очереди операция выполняется сразу"""
+        async def scenario():
+            queue = WriteQueue(bind=engine)
+            await queue.submit(insert(User(telegram_id=42)))
+            return await queue.submit(delete(User, User.telegram_id == 42))
+
+        assert asyncio.run(scenario()) == 1